@@ -1,5 +1,11 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
 import pytz
 from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.requests import StockBarsRequest
@@ -10,6 +16,8 @@ from datetime import time
 from datetime import datetime
 from datetime import timedelta
 
+from indicators import batch_indicators
+
 # Function to start up the main client for retrieving data
 def setup_historical_client(key_: str,secret_: str, base_url_: str, raw_data_: bool):
     return StockHistoricalDataClient(
@@ -18,13 +26,13 @@ def setup_historical_client(key_: str,secret_: str, base_url_: str, raw_data_: b
         raw_data=raw_data_
     )
 
-# Function to retrieve the latest bars 
-def retrieve_stock_bars(client_: StockHistoricalDataClient, symbol_: str, time_interval_: int, time_unit_: TimeFrameUnit, limit_: int):
+# Function to retrieve the latest bars (now_ replaces the current time, e.g. for a replay clock)
+def retrieve_stock_bars(client_: StockHistoricalDataClient, symbol_: str, time_interval_: int, time_unit_: TimeFrameUnit, limit_: int, now_: datetime = None):
     # Get ET and UTC time zones
     eastern = pytz.timezone("America/New_York")
     utc = pytz.UTC
     # Get current time and calculate start and end time for StockBarsRequest by calculating ET then converting to UTC
-    now_et = datetime.now(eastern) 
+    now_et = datetime.now(eastern) if now_ is None else now_.astimezone(eastern)
     start_et = (now_et - timedelta(days=4)).replace(hour=0, minute=0, second=0, microsecond=0)
     end_et = (now_et + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
     start_utc = start_et.astimezone(utc)
@@ -42,28 +50,311 @@ def retrieve_stock_bars(client_: StockHistoricalDataClient, symbol_: str, time_i
     )
     return client_.get_stock_bars(request_params=prev_stock_bar_params)
 
+# Function to retrieve only the bars at or after start_ (oldest first), used to top up a bar buffer
+def retrieve_stock_bars_since(client_: StockHistoricalDataClient, symbol_: str, start_: datetime, time_interval_: int, time_unit_: TimeFrameUnit, limit_: int):
+    new_stock_bar_params = StockBarsRequest(
+        symbol_or_symbols=symbol_,
+        start=start_.astimezone(pytz.UTC),
+        timeframe=TimeFrame(
+            amount=time_interval_,
+            unit=time_unit_),
+        limit=limit_,
+        feed="iex",
+        sort="asc"
+    )
+    return client_.get_stock_bars(request_params=new_stock_bar_params)
+
+# Function to retrieve bars for many symbols with a single StockBarsRequest
+# alpaca-py follows next_page_token itself and merges every page into one {symbol: [bars]} dict,
+# so leaving limit_ as None collects all pages for all symbols in one call
+def retrieve_multi_stock_bars(client_: StockHistoricalDataClient, symbols_: list, start_: datetime, end_: datetime, time_interval_: int, time_unit_: TimeFrameUnit, limit_: int = None):
+    multi_stock_bar_params = StockBarsRequest(
+        symbol_or_symbols=list(symbols_),
+        start=start_.astimezone(pytz.UTC),
+        end=end_.astimezone(pytz.UTC),
+        timeframe=TimeFrame(
+            amount=time_interval_,
+            unit=time_unit_),
+        limit=limit_,
+        feed="iex",
+        sort="asc"
+    )
+    return client_.get_stock_bars(request_params=multi_stock_bar_params)
+
 # Function to retrieve the single latest bar 
 def retrieve_latest(client_: StockHistoricalDataClient, symbol_: str):
     latest_params = StockLatestBarRequest(symbol_or_symbols=symbol_)
     return client_.get_stock_latest_bar(request_params=latest_params)
 
+# Length of one bar of each timeframe unit in seconds (a month is taken as 31 days)
+timeframe_unit_seconds = {'Min': 60, 'Hour': 3600, 'Day': 86400, 'Week': 7 * 86400, 'Month': 31 * 86400}
+
+def _epoch_seconds() -> float:
+    return datetime.now().timestamp()
+
+def _request_epoch(value_) -> float:
+    # alpaca-py treats naive datetimes as UTC
+    if value_ is None:
+        return None
+    if value_.tzinfo is None:
+        value_ = pytz.UTC.localize(value_)
+    return value_.timestamp()
+
+
+class CachingBarFetcher:
+    """
+    Caching stand-in for a StockHistoricalDataClient's get_stock_bars, usable anywhere a
+    client is passed (retrieve_stock_bars, BarBuffer, BarStore.backfill, notebooks).
+
+    Responses are keyed by (symbols, timeframe, start, end, feed, limit, sort, adjustment).
+    A request whose end is over a bar length plus settle_seconds_ in the past only covers
+    closed bars, so its response never changes: it is kept in memory and, when cache_dir_
+    is set, on disk for later runs. Any other request includes the still-forming bars and
+    is only reused for ttl_seconds_, and never past the next minute boundary. Both tiers
+    evict least recently used entries beyond their size caps. Concurrent identical
+    requests are merged into one API call whose response every caller receives.
+
+    Cached responses are shared between callers, so they must not be modified. Other
+    client methods (e.g. get_stock_latest_bar) are passed through uncached.
+    """
+
+    def __init__(self, client_: StockHistoricalDataClient, cache_dir_: str = None, max_memory_bars_: int = 2_000_000,
+                 max_disk_bytes_: int = 1 << 30, ttl_seconds_: float = 10.0, settle_seconds_: float = 60.0, clock_=_epoch_seconds):
+        """
+        Args:
+            client_: Historical data client (raw data mode for disk caching)
+            cache_dir_: Directory for closed-window responses (None keeps everything in memory)
+            max_memory_bars_: Bars held in memory across all entries
+            max_disk_bytes_: Size cap of the disk cache
+            ttl_seconds_: How long a response that includes open bars is reused
+            settle_seconds_: Extra time after a bar closes before it is treated as final (late corrections)
+            clock_: Function returning the current epoch time in seconds
+        """
+        self.client = client_
+        self.cache_dir = cache_dir_
+        self.max_memory_bars = max_memory_bars_
+        self.max_disk_bytes = max_disk_bytes_
+        self.ttl_seconds = ttl_seconds_
+        self.settle_seconds = settle_seconds_
+        self.clock = clock_
+        self._memory = OrderedDict() # key -> (response, expires or None if immutable, bars)
+        self._memory_bars = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.counts = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'merged': 0, 'expired': 0, 'memory_evictions': 0, 'disk_evictions': 0}
+
+        self._disk = OrderedDict() # file name -> size, least recently used first
+        if cache_dir_ is not None:
+            os.makedirs(cache_dir_, exist_ok=True)
+            files = [entry for entry in os.scandir(cache_dir_) if entry.name.endswith(".json")]
+            for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+                self._disk[entry.name] = entry.stat().st_size
+            self._disk_bytes = sum(self._disk.values())
+
+    def __getattr__(self, name_):
+        if name_ == "client":
+            raise AttributeError(name_)
+        return getattr(self.client, name_)
+
+    @staticmethod
+    def request_key(request_params) -> tuple:
+        symbols = request_params.symbol_or_symbols
+        symbols = (symbols,) if isinstance(symbols, str) else tuple(sorted(symbols))
+        value = lambda field: None if field is None else getattr(field, "value", field)
+        return (symbols, str(request_params.timeframe),
+                None if request_params.start is None else _request_epoch(request_params.start),
+                None if request_params.end is None else _request_epoch(request_params.end),
+                value(request_params.feed), request_params.limit, value(request_params.sort), value(request_params.adjustment))
+
+    def _is_closed(self, request_params, now_: float) -> bool:
+        if request_params.end is None:
+            return False
+        timeframe = request_params.timeframe
+        bar_seconds = timeframe.amount_value * timeframe_unit_seconds[timeframe.unit_value.value]
+        return _request_epoch(request_params.end) + bar_seconds + self.settle_seconds <= now_
+
+    def _disk_name(self, key_: tuple) -> str:
+        return hashlib.sha1(repr(key_).encode()).hexdigest() + ".json"
+
+    def _read_disk(self, key_: tuple):
+        name = self._disk_name(key_)
+        with self._lock:
+            if name not in self._disk:
+                return None
+            self._disk.move_to_end(name)
+        path = os.path.join(self.cache_dir, name)
+        try:
+            with open(path) as handle:
+                response = json.load(handle)
+            os.utime(path) # Recency survives restarts
+        except (OSError, ValueError):
+            return None
+        return response
+
+    def _write_disk(self, key_: tuple, response_: dict) -> None:
+        name = self._disk_name(key_)
+        path = os.path.join(self.cache_dir, name)
+        with open(path + ".tmp", "w") as handle:
+            json.dump(response_, handle)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path) - self._disk.pop(name, 0)
+            self._disk[name] = os.path.getsize(path)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                oldest, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.counts['disk_evictions'] += 1
+                try:
+                    os.remove(os.path.join(self.cache_dir, oldest))
+                except OSError:
+                    pass
+
+    def _remember(self, key_: tuple, response_, expires_: float) -> None:
+        bars = sum(len(bars) for bars in response_.values()) if isinstance(response_, dict) else 1
+        with self._lock:
+            if key_ in self._memory:
+                self._memory_bars -= self._memory.pop(key_)[2]
+            self._memory[key_] = (response_, expires_, bars)
+            self._memory_bars += bars
+            while self._memory_bars > self.max_memory_bars and len(self._memory) > 1:
+                _, (_, _, evicted_bars) = self._memory.popitem(last=False)
+                self._memory_bars -= evicted_bars
+                self.counts['memory_evictions'] += 1
+
+    def get_stock_bars(self, request_params):
+        key = self.request_key(request_params)
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] is None or now < entry[1]:
+                    self._memory.move_to_end(key)
+                    self.counts['hits'] += 1
+                    return entry[0]
+                self._memory_bars -= self._memory.pop(key)[2]
+                self.counts['expired'] += 1
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.counts['merged'] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            closed = self._is_closed(request_params, now)
+            response = self._read_disk(key) if closed and self.cache_dir is not None else None
+            if response is not None:
+                with self._lock:
+                    self.counts['disk_hits'] += 1
+            else:
+                response = self.client.get_stock_bars(request_params=request_params)
+                with self._lock:
+                    self.counts['misses'] += 1
+                if closed and self.cache_dir is not None and isinstance(response, dict):
+                    self._write_disk(key, response)
+            # Open windows are reused for ttl_seconds_ but never past the minute the response was fetched in
+            expires = None if closed else min(now + self.ttl_seconds, (now // 60 + 1) * 60)
+            self._remember(key, response, expires)
+            future.set_result(response)
+            return response
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self) -> dict:
+        """
+        Cache statistics.
+
+        Returns:
+            Dictionary with hit/miss/merge/eviction counts, the hit rate and the cache sizes
+        """
+        with self._lock:
+            requests = sum(self.counts[name] for name in ('hits', 'disk_hits', 'misses', 'merged'))
+            return {
+                **self.counts,
+                'requests': requests,
+                'hit_rate': (requests - self.counts['misses']) / requests if requests else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bars': self._memory_bars,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes if self.cache_dir is not None else 0
+            }
+
 # Function to convert raw bar data to an easy to parse dataframe
 def data_frame_from_stock_bars(data_: dict):
     ticker, bars = next(iter(data_.items()))
 
     if not bars:
         raise ValueError(f"No data retrieved for ticker: {ticker}")
-    
-    df = pd.DataFrame(bars) # Create data frame from raw data
-    df.rename(columns={'o':'open', 'h':'high','l':'low','c':'close','v':'volume','t':'timestamp'}, inplace=True) # Rename columns
-    df['timestamp'] = pd.to_datetime(df['timestamp']) # Set time stamp to type datetime
-    df.set_index('timestamp', inplace=True) # Index using time stamp
-    eastern_time_zone = pytz.timezone("America/New_York") # Create ET timezone 
-    df.index = df.index.tz_convert(eastern_time_zone) # Convert data frame times from UTC to ET 
 
-    df['market_status'] = df.index.map(classify_market_status) # Use helper function to get market status
+    return data_frame_from_columns(decode_raw_bars(bars))
 
-    return df[['close','high','low','open','volume', 'market_status']]
+# Function to split a raw multi-symbol response into one dataframe per symbol
+# Symbols with no bars are left out of the result
+def data_frames_from_multi_stock_bars(data_: dict) -> dict:
+    return {ticker: data_frame_from_columns(decode_raw_bars(bars)) for ticker, bars in data_.items() if bars}
+
+# Offsets of the digits in a "YYYY-MM-DDTHH:MM:SSZ" timestamp and of its separators
+timestamp_digit_positions = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+timestamp_separators = {4: ord('-'), 7: ord('-'), 10: ord('T'), 13: ord(':'), 16: ord(':'), 19: ord('Z')}
+
+# Function to parse UTC ISO timestamps into int64 epoch nanoseconds
+# Alpaca sends whole-second "YYYY-MM-DDTHH:MM:SSZ" strings, which are decoded as one
+# (bars, 20) byte array with integer arithmetic; anything else goes through pd.to_datetime
+def parse_utc_timestamps(timestamps_: list) -> np.ndarray:
+    count = len(timestamps_)
+    try:
+        joined = "".join(timestamps_).encode("ascii")
+    except (TypeError, UnicodeEncodeError):
+        joined = b"" # datetime objects or non-ASCII strings
+    if count and len(joined) == 20 * count:
+        characters = np.frombuffer(joined, dtype=np.uint8).reshape(count, 20)
+        digits = characters[:, timestamp_digit_positions].astype(np.int32) - 48
+        if all((characters[:, position] == separator).all() for position, separator in timestamp_separators.items()) \
+                and ((digits >= 0) & (digits <= 9)).all():
+            pairs = digits[:, 0::2] * 10 + digits[:, 1::2] # century, year of century, month, day, hour, minute, second
+            month = pairs[:, 2]
+            # Days since 1970-01-01 from the civil date (Howard Hinnant's days_from_civil)
+            year = pairs[:, 0] * 100 + pairs[:, 1] - (month <= 2)
+            era = year // 400
+            year_of_era = year - era * 400
+            day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + pairs[:, 3] - 1
+            days = (era * 146097 + year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year - 719468).astype(np.int64)
+            seconds = days * 86400 + pairs[:, 4] * 3600 + pairs[:, 5] * 60 + pairs[:, 6]
+            return seconds * 1_000_000_000
+    return pd.to_datetime(timestamps_, utc=True, format="ISO8601").asi8
+
+# Function to decode raw bars into typed column arrays (float64 prices, int64 volume, int64 UTC nanoseconds)
+# One np.fromiter per field is faster than building rows, and pd.DataFrame(bars) is skipped entirely
+def decode_raw_bars(bars_: list) -> dict:
+    count = len(bars_)
+    return {
+        'timestamp': parse_utc_timestamps([bar['t'] for bar in bars_]),
+        'close': np.fromiter((bar['c'] for bar in bars_), dtype=np.float64, count=count),
+        'high': np.fromiter((bar['h'] for bar in bars_), dtype=np.float64, count=count),
+        'low': np.fromiter((bar['l'] for bar in bars_), dtype=np.float64, count=count),
+        'open': np.fromiter((bar['o'] for bar in bars_), dtype=np.float64, count=count),
+        'volume': np.fromiter((bar['v'] for bar in bars_), dtype=np.int64, count=count)
+    }
+
+# Function to build the ET-indexed dataframe data_frame_from_stock_bars returns from decoded columns
+# The arrays are used as they are (no copies) and only the columns downstream code reads are kept
+def data_frame_from_columns(columns_: dict) -> pd.DataFrame:
+    eastern_time_zone = pytz.timezone("America/New_York")
+    index = pd.DatetimeIndex(columns_['timestamp'].view("datetime64[ns]"), name='timestamp').tz_localize(pytz.UTC).tz_convert(eastern_time_zone)
+    return pd.DataFrame({
+        'close': columns_['close'],
+        'high': columns_['high'],
+        'low': columns_['low'],
+        'open': columns_['open'],
+        'volume': columns_['volume'],
+        'market_status': market_status_categorical(index) # Vectorized equivalent of classify_market_status
+    }, index=index, copy=False)
 
 # Helper function used to classify market status in dataframe
 def classify_market_status(dt: pd.Timestamp) -> str:
@@ -77,10 +368,34 @@ def classify_market_status(dt: pd.Timestamp) -> str:
     else:
         return "closed"
 
+# Session boundaries in minutes after ET midnight: 4:00, 9:30, 16:00, 20:00
+market_status_labels = ["closed", "pre-market", "regular", "after-hours"]
+session_boundaries = np.array([4 * 60, 9 * 60 + 30, 16 * 60, 20 * 60], dtype=np.int64)
+session_codes = np.array([0, 1, 2, 3, 0], dtype=np.uint8) # Code per interval between boundaries (before 4:00 and after 20:00 are closed)
+regular_code = 2
+nanoseconds_per_minute = 60 * 1_000_000_000
+
+# Vectorized classify_market_status: uint8 code per timestamp, indexing market_status_labels
+# Works on the int64 nanoseconds of the ET wall clock so DST is handled by the tz conversion
+def market_status_codes(index_: pd.DatetimeIndex) -> np.ndarray:
+    if index_.tz is not None:
+        index_ = index_.tz_localize(None) # ET wall clock times
+    minute_of_day = (index_.asi8 // nanoseconds_per_minute) % (24 * 60)
+    return session_codes[np.searchsorted(session_boundaries, minute_of_day, side="right")]
+
+def market_status_categorical(index_: pd.DatetimeIndex) -> pd.Categorical:
+    return pd.Categorical.from_codes(market_status_codes(index_), categories=market_status_labels)
+
+# Boolean mask of regular hours bars for an ET index
+def regular_hours_mask(index_: pd.DatetimeIndex) -> np.ndarray:
+    return market_status_codes(index_) == regular_code
+
 def filter_regular_hours(data_: pd.DataFrame) -> pd.DataFrame: 
-    return data_[data_["market_status"] == "regular"]
+    return data_[regular_hours_mask(data_.index)]
 
 def add_technical_indicators(data_: pd.DataFrame) -> pd.DataFrame:
+    # Imported here so the live loop (StreamingIndicators) never loads pandas_ta; importing it registers DataFrame.ta
+    import pandas_ta
     data_ = data_.sort_index()
     data_['ATR'] = data_.ta.atr(length=20) # Average True Range for 20 candlesticks
     data_['RSI'] = data_.ta.rsi() # Relative Strength Index
@@ -89,21 +404,43 @@ def add_technical_indicators(data_: pd.DataFrame) -> pd.DataFrame:
     data_['MA160'] = data_.ta.sma(length=160) # Moving Average for 160 candlesticks
     return data_
 
+# Function to add the same indicators to many symbols' dataframes in one vectorized pass
+# The frames are aligned on the union of their timestamps (NaN where a symbol has no bar),
+# so every symbol's values are the ones add_technical_indicators gives for its own frame
+def add_technical_indicators_multi(data_frames_: dict, chunk_symbols_: int = 64) -> dict:
+    symbols = list(data_frames_)
+    frames = [data_frames_[symbol].sort_index() for symbol in symbols]
+    index = frames[0].index
+    for frame in frames[1:]:
+        index = index.union(frame.index)
+    positions = [index.get_indexer(frame.index) for frame in frames]
+
+    arrays = {column: np.full((len(index), len(symbols)), np.nan) for column in ('high', 'low', 'close')}
+    for column_number, (frame, rows) in enumerate(zip(frames, positions)):
+        for column, values in arrays.items():
+            values[rows, column_number] = frame[column].to_numpy(dtype=np.float64)
+    indicators = batch_indicators(arrays['high'], arrays['low'], arrays['close'], chunk_symbols_=chunk_symbols_)
+
+    results = {}
+    for column_number, (symbol, frame, rows) in enumerate(zip(symbols, frames, positions)):
+        for column, values in indicators.items():
+            frame[column] = values[rows, column_number]
+        results[symbol] = frame
+    return results
+
 # Creates target variable for ML prediction
 # New column "Higher/Lower" indicates whether the NEXT candlestick's open price
 # will be higher (1), lower (-1), or same (0) than the CURRENT close price
 # Note: Data is sorted chronologically (oldest first) to ensure proper time sequence
 def classify_price_gap(data_: pd.DataFrame) -> pd.DataFrame:
-    data_ = data_.copy()
-    # Sort by timestamp to ensure chronological order (oldest first)
+    # Sort by timestamp to ensure chronological order (oldest first); sort_index returns a new frame
     data_ = data_.sort_index()
     
     # Calculate whether the NEXT candlestick's open is higher/lower than CURRENT close
     # This creates a target variable for ML prediction
     data_['next_open_vs_current_close'] = data_['open'].shift(-1) - data_['close']
-    data_['Higher/Lower'] = data_['next_open_vs_current_close'].apply(
-        lambda x: -1 if x < 0 else (1 if x > 0 else 0)
-    )
+    # Sign of the gap; the last row has no next open and gets 0
+    data_['Higher/Lower'] = np.sign(data_['next_open_vs_current_close']).fillna(0).astype(np.int64)
     # Drop the last row since we can't predict the next candlestick for it
     # data_ = data_.dropna()
     return data_
\ No newline at end of file
@@ -1,7 +1,17 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import GetOrdersRequest, MarketOrderRequest, LimitOrderRequest
 from alpaca.trading.enums import OrderSide, TimeInForce
 
+from instrumentation import metrics
+
+# Order statuses after which an order can no longer fill
+terminal_order_statuses = {"filled", "canceled", "expired", "rejected", "replaced", "done_for_day"}
+
 def setup_client(key_: str, secret_: str, paper_: bool, base_url_: str):
     return TradingClient(api_key=key_, secret_key=secret_, paper=paper_)
 
@@ -28,7 +38,8 @@ def place_market_buy_order(client: TradingClient, symbol: str, quantity: int) ->
         )
         
         # Submit the order
-        order = client.submit_order(order_data=market_order_data)
+        with metrics.api_call("submit_order"):
+            order = client.submit_order(order_data=market_order_data)
         
         print(f"Market BUY order placed for {quantity} shares of {symbol}")
         print(f"Order ID: {order.id}")
@@ -76,7 +87,8 @@ def place_limit_buy_order(client: TradingClient, symbol: str, quantity: int, lim
         )
         
         # Submit the order
-        order = client.submit_order(order_data=limit_order_data)
+        with metrics.api_call("submit_order"):
+            order = client.submit_order(order_data=limit_order_data)
         
         print(f"Limit BUY order placed for {quantity} shares of {symbol} at ${limit_price}")
         print(f"Order ID: {order.id}")
@@ -112,7 +124,8 @@ def get_account_info(client: TradingClient) -> dict:
         Account information dictionary
     """
     try:
-        account = client.get_account()
+        with metrics.api_call("get_account"):
+            account = client.get_account()
         
         return {
             'buying_power': float(account.buying_power),
@@ -149,7 +162,8 @@ def place_market_sell_order(client: TradingClient, symbol: str, quantity: int) -
         )
         
         # Submit the order
-        order = client.submit_order(order_data=market_order_data)
+        with metrics.api_call("submit_order"):
+            order = client.submit_order(order_data=market_order_data)
         
         print(f"Market SELL order placed for {quantity} shares of {symbol}")
         print(f"Order ID: {order.id}")
@@ -197,7 +211,8 @@ def place_limit_sell_order(client: TradingClient, symbol: str, quantity: int, li
         )
         
         # Submit the order
-        order = client.submit_order(order_data=limit_order_data)
+        with metrics.api_call("submit_order"):
+            order = client.submit_order(order_data=limit_order_data)
         
         print(f"Limit SELL order placed for {quantity} shares of {symbol} at ${limit_price}")
         print(f"Order ID: {order.id}")
@@ -233,7 +248,8 @@ def get_positions(client: TradingClient) -> dict:
         Dictionary of current positions
     """
     try:
-        positions = client.get_all_positions()
+        with metrics.api_call("get_all_positions"):
+            positions = client.get_all_positions()
         
         positions_dict = {}
         for position in positions:
@@ -254,6 +270,302 @@ def get_positions(client: TradingClient) -> dict:
         return {'error': str(e)}
 
 
+def configure_connection_pool(client: TradingClient, pool_size: int) -> None:
+    """
+    Size the trading client's HTTP connection pool for concurrent requests.
+
+    TradingClient sends every request through one requests.Session, whose default pool
+    keeps 10 connections per host. With more requests in flight than that, the extra
+    connections are opened and thrown away again instead of being reused.
+
+    Args:
+        client: Alpaca trading client
+        pool_size: Number of connections kept open
+    """
+    # TradingClient has no public hook for its session: this relies on the private _session
+    # attribute of alpaca-py 0.42 (the version pinned in requirements.txt)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    client._session.mount("https://", adapter)
+    client._session.mount("http://", adapter)
+
+
+class OrderManager:
+    """
+    Order submission and a local position/order book on top of a TradingClient.
+
+    Orders are submitted from a thread pool sharing one pooled HTTP session, so a
+    multi-symbol rebalance costs about one round-trip instead of one per order.
+    Fills update the local book, so position checks are answered from memory: fills
+    seen on order responses, on trade updates (see subscribe) and on the open orders,
+    which position checks fetch while any are still working (a market order usually
+    comes back "accepted" with nothing filled). The book is replaced with the broker's
+    positions every reconcile_interval seconds. Finished orders leave the book; the
+    final fill of the latest max_finished of them is kept so that a late or repeated
+    update for one is not counted again.
+    """
+
+    def __init__(self, client: TradingClient, max_workers: int = 8, reconcile_interval: float = 60.0, clock=time.monotonic,
+                 max_finished: int = 10_000):
+        """
+        Args:
+            client: Alpaca trading client
+            max_workers: Orders in flight at once (also the HTTP connection pool size)
+            reconcile_interval: Seconds between reconciliations with the broker's positions
+            clock: Function returning a monotonic time in seconds
+            max_finished: Finished orders whose final fill is remembered
+        """
+        self.client = client
+        if hasattr(client, "_session"):
+            configure_connection_pool(client, max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.reconcile_interval = reconcile_interval
+        self.clock = clock
+        self.positions = {} # symbol -> signed quantity
+        self.orders = {} # order id -> order details
+        self.last_reconciled = None
+        self.stats = {'submitted': 0, 'failed': 0, 'position_checks': 0, 'reconciliations': 0, 'discrepancies': 0}
+        self._applied = {} # order id -> filled quantity already counted in positions (working orders)
+        self._finished = OrderedDict() # order id -> final filled quantity, oldest first
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+
+    def _counted_fill(self, order_id_: str) -> float:
+        # Caller holds the lock
+        return self._applied.get(order_id_, self._finished.get(order_id_, 0.0))
+
+    def _adjust_position(self, symbol_: str, change_: float) -> None:
+        # Caller holds the lock
+        quantity = self.positions.get(symbol_, 0.0) + change_
+        if quantity:
+            self.positions[symbol_] = quantity
+        else:
+            self.positions.pop(symbol_, None)
+
+    def _apply_order(self, order) -> None:
+        # Caller holds the lock
+        order_id = str(order.id)
+        if order_id in self._finished:
+            return # Already final and counted
+        side = getattr(order.side, "value", order.side)
+        filled = float(order.filled_qty or 0)
+        change = filled - self._applied.get(order_id, 0.0)
+        if change:
+            self._adjust_position(order.symbol, change if side == "buy" else -change)
+        status = getattr(order.status, "value", order.status)
+        if status in terminal_order_statuses:
+            self._applied.pop(order_id, None)
+            self.orders.pop(order_id, None)
+            self._finished[order_id] = filled
+            while len(self._finished) > self.max_finished:
+                self._finished.popitem(last=False)
+            return
+        self._applied[order_id] = filled
+        self.orders[order_id] = {
+            'symbol': order.symbol,
+            'side': side,
+            'qty': float(order.qty),
+            'filled_qty': filled,
+            'status': status,
+            'limit_price': None if order.limit_price is None else float(order.limit_price)
+        }
+
+    def apply_order_update(self, order) -> None:
+        """Update the local book from an order object (e.g. from a trade updates stream)."""
+        with self._lock:
+            self._apply_order(order)
+
+    def subscribe(self, trading_stream) -> None:
+        """
+        Apply the orders of a TradingStream's trade updates to the local book as they arrive.
+
+        Args:
+            trading_stream: alpaca.trading.stream.TradingStream (run it with its _run_forever coroutine)
+        """
+        async def on_trade_update(data):
+            self.apply_order_update(data.order)
+        trading_stream.subscribe_trade_updates(on_trade_update)
+
+    def submit_order(self, symbol: str, quantity: float, side: str, limit_price: float = None) -> dict:
+        """
+        Submit one market order, or a limit order when limit_price is given.
+
+        Args:
+            symbol: Stock symbol (e.g., 'TSLA')
+            quantity: Number of shares
+            side: 'buy' or 'sell'
+            limit_price: Limit price per share (None for a market order)
+
+        Returns:
+            Order response dictionary in the same shape as place_market_buy_order's
+        """
+        order_side = OrderSide.BUY if side == "buy" else OrderSide.SELL
+        try:
+            if limit_price is None:
+                order_data = MarketOrderRequest(symbol=symbol, qty=quantity, side=order_side, time_in_force=TimeInForce.DAY)
+            else:
+                order_data = LimitOrderRequest(symbol=symbol, qty=quantity, side=order_side, time_in_force=TimeInForce.DAY, limit_price=limit_price)
+            with metrics.api_call("submit_order"):
+                order = self.client.submit_order(order_data=order_data)
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+            print(f"Error placing {side} order for {symbol}: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'symbol': symbol
+            }
+
+        with self._lock:
+            self.stats['submitted'] += 1
+            self._apply_order(order)
+        result = {
+            'success': True,
+            'order_id': order.id,
+            'status': order.status,
+            'symbol': symbol,
+            'quantity': quantity,
+            'side': side.upper(),
+            'order_type': 'MARKET' if limit_price is None else 'LIMIT'
+        }
+        if limit_price is not None:
+            result['limit_price'] = limit_price
+        return result
+
+    def submit_orders(self, orders: list) -> list:
+        """
+        Submit several orders concurrently.
+
+        Args:
+            orders: List of dictionaries with submit_order's arguments
+
+        Returns:
+            Order response dictionaries in the same order as orders
+        """
+        return list(self.executor.map(lambda order: self.submit_order(**order), orders))
+
+    def open_quantity(self, symbol: str) -> float:
+        """Signed quantity of symbol's open orders that has not filled yet."""
+        with self._lock:
+            return sum((order['qty'] - order['filled_qty']) * (1 if order['side'] == "buy" else -1)
+                       for order in self.orders.values()
+                       if order['symbol'] == symbol and order['status'] not in terminal_order_statuses)
+
+    def _get_order(self, order_id):
+        with metrics.api_call("get_order_by_id"):
+            return self.client.get_order_by_id(order_id)
+
+    def _fetch_open_orders(self) -> list:
+        with self._lock:
+            order_ids = list(self.orders) # finished orders have already left the book
+        return list(self.executor.map(self._get_order, order_ids))
+
+    def refresh_open_orders(self) -> int:
+        """
+        Fetch every order not known to be finished and apply any new fills.
+
+        Returns:
+            Number of orders refreshed
+        """
+        orders = self._fetch_open_orders()
+        with self._lock:
+            for order in orders:
+                self._apply_order(order)
+        return len(orders)
+
+    def reconcile(self) -> dict:
+        """
+        Replace the local positions with the broker's.
+
+        The open orders are fetched before and after the positions, and the positions are
+        only taken once no fill landed in between, so the fills already counted for each
+        order match the broker's snapshot. On an API error the book is kept as it was and
+        the next position check tries again.
+
+        Returns:
+            Dictionary with the broker positions and the symbols whose local quantity differed,
+            or with the error
+        """
+        try:
+            for attempt in range(3):
+                before = {str(order.id): float(order.filled_qty or 0) for order in self._fetch_open_orders()}
+                with metrics.api_call("get_all_positions"):
+                    broker_positions = {position.symbol: float(position.qty) for position in self.client.get_all_positions()}
+                orders = self._fetch_open_orders()
+                if before == {str(order.id): float(order.filled_qty or 0) for order in orders}:
+                    break
+            else:
+                raise RuntimeError("orders kept filling while the positions were fetched")
+        except Exception as e:
+            print(f"Error reconciling positions: {e}")
+            return {'error': str(e)}
+
+        with self._lock:
+            positions = dict(broker_positions)
+            for order in orders:
+                # A trade update may have counted more of this order since it was fetched:
+                # that fill is newer than the broker's snapshot, so it is kept on top of it
+                late = self._counted_fill(str(order.id)) - float(order.filled_qty or 0)
+                if late > 0:
+                    side = getattr(order.side, "value", order.side)
+                    positions[order.symbol] = positions.get(order.symbol, 0.0) + (late if side == "buy" else -late)
+                else:
+                    self._apply_order(order)
+            positions = {symbol: quantity for symbol, quantity in positions.items() if quantity}
+            discrepancies = [symbol for symbol in set(positions) | set(self.positions)
+                             if positions.get(symbol, 0.0) != self.positions.get(symbol, 0.0)]
+            self.positions = positions
+            self.stats['reconciliations'] += 1
+            self.stats['discrepancies'] += len(discrepancies)
+        self.last_reconciled = self.clock()
+        return {
+            'positions': positions,
+            'discrepancies': discrepancies
+        }
+
+    def _update_book(self) -> None:
+        # Reconcile when due, otherwise pick up the fills of any orders still working
+        if self.last_reconciled is None or self.clock() - self.last_reconciled >= self.reconcile_interval:
+            if 'error' not in self.reconcile():
+                return
+        try:
+            self.refresh_open_orders()
+        except Exception as e:
+            print(f"Error refreshing open orders: {e}")
+
+    def position(self, symbol: str) -> float:
+        """
+        Quantity held of symbol from the local book, after applying the fills of its working orders.
+
+        Shares of orders that have not filled yet are not included (see open_quantity).
+        """
+        self._update_book()
+        with self._lock:
+            self.stats['position_checks'] += 1
+            return self.positions.get(symbol, 0.0)
+
+    def rebalance(self, targets: dict) -> list:
+        """
+        Submit the orders that move every symbol in targets to its target quantity.
+
+        Open orders count towards the target, so calling this again before they fill
+        does not double up.
 
+        Args:
+            targets: Dictionary of {symbol: target quantity}
 
+        Returns:
+            Order response dictionaries
+        """
+        self._update_book()
+        orders = []
+        for symbol, target in targets.items():
+            with self._lock:
+                held = self.positions.get(symbol, 0.0)
+            change = target - held - self.open_quantity(symbol)
+            if change:
+                orders.append({'symbol': symbol, 'quantity': abs(change), 'side': "buy" if change > 0 else "sell"})
+        return self.submit_orders(orders)
 
+    def close(self) -> None:
+        self.executor.shutdown()
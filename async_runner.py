@@ -0,0 +1,126 @@
+import asyncio
+import time
+from alpaca.trading.client import TradingClient
+
+from alpaca_paper_trading import (
+    place_market_buy_order,
+    place_market_sell_order,
+    get_account_info,
+    get_positions
+)
+from bar_buffer import BarBuffer
+from instrumentation import metrics
+from predictor import KNNPredictor
+
+# asyncio version of the main() loop. The bar refresh, positions and account
+# calls are independent round-trips, so each cycle starts all three at once
+# (the alpaca-py clients are synchronous, so they run in worker threads) and
+# submits an order as soon as the prediction only needs what has arrived: a
+# buy does not wait for positions, and nothing waits for the account call.
+# Cycles start on wall-clock minute boundaries rather than sleeping 60s minus
+# the elapsed time, so the schedule does not drift.
+
+
+def seconds_until_next_cycle(now_: float, interval_: float = 60.0, offset_: float = 0.0) -> float:
+    """Seconds from now_ until the next interval_ boundary plus offset_ (epoch based)."""
+    next_start = (now_ - offset_) // interval_ * interval_ + interval_ + offset_
+    return next_start - now_
+
+
+class AsyncTradingRunner:
+    """
+    Runs the predict-and-trade cycle for one symbol on minute boundaries with concurrent API calls.
+    """
+
+    def __init__(self, trading_client_: TradingClient, bar_buffer_: BarBuffer, predictor_: KNNPredictor,
+                 quantity_: int = 1, bar_delay_: float = 2.0, clock_=time.time, sleep_=asyncio.sleep):
+        """
+        Args:
+            trading_client_: Alpaca trading client
+            bar_buffer_: Bar buffer for the traded symbol
+            predictor_: Predictor used on the newest bar's features
+            quantity_: Shares bought per buy signal
+            bar_delay_: Seconds after each minute boundary to wait for the closed bar to be published
+            clock_: Function returning the current epoch time in seconds
+            sleep_: Coroutine function used to wait (replaceable for tests)
+        """
+        self.trading_client = trading_client_
+        self.bar_buffer = bar_buffer_
+        self.predictor = predictor_
+        self.symbol = bar_buffer_.symbol
+        self.quantity = quantity_
+        self.bar_delay = bar_delay_
+        self.clock = clock_
+        self.sleep = sleep_
+        self.cycles = []
+
+    async def run_cycle(self) -> dict:
+        """
+        Fetch bars, positions and account state concurrently, predict and submit any order.
+
+        Returns:
+            Cycle metrics, including bar_close_to_submit (seconds from the newest bar's close
+            to order submission) when an order was sent
+        """
+        cycle_start = self.clock()
+        bars_task = asyncio.create_task(asyncio.to_thread(self.bar_buffer.refresh))
+        positions_task = asyncio.create_task(asyncio.to_thread(get_positions, self.trading_client))
+        account_task = asyncio.create_task(asyncio.to_thread(get_account_info, self.trading_client))
+        tasks = [bars_task, positions_task, account_task]
+        try:
+            await bars_task
+            bars_ready = self.clock()
+            # Minute bars are stamped with their start, so the bar closes a minute later
+            bar_close = self.bar_buffer.last_timestamp.timestamp() + 60
+            with metrics.stage("predict"):
+                prediction = self.predictor.predict(self.bar_buffer.latest_features(self.predictor.row, self.predictor.features))
+            decided = self.clock()
+            metrics.observe_bar_staleness(bar_close, decided)
+
+            order_result = None
+            submitted = None
+            if prediction == 1:
+                submitted = self.clock()
+                order_result = await asyncio.to_thread(place_market_buy_order, self.trading_client, self.symbol, self.quantity)
+            elif prediction == -1:
+                positions = await positions_task
+                if self.symbol in positions and positions[self.symbol]['qty'] > 0:
+                    submitted = self.clock()
+                    order_result = await asyncio.to_thread(place_market_sell_order, self.trading_client, self.symbol, int(positions[self.symbol]['qty']))
+                else:
+                    print(f"No {self.symbol} positions to sell")
+
+            await positions_task
+            account_info = await account_task
+            cycle_end = self.clock()
+            metrics.end_cycle()
+        finally:
+            # When a call or the prediction raised, the other calls are cancelled and awaited
+            # so none is left running with an exception nobody retrieves
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        cycle_metrics = {
+            'prediction': int(prediction),
+            'order': order_result,
+            'buying_power': account_info.get('buying_power'),
+            'bars_seconds': bars_ready - cycle_start,
+            'decision_seconds': decided - bars_ready,
+            'cycle_seconds': cycle_end - cycle_start,
+            'cycle_start_to_submit': None if submitted is None else submitted - cycle_start,
+            'bar_close_to_submit': None if submitted is None else submitted - bar_close
+        }
+        self.cycles.append(cycle_metrics)
+        return cycle_metrics
+
+    async def run(self, cycles_: int = None) -> None:
+        """Run cycles on minute boundaries (forever when cycles_ is None)."""
+        completed = 0
+        while cycles_ is None or completed < cycles_:
+            await self.sleep(seconds_until_next_cycle(self.clock(), offset_=self.bar_delay))
+            cycle_metrics = await self.run_cycle()
+            completed += 1
+            latency = cycle_metrics['bar_close_to_submit']
+            print(f"Cycle completed in {cycle_metrics['cycle_seconds']:.2f} seconds. Prediction: {cycle_metrics['prediction']}. "
+                  f"Bar close to order: {'no order' if latency is None else f'{latency:.3f} seconds'}")
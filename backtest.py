@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from machine_learning import feature_columns
+
+# Vectorized backtesting over a frame produced by add_technical_indicators.
+# Signals are computed for every row at once (1 = buy, -1 = sell, 0 = hold) and
+# turned into fills with the same order semantics main() uses with
+# alpaca_paper_trading: each buy signal buys a fixed quantity, each sell signal
+# sells the whole position. Decisions are made on a bar's close and the order
+# fills on the next bar, so the simulation never sees the bar it trades on.
+
+
+def knn_signals(model, data_: pd.DataFrame, features_: list = None) -> np.ndarray:
+    """
+    Predict every row with one batched model.predict call.
+
+    Rows with missing features (indicator warmup) are held (0). For rows with all
+    features present the result equals predict_latest_candlestick on the frame up to that row.
+
+    Args:
+        model: Trained classifier (e.g. from load_knn_model)
+        data_: DataFrame with technical indicators
+        features_: Feature columns, defaults to the ones the KNN model is trained on
+
+    Returns:
+        int8 array of predictions (-1, 0, 1), one per row
+    """
+    features = feature_columns if features_ is None else features_
+    values = data_[features].to_numpy(dtype=np.float64)
+    complete = ~np.isnan(values).any(axis=1)
+    signals = np.zeros(len(data_), dtype=np.int8)
+    if complete.any():
+        signals[complete] = model.predict(values[complete])
+    return signals
+
+
+def rsi_ma_crossover_signals(data_: pd.DataFrame) -> np.ndarray:
+    """
+    Vectorized hardcoded_algorithms.RSI_MA_Crossover for every row.
+
+    Returns:
+        int8 array where 1 is "Buy", -1 is "Sell" and 0 is "Hold"
+    """
+    rsi_curr = data_["RSI"].to_numpy(dtype=np.float64)
+    rsi_prev = np.concatenate(([np.nan], rsi_curr[:-1]))
+    close = data_["close"].to_numpy(dtype=np.float64)
+    ma40 = data_["MA40"].to_numpy(dtype=np.float64)
+    ma80 = data_["MA80"].to_numpy(dtype=np.float64)
+
+    # Comparisons with NaN are False, exactly as in the scalar version
+    buy = (rsi_prev < 30) & (rsi_curr >= 30) & (close > ma40) & (close > ma80)
+    sell = (rsi_prev > 70) & (rsi_curr <= 70) & ((close < ma40) | (close < ma80))
+    return np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+
+
+def run_backtest(data_: pd.DataFrame, signals_: np.ndarray, order_type_: str = "market", quantity_: int = 1,
+                 limit_offset_: float = 0.005, slippage_bps_: float = 0.0, commission_per_share_: float = 0.0,
+                 initial_cash_: float = 100_000.0) -> dict:
+    """
+    Simulate trading a signal array over a frame of bars.
+
+    Market orders fill at the next bar's open, moved against the trade by slippage_bps_.
+    Limit orders are placed limit_offset_ below (buy) or above (sell) the decision bar's close,
+    like the commented-out limit examples in main(), and only live for the next bar: they fill
+    at the better of that bar's open and the limit price if the bar trades through it,
+    otherwise they are cancelled.
+
+    Args:
+        data_: DataFrame with 'open', 'high', 'low', 'close' columns in chronological order
+        signals_: One signal per row (1 buy, -1 sell, 0 hold)
+        order_type_: "market" or "limit"
+        quantity_: Shares bought per buy signal
+        limit_offset_: Fractional distance of limit prices from the close
+        slippage_bps_: Adverse slippage for market orders in basis points
+        commission_per_share_: Commission charged per share traded
+        initial_cash_: Starting cash balance
+
+    Returns:
+        Dictionary of summary statistics plus 'equity', 'position' and 'trades_frame'
+    """
+    if order_type_ not in ("market", "limit"):
+        raise ValueError(f"Unknown order type: {order_type_}")
+    open_ = data_["open"].to_numpy(dtype=np.float64)
+    high = data_["high"].to_numpy(dtype=np.float64)
+    low = data_["low"].to_numpy(dtype=np.float64)
+    close = data_["close"].to_numpy(dtype=np.float64)
+    signals = np.asarray(signals_)
+    count = len(close)
+
+    # Orders decided on bar t are filled on bar t + 1
+    buy_order = np.zeros(count, dtype=bool)
+    sell_order = np.zeros(count, dtype=bool)
+    buy_order[1:] = signals[:-1] == 1
+    sell_order[1:] = signals[:-1] == -1
+
+    if order_type_ == "market":
+        slippage = slippage_bps_ / 10_000
+        buy_fill = buy_order
+        sell_fill = sell_order
+        buy_price = open_ * (1 + slippage)
+        sell_price = open_ * (1 - slippage)
+    else:
+        previous_close = np.concatenate(([np.nan], close[:-1]))
+        buy_limit = previous_close * (1 - limit_offset_)
+        sell_limit = previous_close * (1 + limit_offset_)
+        buy_fill = buy_order & (low <= buy_limit)
+        sell_fill = sell_order & (high >= sell_limit)
+        buy_price = np.minimum(open_, buy_limit)
+        sell_price = np.maximum(open_, sell_limit)
+
+    # Position is the shares bought since the last filled sell (which closes everything)
+    bought = np.cumsum(np.where(buy_fill, quantity_, 0))
+    bought_at_last_sell = np.maximum.accumulate(np.where(sell_fill, bought, 0))
+    position = bought - bought_at_last_sell
+    traded = np.diff(position, prepend=0)
+
+    fill_price = np.where(traded > 0, buy_price, np.where(traded < 0, sell_price, 0.0))
+    commissions = np.abs(traded) * commission_per_share_
+    cash = initial_cash_ + np.cumsum(-traded * fill_price - commissions)
+    equity = cash + position * close
+
+    running_peak = np.maximum.accumulate(np.concatenate(([initial_cash_], equity)))[1:]
+    drawdown = equity - running_peak
+    notional = np.abs(traded) * fill_price
+    trade_rows = np.flatnonzero(traded)
+
+    return {
+        'pnl': float(equity[-1] - initial_cash_) if count else 0.0,
+        'return_pct': float((equity[-1] / initial_cash_ - 1) * 100) if count else 0.0,
+        'max_drawdown': float(drawdown.min()) if count else 0.0,
+        'max_drawdown_pct': float((drawdown / running_peak).min() * 100) if count else 0.0,
+        'traded_notional': float(notional.sum()),
+        'turnover': float(notional.sum() / initial_cash_),
+        'trades': len(trade_rows),
+        'commissions': float(commissions.sum()),
+        'final_position': int(position[-1]) if count else 0,
+        'equity': pd.Series(equity, index=data_.index, name='equity'),
+        'position': pd.Series(position, index=data_.index, name='position'),
+        'trades_frame': pd.DataFrame({
+            'quantity': traded[trade_rows],
+            'price': fill_price[trade_rows],
+            'commission': commissions[trade_rows]
+        }, index=data_.index[trade_rows])
+    }
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+import pytz
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from alpaca.data.historical import StockHistoricalDataClient
+from alpaca.data.timeframe import TimeFrameUnit
+
+from alpaca_data import (
+    retrieve_stock_bars,
+    retrieve_stock_bars_since,
+    data_frame_from_stock_bars,
+    filter_regular_hours,
+    classify_market_status
+)
+from bar_store import BarStore
+from indicators import StreamingIndicators
+from instrumentation import metrics
+from resampler import MultiTimeframeIndicators
+
+bar_columns = ['close', 'high', 'low', 'open', 'volume', 'market_status']
+frame_columns = bar_columns + StreamingIndicators.columns
+frame_positions = {column: position for position, column in enumerate(frame_columns)}
+eastern_time_zone = pytz.timezone("America/New_York")
+
+
+class BarBuffer:
+    """
+    Rolling window of regular-hours 1-minute bars for one symbol with indicators kept up to date.
+
+    The first refresh loads the same lookback as retrieve_stock_bars; every refresh after
+    that only asks the API for bars newer than the last timestamp held, and each new bar
+    updates the streaming indicator state in O(1). The frames it hands out have the same
+    columns as add_technical_indicators(filter_regular_hours(data_frame_from_stock_bars(...))).
+
+    The historical client must be created with raw_data_=True.
+    """
+
+    def __init__(self, client_: StockHistoricalDataClient, symbol_: str, max_bars_: int = 1000, limit_: int = 1000, store_: BarStore = None,
+                 timeframes_: MultiTimeframeIndicators = None, clock_=None):
+        """
+        Args:
+            client_: Alpaca historical data client (raw data mode)
+            symbol_: Stock symbol (e.g., 'TSLA')
+            max_bars_: Number of bars kept in memory for to_data_frame (indicator state is unbounded)
+            limit_: Maximum number of bars requested per API call
+            store_: Optional local bar store every fetched bar (all sessions) is appended to
+            timeframes_: Optional higher-timeframe indicators updated with every regular-hours bar,
+                so features like "RSI_15Min" can be passed to latest_features
+            clock_: Function returning the current epoch seconds for the first lookback (None for the system clock)
+        """
+        self.client = client_
+        self.symbol = symbol_
+        self.limit = limit_
+        self.store = store_
+        self.timeframes = timeframes_
+        self.clock = clock_
+        self.indicators = StreamingIndicators()
+        self.last_timestamp = None
+        self._last_fetched = None  # newest bar seen from the API, including extended hours
+        self._timestamps = deque(maxlen=max_bars_)
+        self._rows = deque(maxlen=max_bars_)
+        self._pending_store = [] # bars from append_bar not yet written to the store
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def last_fetched(self) -> pd.Timestamp:
+        """Newest bar seen from the API or the stream (any session), None until the first bars arrive."""
+        return self._last_fetched
+
+    def refresh(self) -> int:
+        """
+        Fetch any bars newer than the last one held and append them.
+
+        Returns:
+            Number of regular-hours bars appended
+        """
+        if self._last_fetched is None:
+            with metrics.stage("fetch"), metrics.api_call("get_stock_bars"):
+                now = None if self.clock is None else datetime.fromtimestamp(self.clock(), timezone.utc)
+                raw_bars = retrieve_stock_bars(client_=self.client, symbol_=self.symbol, time_interval_=1, time_unit_=TimeFrameUnit.Minute,
+                                               limit_=self.limit, now_=now)
+            return self.append_raw(raw_bars)
+
+        appended = 0
+        while True:
+            with metrics.stage("fetch"), metrics.api_call("get_stock_bars"):
+                raw_bars = retrieve_stock_bars_since(
+                    client_=self.client,
+                    symbol_=self.symbol,
+                    start_=self._last_fetched + timedelta(minutes=1),
+                    time_interval_=1,
+                    time_unit_=TimeFrameUnit.Minute,
+                    limit_=self.limit
+                )
+            appended += self.append_raw(raw_bars)
+            # A full page means there may be more bars waiting (e.g. after a restart)
+            if len(raw_bars.get(self.symbol) or []) < self.limit:
+                return appended
+
+    def append_raw(self, data_: dict) -> int:
+        """Append bars from a raw get_stock_bars response, skipping anything already held."""
+        bars = data_.get(self.symbol)
+        if not bars:
+            return 0
+        self.flush_store() # Keep the store in time order
+        with metrics.stage("frame"):
+            data_frame = data_frame_from_stock_bars({self.symbol: bars})
+            regular_hours = filter_regular_hours(data_frame)
+        newest = data_frame.index.max()
+        if self._last_fetched is None or newest > self._last_fetched:
+            self._last_fetched = newest
+        if self.store is not None:
+            with metrics.stage("store"):
+                self.store.append_bars(self.symbol, data_frame)
+        with metrics.stage("indicators"):
+            return self.append(regular_hours)
+
+    def append(self, data_: pd.DataFrame) -> int:
+        """Append bars from a frame shaped like data_frame_from_stock_bars output."""
+        data_ = data_.sort_index()
+        if self.last_timestamp is not None:
+            data_ = data_[data_.index > self.last_timestamp]
+
+        for timestamp, close, high, low, open_, volume, market_status in zip(
+                data_.index, data_['close'], data_['high'], data_['low'], data_['open'], data_['volume'], data_['market_status']):
+            self._append_row(timestamp, close, high, low, open_, volume, market_status)
+        return len(data_)
+
+    def append_bar(self, bar_: dict) -> int:
+        """
+        Append one raw bar (e.g. a streamed bar) without building a DataFrame.
+
+        Produces the same row as append_raw({symbol: [bar_]}). Store writes are queued
+        until flush_store, so they can happen after the strategy has run.
+
+        Returns:
+            1 if a regular-hours bar was appended, otherwise 0
+        """
+        timestamp = pd.Timestamp(bar_['t']).tz_convert(eastern_time_zone)
+        if self._last_fetched is None or timestamp > self._last_fetched:
+            self._last_fetched = timestamp
+        if self.store is not None:
+            self._pending_store.append((timestamp, bar_['c'], bar_['h'], bar_['l'], bar_['o'], bar_['v']))
+        market_status = classify_market_status(timestamp)
+        if market_status != "regular" or (self.last_timestamp is not None and timestamp <= self.last_timestamp):
+            return 0
+        self._append_row(timestamp, bar_['c'], bar_['h'], bar_['l'], bar_['o'], bar_['v'], market_status)
+        return 1
+
+    def flush_store(self) -> int:
+        """Write bars queued by append_bar to the store. Returns the number of bars written."""
+        if not self._pending_store:
+            return 0
+        timestamps, close, high, low, open_, volume = zip(*self._pending_store)
+        self._pending_store = []
+        with metrics.stage("store"):
+            data_frame = pd.DataFrame({'close': close, 'high': high, 'low': low, 'open': open_, 'volume': volume},
+                                      index=pd.DatetimeIndex(timestamps, name='timestamp'))
+            return self.store.append_bars(self.symbol, data_frame)
+
+    def _append_row(self, timestamp_, close_, high_, low_, open_, volume_, market_status_) -> None:
+        values = self.indicators.update(high_, low_, close_)
+        self._timestamps.append(timestamp_)
+        self._rows.append((close_, high_, low_, open_, volume_, market_status_,
+                           values['ATR'], values['RSI'], values['MA40'], values['MA80'], values['MA160']))
+        self.last_timestamp = timestamp_
+        if self.timeframes is not None:
+            self.timeframes.update(timestamp_, open_, high_, low_, close_, volume_, market_status_)
+
+    def latest_frame(self) -> pd.DataFrame:
+        """Single-row frame for the newest bar, ready for predict_latest_candlestick."""
+        if not self._rows:
+            raise ValueError(f"No data retrieved for ticker: {self.symbol}")
+        return pd.DataFrame([self._rows[-1]], index=pd.DatetimeIndex([self._timestamps[-1]], name='timestamp'), columns=frame_columns)
+
+    def latest_features(self, out_: np.ndarray, features_: list) -> np.ndarray:
+        """Write the newest bar's features_ values into the preallocated out_ array and return it."""
+        if not self._rows:
+            raise ValueError(f"No data retrieved for ticker: {self.symbol}")
+        row = self._rows[-1]
+        for position, feature in enumerate(features_):
+            column = frame_positions.get(feature)
+            if column is not None:
+                out_[position] = row[column]
+            elif self.timeframes is not None:
+                out_[position] = self.timeframes.feature(feature)
+            else:
+                raise KeyError(feature) # Neither a frame column nor a higher-timeframe feature
+        return out_
+
+    def bars_since(self, timestamp_=None) -> list:
+        """(timestamp, row) pairs for the buffered bars newer than timestamp_ (all of them for None), oldest first; rows follow frame_columns."""
+        bars = []
+        for timestamp, row in zip(reversed(self._timestamps), reversed(self._rows)):
+            if timestamp_ is not None and timestamp <= timestamp_:
+                break
+            bars.append((timestamp, row))
+        bars.reverse()
+        return bars
+
+    def to_data_frame(self) -> pd.DataFrame:
+        """Every buffered bar with its indicators, oldest first."""
+        return pd.DataFrame(list(self._rows), index=pd.DatetimeIndex(list(self._timestamps), name='timestamp'), columns=frame_columns)
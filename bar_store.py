@@ -0,0 +1,334 @@
+import os
+import numpy as np
+import pandas as pd
+import pytz
+from datetime import date, datetime, timedelta
+from alpaca.data.historical import StockHistoricalDataClient
+from alpaca.data.timeframe import TimeFrameUnit
+
+from alpaca_data import (
+    retrieve_multi_stock_bars,
+    data_frames_from_multi_stock_bars,
+    market_status_categorical
+)
+
+# On-disk layout, one directory per symbol:
+#   <root>/<symbol>/<column>.bin  raw little-endian column arrays, rows in chronological order
+#   <root>/<symbol>/days.npy      int64 rows of (ET day number, first row, end row, complete)
+# Column files are only ever appended to while days arrive in order (the live loop and
+# forward backfills); filling a gap before the newest stored day rewrites that symbol once.
+# The day index is the source of truth, so rows written after the last index update
+# (e.g. a crash mid-append) are ignored and truncated on the next write.
+
+store_columns = {
+    'timestamp': np.dtype('<i8'), # UTC epoch nanoseconds
+    'open': np.dtype('<f8'),
+    'high': np.dtype('<f8'),
+    'low': np.dtype('<f8'),
+    'close': np.dtype('<f8'),
+    'volume': np.dtype('<i8')
+}
+DAY, FIRST, END, COMPLETE = range(4)
+nanoseconds_per_day = 24 * 60 * 60 * 1_000_000_000
+eastern_time_zone = pytz.timezone("America/New_York")
+epoch_day = date(1970, 1, 1)
+
+
+def _day_numbers(index_: pd.DatetimeIndex) -> np.ndarray:
+    # ET calendar day of each bar as days since 1970-01-01
+    return index_.tz_convert(eastern_time_zone).tz_localize(None).asi8 // nanoseconds_per_day
+
+
+def _to_day_number(day_: date) -> int:
+    return (day_ - epoch_day).days
+
+
+def _from_day_number(day_number_: int) -> date:
+    return epoch_day + timedelta(days=int(day_number_))
+
+
+def _today_et() -> date:
+    return datetime.now(eastern_time_zone).date()
+
+
+class BarStore:
+    """
+    Local columnar store of 1-minute bars keyed by symbol and ET trading day.
+
+    Reads memory-map the column files and hand the mapped arrays to the DataFrame
+    without copying, so a year of minute bars loads without touching the network.
+    """
+
+    def __init__(self, root_: str):
+        """
+        Args:
+            root_: Directory holding one sub-directory per symbol (created if missing)
+        """
+        self.root = root_
+        os.makedirs(root_, exist_ok=True)
+
+    def symbols(self) -> list:
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def _path(self, symbol_: str, name_: str) -> str:
+        return os.path.join(self.root, symbol_, name_)
+
+    def _load_days(self, symbol_: str) -> np.ndarray:
+        path = self._path(symbol_, "days.npy")
+        if not os.path.exists(path):
+            return np.empty((0, 4), dtype=np.int64)
+        return np.load(path)
+
+    def _save_days(self, symbol_: str, days_: np.ndarray) -> None:
+        path = self._path(symbol_, "days.npy")
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as handle:
+            np.save(handle, days_)
+        os.replace(temp_path, path)
+
+    def stored_days(self, symbol_: str, complete_only_: bool = False) -> list:
+        days = self._load_days(symbol_)
+        if complete_only_:
+            days = days[days[:, COMPLETE] == 1]
+        return [_from_day_number(day) for day in days[:, DAY]]
+
+    def last_timestamp(self, symbol_: str) -> pd.Timestamp:
+        """Timestamp (ET) of the newest stored bar, or None if the symbol has no bars."""
+        days = self._load_days(symbol_)
+        if len(days) == 0 or days[-1, END] == 0:
+            return None
+        timestamps = self._column(symbol_, 'timestamp', days[-1, END])
+        return pd.Timestamp(int(timestamps[days[-1, END] - 1]), tz="UTC").tz_convert(eastern_time_zone)
+
+    def missing_days(self, symbol_: str, start_: date, end_: date) -> list:
+        """
+        Weekdays in [start_, end_] that are not stored as complete days.
+
+        Market holidays only show up here until the first backfill, which stores them as empty complete days.
+        """
+        complete = set(self.stored_days(symbol_, complete_only_=True))
+        missing = []
+        day = start_
+        while day <= end_:
+            if day.weekday() < 5 and day not in complete:
+                missing.append(day)
+            day += timedelta(days=1)
+        return missing
+
+    def _column(self, symbol_: str, name_: str, rows_: int) -> np.ndarray:
+        if rows_ == 0:
+            return np.empty(0, dtype=store_columns[name_])
+        return np.memmap(self._path(symbol_, f"{name_}.bin"), dtype=store_columns[name_], mode="r", shape=(rows_,))
+
+    def day_index(self, symbol_: str, start_: date = None, end_: date = None) -> np.ndarray:
+        """
+        Day index of symbol_ for [start_, end_] (inclusive ET days, open-ended when None).
+
+        Returns:
+            int64 rows of (ET day number, first row, end row, complete), indexed with DAY, FIRST, END and COMPLETE
+        """
+        days = self._load_days(symbol_)
+        if start_ is not None:
+            days = days[days[:, DAY] >= _to_day_number(start_)]
+        if end_ is not None:
+            days = days[days[:, DAY] <= _to_day_number(end_)]
+        return days
+
+    def column(self, symbol_: str, name_: str, first_: int = 0, end_: int = None) -> np.ndarray:
+        """
+        Rows [first_, end_) of one stored column (a store_columns name) as a read-only memory-mapped array.
+
+        Args:
+            symbol_: Stored symbol
+            name_: Column name (e.g. 'close' or 'timestamp')
+            first_: First row
+            end_: End row, at most the day index's last end row (None for all of them)
+        """
+        if end_ is None:
+            days = self._load_days(symbol_)
+            end_ = int(days[-1, END]) if len(days) else 0
+        return self._column(symbol_, name_, end_)[first_:end_]
+
+    def _empty_frame(self) -> pd.DataFrame:
+        index = pd.DatetimeIndex([], tz=eastern_time_zone, name='timestamp')
+        return pd.DataFrame({
+            'close': np.empty(0), 'high': np.empty(0), 'low': np.empty(0), 'open': np.empty(0),
+            'volume': np.empty(0, dtype=np.int64), 'market_status': market_status_categorical(index)
+        }, index=index)
+
+    def read(self, symbol_: str, start_: date = None, end_: date = None) -> pd.DataFrame:
+        """
+        Load stored bars for [start_, end_] (inclusive ET days, open-ended when None).
+
+        Returns:
+            DataFrame shaped like data_frame_from_stock_bars output (ET index, oldest first);
+            the OHLCV columns are read-only views of the memory-mapped files
+        """
+        days = self.day_index(symbol_, start_, end_)
+        first = int(days[0, FIRST]) if len(days) else 0
+        end = int(days[-1, END]) if len(days) else 0
+
+        columns = {name: self._column(symbol_, name, end)[first:end] for name in store_columns}
+        index = pd.DatetimeIndex(columns['timestamp'].view('M8[ns]'), name='timestamp').tz_localize("UTC").tz_convert(eastern_time_zone)
+        return pd.DataFrame({
+            'close': columns['close'],
+            'high': columns['high'],
+            'low': columns['low'],
+            'open': columns['open'],
+            'volume': columns['volume'],
+            'market_status': market_status_categorical(index)
+        }, index=index, copy=False)
+
+    def _column_arrays(self, data_: pd.DataFrame) -> dict:
+        return {
+            'timestamp': data_.index.tz_convert("UTC").asi8,
+            'open': data_['open'].to_numpy(),
+            'high': data_['high'].to_numpy(),
+            'low': data_['low'].to_numpy(),
+            'close': data_['close'].to_numpy(),
+            'volume': data_['volume'].to_numpy()
+        }
+
+    def _append_rows(self, symbol_: str, rows_: int, data_: pd.DataFrame) -> None:
+        # Drop anything past the indexed rows (left by an interrupted write) and append
+        os.makedirs(os.path.join(self.root, symbol_), exist_ok=True)
+        arrays = self._column_arrays(data_)
+        for name, dtype in store_columns.items():
+            with open(self._path(symbol_, f"{name}.bin"), "ab") as handle:
+                handle.truncate(rows_ * dtype.itemsize)
+                handle.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+
+    def _rewrite_rows(self, symbol_: str, data_: pd.DataFrame) -> None:
+        # Write complete replacement column files next to the old ones, then swap them in
+        arrays = self._column_arrays(data_)
+        for name, dtype in store_columns.items():
+            path = self._path(symbol_, f"{name}.bin")
+            with open(path + ".tmp", "wb") as handle:
+                handle.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        for name in store_columns:
+            path = self._path(symbol_, f"{name}.bin")
+            os.replace(path + ".tmp", path)
+
+    def append_bars(self, symbol_: str, data_: pd.DataFrame) -> int:
+        """
+        Append bars newer than the newest stored bar, e.g. from the live loop.
+
+        Days touched this way are stored as incomplete, so a later backfill can replace them.
+
+        Returns:
+            Number of bars appended
+        """
+        data_ = data_.sort_index()
+        last_timestamp = self.last_timestamp(symbol_)
+        if last_timestamp is not None:
+            data_ = data_[data_.index > last_timestamp]
+        if len(data_) == 0:
+            return 0
+
+        days = self._load_days(symbol_)
+        rows = int(days[-1, END]) if len(days) else 0
+        self._append_rows(symbol_, rows, data_)
+
+        new_days = []
+        day_numbers = _day_numbers(data_.index)
+        boundaries = np.flatnonzero(np.diff(day_numbers)) + 1
+        for day_rows in np.split(np.arange(len(data_)), boundaries):
+            day_number = day_numbers[day_rows[0]]
+            if len(days) and days[-1, DAY] == day_number:
+                days[-1, END] = rows + day_rows[-1] + 1
+                days[-1, COMPLETE] = 0
+            else:
+                new_days.append([day_number, rows + day_rows[0], rows + day_rows[-1] + 1, 0])
+        if new_days:
+            days = np.vstack([days, np.array(new_days, dtype=np.int64)])
+        self._save_days(symbol_, days)
+        return len(data_)
+
+    def write_days(self, symbol_: str, data_: pd.DataFrame, days_: list) -> None:
+        """
+        Store the bars of data_ falling on days_ as complete days, replacing any partial copies.
+
+        Days in days_ with no bars (holidays) are stored empty so they are not fetched again.
+        Days that are already complete are left untouched.
+        """
+        data_ = data_.sort_index()
+        stored = self._load_days(symbol_)
+        complete = set(stored[stored[:, COMPLETE] == 1, DAY].tolist())
+        new_day_numbers = sorted(set(_to_day_number(day) for day in days_) - complete)
+        if not new_day_numbers:
+            return
+
+        day_numbers = _day_numbers(data_.index)
+        replaced = np.isin(stored[:, DAY], new_day_numbers)
+        kept = stored[~replaced]
+        rows = int(kept[-1, END]) if len(kept) else 0
+
+        # kept is a prefix of the stored days when only trailing days are being replaced
+        if len(kept) == 0 or (kept[-1, DAY] < new_day_numbers[0] and not replaced[:len(kept)].any()):
+            # Every new day comes after the kept ones: append in place
+            data_ = data_[np.isin(day_numbers, new_day_numbers)]
+            self._append_rows(symbol_, rows, data_)
+            new_days = []
+            for day_number in new_day_numbers:
+                count = int(np.count_nonzero(day_numbers == day_number))
+                new_days.append([day_number, rows, rows + count, 1])
+                rows += count
+            self._save_days(symbol_, np.vstack([kept, np.array(new_days, dtype=np.int64)]))
+            return
+
+        # Filling a gap before the newest day: rebuild this symbol's files in day order
+        existing = self.read(symbol_)
+        existing_days = _day_numbers(existing.index)
+        merged = pd.concat([
+            existing[np.isin(existing_days, kept[:, DAY])],
+            data_[np.isin(day_numbers, new_day_numbers)]
+        ]).sort_index()
+        complete_by_day = {int(day): int(flag) for day, flag in zip(kept[:, DAY], kept[:, COMPLETE])}
+        complete_by_day.update({day_number: 1 for day_number in new_day_numbers})
+        merged_days = _day_numbers(merged.index)
+
+        rows = 0
+        all_days = []
+        for day_number in sorted(complete_by_day):
+            count = int(np.count_nonzero(merged_days == day_number))
+            all_days.append([day_number, rows, rows + count, complete_by_day[day_number]])
+            rows += count
+        self._rewrite_rows(symbol_, merged)
+        self._save_days(symbol_, np.array(all_days, dtype=np.int64).reshape(-1, 4))
+
+    def backfill(self, client_: StockHistoricalDataClient, symbols_: list, start_: date, end_: date) -> int:
+        """
+        Fetch only the days missing for symbols_ in [start_, end_] and store them.
+
+        Each contiguous run of missing days is requested once for every symbol missing
+        any day in it. Today (ET) is never marked complete since its bars are still forming.
+
+        Returns:
+            Number of API requests made
+        """
+        end_ = min(end_, _today_et() - timedelta(days=1))
+        missing = {symbol: set(self.missing_days(symbol, start_, end_)) for symbol in symbols_}
+        all_missing = sorted(set().union(*missing.values())) if missing else []
+
+        runs = []
+        for day in all_missing:
+            # Days only separated by a weekend share a request
+            if runs and all((runs[-1][-1] + timedelta(days=offset)).weekday() >= 5 for offset in range(1, (day - runs[-1][-1]).days)):
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+
+        requests = 0
+        for run in runs:
+            run_symbols = [symbol for symbol in symbols_ if missing[symbol].intersection(run)]
+            start_et = eastern_time_zone.localize(datetime.combine(run[0], datetime.min.time()))
+            end_et = eastern_time_zone.localize(datetime.combine(run[-1] + timedelta(days=1), datetime.min.time()))
+            raw_bars = retrieve_multi_stock_bars(client_, run_symbols, start_et, end_et, 1, TimeFrameUnit.Minute)
+            requests += 1
+            frames = data_frames_from_multi_stock_bars(raw_bars)
+            for symbol in run_symbols:
+                data_frame = frames.get(symbol)
+                if data_frame is None:
+                    data_frame = self._empty_frame()
+                self.write_days(symbol, data_frame, sorted(missing[symbol].intersection(run)))
+        return requests
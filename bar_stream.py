@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from alpaca.data.enums import DataFeed
+from alpaca.data.live import StockDataStream
+
+from bar_buffer import BarBuffer
+from instrumentation import metrics
+
+# Streaming ingestion: instead of polling REST once a minute, subscribe to the
+# minute bar channel of the Alpaca market data websocket and run the strategy
+# as soon as each bar arrives. Streamed bars go into the same BarBuffer as REST
+# bars (BarBuffer.append_bar is the single-bar form of append_raw), so the
+# frames and indicators are the ones data_frame_from_stock_bars and
+# add_technical_indicators produce. After every
+# (re)connection the buffer is topped up over REST, which fills any bars the
+# stream missed while it was down.
+# alpaca-py has no public hook for either of these, so this module relies on two
+# private DataStream methods of the pinned alpaca-py 0.42 (requirements.txt):
+# _start_ws, overridden to back off and backfill around each connection, and
+# _run_forever, the coroutine behind the blocking run(), awaited so the stream
+# shares the caller's event loop. tests/test_bar_stream.py exercises both.
+
+log = logging.getLogger(__name__)
+
+
+def stream_bar_to_raw(msg_: dict) -> dict:
+    """
+    Convert a raw websocket bar message to the REST raw bar format.
+
+    Args:
+        msg_: Bar message from a StockDataStream created with raw_data=True
+
+    Returns:
+        Dictionary with the 't', 'o', 'h', 'l', 'c', 'v', 'n', 'vw' keys of a get_stock_bars bar
+    """
+    timestamp = msg_['t']
+    if hasattr(timestamp, "to_datetime"):
+        timestamp = timestamp.to_datetime() # msgpack Timestamp
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {
+        'c': msg_['c'], 'h': msg_['h'], 'l': msg_['l'], 'n': msg_.get('n'), 'o': msg_['o'],
+        't': timestamp, 'v': msg_['v'], 'vw': msg_.get('vw')
+    }
+
+
+class ReconnectingStockDataStream(StockDataStream):
+    """
+    StockDataStream that backs off between failed connection attempts and calls
+    on_connect_ after every successful (re)connection.
+
+    StockDataStream already reconnects after a dropped connection, but retries in a
+    tight loop while the endpoint is unreachable and gives no hook to fill the gap.
+    """
+
+    def __init__(self, api_key_: str, secret_key_: str, feed_: DataFeed = DataFeed.IEX, url_override_: str = None,
+                 on_connect_=None, initial_backoff_: float = 0.5, max_backoff_: float = 30.0):
+        """
+        Args:
+            api_key_: Alpaca API key
+            secret_key_: Alpaca secret key
+            feed_: Market data feed (IEX or SIP)
+            url_override_: Websocket URL to use instead of Alpaca's (e.g. a ReplayBarServer)
+            on_connect_: Coroutine function called with the connection count after each connection
+            initial_backoff_: Seconds waited after the first failed attempt
+            max_backoff_: Longest wait between attempts
+        """
+        super().__init__(api_key=api_key_, secret_key=secret_key_, raw_data=True, feed=feed_, url_override=url_override_)
+        self.on_connect = on_connect_
+        self.initial_backoff = initial_backoff_
+        self.max_backoff = max_backoff_
+        self.backoff = 0.0
+        self.connections = 0
+
+    async def _start_ws(self) -> None:
+        # Private alpaca-py hook (see the header comment): called by DataStream._run_forever for every connection attempt
+        if self.backoff:
+            await asyncio.sleep(self.backoff)
+        try:
+            await super()._start_ws()
+            self.connections += 1
+            if self.on_connect is not None:
+                await self.on_connect(self.connections)
+        except Exception:
+            # A failed backfill counts as a failed attempt too: the socket is closed (the next
+            # attempt opens a new one) and the wait grows until a connection fully succeeds
+            try:
+                await self.close()
+            except Exception:
+                self._ws = None
+            self.backoff = min(max(self.backoff * 2, self.initial_backoff), self.max_backoff)
+            raise
+        self.backoff = 0.0
+
+
+class StreamingBarIngestor:
+    """
+    Feeds streamed minute bars for one symbol into a BarBuffer and runs the strategy on every bar.
+
+    decide_ is called with the bar buffer for every new regular-hours bar and returns the
+    strategy's decision; act_ (optional coroutine function) is then awaited with it, e.g.
+    to submit the order. The time from a bar message arriving to decide_ returning is
+    recorded for every bar.
+    """
+
+    def __init__(self, stream_: StockDataStream, bar_buffer_: BarBuffer, decide_, act_=None, clock_=time.time):
+        """
+        Args:
+            stream_: Data stream created with raw_data=True (see ReconnectingStockDataStream)
+            bar_buffer_: Bar buffer for the streamed symbol
+            decide_: Function taking the bar buffer and returning a decision
+            act_: Optional coroutine function awaited with each decision
+            clock_: Function returning the current epoch time in seconds
+        """
+        self.stream = stream_
+        self.bar_buffer = bar_buffer_
+        self.symbol = bar_buffer_.symbol
+        self.decide = decide_
+        self.act = act_
+        self.clock = clock_
+        self.decisions = []
+        self.backfills = 0
+        self.backfilled_bars = 0
+        self._check_gap = False
+        if isinstance(stream_, ReconnectingStockDataStream):
+            stream_.on_connect = self._on_connect
+        stream_.subscribe_bars(self.handle_bar, self.symbol)
+
+    async def backfill(self) -> int:
+        """
+        Fetch every bar newer than the newest one held over REST.
+
+        Returns:
+            Number of regular-hours bars appended
+        """
+        appended = await asyncio.to_thread(self.bar_buffer.refresh)
+        self.backfills += 1
+        self.backfilled_bars += appended
+        return appended
+
+    async def _on_connect(self, connection_: int) -> None:
+        # The first connection loads the initial lookback. Bars published between this
+        # backfill and the subscription taking effect are caught by a second backfill
+        # when the first streamed bar shows a gap.
+        appended = await self.backfill()
+        self._check_gap = True
+        log.info(f"connection {connection_}: backfilled {appended} bars for {self.symbol}")
+
+    async def handle_bar(self, msg_: dict):
+        """Append one streamed bar and run the strategy if it is a new regular-hours bar."""
+        received = time.perf_counter()
+        raw_bar = stream_bar_to_raw(msg_)
+        backfilled = 0
+        if self._check_gap:
+            self._check_gap = False
+            last_fetched = self.bar_buffer.last_fetched
+            if last_fetched is not None and datetime.fromisoformat(raw_bar['t']) > last_fetched + timedelta(minutes=1):
+                backfilled = await self.backfill()
+
+        # The backfill may already have delivered this bar, in which case it is skipped here
+        if not self.bar_buffer.append_bar(raw_bar) and not backfilled:
+            self.bar_buffer.flush_store()
+            return None # Extended-hours bar or a duplicate
+
+        try:
+            with metrics.stage("decide"):
+                decision = self.decide(self.bar_buffer)
+        except ValueError as error:
+            # e.g. indicators still warming up; the bar is kept and the next one is tried
+            print(f"No decision for {self.symbol} at {self.bar_buffer.last_timestamp}: {error}")
+            self.bar_buffer.flush_store()
+            return None
+        decided = time.perf_counter()
+        # Minute bars are stamped with their start, so the bar closes a minute later
+        bar_close = self.bar_buffer.last_timestamp.timestamp() + 60
+        now = self.clock()
+        metrics.observe_bar_staleness(bar_close, now)
+        self.decisions.append({
+            'timestamp': self.bar_buffer.last_timestamp,
+            'decision': decision,
+            'event_to_decision': decided - received,
+            'bar_close_to_decision': now - bar_close
+        })
+        if self.act is not None:
+            await self.act(decision)
+        self.bar_buffer.flush_store()
+        metrics.end_cycle()
+        return decision
+
+    def latency_summary(self) -> dict:
+        """
+        Event-to-decision latency over every decision so far.
+
+        Returns:
+            Dictionary with the decision count and p50/p99/max latency in microseconds
+        """
+        if not self.decisions:
+            return {'decisions': 0}
+        latencies = np.array([decision['event_to_decision'] for decision in self.decisions]) * 1_000_000
+        return {
+            'decisions': len(latencies),
+            'p50_us': float(np.percentile(latencies, 50)),
+            'p99_us': float(np.percentile(latencies, 99)),
+            'max_us': float(latencies.max()),
+            'backfills': self.backfills,
+            'backfilled_bars': self.backfilled_bars
+        }
+
+    async def run(self) -> None:
+        """Stream until stop() is called (reconnecting and backfilling as needed)."""
+        # DataStream.run() starts its own event loop; _run_forever is the coroutine it runs
+        await self.stream._run_forever()
+
+    async def stop(self) -> None:
+        await self.stream.stop_ws()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+import pandas as pd
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from alpaca_paper_trading import place_market_buy_order, place_market_sell_order, get_account_info, get_positions
+from async_runner import AsyncTradingRunner
+from bar_buffer import BarBuffer
+from fake_clients import make_raw_bars, make_bar_frame, FakeStockHistoricalDataClient, FakeTradingClient
+from machine_learning import feature_columns
+from predictor import KNNPredictor
+
+# Cycle time and bar-close-to-order latency of the sequential main() cycle versus
+# AsyncTradingRunner.run_cycle, against fake clients that add latency_ to every call.
+# Run from the repo root: python -m benchmarks.bench_async_runner
+
+
+class VirtualClock:
+    """Wall clock starting at start_ (epoch seconds) and advancing in real time."""
+
+    def __init__(self, start_: float):
+        self.set(start_)
+
+    def set(self, now_: float) -> None:
+        self.offset = now_ - time.time()
+
+    def __call__(self) -> float:
+        return time.time() + self.offset
+
+
+def _sequential_cycle(trading_client_, bar_buffer_: BarBuffer, predictor_: KNNPredictor, clock_) -> dict:
+    # The per-iteration steps of main(), one call after another
+    cycle_start = clock_()
+    bar_buffer_.refresh()
+    prediction = predictor_.predict(bar_buffer_.latest_features(predictor_.row, predictor_.features))
+    submitted = None
+    if prediction == 1:
+        submitted = clock_()
+        place_market_buy_order(trading_client_, bar_buffer_.symbol, 1)
+    elif prediction == -1:
+        positions = get_positions(trading_client_)
+        if bar_buffer_.symbol in positions and positions[bar_buffer_.symbol]['qty'] > 0:
+            submitted = clock_()
+            place_market_sell_order(trading_client_, bar_buffer_.symbol, int(positions[bar_buffer_.symbol]['qty']))
+    get_account_info(trading_client_)
+    bar_close = bar_buffer_.last_timestamp.timestamp() + 60
+    return {
+        'cycle_seconds': clock_() - cycle_start,
+        'bar_close_to_submit': None if submitted is None else submitted - bar_close
+    }
+
+
+def _summary(cycles_: list) -> dict:
+    latencies = [cycle['bar_close_to_submit'] for cycle in cycles_ if cycle['bar_close_to_submit'] is not None]
+    return {
+        'mean_cycle_seconds': sum(cycle['cycle_seconds'] for cycle in cycles_) / len(cycles_),
+        'mean_bar_close_to_submit': sum(latencies) / len(latencies) if latencies else None,
+        'orders': len(latencies)
+    }
+
+
+def run(latency_: float = 0.05, cycles_: int = 20) -> dict:
+    model_frame = classify_price_gap(add_technical_indicators(make_bar_frame(20_000))).dropna()
+    model_frame = model_frame[model_frame['Higher/Lower'] != 0]
+    X, y = model_frame[feature_columns].to_numpy(), model_frame['Higher/Lower'].to_numpy()
+    predictor = KNNPredictor(KNeighborsClassifier(n_neighbors=5).fit(X, y), training_data_=X, y_=y)
+
+    # Two days of bars ending late in yesterday's session (inside retrieve_stock_bars' 4-day window)
+    session = (pd.Timestamp.now(tz="America/New_York") - pd.Timedelta(days=1)).normalize()
+    first_bar = session - pd.Timedelta(days=1) + pd.Timedelta(hours=4)
+    raw_bars = make_raw_bars(["TSLA"], 2 * 1440, start_=first_bar.strftime("%Y-%m-%d %H:%M"))
+    results = {}
+    for mode in ("sequential", "async"):
+        bar_close = (session + pd.Timedelta(hours=15)).timestamp()
+        clock = VirtualClock(bar_close)
+        data_client = FakeStockHistoricalDataClient(raw_bars, latency_=latency_)
+        data_client.clock = clock()
+        trading_client = FakeTradingClient(latency_=latency_)
+        bar_buffer = BarBuffer(data_client, "TSLA")
+        bar_buffer.refresh()
+        runner = AsyncTradingRunner(trading_client, bar_buffer, predictor, clock_=clock)
+
+        cycles = []
+        for _ in range(cycles_):
+            # A new bar closes and the cycle starts right as it is published
+            bar_close += 60
+            clock.set(bar_close)
+            data_client.clock = clock()
+            if mode == "sequential":
+                cycles.append(_sequential_cycle(trading_client, bar_buffer, predictor, clock))
+            else:
+                cycles.append(asyncio.run(runner.run_cycle()))
+        results[mode] = _summary(cycles)
+    return results
+
+
+if __name__ == "__main__":
+    for mode, summary in run().items():
+        print(mode, {key: round(value, 4) if isinstance(value, float) else value for key, value in summary.items()})
@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from backtest import knn_signals, rsi_ma_crossover_signals, run_backtest
+from fake_clients import make_bar_frame
+from hardcoded_algorithms import RSI_MA_Crossover
+from machine_learning import feature_columns, predict_latest_candlestick
+
+# Times the vectorized signals and run_backtest on synthetic regular-hours bars and checks
+# sampled rows against the row-by-row RSI_MA_Crossover and predict_latest_candlestick.
+# Run from the repo root: python -m benchmarks.bench_backtest
+
+
+def run(bars_: int = 2_000_000, knn_bars_: int = 100_000, samples_: int = 200, seed_: int = 0) -> dict:
+    rng = np.random.default_rng(seed_)
+    data_frame = add_technical_indicators(make_bar_frame(bars_, seed_=seed_))
+
+    start_time = time.perf_counter()
+    signals = rsi_ma_crossover_signals(data_frame)
+    result = run_backtest(data_frame, signals, slippage_bps_=1.0, commission_per_share_=0.005)
+    rsi_seconds = time.perf_counter() - start_time
+
+    labels = {"Buy": 1, "Sell": -1, "Hold": 0}
+    rows = np.concatenate([rng.integers(2, bars_, samples_), np.flatnonzero(signals)[:samples_]])
+    rsi_mismatches = sum(labels[RSI_MA_Crossover(data_frame.iloc[max(0, row - 1):row + 1])] != signals[row] for row in rows)
+
+    knn_frame = data_frame.iloc[:knn_bars_]
+    training = classify_price_gap(knn_frame.iloc[:knn_bars_ // 2]).dropna()
+    training = training[training['Higher/Lower'] != 0]
+    model = KNeighborsClassifier(n_neighbors=5).fit(training[feature_columns].values, training['Higher/Lower'])
+
+    start_time = time.perf_counter()
+    predictions = knn_signals(model, knn_frame)
+    knn_result = run_backtest(knn_frame, predictions, order_type_="limit")
+    knn_seconds = time.perf_counter() - start_time
+
+    knn_rows = rng.integers(200, knn_bars_, samples_ // 4)
+    knn_mismatches = sum(predict_latest_candlestick(model, knn_frame.iloc[:row + 1]) != predictions[row] for row in knn_rows)
+
+    return {
+        'rsi_bars': bars_,
+        'rsi_seconds': rsi_seconds,
+        'rsi_pnl': result['pnl'],
+        'rsi_max_drawdown': result['max_drawdown'],
+        'rsi_turnover': result['turnover'],
+        'rsi_sampled_mismatches': int(rsi_mismatches),
+        'knn_bars': knn_bars_,
+        'knn_seconds': knn_seconds,
+        'knn_pnl': knn_result['pnl'],
+        'knn_sampled_mismatches': int(knn_mismatches)
+    }
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from alpaca.data.timeframe import TimeFrameUnit
+
+from alpaca_data import CachingBarFetcher, retrieve_stock_bars, retrieve_multi_stock_bars
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+
+# CachingBarFetcher against a fake data client that sleeps latency_ per page:
+# the live loop's repeated 4-day window, closed historical windows served from
+# disk by a second fetcher (a later run or another notebook), concurrent
+# identical requests merged into one call, and expiry of open windows.
+# Run from the repo root: python -m benchmarks.bench_bar_cache
+
+
+def run(latency_: float = 0.05, symbols_: int = 20, repeats_: int = 10) -> dict:
+    directory = tempfile.mkdtemp()
+    symbols = [f"SYM{number}" for number in range(symbols_)]
+    raw_bars = make_raw_bars(symbols, 5 * 1440, start_="2025-03-03 00:00")
+    results = {}
+    try:
+        # Same 4-day window asked for repeatedly within a minute
+        data_client = FakeStockHistoricalDataClient(raw_bars, latency_=latency_)
+        fetcher = CachingBarFetcher(data_client, cache_dir_=directory, clock_=lambda: 1_000_000_020.0)
+        start_time = time.perf_counter()
+        for _ in range(repeats_):
+            retrieve_stock_bars(client_=fetcher, symbol_="SYM0", time_interval_=1, time_unit_=TimeFrameUnit.Minute, limit_=1000)
+        results['repeated_window_seconds'] = time.perf_counter() - start_time
+        results['repeated_window_api_calls'] = data_client.calls
+
+        # Closed historical windows: first fetcher fills the disk cache, a new one reads it back
+        start = datetime(2025, 3, 3, tzinfo=timezone.utc)
+        windows = [(start + timedelta(days=day), start + timedelta(days=day + 1)) for day in range(4)]
+        timings = {}
+        for run_name in ("cold", "warm_disk"):
+            data_client = FakeStockHistoricalDataClient(raw_bars, latency_=latency_)
+            fetcher = CachingBarFetcher(data_client, cache_dir_=directory)
+            start_time = time.perf_counter()
+            responses = [retrieve_multi_stock_bars(client_=fetcher, symbols_=symbols, start_=first, end_=last,
+                                                   time_interval_=1, time_unit_=TimeFrameUnit.Minute) for first, last in windows]
+            timings[run_name] = time.perf_counter() - start_time
+            results[f'{run_name}_api_calls'] = data_client.calls
+            results[f'{run_name}_stats'] = fetcher.stats()
+            if run_name == "cold":
+                expected = responses
+        assert responses == expected
+        results['historical_cold_seconds'] = timings['cold']
+        results['historical_warm_disk_seconds'] = timings['warm_disk']
+
+        # Eight threads asking for the same window at once
+        data_client = FakeStockHistoricalDataClient(raw_bars, latency_=latency_)
+        fetcher = CachingBarFetcher(data_client)
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda _: retrieve_multi_stock_bars(client_=fetcher, symbols_=symbols, start_=windows[0][0], end_=windows[0][1],
+                                                                  time_interval_=1, time_unit_=TimeFrameUnit.Minute), range(8)))
+        results['concurrent_api_calls'] = data_client.calls
+        results['concurrent_merged'] = fetcher.stats()['merged']
+
+        # An open window is refetched once the minute it was fetched in is over
+        now = [datetime(2025, 3, 7, 15, 0, 30, tzinfo=timezone.utc).timestamp()]
+        data_client = FakeStockHistoricalDataClient(raw_bars)
+        fetcher = CachingBarFetcher(data_client, ttl_seconds_=60.0, clock_=lambda: now[0])
+        for offset in (0, 20, 31):
+            now[0] += offset
+            retrieve_multi_stock_bars(client_=fetcher, symbols_=["SYM0"], start_=datetime(2025, 3, 7, 14, tzinfo=timezone.utc),
+                                      end_=datetime(2025, 3, 7, 16, tzinfo=timezone.utc), time_interval_=1, time_unit_=TimeFrameUnit.Minute)
+        results['open_window_api_calls'] = data_client.calls
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+if __name__ == "__main__":
+    for key, value in run().items():
+        print(f"{key}: {value}")
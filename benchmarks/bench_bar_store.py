@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+import time
+from datetime import date
+
+from bar_store import BarStore
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+
+# Times a cold backfill of a year of 1-minute bars into a BarStore and reading it back.
+# Run from the repo root: python -m benchmarks.bench_bar_store
+
+
+def run(days_: int = 365, start_: date = date(2024, 1, 1)) -> dict:
+    root = tempfile.mkdtemp(prefix="bar_store_")
+    try:
+        raw_bars = make_raw_bars(["TSLA"], days_ * 24 * 60, start_=start_.strftime("%Y-%m-%d 00:00"))
+        client = FakeStockHistoricalDataClient(raw_bars)
+        store = BarStore(root)
+        end = date.fromordinal(start_.toordinal() + days_ - 1)
+
+        start_time = time.perf_counter()
+        store.backfill(client, ["TSLA"], start_, end)
+        backfill_time = time.perf_counter() - start_time
+
+        client.reset_counts()
+        store.backfill(client, ["TSLA"], start_, end)
+        repeat_requests = client.calls
+
+        start_time = time.perf_counter()
+        data_frame = BarStore(root).read("TSLA")
+        read_time = time.perf_counter() - start_time
+        return {
+            'bars': len(data_frame),
+            'backfill_seconds': backfill_time,
+            'repeat_backfill_requests': repeat_requests,
+            'read_seconds': read_time
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value}")
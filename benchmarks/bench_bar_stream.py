@@ -0,0 +1,67 @@
+import asyncio
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import data_frame_from_stock_bars, filter_regular_hours, add_technical_indicators, classify_price_gap
+from bar_buffer import BarBuffer
+from bar_stream import ReconnectingStockDataStream, StreamingBarIngestor
+from fake_clients import make_raw_bars, make_bar_frame, FakeStockHistoricalDataClient, ReplayBarServer
+from machine_learning import feature_columns
+from predictor import KNNPredictor
+
+# Streams a session of synthetic bars from a local ReplayBarServer through
+# StreamingBarIngestor with periodic disconnects, then reports event-to-decision
+# latency and checks the buffer against the batch pipeline on the same bars.
+# Run from the repo root: python -m benchmarks.bench_bar_stream
+
+
+async def run(streamed_bars_: int = 400, drop_every_: int = 60, skip_on_drop_: int = 5, interval_: float = 0.002) -> dict:
+    model_frame = classify_price_gap(add_technical_indicators(make_bar_frame(20_000))).dropna()
+    model_frame = model_frame[model_frame['Higher/Lower'] != 0]
+    X, y = model_frame[feature_columns].to_numpy(), model_frame['Higher/Lower'].to_numpy()
+    predictor = KNNPredictor(KNeighborsClassifier(n_neighbors=5).fit(X, y), training_data_=X, y_=y)
+
+    # Two days of bars; streaming starts at 13:00 ET yesterday (inside retrieve_stock_bars' 4-day window)
+    session = (pd.Timestamp.now(tz="America/New_York") - pd.Timedelta(days=1)).normalize()
+    first_bar = session - pd.Timedelta(days=1) + pd.Timedelta(hours=4)
+    raw_bars = make_raw_bars(["TSLA"], 2 * 1440, start_=first_bar.strftime("%Y-%m-%d %H:%M"))["TSLA"]
+    first_streamed = 1440 + 9 * 60
+
+    data_client = FakeStockHistoricalDataClient({"TSLA": raw_bars})
+    data_client.clock = pd.Timestamp(raw_bars[first_streamed]['t']).timestamp()
+    server = ReplayBarServer({"TSLA": raw_bars[first_streamed:first_streamed + streamed_bars_]}, interval_=interval_,
+                             drop_every_=drop_every_, skip_on_drop_=skip_on_drop_, data_client_=data_client)
+    url = await server.start()
+
+    bar_buffer = BarBuffer(data_client, "TSLA")
+    stream = ReconnectingStockDataStream("key", "secret", url_override_=url)
+    ingestor = StreamingBarIngestor(stream, bar_buffer,
+                                    decide_=lambda buffer: predictor.predict(buffer.latest_features(predictor.row, predictor.features)))
+    stream_task = asyncio.create_task(ingestor.run())
+    await asyncio.wait_for(server.finished.wait(), timeout=120)
+    await asyncio.sleep(0.1)
+    await ingestor.stop()
+    await asyncio.wait_for(stream_task, timeout=10)
+    await server.stop()
+
+    # The buffer's indicators start from the initial 1000-bar lookback, so compare with the batch pipeline over the same bars
+    expected = add_technical_indicators(filter_regular_hours(data_frame_from_stock_bars(
+        {"TSLA": raw_bars[first_streamed - bar_buffer.limit:first_streamed + streamed_bars_]})))
+    buffered = bar_buffer.to_data_frame()
+    numeric = [column for column in buffered.columns if column != 'market_status']
+    difference = np.nanmax(np.abs(buffered[numeric].to_numpy(dtype=float) - expected.loc[buffered.index, numeric].to_numpy(dtype=float)))
+
+    return {
+        **ingestor.latency_summary(),
+        'connections': server.connections,
+        'streamed': server.sent,
+        'skipped_during_reconnect': server.skipped,
+        'last_bar_matches': buffered.index[-1] == expected.index[-1],
+        'max_abs_difference': float(difference)
+    }
+
+
+if __name__ == "__main__":
+    for key, value in asyncio.run(run()).items():
+        print(f"{key}: {round(value, 2) if isinstance(value, float) else value}")
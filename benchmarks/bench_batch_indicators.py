@@ -0,0 +1,52 @@
+import sys
+import time
+import numpy as np
+
+from alpaca_data import add_technical_indicators
+from fake_clients import make_bar_frame
+from indicators import batch_indicators
+
+# batch_indicators on aligned (time x symbol) arrays versus looping
+# add_technical_indicators over one DataFrame per symbol. Symbols are generated
+# and compared in groups so memory stays bounded at 100k bars per symbol.
+# Run from the repo root: python -m benchmarks.bench_batch_indicators [symbols] [bars]
+
+
+def run(symbols_: int = 500, bars_: int = 100_000, group_: int = 50) -> dict:
+    loop_seconds = 0.0
+    batch_seconds = 0.0
+    worst = 0.0
+    for first in range(0, symbols_, group_):
+        frames = [make_bar_frame(bars_, seed_=seed) for seed in range(first, min(first + group_, symbols_))]
+        high, low, close = (np.column_stack([frame[column].to_numpy() for frame in frames]) for column in ('high', 'low', 'close'))
+
+        start_time = time.perf_counter()
+        expected = [add_technical_indicators(frame) for frame in frames]
+        loop_seconds += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        results = batch_indicators(high, low, close)
+        batch_seconds += time.perf_counter() - start_time
+
+        for column_number, frame in enumerate(expected):
+            for column, values in results.items():
+                reference = frame[column].to_numpy()
+                assert np.array_equal(np.isnan(values[:, column_number]), np.isnan(reference)), column
+                valid = ~np.isnan(reference)
+                difference = np.abs(values[valid, column_number] - reference[valid]) / np.abs(reference[valid])
+                worst = max(worst, float(difference.max()))
+
+    return {
+        'symbols': symbols_,
+        'bars': bars_,
+        'loop_seconds': loop_seconds,
+        'batch_seconds': batch_seconds,
+        'speedup': loop_seconds / batch_seconds,
+        'max_relative_difference': worst
+    }
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:3]]
+    for key, value in run(*arguments).items():
+        print(f"{key}: {value}")
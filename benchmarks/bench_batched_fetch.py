@@ -0,0 +1,63 @@
+import time
+import pytz
+from datetime import datetime, timedelta
+from alpaca.data.timeframe import TimeFrameUnit
+
+from alpaca_data import (
+    retrieve_stock_bars,
+    retrieve_multi_stock_bars,
+    data_frame_from_stock_bars,
+    data_frames_from_multi_stock_bars
+)
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+
+# Compares fetching a universe one symbol at a time (retrieve_stock_bars + data_frame_from_stock_bars)
+# with one batched retrieve_multi_stock_bars + data_frames_from_multi_stock_bars call, and checks
+# that both give every symbol the same frame (tests/test_batched_fetch.py covers paginated responses).
+# Run from the repo root: python -m benchmarks.bench_batched_fetch
+
+
+def run(symbol_counts_: tuple = (1, 10, 100), bars_per_symbol_: int = 1000, latency_: float = 0.05) -> list:
+    eastern = pytz.timezone("America/New_York")
+    now_et = datetime.now(eastern)
+    start_et = (now_et - timedelta(days=2)).replace(hour=4, minute=0, second=0, microsecond=0)
+    end_et = (now_et + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    results = []
+    for symbol_count in symbol_counts_:
+        symbols = [f"SYM{i:03d}" for i in range(symbol_count)]
+        raw_bars = make_raw_bars(symbols, bars_per_symbol_, start_=start_et.strftime("%Y-%m-%d %H:%M"))
+        client = FakeStockHistoricalDataClient(raw_bars, latency_=latency_)
+
+        start_time = time.perf_counter()
+        sequential_frames = {symbol: data_frame_from_stock_bars(retrieve_stock_bars(client, symbol, 1, TimeFrameUnit.Minute, bars_per_symbol_))
+                             for symbol in symbols}
+        sequential_time = time.perf_counter() - start_time
+        sequential_requests = client.http_requests
+        client.reset_counts()
+
+        start_time = time.perf_counter()
+        frames = data_frames_from_multi_stock_bars(
+            retrieve_multi_stock_bars(client, symbols, start_et, end_et, 1, TimeFrameUnit.Minute))
+        batched_time = time.perf_counter() - start_time
+        # retrieve_stock_bars asks for the newest bars first
+        frames_match = sorted(frames) == symbols and all(frames[symbol].equals(sequential_frames[symbol].sort_index()) for symbol in symbols)
+
+        results.append({
+            'symbols': symbol_count,
+            'sequential_requests': sequential_requests,
+            'sequential_seconds': sequential_time,
+            'batched_requests': client.http_requests,
+            'batched_seconds': batched_time,
+            'injected_latency_seconds': latency_,
+            'frames_match': frames_match
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'symbols':>8} {'seq reqs':>9} {'seq s':>8} {'batch reqs':>11} {'batch s':>8} {'speedup':>8} {'match':>6}")
+    for result in run():
+        print(f"{result['symbols']:>8} {result['sequential_requests']:>9} {result['sequential_seconds']:>8.3f} "
+              f"{result['batched_requests']:>11} {result['batched_seconds']:>8.3f} "
+              f"{result['sequential_seconds'] / result['batched_seconds']:>7.1f}x {str(result['frames_match']):>6}")
@@ -0,0 +1,108 @@
+import gc
+import sys
+import time
+import numpy as np
+
+from alpaca_data import add_technical_indicators
+from compact_knn import build_compact_knn
+from fake_clients import make_bar_frame
+from machine_learning import ScalerArrays, feature_columns
+from predictor import KNNPredictor, measure_latency
+
+# Accuracy, latency and memory of CompactKNN against the exact KNNPredictor at
+# several training set sizes: every row indexed in float16 and in int8, and the
+# set condensed to 20k prototypes by clustering and by selection. The target is
+# whether close is above MA40 with 10% of the labels flipped, since the
+# Higher/Lower label of synthetic random-walk bars cannot be learned by any
+# model; agreement is the share of test rows predicted like the exact model.
+# Memory is the index arrays for CompactKNN, and the training array, labels,
+# KD-tree index and KD-tree nodes (72 bytes each, scipy's ckdtreenode) for
+# KNNPredictor.
+# Run from the repo root: python -m benchmarks.bench_compact_knn [rows ...]
+#   python -m benchmarks.bench_compact_knn 100000 1000000 10000000
+
+configurations = [
+    ('ivf_float16', None, "float16"),
+    ('ivf_int8', None, "int8"),
+    ('clustering_int8', "clustering", "int8"),
+    ('selection_int8', "selection", "int8")
+]
+
+
+def _exact_bytes(predictor_: KNNPredictor) -> int:
+    tree = predictor_.tree
+    return predictor_.training_data.nbytes + predictor_.labels.nbytes + tree.indices.nbytes + tree.size * 72
+
+
+def _training_set(rows_: int, seed_: int) -> tuple:
+    # Chunks of at most 1M bars keep the indicator frames small
+    X, y = [], []
+    remaining = rows_
+    while remaining > 0:
+        frame = add_technical_indicators(make_bar_frame(min(remaining, 1_000_000) + 200, seed_=seed_ + len(X))).dropna()
+        frame = frame.iloc[:remaining]
+        X.append(frame[feature_columns].to_numpy(dtype=np.float64))
+        y.append(np.where(frame['close'] > frame['MA40'], 1, -1))
+        remaining -= len(frame)
+    y = np.concatenate(y)
+    y[np.random.default_rng(seed_).random(len(y)) < 0.1] *= -1
+    return np.concatenate(X), y
+
+
+def run_size(rows_: int, prototypes_: int = 20_000, test_rows_: int = 2000) -> dict:
+    X, y = _training_set(rows_, 0)
+    X_test, y_test = _training_set(test_rows_, 10_000)
+    scaler = ScalerArrays(X.mean(axis=0), X.std(axis=0))
+    X -= scaler.mean_
+    X /= scaler.scale_
+    classes, labels = np.unique(y, return_inverse=True)
+    results = {}
+
+    start_time = time.perf_counter()
+    exact = KNNPredictor.from_arrays(X, labels, classes, 5, scaler_=scaler, warmup_=10)
+    build_seconds = time.perf_counter() - start_time
+    expected = np.array([exact.predict(row) for row in X_test])
+    # Latency over varied rows, since the cells probed (and the KD-tree branches visited) depend on the row
+    rows = iter(np.resize(X_test, (2000, X_test.shape[1])))
+    results['exact'] = {
+        'rows': rows_,
+        'build_seconds': build_seconds,
+        'megabytes': _exact_bytes(exact) / 1e6,
+        'accuracy': float((expected == y_test).mean()),
+        'agreement': 1.0,
+        **measure_latency(lambda: exact.predict(next(rows)), 2000)
+    }
+    del exact
+    gc.collect()
+
+    for name, condense, dtype in configurations:
+        start_time = time.perf_counter()
+        compact = build_compact_knn(X, y, condense_=condense, prototypes_=prototypes_, dtype_=dtype, scaler_=scaler)
+        build_seconds = time.perf_counter() - start_time
+        predicted = compact.predict(X_test)
+        rows = iter(np.resize(X_test, (2000, X_test.shape[1])))
+        results[name] = {
+            'rows': len(compact.vectors),
+            'build_seconds': build_seconds,
+            'megabytes': compact.nbytes() / 1e6,
+            'accuracy': float((predicted == y_test).mean()),
+            'agreement': float((predicted == expected).mean()),
+            **measure_latency(lambda: compact.predict(next(rows)), 2000)
+        }
+        del compact
+        gc.collect()
+    return results
+
+
+def run(sizes_: tuple = (100_000, 1_000_000)) -> dict:
+    return {rows: run_size(rows) for rows in sizes_}
+
+
+if __name__ == "__main__":
+    sizes = tuple(int(argument) for argument in sys.argv[1:]) or (100_000, 1_000_000)
+    for rows, results in run(sizes).items():
+        print(f"\n{rows} training rows")
+        print(f"{'':>16} {'rows':>9} {'build s':>8} {'MB':>9} {'accuracy':>9} {'agreement':>9} {'p50 us':>8} {'p99 us':>8}")
+        for name, result in results.items():
+            print(f"{name:>16} {result['rows']:>9} {result['build_seconds']:>8.1f} {result['megabytes']:>9.1f} {result['accuracy']:>9.4f} "
+                  f"{result['agreement']:>9.4f} {result['p50_us']:>8.1f} {result['p99_us']:>8.1f}")
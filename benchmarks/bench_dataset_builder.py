@@ -0,0 +1,69 @@
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from bar_store import BarStore
+from dataset_builder import iter_dataset_chunks, load_dataset, write_dataset
+from fake_clients import make_bar_frame
+from machine_learning import clean_training_data, feature_columns
+
+# Training dataset build: classify_price_gap + add_technical_indicators + the
+# training functions' cleaning on one full-history DataFrame per symbol, versus
+# write_dataset reading the bar store a few days at a time and writing flat
+# arrays. The chunked output is checked row for row against the DataFrame path.
+# Run from the repo root: python -m benchmarks.bench_dataset_builder [symbols] [days]
+
+
+def run(symbols_: int = 5, days_: int = 250) -> dict:
+    directory = tempfile.mkdtemp()
+    try:
+        store = BarStore(directory)
+        symbols = [f"SYM{number}" for number in range(symbols_)]
+        frames = {}
+        for seed, symbol in enumerate(symbols):
+            frame = make_bar_frame(days_ * 390, seed_=seed)
+            frames[symbol] = frame
+            store.write_days(symbol, frame, sorted(set(frame.index.date)))
+
+        start_time = time.perf_counter()
+        expected = {symbol: clean_training_data(add_technical_indicators(classify_price_gap(frame))) for symbol, frame in frames.items()}
+        frame_seconds = time.perf_counter() - start_time
+
+        stats = write_dataset(store, symbols, f"{directory}/dataset")
+        X, y, timestamps, manifest = load_dataset(f"{directory}/dataset")
+
+        worst = 0.0
+        for symbol in symbols:
+            first, last = manifest['symbols'][symbol]
+            reference = expected[symbol]
+            assert last - first == len(reference), symbol
+            assert np.array_equal(timestamps[first:last], reference.index.tz_convert("UTC").asi8)
+            assert np.array_equal(y[first:last], reference['Higher/Lower'].to_numpy())
+            values = reference[feature_columns].to_numpy()
+            difference = np.abs(X[first:last] - values) / np.abs(values).clip(min=1)
+            worst = max(worst, float(difference.max()))
+        streamed = sum(len(block_y) for _, block_y in iter_dataset_chunks(f"{directory}/dataset", rows_=50_000))
+        assert streamed == manifest['rows']
+
+        rows = manifest['rows']
+        return {
+            'symbols': symbols_,
+            'rows': rows,
+            'frame_seconds': frame_seconds,
+            'frame_rows_per_second': rows / frame_seconds,
+            'builder_seconds': stats['seconds'],
+            'builder_rows_per_second': stats['rows_per_second'],
+            'dataset_megabytes': (X.nbytes + y.nbytes + timestamps.nbytes) / 1e6,
+            'max_relative_difference': worst
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:3]]
+    for key, value in run(*arguments).items():
+        print(f"{key}: {value}")
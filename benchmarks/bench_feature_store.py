@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from alpaca_data import add_technical_indicators, filter_regular_hours, data_frames_from_multi_stock_bars
+from bar_store import BarStore
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+from feature_store import FeatureStore, default_indicator_config
+
+# Feature store over a year of 1-minute bars: the first full computation, reading
+# ready features back, and the incremental updates after a backfilled day, a
+# live-appended bar and a backfill completing that live day, against running
+# add_technical_indicators over the whole history as every consumer does today.
+# Checks the stored values against add_technical_indicators and the incrementally
+# built columns against a rebuild from scratch, and that changing one indicator's
+# length only recomputes that column.
+# Run from the repo root: python -m benchmarks.bench_feature_store
+
+
+def _max_relative_difference(first_: np.ndarray, second_: np.ndarray) -> float:
+    if not np.array_equal(np.isnan(first_), np.isnan(second_)):
+        return float("inf")
+    valid = ~np.isnan(first_)
+    return float((np.abs(first_[valid] - second_[valid]) / np.abs(second_[valid])).max())
+
+
+def run(days_: int = 365, start_: date = date(2024, 1, 1)) -> dict:
+    root = tempfile.mkdtemp(prefix="feature_store_")
+    try:
+        raw_bars = make_raw_bars(["TSLA"], (days_ + 2) * 24 * 60, start_=start_.strftime("%Y-%m-%d 00:00"))
+        client = FakeStockHistoricalDataClient(raw_bars)
+        store = BarStore(root)
+        end = start_ + timedelta(days=days_ - 1)
+        store.backfill(client, ["TSLA"], start_, end)
+        feature_store = FeatureStore(store)
+        results = {'bars': len(store.read("TSLA"))}
+
+        start_time = time.perf_counter()
+        feature_store.update("TSLA")
+        results['full_update_seconds'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        reference = add_technical_indicators(filter_regular_hours(store.read("TSLA")).copy())
+        results['add_technical_indicators_seconds'] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        stored = feature_store.read("TSLA")
+        results['read_seconds'] = time.perf_counter() - start_time
+        results['max_relative_difference'] = max(_max_relative_difference(stored[column].to_numpy(), reference[column].to_numpy())
+                                                 for column in default_indicator_config)
+
+        # One more backfilled day
+        next_day = end + timedelta(days=1)
+        while next_day.weekday() >= 5:
+            next_day += timedelta(days=1)
+        store.backfill(client, ["TSLA"], next_day, next_day)
+        start_time = time.perf_counter()
+        report = feature_store.update("TSLA")
+        results['day_update_seconds'] = time.perf_counter() - start_time
+        results['day_update_rows'] = report['columns']['RSI']['computed_rows']
+
+        # The live loop appending bars of the following day one at a time
+        live_day = next_day + timedelta(days=1)
+        while live_day.weekday() >= 5:
+            live_day += timedelta(days=1)
+        frame = data_frames_from_multi_stock_bars(raw_bars)["TSLA"]
+        session_open = pd.Timestamp(live_day).tz_localize("America/New_York") + pd.Timedelta(hours=9, minutes=30)
+        store.append_bars("TSLA", frame[(frame.index >= session_open - pd.Timedelta(hours=5, minutes=30)) & (frame.index < session_open + pd.Timedelta(hours=1))])
+        feature_store.update("TSLA")
+        timings = []
+        for minute in range(60, 120):
+            store.append_bars("TSLA", frame[frame.index == session_open + pd.Timedelta(minutes=minute)])
+            start_time = time.perf_counter()
+            feature_store.update("TSLA")
+            timings.append(time.perf_counter() - start_time)
+        results['bar_update_ms'] = float(np.median(timings)) * 1000
+
+        # A backfill replaces the partial live day: resume from the checkpoint at its start
+        store.backfill(client, ["TSLA"], live_day, live_day)
+        start_time = time.perf_counter()
+        report = feature_store.update("TSLA")
+        results['completed_day_update_seconds'] = time.perf_counter() - start_time
+        results['completed_day_resumed_from'] = report['columns']['RSI']['resumed_from']
+
+        incremental = feature_store.read("TSLA")
+        shutil.rmtree(f"{root}/TSLA/features")
+        rebuilt = feature_store.read("TSLA")
+        results['incremental_vs_rebuilt'] = max(_max_relative_difference(incremental[column].to_numpy(), rebuilt[column].to_numpy())
+                                                for column in default_indicator_config)
+        reference = add_technical_indicators(filter_regular_hours(store.read("TSLA")).copy())
+        results['incremental_vs_add_technical_indicators'] = max(
+            _max_relative_difference(incremental[column].to_numpy(), reference[column].to_numpy()) for column in default_indicator_config)
+
+        # Changing one length recomputes only that column
+        config = dict(default_indicator_config, MA40={'kind': "sma", 'length': 30, 'source': "close"})
+        start_time = time.perf_counter()
+        report = FeatureStore(store, config).update("TSLA")
+        results['config_change_seconds'] = time.perf_counter() - start_time
+        results['config_change_recomputed'] = sorted(column for column, entry in report['columns'].items() if entry['computed_rows'])
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+import pandas as pd
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from alpaca_paper_trading import get_account_info, OrderManager
+from bar_buffer import BarBuffer
+from fake_clients import make_raw_bars, make_bar_frame, FakeStockHistoricalDataClient, FakeTradingClient
+from instrumentation import metrics, CycleProfiler, JsonMetricsWriter
+from machine_learning import feature_columns
+from predictor import KNNPredictor
+
+# Cost of the instrumentation layer: a stage context manager while metrics are
+# disabled and enabled, and the main() cycle (refresh, predict, order, account
+# against fake clients) with metrics off versus on. Also prints the per-stage
+# breakdown and checks the Prometheus, JSON and profiler outputs are written.
+# Run from the repo root: python -m benchmarks.bench_instrumentation
+
+
+def _stage_nanoseconds(calls_: int = 200_000) -> float:
+    # Cost per `with metrics.stage(...)` over an empty loop
+    start_time = time.perf_counter()
+    for _ in range(calls_):
+        pass
+    loop_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for _ in range(calls_):
+        with metrics.stage("noop"):
+            pass
+    return (time.perf_counter() - start_time - loop_seconds) / calls_ * 1e9
+
+
+def _cycle(bar_buffer_: BarBuffer, predictor_: KNNPredictor, order_manager_: OrderManager, trading_client_) -> int:
+    # The instrumented per-iteration steps of main()
+    with metrics.stage("cycle"):
+        bar_buffer_.refresh()
+        with metrics.stage("predict"):
+            prediction = predictor_.predict(bar_buffer_.latest_features(predictor_.row, predictor_.features))
+        metrics.observe_bar_staleness(bar_buffer_.last_timestamp.timestamp() + 60, bar_buffer_.client.clock)
+        if prediction == 1:
+            with metrics.stage("order"):
+                order_manager_.submit_order(bar_buffer_.symbol, 1, "buy")
+        with metrics.stage("account"):
+            get_account_info(trading_client_)
+    metrics.end_cycle()
+    return prediction
+
+
+def run(cycles_: int = 150) -> dict:
+    model_frame = classify_price_gap(add_technical_indicators(make_bar_frame(20_000))).dropna()
+    model_frame = model_frame[model_frame['Higher/Lower'] != 0]
+    X, y = model_frame[feature_columns].to_numpy(), model_frame['Higher/Lower'].to_numpy()
+    predictor = KNNPredictor(KNeighborsClassifier(n_neighbors=5).fit(X, y), training_data_=X, y_=y)
+
+    session = (pd.Timestamp.now(tz="America/New_York") - pd.Timedelta(days=1)).normalize()
+    raw_bars = make_raw_bars(["TSLA"], 2 * 1440, start_=(session - pd.Timedelta(days=1) + pd.Timedelta(hours=4)).strftime("%Y-%m-%d %H:%M"))
+    first_close = (session + pd.Timedelta(hours=13)).timestamp()
+
+    results = {'disabled_stage_ns': _stage_nanoseconds()}
+    metrics.enable()
+    results['enabled_stage_ns'] = _stage_nanoseconds()
+    metrics.disable()
+    metrics.reset()
+
+    directory = tempfile.mkdtemp()
+    for mode in ("disabled", "enabled"):
+        if mode == "enabled":
+            metrics.enable()
+        data_client = FakeStockHistoricalDataClient(raw_bars)
+        data_client.clock = first_close
+        trading_client = FakeTradingClient()
+        order_manager = OrderManager(trading_client, max_workers=2)
+        bar_buffer = BarBuffer(data_client, "TSLA")
+        bar_buffer.refresh()
+        metrics.reset()
+        json_writer = JsonMetricsWriter(os.path.join(directory, "metrics.json")) if mode == "enabled" else None
+
+        elapsed = 0.0
+        for cycle in range(cycles_):
+            data_client.clock = first_close + 60 * (cycle + 1)
+            start_time = time.perf_counter()
+            prediction = _cycle(bar_buffer, predictor, order_manager, trading_client)
+            elapsed += time.perf_counter() - start_time
+            if json_writer is not None:
+                json_writer.write({'prediction': int(prediction)})
+        results[f'{mode}_cycle_ms'] = elapsed / cycles_ * 1000
+        order_manager.close()
+
+    snapshot = metrics.snapshot()
+    for stage, summary in sorted(snapshot['stages'].items()):
+        results[f'{stage}_p50_ms'] = summary['p50'] * 1000
+        results[f'{stage}_p99_ms'] = summary['p99'] * 1000
+    results['api_calls'] = snapshot['api_calls']
+    results['api_errors'] = snapshot['api_errors']
+    results['prometheus_lines'] = len(metrics.prometheus_text().splitlines())
+    results['json_bytes'] = os.path.getsize(os.path.join(directory, "metrics.json"))
+    metrics.disable()
+
+    # Three sampled cycles written as folded stacks
+    profiler = CycleProfiler(cycles_=3, output_=os.path.join(directory, "profile.folded"), mode_="sample")
+    while profiler.active:
+        data_client.clock += 60
+        with profiler.cycle():
+            _cycle(bar_buffer, predictor, order_manager, trading_client)
+    results['profile_stacks'] = len(profiler.samples)
+    return results
+
+
+if __name__ == "__main__":
+    for key, value in run().items():
+        print(f"{key}: {value}")
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from fake_clients import make_bar_frame
+from machine_learning import feature_columns, save_model_bundle, load_model_bundle
+from predictor import KNNPredictor
+
+# Bundle size and load time for KNN versus Random Forest, with and without memory-mapping.
+# Run from the repo root: python -m benchmarks.bench_model_bundle
+
+
+def _directory_size(path_: str) -> int:
+    return sum(os.path.getsize(os.path.join(path_, name)) for name in os.listdir(path_))
+
+
+def _load_seconds(bundle_dir_: str, mmap_: bool, repeats_: int = 5) -> float:
+    timings = []
+    for _ in range(repeats_):
+        start_time = time.perf_counter()
+        load_model_bundle(bundle_dir_, mmap_=mmap_)
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings))
+
+
+def run(training_rows_: int = 200_000) -> dict:
+    data_frame = classify_price_gap(add_technical_indicators(make_bar_frame(training_rows_))).dropna()
+    data_frame = data_frame[data_frame['Higher/Lower'] != 0]
+    X = data_frame[feature_columns].to_numpy(dtype=np.float64)
+    y = data_frame['Higher/Lower'].to_numpy()
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+
+    models = {
+        'knn': KNeighborsClassifier(n_neighbors=5).fit(X_scaled, y),
+        'rf': RandomForestClassifier(n_estimators=100, max_depth=12, random_state=42, n_jobs=-1).fit(X_scaled, y)
+    }
+    root = tempfile.mkdtemp(prefix="model_bundle_")
+    results = {}
+    try:
+        for name, model in models.items():
+            bundle_dir = os.path.join(root, name)
+            save_model_bundle(model, scaler, X, y, bundle_dir)
+            results[name] = {
+                'bytes': _directory_size(bundle_dir),
+                'load_seconds_mmap': _load_seconds(bundle_dir, mmap_=True),
+                'load_seconds_copy': _load_seconds(bundle_dir, mmap_=False)
+            }
+        start_time = time.perf_counter()
+        KNNPredictor.from_bundle(load_model_bundle(os.path.join(root, 'knn')))
+        results['knn']['load_to_warm_predictor_seconds'] = time.perf_counter() - start_time
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(name, {key: round(value, 4) if isinstance(value, float) else value for key, value in result.items()})
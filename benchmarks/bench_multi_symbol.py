@@ -0,0 +1,68 @@
+import functools
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import add_technical_indicators, classify_price_gap, data_frame_from_stock_bars, filter_regular_hours
+from fake_clients import make_raw_bars, make_bar_frame, FakeStockHistoricalDataClient
+from machine_learning import feature_columns, save_model_bundle
+from multi_symbol_runner import MultiSymbolRunner
+from predictor import load_predictor
+
+# Cycle time of MultiSymbolRunner against symbol count on 1..N worker processes,
+# with an in-memory data client (no network latency) so the numbers show the
+# indicator and prediction work. Each timed cycle adds one bar per symbol.
+# Run from the repo root: python -m benchmarks.bench_multi_symbol [max_workers]
+
+first_bar = "2025-03-03 04:00"
+bars_per_symbol = 900 # 04:00 to 19:00
+
+
+def _symbol_bars(symbol_: str) -> list:
+    return make_raw_bars([symbol_], bars_per_symbol, start_=first_bar, seed_=int(symbol_[3:]))[symbol_]
+
+
+def fake_client(symbols_: list) -> FakeStockHistoricalDataClient:
+    return FakeStockHistoricalDataClient({symbol: _symbol_bars(symbol) for symbol in symbols_})
+
+
+def run(symbol_counts_: tuple = (50, 100, 200, 400), max_workers_: int = None, cycles_: int = 10) -> list:
+    model_frame = classify_price_gap(add_technical_indicators(make_bar_frame(20_000))).dropna()
+    model_frame = model_frame[model_frame['Higher/Lower'] != 0]
+    X = model_frame[feature_columns].to_numpy()
+    y = model_frame['Higher/Lower'].to_numpy()
+    bundle_dir = tempfile.mkdtemp()
+    save_model_bundle(KNeighborsClassifier(n_neighbors=5).fit(X, y), None, X, y, bundle_dir)
+    predictor_factory = functools.partial(load_predictor, bundle_dir)
+
+    first_end = pd.Timestamp("2025-03-03 13:00", tz="America/New_York").timestamp()
+    results = []
+    for symbol_count in symbol_counts_:
+        symbols = [f"SYM{i}" for i in range(symbol_count)]
+        for workers in range(1, (max_workers_ or os.cpu_count()) + 1):
+            with MultiSymbolRunner(symbols, fake_client, predictor_factory, workers_=workers) as runner:
+                load_seconds = runner.run_cycle(first_end)['cycle_seconds']
+                cycle_seconds = [runner.run_cycle(first_end + 60 * cycle)['cycle_seconds'] for cycle in range(1, cycles_ + 1)]
+                # The last symbol's shared feature row must match the batch pipeline on the same bars
+                last_close = pd.Timestamp(first_end + 60 * cycles_, unit="s", tz="UTC")
+                expected = add_technical_indicators(filter_regular_hours(data_frame_from_stock_bars({symbols[-1]: _symbol_bars(symbols[-1])})))
+                expected = expected[expected.index < last_close][feature_columns].iloc[-1].to_numpy(dtype=float)
+                matches = bool(np.allclose(runner.feature_rows()[-1], expected, rtol=1e-12, atol=0))
+            results.append({
+                'symbols': symbol_count,
+                'workers': workers,
+                'load_seconds': load_seconds,
+                'median_cycle_ms': float(np.median(cycle_seconds)) * 1000,
+                'features_match': matches
+            })
+    return results
+
+
+if __name__ == "__main__":
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    for result in run(max_workers_=max_workers):
+        print(result)
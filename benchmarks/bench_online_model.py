@@ -0,0 +1,122 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from bar_buffer import BarBuffer
+from fake_clients import make_raw_bars, make_bar_frame, FakeStockHistoricalDataClient
+from machine_learning import clean_training_data, feature_columns
+from online_learning import OnlineKNN, OnlineSGD, OnlineLearner
+from predictor import KNNPredictor, measure_latency
+
+# Online model updates versus a full retrain: the KNeighborsClassifier fit plus
+# KNNPredictor build on the whole history, against one OnlineKNN update (ring
+# buffer write and KD-tree rebuild, and its cost per bar when rebuilds are
+# batched) and one OnlineSGD partial_fit step. Checks that OnlineKNN predicts
+# like a KNN refitted on the same rows, that the labels
+# observe_buffer queues match classify_price_gap on the live buffer, that
+# prediction latency holds up while the worker rebuilds in the background, and
+# that memory stops growing once the buffer is full.
+# Run from the repo root: python -m benchmarks.bench_online_model
+
+
+def _training_set(bars_: int, seed_: int):
+    frame = clean_training_data(classify_price_gap(add_technical_indicators(make_bar_frame(bars_, seed_=seed_))))
+    return frame[feature_columns].to_numpy(), frame['Higher/Lower'].to_numpy()
+
+
+def run(training_bars_: int = 50_000, new_bars_: int = 390, max_rows_: int = 60_000) -> dict:
+    X, y = _training_set(training_bars_, 0)
+    X_new, y_new = _training_set(new_bars_ + 200, 1)
+    X_new, y_new = X_new[-new_bars_:], y_new[-new_bars_:]
+    results = {'training_rows': len(X)}
+
+    start_time = time.perf_counter()
+    predictor = KNNPredictor(KNeighborsClassifier(n_neighbors=5).fit(np.vstack([X, X_new]), np.concatenate([y, y_new])))
+    results['full_retrain_ms'] = (time.perf_counter() - start_time) * 1000
+
+    # One day of bars absorbed in one update must predict like the full retrain
+    online = OnlineKNN.from_predictor(KNNPredictor(KNeighborsClassifier(n_neighbors=5).fit(X, y)), max_rows_=len(X) + new_bars_, rebuild_rows_=1)
+    start_time = time.perf_counter()
+    updated = online.update(X_new, y_new)
+    results['knn_update_ms'] = (time.perf_counter() - start_time) * 1000
+    probes = X[::97]
+    results['knn_matches_retrain'] = all(updated.predict(row) == predictor.predict(row) for row in probes)
+
+    # One bar at a time with the default batching: most updates only write the ring buffer
+    batched = OnlineKNN.from_predictor(KNNPredictor(KNeighborsClassifier(n_neighbors=5).fit(X, y)), max_rows_=len(X) + new_bars_)
+    batched.predictor()
+    start_time = time.perf_counter()
+    for index in range(new_bars_):
+        batched.update(X_new[index:index + 1], y_new[index:index + 1])
+    results['knn_batched_update_ms'] = (time.perf_counter() - start_time) / new_bars_ * 1000
+
+    sgd = OnlineSGD.from_dataset(X, y, loss="log_loss", random_state=0)
+    sgd_timings = []
+    for start in range(0, len(X_new), 30):
+        start_time = time.perf_counter()
+        sgd.update(X_new[start:start + 30], y_new[start:start + 30])
+        sgd_timings.append(time.perf_counter() - start_time)
+    results['sgd_update_ms'] = float(np.median(sgd_timings)) * 1000
+    results['sgd_predict'] = measure_latency(lambda: sgd.predictor().predict(X_new[0]))
+
+    # Bounded memory: pushing 3x capacity through the buffer leaves its size unchanged
+    bounded = OnlineKNN.from_predictor(predictor, max_rows_=max_rows_)
+    learner = OnlineLearner(bounded)
+    for start in range(0, 3 * max_rows_, 10_000):
+        bounded.update(X[start % len(X):start % len(X) + 10_000], y[start % len(X):start % len(X) + 10_000])
+    results['bounded_rows'] = bounded.rows
+    results['bounded_megabytes'] = bounded.nbytes() / 1e6
+    results['bounded_growth_bytes'] = learner.stats()['model_bytes_growth']
+
+    # Prediction latency on the main thread, idle and while the worker rebuilds a 60k-row tree
+    learner = OnlineLearner(OnlineKNN.from_predictor(predictor, max_rows_=max_rows_, rebuild_rows_=1)).start()
+    row = X_new[0]
+    results['predict_idle'] = measure_latency(lambda: learner.predictor.predict(row), 2000)
+    busy = threading.Event()
+
+    def feed():
+        while not busy.is_set():
+            for label_row, label in zip(X_new[:5], y_new[:5]):
+                learner._queue.put((label_row, int(label)))
+            learner.flush()
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    results['predict_during_updates'] = measure_latency(lambda: learner.predictor.predict(row), 2000)
+    busy.set()
+    feeder.join()
+    learner.stop()
+    stats = learner.stats()
+    results['background_updates'] = stats['updates']
+    results['background_update_ms'] = stats['last_update_seconds'] * 1000
+
+    # Live labeling: feed a BarBuffer minute by minute and compare with classify_price_gap
+    session = (pd.Timestamp.now(tz="America/New_York") - pd.Timedelta(days=1)).normalize()
+    raw_bars = make_raw_bars(["TSLA"], 2 * 1440, start_=(session - pd.Timedelta(days=1) + pd.Timedelta(hours=4)).strftime("%Y-%m-%d %H:%M"), seed_=2)
+    data_client = FakeStockHistoricalDataClient(raw_bars)
+    data_client.clock = (session + pd.Timedelta(hours=13)).timestamp()
+    bar_buffer = BarBuffer(data_client, "TSLA", max_bars_=2000)
+    bar_buffer.refresh()
+    recorder = OnlineLearner(OnlineKNN.from_predictor(predictor, max_rows_=max_rows_))
+    recorder.observe_buffer(bar_buffer)
+    for minute in range(1, 121):
+        data_client.clock = (session + pd.Timedelta(hours=13, minutes=minute)).timestamp()
+        bar_buffer.refresh()
+        recorder.observe_buffer(bar_buffer)
+    queued = []
+    while not recorder._queue.empty():
+        queued.append(recorder._queue.get_nowait())
+    expected = clean_training_data(classify_price_gap(bar_buffer.to_data_frame()))
+    results['labeled_rows'] = len(queued)
+    results['labels_match'] = (len(queued) == len(expected)
+                               and np.array_equal([label for _, label in queued], expected['Higher/Lower'].to_numpy())
+                               and np.allclose([features for features, _ in queued], expected[feature_columns].to_numpy()))
+    return results
+
+
+if __name__ == "__main__":
+    for key, value in run().items():
+        print(f"{key}: {value}")
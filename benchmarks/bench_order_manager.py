@@ -0,0 +1,67 @@
+import contextlib
+import io
+import time
+from alpaca.trading.client import TradingClient
+from requests.adapters import HTTPAdapter
+
+from alpaca_paper_trading import OrderManager, place_market_buy_order, get_positions
+from fake_clients import MockBrokerServer
+
+# Order throughput and position-check latency against a local mock broker
+# (MockBrokerServer) that a real TradingClient talks to over HTTP:
+# sequential place_market_buy_order calls versus OrderManager.submit_orders,
+# in bursts of max_workers_ orders, with the default and a resized connection pool.
+# Run from the repo root: python -m benchmarks.bench_order_manager
+
+
+def _timed(function_) -> tuple:
+    start_time = time.perf_counter()
+    result = function_()
+    return result, time.perf_counter() - start_time
+
+
+def run(orders_: int = 200, latency_: float = 0.02, max_workers_: int = 32) -> dict:
+    results = {}
+    symbols = [f"SYM{i}" for i in range(orders_)]
+
+    server = MockBrokerServer(latency_=latency_)
+    url = server.start()
+    try:
+        client = TradingClient("key", "secret", url_override=url)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, seconds = _timed(lambda: [place_market_buy_order(client, symbol, 1) for symbol in symbols])
+        results['sequential'] = {'orders_per_second': orders_ / seconds, 'connections': server.connections}
+
+        for pool in ("default_pool", "sized_pool"):
+            connections = server.connections
+            manager = OrderManager(TradingClient("key", "secret", url_override=url), max_workers=max_workers_)
+            if pool == "default_pool":
+                manager.client._session.mount("http://", HTTPAdapter()) # requests' default of 10 connections
+            # Rebalances arrive in bursts; connections the pool cannot keep are reopened on every burst
+            seconds = 0.0
+            for burst in range(0, orders_, max_workers_):
+                orders = [{'symbol': symbol, 'quantity': 1, 'side': "buy"} for symbol in symbols[burst:burst + max_workers_]]
+                responses, burst_seconds = _timed(lambda: manager.submit_orders(orders))
+                assert all(response['success'] for response in responses)
+                seconds += burst_seconds
+            results[pool] = {'orders_per_second': orders_ / seconds, 'connections': server.connections - connections}
+
+        # A sell decision's position check: broker round-trip versus the local book
+        _, seconds = _timed(lambda: [get_positions(client) for _ in range(20)])
+        results['position_check_broker_ms'] = seconds / 20 * 1000
+        _, seconds = _timed(lambda: [manager.position("SYM0") for _ in range(10_000)])
+        results['position_check_local_ms'] = seconds / 10_000 * 1000
+        results['reconcile_discrepancies'] = manager.reconcile()['discrepancies']
+        manager.close()
+    finally:
+        server.stop()
+    return results
+
+
+if __name__ == "__main__":
+    for key, value in run().items():
+        if isinstance(value, dict):
+            value = {name: round(number, 1) if isinstance(number, float) else number for name, number in value.items()}
+        elif isinstance(value, float):
+            value = round(value, 4)
+        print(f"{key}: {value}")
@@ -0,0 +1,42 @@
+import warnings
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from fake_clients import make_bar_frame
+from machine_learning import feature_columns, predict_latest_candlestick
+from predictor import KNNPredictor, measure_latency
+
+# Single-row predict latency of predict_latest_candlestick versus KNNPredictor.
+# Run from the repo root: python -m benchmarks.bench_predictor
+
+
+def run(training_rows_: int = 50_000, neighbors_: int = 5, iterations_: int = 2000) -> dict:
+    data_frame = classify_price_gap(add_technical_indicators(make_bar_frame(training_rows_ + 1000)))
+    training = data_frame.iloc[:training_rows_].dropna()
+    training = training[training['Higher/Lower'] != 0]
+    live = data_frame.iloc[training_rows_:].dropna(subset=feature_columns)
+
+    # Fit on a DataFrame, as train_and_save_knn_model does
+    model = KNeighborsClassifier(n_neighbors=neighbors_).fit(training[feature_columns], training['Higher/Lower'])
+    predictor = KNNPredictor(model)
+
+    live_rows = live[feature_columns].to_numpy()
+    mismatches = sum(predictor.predict(row) != predict_latest_candlestick(model, live.iloc[i:i + 1]) for i, row in enumerate(live_rows))
+
+    latest_frame = live.iloc[-1:]
+    predictor.row[:] = live_rows[-1]
+    return {
+        'training_rows': len(training),
+        'predict_latest_candlestick': measure_latency(lambda: predict_latest_candlestick(model, latest_frame), iterations_),
+        'knn_predictor': measure_latency(predictor.predict, iterations_),
+        'mismatches': int(mismatches),
+        'compared_rows': len(live_rows)
+    }
+
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    result = run()
+    for name in ('predict_latest_candlestick', 'knn_predictor'):
+        print(f"{name:>28}: p50 {result[name]['p50_us']:8.1f} us  p99 {result[name]['p99_us']:8.1f} us")
+    print(f"mismatches: {result['mismatches']} / {result['compared_rows']} rows")
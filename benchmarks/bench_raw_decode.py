@@ -0,0 +1,50 @@
+import sys
+import time
+import pandas as pd
+import pytz
+
+from alpaca_data import data_frame_from_stock_bars, market_status_categorical
+from fake_clients import make_raw_bars
+
+# data_frame_from_stock_bars (typed column decode with the fixed-format
+# timestamp parser) versus the row-dict route it replaced: pd.DataFrame(bars),
+# a column rename and pd.to_datetime on the ISO strings.
+# Run from the repo root: python -m benchmarks.bench_raw_decode [bars per page]
+
+
+def row_dict_frame(data_: dict) -> pd.DataFrame:
+    # The previous data_frame_from_stock_bars
+    ticker, bars = next(iter(data_.items()))
+    df = pd.DataFrame(bars)
+    df.rename(columns={'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume', 't': 'timestamp'}, inplace=True)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df.set_index('timestamp', inplace=True)
+    df.index = df.index.tz_convert(pytz.timezone("America/New_York"))
+    df['market_status'] = market_status_categorical(df.index)
+    return df[['close', 'high', 'low', 'open', 'volume', 'market_status']]
+
+
+def _seconds(function_, iterations_: int) -> float:
+    function_()
+    start_time = time.perf_counter()
+    for _ in range(iterations_):
+        function_()
+    return (time.perf_counter() - start_time) / iterations_
+
+
+def run(pages_: tuple = (1000, 10_000, 100_000)) -> dict:
+    results = {}
+    for bars in pages_:
+        raw_bars = make_raw_bars(["TSLA"], bars)
+        pd.testing.assert_frame_equal(data_frame_from_stock_bars(raw_bars), row_dict_frame(raw_bars))
+        iterations = max(3, 100_000 // bars)
+        row_dict = _seconds(lambda: row_dict_frame(raw_bars), iterations)
+        decoded = _seconds(lambda: data_frame_from_stock_bars(raw_bars), iterations)
+        results[bars] = {'row_dict_ms': row_dict * 1000, 'decoded_ms': decoded * 1000, 'speedup': row_dict / decoded}
+    return results
+
+
+if __name__ == "__main__":
+    pages = tuple(int(argument) for argument in sys.argv[1:]) or (1000, 10_000, 100_000)
+    for bars, result in run(pages).items():
+        print(f"{bars:>7} bars: row dicts {result['row_dict_ms']:8.2f} ms  decoded {result['decoded_ms']:8.2f} ms  speedup {result['speedup']:.1f}x")
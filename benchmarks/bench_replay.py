@@ -0,0 +1,52 @@
+import sys
+from datetime import date
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from fake_clients import make_bar_frame
+from machine_learning import clean_training_data, feature_columns
+from predictor import KNNPredictor
+from replay import replay_day, synthetic_bars
+
+# End-to-end throughput of main() replayed over one synthetic session with the
+# virtual clock: cycles per second, speedup over real time and per-stage
+# latency, with no API latency and with 5 ms per fake API call. The replay is
+# run twice and the submitted orders compared, since a replay must be
+# deterministic to be useful as a benchmark.
+# Run from the repo root: python -m benchmarks.bench_replay [cycles]
+
+
+def run(cycles_: int = 390) -> dict:
+    model_frame = clean_training_data(classify_price_gap(add_technical_indicators(make_bar_frame(20_000))))
+    X, y = model_frame[feature_columns].to_numpy(), model_frame['Higher/Lower'].to_numpy()
+    predictor = KNNPredictor(KNeighborsClassifier(n_neighbors=5).fit(X, y), training_data_=X, y_=y)
+    day = date(2025, 1, 6)
+    raw_bars = synthetic_bars(day, seed_=3)
+
+    first = replay_day(raw_bars, day, predictor, cycles_=cycles_)
+    second = replay_day(raw_bars, day, predictor, cycles_=cycles_)
+    with_latency = replay_day(raw_bars, day, predictor, cycles_=cycles_, data_latency_=0.005, trading_latency_=0.005)
+    results = {
+        'cycles': first['cycles'],
+        'simulated_minutes': first['simulated_minutes'],
+        'wall_seconds': first['wall_seconds'],
+        'cycles_per_second': first['cycles_per_second'],
+        'speedup': first['speedup'],
+        'orders': first['orders'],
+        'buys': first['buys'],
+        'sells': first['sells'],
+        'api_calls': first['api_calls'],
+        'deterministic': first['orders_digest'] == second['orders_digest'] and first['cash'] == second['cash'],
+        'latency_5ms_cycles_per_second': with_latency['cycles_per_second'],
+        'latency_5ms_orders_match': with_latency['orders_digest'] == first['orders_digest']
+    }
+    for stage, timing in first['stages_ms'].items():
+        results[f'{stage}_p50_ms'] = timing['p50']
+        results[f'{stage}_p99_ms'] = timing['p99']
+    return results
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:2]]
+    for key, value in run(*arguments).items():
+        print(f"{key}: {value}")
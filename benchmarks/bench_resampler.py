@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytz
+from alpaca.data.timeframe import TimeFrameUnit
+
+from alpaca_data import retrieve_multi_stock_bars, data_frame_from_stock_bars
+from fake_clients import make_bar_frame
+from resampler import resample_bars, compare_bars, MultiTimeframeIndicators, add_multi_timeframe_indicators
+
+# Local multi-timeframe bars: resample_bars checked against pandas' resample
+# over every session (including both DST changes, with random missing
+# minutes), the per-minute cost of keeping 5Min/15Min/1Hour indicators up to
+# date incrementally, and the batch training equivalent.
+# Run from the repo root: python -m benchmarks.bench_resampler
+# With API keys in environment.env, compare against Alpaca's own aggregated bars:
+#   python -m benchmarks.bench_resampler api TSLA 2025-03-04 15Min
+
+
+def _pandas_resample(data_: pd.DataFrame, rule_: str) -> pd.DataFrame:
+    resampled = data_.resample(rule_, label="left", closed="left").agg({'close': 'last', 'high': 'max', 'low': 'min', 'open': 'first', 'volume': 'sum'})
+    return resampled[data_['close'].resample(rule_).count() > 0]
+
+
+def run(days_: int = 30) -> dict:
+    data = pd.concat([
+        make_bar_frame(days_ * 1440, start_="2025-02-20 00:00", regular_hours_only_=False, seed_=0),
+        make_bar_frame(10 * 1440, start_="2025-10-28 00:00", regular_hours_only_=False, seed_=1)
+    ])
+    data = data[np.random.default_rng(0).random(len(data)) > 0.2]
+    results = {'minute_bars': len(data)}
+    for timeframe, rule in (("5Min", "5min"), ("15Min", "15min"), ("1Hour", "1h"), ("1Day", "1D")):
+        start_time = time.perf_counter()
+        resampled = resample_bars(data, timeframe)
+        results[f'{timeframe}_ms'] = (time.perf_counter() - start_time) * 1000
+        comparison = compare_bars(resampled, _pandas_resample(data, rule))
+        assert not (comparison['only_resampled'] or comparison['only_reference'] or comparison['different']), timeframe
+
+    regular = make_bar_frame(days_ * 390, seed_=2)
+    timeframes = ["5Min", "15Min", "1Hour"]
+    indicators = MultiTimeframeIndicators(timeframes, sessions_=["regular"], anchor_="session")
+    rows = list(zip(regular.index, regular['open'], regular['high'], regular['low'], regular['close'], regular['volume'], regular['market_status']))
+    features = np.empty((len(rows), 15))
+    names = list(indicators.values())
+    start_time = time.perf_counter()
+    for position, row in enumerate(rows):
+        indicators.update(*row)
+        features[position] = [indicators.feature(name) for name in names]
+    results['incremental_us_per_minute'] = (time.perf_counter() - start_time) / len(rows) * 1e6
+
+    start_time = time.perf_counter()
+    batch = add_multi_timeframe_indicators(regular.copy(), timeframes, sessions_=["regular"], anchor_="session")
+    results['batch_ms'] = (time.perf_counter() - start_time) * 1000
+    expected = batch[names].to_numpy()
+    assert np.array_equal(np.isnan(expected), np.isnan(features))
+    valid = ~np.isnan(expected)
+    results['incremental_vs_batch_max_difference'] = float(np.abs(expected[valid] - features[valid]).max())
+    return results
+
+
+def against_api(symbol_: str, day_: str, timeframe_: str) -> dict:
+    from dotenv import load_dotenv
+    from alpaca_data import setup_historical_client
+    load_dotenv("environment.env")
+    client = setup_historical_client(key_=os.getenv("ALPACA_API_KEY"), secret_=os.getenv("ALPACA_SECRET"), base_url_=None, raw_data_=True)
+    start = pytz.timezone("America/New_York").localize(datetime.fromisoformat(day_))
+    amount, unit = int(timeframe_.rstrip("MinHourDay")), {'Min': TimeFrameUnit.Minute, 'Hour': TimeFrameUnit.Hour, 'Day': TimeFrameUnit.Day}[timeframe_.lstrip("0123456789")]
+    minute_bars = data_frame_from_stock_bars(retrieve_multi_stock_bars(client, [symbol_], start, start + timedelta(days=1), 1, TimeFrameUnit.Minute))
+    api_bars = data_frame_from_stock_bars(retrieve_multi_stock_bars(client, [symbol_], start, start + timedelta(days=1), amount, unit))
+    # The last bucket may extend past the requested window
+    return compare_bars(resample_bars(minute_bars, timeframe_), api_bars)
+
+
+if __name__ == "__main__":
+    result = against_api(*sys.argv[2:5]) if sys.argv[1:2] == ["api"] else run()
+    for key, value in result.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,75 @@
+import sys
+import time
+import numpy as np
+
+from alpaca_data import add_technical_indicators
+from backtest import rsi_ma_crossover_signals, run_backtest
+from fake_clients import make_bar_frame
+from rule_sweep import bars_per_year, build_sweep_arrays, parameter_grid, rule_signals, sweep_rule_strategy
+
+# Parameter sweep of the RSI/moving-average crossover over several synthetic
+# symbols: thousands of parameter sets in one call, with the time per set.
+# Checks that the default parameters give the same signals as
+# backtest.rsi_ma_crossover_signals on add_technical_indicators frames, and that
+# the PnL and Sharpe of sampled parameter sets equal those of
+# backtest.run_backtest run symbol by symbol on the same signals.
+# Run from the repo root: python -m benchmarks.bench_rule_sweep [symbols] [bars]
+
+
+def run(symbols_: int = 8, bars_: int = 20_000) -> dict:
+    frames = {f"SYM{index}": make_bar_frame(bars_ - 500 * index, seed_=index) for index in range(symbols_)}
+    grid = parameter_grid(rsi_lower_=(20, 22.5, 25, 27.5, 30, 32.5, 35, 37.5, 40), rsi_upper_=(60, 62.5, 65, 67.5, 70, 72.5, 75, 77.5, 80),
+                          fast_lengths_=(5, 10, 20, 30, 40), slow_lengths_=(60, 80, 120, 160), rsi_lengths_=(7, 14))
+    results = {'symbols': symbols_, 'bars_per_symbol': bars_}
+
+    sweep = sweep_rule_strategy(frames, grid, slippage_bps_=1.0, commission_per_share_=0.005)
+    results['combinations'] = sweep['combinations']
+    results['sweep_seconds'] = sweep['sweep_seconds']
+    results['ms_per_combination'] = sweep['sweep_seconds'] / sweep['combinations'] * 1000
+    results['best'] = {key: sweep['best'][key] for key in ('rsi_length', 'rsi_lower', 'rsi_upper', 'fast', 'slow', 'sharpe', 'pnl')}
+
+    # Default parameters against the existing vectorized RSI_MA_Crossover
+    arrays = build_sweep_arrays(frames, [40, 80], [14])
+    default = rule_signals(arrays, {'rsi_length': 14, 'rsi_lower': 30, 'rsi_upper': 70, 'fast': 40, 'slow': 80})
+    mismatches = 0
+    for row, (symbol, frame) in enumerate(frames.items()):
+        expected = rsi_ma_crossover_signals(add_technical_indicators(frame.copy()))
+        mismatches += int(np.count_nonzero(default[row, :len(frame)] != expected))
+    results['default_signal_mismatches'] = mismatches
+
+    # Sampled parameter sets against run_backtest, one symbol at a time
+    table = sweep['table']
+    largest_difference = 0.0
+    largest_sharpe_difference = 0.0
+    for index in np.random.default_rng(0).choice(len(table), 5, replace=False):
+        params = {key: table.at[index, key] for key in ('rsi_length', 'rsi_lower', 'rsi_upper', 'fast', 'slow')}
+        arrays = build_sweep_arrays(frames, [params['fast'], params['slow']], [params['rsi_length']])
+        signals = rule_signals(arrays, params)
+        backtests = [run_backtest(frame, signals[row, :len(frame)], slippage_bps_=1.0, commission_per_share_=0.005)
+                     for row, frame in enumerate(frames.values())]
+        sharpes = []
+        for backtest in backtests:
+            bar_pnl = np.diff(backtest['equity'].to_numpy(), prepend=100_000.0)
+            sharpes.append(bar_pnl.mean() / bar_pnl.std() * np.sqrt(bars_per_year) if bar_pnl.std() > 0 else 0.0)
+        largest_difference = max(largest_difference, abs(sum(backtest['pnl'] for backtest in backtests) - table.at[index, 'pnl']))
+        largest_sharpe_difference = max(largest_sharpe_difference, abs(np.mean(sharpes) - table.at[index, 'sharpe']))
+    results['pnl_max_abs_difference'] = largest_difference
+    results['sharpe_max_abs_difference'] = largest_sharpe_difference
+
+    # The same sweep as a loop of run_backtest calls, timed on a slice of the grid
+    sample = grid[:20]
+    start_time = time.perf_counter()
+    for params in sample:
+        arrays = build_sweep_arrays(frames, [params['fast'], params['slow']], [params['rsi_length']])
+        signals = rule_signals(arrays, params)
+        for row, frame in enumerate(frames.values()):
+            run_backtest(frame, signals[row, :len(frame)])
+    results['loop_ms_per_combination'] = (time.perf_counter() - start_time) / len(sample) * 1000
+    results['speedup'] = results['loop_ms_per_combination'] / results['ms_per_combination']
+    return results
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:3]]
+    for key, value in run(*arguments).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from alpaca_data import add_technical_indicators, classify_price_gap
+from benchmarks.suite import compare, _environment
+from fake_clients import make_bar_frame
+from machine_learning import clean_training_data, feature_columns, save_model_bundle
+
+# Cold start of the live entry point, each sample in a fresh interpreter:
+# `import main`, load_predictor on a saved bundle, and the first prediction
+# (first BarBuffer refresh against the fake data client plus predict), together
+# with the -X importtime breakdown of `import main`. Also fails when a module
+# the live path is not supposed to load (training, plotting, pandas_ta, the
+# --async/--stream runners) shows up in sys.modules after startup.
+# Run from the repo root:
+#   python -m benchmarks.bench_startup --output startup.json
+#   python -m benchmarks.bench_startup --baseline startup.json --threshold 0.2
+
+startup_version = 1
+
+# Modules that must stay out of the live path
+deferred_modules = ['matplotlib', 'sklearn', 'joblib', 'machine_learning', 'pandas_ta', 'scipy.signal', 'scipy.stats', 'async_runner', 'bar_stream',
+                    'online_learning']
+
+_child = """
+import json, sys, time
+start_time = time.perf_counter()
+import main
+imported = time.perf_counter()
+from predictor import load_predictor
+predictor = load_predictor(bundle_dir=sys.argv[1], model_filename="missing.pkl")
+loaded = time.perf_counter()
+loaded_modules = set(sys.modules)
+import pandas as pd
+from bar_buffer import BarBuffer
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+session = pd.Timestamp("2025-01-03 09:30", tz="America/New_York")
+client = FakeStockHistoricalDataClient(make_raw_bars(["TSLA"], 1440, start_="2025-01-03 00:00"))
+client.clock = (session + pd.Timedelta(hours=4)).timestamp()
+bar_buffer = BarBuffer(client, "TSLA", clock_=lambda: client.clock)
+fixture_seconds = time.perf_counter() - loaded
+bar_buffer.refresh()
+prediction = predictor.predict(bar_buffer.latest_features(predictor.row, predictor.features))
+predicted = time.perf_counter()
+json.dump({
+    'import_main': imported - start_time,
+    'load_predictor': loaded - imported,
+    'first_prediction': predicted - start_time - fixture_seconds,
+    'deferred_loaded': sorted(name for name in json.loads(sys.argv[2]) if name in loaded_modules),
+    'prediction': int(prediction)
+}, sys.stdout)
+"""
+
+
+def _save_bundle(bundle_dir_: str) -> None:
+    frame = clean_training_data(classify_price_gap(add_technical_indicators(make_bar_frame(20_000))))
+    X = frame[feature_columns].to_numpy()
+    y = frame['Higher/Lower'].to_numpy()
+    scaler = StandardScaler().fit(X)
+    model = KNeighborsClassifier(n_neighbors=5).fit(scaler.transform(X), y)
+    save_model_bundle(model, scaler, X, y, bundle_dir_)
+
+
+def _run_child(bundle_dir_: str) -> dict:
+    start_time = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", _child, bundle_dir_, json.dumps(deferred_modules)],
+                               capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.splitlines()[-1])
+    result['process'] = time.perf_counter() - start_time
+    return result
+
+
+def import_breakdown(top_: int = 15) -> list:
+    """
+    Run `python -X importtime -c "import main"` and return the slowest top-level imports.
+
+    Returns:
+        Up to top_ (cumulative seconds, module) pairs for modules imported directly by main or
+        its repo modules, slowest first
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], capture_output=True, text=True, check=True)
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue # header line
+        # Nesting is shown by two spaces per level; keep main's direct imports and one level below
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        if depth <= 2:
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:top_]
+
+
+def run(repeat_: int = 5) -> dict:
+    """
+    Time the cold start repeat_ times in fresh interpreters.
+
+    Returns:
+        Dictionary in the same shape as benchmarks.suite.run (so suite.compare works on it),
+        plus the import breakdown and the deferred modules found loaded
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        _save_bundle(directory)
+        samples = [_run_child(directory) for _ in range(repeat_)]
+    results = {}
+    for case in ('import_main', 'load_predictor', 'first_prediction', 'process'):
+        values = [sample[case] for sample in samples]
+        results[case] = {
+            'median_seconds': statistics.median(values),
+            'min_seconds': min(values),
+            'stdev_seconds': statistics.stdev(values) if len(values) > 1 else 0.0,
+            'repeat': repeat_,
+            'number': 1
+        }
+    return {
+        'startup_version': startup_version,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'environment': _environment(),
+        'parameters': {'repeat': repeat_},
+        'results': results,
+        'deferred_loaded': sorted(set(name for sample in samples for name in sample['deferred_loaded'])),
+        'import_breakdown': import_breakdown()
+    }
+
+
+def main(arguments_: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold start benchmark for the live entry point")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown flagged as a regression")
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args(arguments_)
+
+    result = run(repeat_=arguments.repeat)
+    for name, timing in result['results'].items():
+        print(f"{name:>18}: median {timing['median_seconds'] * 1000:9.1f} ms  min {timing['min_seconds'] * 1000:9.1f} ms")
+    print("\nSlowest imports under `import main` (cumulative):")
+    for seconds, module in result['import_breakdown']:
+        print(f"{seconds * 1000:9.1f} ms  {module}")
+
+    failed = False
+    if result['deferred_loaded']:
+        print(f"\nLoaded at startup but meant to be deferred: {', '.join(result['deferred_loaded'])}")
+        failed = True
+    if arguments.baseline:
+        with open(arguments.baseline) as handle:
+            baseline = json.load(handle)
+        result['comparison'] = compare(result, baseline, arguments.threshold)
+        print(f"\nCompared with {arguments.baseline} (threshold {arguments.threshold:.0%}):")
+        for row in result['comparison']:
+            print(f"{row['case']:>18}: {row['ratio']:6.2f}x  {'REGRESSION' if row['regression'] else ''}")
+        failed = failed or any(row['regression'] for row in result['comparison'])
+    if arguments.output:
+        with open(arguments.output, "w") as handle:
+            json.dump(result, handle, indent=2)
+        print(f"Results saved to {arguments.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
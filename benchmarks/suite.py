@@ -0,0 +1,228 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.neighbors import KNeighborsClassifier
+
+from alpaca_data import (
+    data_frame_from_stock_bars,
+    classify_market_status,
+    filter_regular_hours,
+    add_technical_indicators,
+    classify_price_gap
+)
+from alpaca_paper_trading import (
+    place_market_buy_order,
+    place_limit_buy_order,
+    place_market_sell_order,
+    place_limit_sell_order
+)
+from fake_clients import make_raw_bars, FakeTradingClient
+from machine_learning import clean_training_data, feature_columns, train_and_save_knn_model, predict_latest_candlestick
+
+# Offline benchmark suite for the functions the live loop and training depend
+# on, run on synthetic minute bars shaped like raw Alpaca responses and against
+# the in-memory FakeTradingClient. Every case is timed repeat_ times (after one
+# warm-up call) and the results are saved as JSON together with the library
+# versions, so a run after a pandas, pandas_ta or scikit-learn upgrade can be
+# compared with an earlier one and slower cases flagged.
+# Run from the repo root:
+#   python -m benchmarks.suite --output bench_results.json
+#   python -m benchmarks.suite --output new.json --baseline bench_results.json --threshold 0.2
+# Exits with status 1 when a case is slower than the baseline by more than threshold.
+
+suite_version = 1
+
+
+def _environment() -> dict:
+    try:
+        from importlib.metadata import version
+        pandas_ta_version = version("pandas_ta")
+    except Exception:
+        pandas_ta_version = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pandas_ta': pandas_ta_version,
+        'scikit-learn': sklearn.__version__
+    }
+
+
+def _time_case(function_, repeat_: int, number_: int) -> dict:
+    function_() # Warm-up (imports, caches, first-call allocation)
+    samples = []
+    for _ in range(repeat_):
+        start_time = time.perf_counter()
+        for _ in range(number_):
+            function_()
+        samples.append((time.perf_counter() - start_time) / number_)
+    return {
+        'median_seconds': statistics.median(samples),
+        'min_seconds': min(samples),
+        'stdev_seconds': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': repeat_,
+        'number': number_
+    }
+
+
+def _quiet(function_):
+    # The training and order functions print their results on every call
+    def call():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function_()
+    return call
+
+
+def build_cases(bars_: int, training_bars_: int, directory_: str) -> dict:
+    """
+    Create the fixtures once and return the benchmark cases.
+
+    Args:
+        bars_: Raw bars per call for the data functions (the live loop requests 1000)
+        training_bars_: Bars in the training frame
+        directory_: Scratch directory for the saved model
+
+    Returns:
+        Dictionary of {case name: (zero-argument function, calls per sample)}
+    """
+    raw_bars = make_raw_bars(["TSLA"], bars_, seed_=0)
+    data_frame = data_frame_from_stock_bars(raw_bars)
+    regular_hours = filter_regular_hours(data_frame)
+    technical = add_technical_indicators(regular_hours.copy())
+
+    training_raw = make_raw_bars(["TSLA"], training_bars_, seed_=1)
+    training_frame = classify_price_gap(add_technical_indicators(filter_regular_hours(data_frame_from_stock_bars(training_raw))))
+    clean = clean_training_data(training_frame)
+    model = KNeighborsClassifier(n_neighbors=5).fit(clean[feature_columns], clean['Higher/Lower'])
+    latest_frame = technical.iloc[-1:]
+    model_path = os.path.join(directory_, "knn_model.pkl")
+
+    trading_client = FakeTradingClient()
+    timestamps = data_frame.index
+    return {
+        'data_frame_from_stock_bars': (lambda: data_frame_from_stock_bars(raw_bars), 5),
+        'classify_market_status': (lambda: [classify_market_status(timestamp) for timestamp in timestamps], 1),
+        'filter_regular_hours': (lambda: filter_regular_hours(data_frame), 20),
+        'add_technical_indicators': (lambda: add_technical_indicators(regular_hours.copy()), 5),
+        'classify_price_gap': (lambda: classify_price_gap(technical), 20),
+        'train_and_save_knn_model': (_quiet(lambda: train_and_save_knn_model(training_frame, neighbors_=5, model_filename=model_path)), 1),
+        'predict_latest_candlestick': (lambda: predict_latest_candlestick(model, latest_frame), 50),
+        'place_market_buy_order': (_quiet(lambda: place_market_buy_order(trading_client, "TSLA", 1)), 100),
+        'place_limit_buy_order': (_quiet(lambda: place_limit_buy_order(trading_client, "TSLA", 1, 99.5)), 100),
+        'place_market_sell_order': (_quiet(lambda: place_market_sell_order(trading_client, "TSLA", 1)), 100),
+        'place_limit_sell_order': (_quiet(lambda: place_limit_sell_order(trading_client, "TSLA", 1, 100.5)), 100)
+    }
+
+
+def run(bars_: int = 10_000, training_bars_: int = 50_000, repeat_: int = 7, cases_: list = None) -> dict:
+    """
+    Run the suite.
+
+    Args:
+        bars_: Raw bars per call for the data functions
+        training_bars_: Raw bars behind the training frame
+        repeat_: Timed samples per case
+        cases_: Case names to run (None for all)
+
+    Returns:
+        Dictionary with the suite version, environment, parameters and per-case timings
+    """
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cases = build_cases(bars_, training_bars_, directory)
+        for name, (function, number) in cases.items():
+            if cases_ and name not in cases_:
+                continue
+            results[name] = _time_case(function, repeat_, number)
+    return {
+        'suite_version': suite_version,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'environment': _environment(),
+        'parameters': {'bars': bars_, 'training_bars': training_bars_, 'repeat': repeat_},
+        'results': results
+    }
+
+
+def compare(current_: dict, baseline_: dict, threshold_: float = 0.2) -> list:
+    """
+    Compare two suite runs case by case on the median time.
+
+    Args:
+        current_: Result of run()
+        baseline_: Earlier result of run()
+        threshold_: Relative slowdown above which a case is flagged (0.2 = 20% slower)
+
+    Returns:
+        One dictionary per case present in both runs with the ratio and a regression flag
+    """
+    if current_['parameters'] != baseline_['parameters']:
+        print(f"Warning: parameters differ from the baseline ({baseline_['parameters']} vs {current_['parameters']})")
+    comparison = []
+    for name, result in current_['results'].items():
+        if name not in baseline_['results']:
+            continue
+        ratio = result['median_seconds'] / baseline_['results'][name]['median_seconds']
+        comparison.append({
+            'case': name,
+            'baseline_seconds': baseline_['results'][name]['median_seconds'],
+            'current_seconds': result['median_seconds'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold_
+        })
+    return comparison
+
+
+def main(arguments_: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown flagged as a regression")
+    parser.add_argument("--bars", type=int, default=10_000)
+    parser.add_argument("--training-bars", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--case", action="append", help="Only run this case (repeatable)")
+    arguments = parser.parse_args(arguments_)
+
+    result = run(bars_=arguments.bars, training_bars_=arguments.training_bars, repeat_=arguments.repeat, cases_=arguments.case)
+    for name, timing in result['results'].items():
+        print(f"{name:>28}: median {timing['median_seconds'] * 1000:10.3f} ms  min {timing['min_seconds'] * 1000:10.3f} ms")
+
+    regressions = []
+    if arguments.baseline:
+        with open(arguments.baseline) as handle:
+            baseline = json.load(handle)
+        result['comparison'] = compare(result, baseline, arguments.threshold)
+        print(f"\nCompared with {arguments.baseline} (threshold {arguments.threshold:.0%}):")
+        for row in result['comparison']:
+            flag = "REGRESSION" if row['regression'] else ""
+            print(f"{row['case']:>28}: {row['ratio']:6.2f}x  {flag}")
+        regressions = [row['case'] for row in result['comparison'] if row['regression']]
+
+    if arguments.output:
+        with open(arguments.output, "w") as handle:
+            json.dump(result, handle, indent=2)
+        print(f"Results saved to {arguments.output}")
+    if regressions:
+        print(f"Slower than the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
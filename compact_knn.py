@@ -0,0 +1,354 @@
+import json
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+
+from model_bundle import feature_columns, bundle_version, ScalerArrays
+
+# Memory-bounded KNN for the live predictor. A KNeighborsClassifier keeps every
+# training row, so memory and predict latency grow with the history trained on.
+# Here the training set can first be condensed to a fixed number of prototypes:
+#   clustering: k-means within each class, prototypes in proportion to the class
+#               sizes, each voting with the number of rows it stands for
+#   selection:  batched condensed nearest neighbor (Hart), keeping the rows the
+#               prototypes chosen so far misclassify, up to a budget, after
+#               Wilson editing has ruled out rows that look mislabeled
+# and the rows kept are searched with an inverted-file index: k-means cells over
+# the rows, stored cell by cell in float32, float16 or int8 (per-column linear
+# quantization), with each query scanning only the probes_ cells nearest to it.
+# Distances are computed on the stored values directly; int8 is the fastest to
+# scan, since numpy widens float16 without SIMD. The result predicts like
+# KNNPredictor (same row/features/scaler attributes and predict), and predict
+# also takes a 2D array as KNeighborsClassifier.predict does, so
+# predict_latest_candlestick and backtest.knn_signals accept it.
+#   <bundle_dir>/compact_knn.npz  written by save_model_bundle(compact_predictor_=...),
+#                                 preferred by load_predictor when present
+
+
+def _kmeans(X_: np.ndarray, clusters_: int, iterations_: int, rng_: np.random.Generator) -> tuple:
+    # Lloyd's iterations with the assignment step done by a KD-tree over the centroids
+    centroids = X_[rng_.choice(len(X_), clusters_, replace=False)].astype(np.float64)
+    for _ in range(iterations_):
+        _, assignment = cKDTree(centroids).query(X_, workers=-1)
+        counts = np.bincount(assignment, minlength=clusters_)
+        filled = counts > 0 # an empty cluster keeps its previous centroid
+        for column in range(X_.shape[1]):
+            centroids[filled, column] = np.bincount(assignment, weights=X_[:, column], minlength=clusters_)[filled] / counts[filled]
+    _, assignment = cKDTree(centroids).query(X_, workers=-1)
+    return centroids, assignment
+
+
+def condense_by_clustering(X_: np.ndarray, labels_: np.ndarray, prototypes_: int = 20_000, sample_rows_: int = 500_000,
+                           iterations_: int = 10, random_state_: int = 0) -> tuple:
+    """
+    Replace each class's rows by k-means centroids.
+
+    Args:
+        X_: Training rows in model space
+        labels_: Index into the classes of each row's label
+        prototypes_: Total centroids, split between the classes in proportion to their sizes
+        sample_rows_: Rows (over all classes) the centroids are fitted on
+        iterations_: Lloyd iterations
+        random_state_: Seed for the sample and the initial centroids
+
+    Returns:
+        (prototypes, prototype labels, vote weights) where each weight is the number of
+        training rows the prototype stands for
+    """
+    rng = np.random.default_rng(random_state_)
+    sample_fraction = min(1.0, sample_rows_ / len(X_))
+    prototypes, prototype_labels, weights = [], [], []
+    for label in np.unique(labels_):
+        rows = np.flatnonzero(labels_ == label)
+        sample = rows if sample_fraction == 1.0 else np.sort(rng.choice(rows, max(1, int(len(rows) * sample_fraction)), replace=False))
+        clusters = min(len(sample), max(1, round(prototypes_ * len(rows) / len(X_))))
+        centroids, assignment = _kmeans(X_[sample], clusters, iterations_, rng)
+        counts = np.bincount(assignment, minlength=clusters)
+        kept = counts > 0
+        prototypes.append(centroids[kept])
+        prototype_labels.append(np.full(kept.sum(), label))
+        weights.append(counts[kept] * (len(rows) / len(sample)))
+    return np.concatenate(prototypes), np.concatenate(prototype_labels), np.concatenate(weights)
+
+
+def condense_by_selection(X_: np.ndarray, labels_: np.ndarray, prototypes_: int = 20_000, batch_rows_: int = 50_000,
+                          passes_: int = 2, editing_neighbors_: int = 5, reference_rows_: int = 200_000,
+                          random_state_: int = 0) -> tuple:
+    """
+    Keep the training rows the 1-nearest-neighbor rule needs (Hart's condensed nearest neighbor
+    after Wilson editing).
+
+    Rows are visited in random order in batches no larger than the prototype set: every row of
+    a batch that the prototypes kept so far misclassify is added, until prototypes_ rows are kept or a pass adds none. Rows whose
+    label disagrees with most of their editing_neighbors_ nearest rows in a reference sample are
+    never added, since plain condensation keeps exactly the mislabeled rows.
+
+    Args:
+        X_: Training rows in model space
+        labels_: Index into the classes of each row's label
+        prototypes_: Most rows kept
+        batch_rows_: Most rows classified per KD-tree rebuild
+        passes_: Most passes over the training set
+        editing_neighbors_: Neighbors the editing vote is taken over
+        reference_rows_: Rows in the editing reference sample
+        random_state_: Seed for the visiting order and the reference sample
+
+    Returns:
+        (prototypes, prototype labels, vote weights) with every weight 1
+    """
+    rng = np.random.default_rng(random_state_)
+    order = rng.permutation(len(X_))
+    reference = order[:reference_rows_]
+    reference_tree = cKDTree(X_[reference])
+    # Start from the first row of each class in visiting order
+    _, first = np.unique(labels_[order], return_index=True)
+    selected = list(order[first])
+    for _ in range(passes_):
+        added = 0
+        start = 0
+        while start < len(order) and len(selected) < prototypes_:
+            # Batches grow with the prototype set, so early prototypes are not chosen against a handful of rows
+            batch = order[start:start + min(batch_rows_, max(256, len(selected)))]
+            start += len(batch)
+            kept = np.array(selected)
+            _, nearest = cKDTree(X_[kept]).query(X_[batch], workers=-1)
+            missed = labels_[kept[nearest]] != labels_[batch]
+            # Wilson editing against the reference sample, leaving out the row itself
+            distances, neighbors = reference_tree.query(X_[batch], k=editing_neighbors_ + 1, workers=-1)
+            neighbors = np.where(distances[:, :1] == 0, neighbors[:, 1:], neighbors[:, :-1])
+            agreeing = (labels_[reference[neighbors]] == labels_[batch][:, None]).sum(axis=1)
+            candidates = batch[missed & (2 * agreeing > editing_neighbors_)]
+            candidates = candidates[~np.isin(candidates, kept)][:prototypes_ - len(selected)]
+            selected.extend(candidates)
+            added += len(candidates)
+        if added == 0 or len(selected) >= prototypes_:
+            break
+    selected = np.sort(np.array(selected))
+    return X_[selected], labels_[selected], np.ones(len(selected))
+
+
+class CompactKNN:
+    """
+    Approximate KNN predictor over compact storage, interchangeable with KNNPredictor.
+
+    Rows are grouped into k-means cells and stored contiguously per cell in dtype_; a query
+    ranks the cells by centroid distance and computes exact distances only in the probes_
+    nearest ones (probes_ >= cells searches every row).
+    """
+
+    def __init__(self, training_data_: np.ndarray, labels_: np.ndarray, classes_: np.ndarray, n_neighbors_: int = 5,
+                 vote_weights_: np.ndarray = None, dtype_: str = "float16", cells_: int = None, probes_: int = 8,
+                 features_: list = None, scaler_: "ScalerArrays" = None, warmup_: int = 10, random_state_: int = 0):
+        """
+        Args:
+            training_data_: Rows to search, in model space (already scaled when scaler_ is given)
+            labels_: Index into classes_ of each row's label
+            classes_: Class values, as in KNeighborsClassifier.classes_
+            n_neighbors_: Neighbors voting on each prediction
+            vote_weights_: Vote of each row (e.g. prototype cluster sizes; default 1)
+            dtype_: Storage type of the rows: "float32", "float16" or "int8" (256 levels between each
+                    column's minimum and maximum)
+            cells_: Inverted-file cells (default about 2 * sqrt(rows))
+            probes_: Cells scanned per query
+            features_: Feature columns in training order
+            scaler_: Scaler applied to every live row (StandardScaler or ScalerArrays)
+            warmup_: Number of predictions run at startup so the first live one is not cold
+            random_state_: Seed for the cell centroids
+        """
+        training_data = np.asarray(training_data_, dtype=np.float64)
+        if dtype_ == "float16" and np.abs(training_data).max() > np.finfo(np.float16).max:
+            raise ValueError("Training data overflows float16; scale the features or use dtype_='float32'")
+        cells = min(len(training_data), cells_ or max(1, int(2 * np.sqrt(len(training_data)))))
+        rng = np.random.default_rng(random_state_)
+        sample = training_data if len(training_data) <= 256 * cells else training_data[rng.choice(len(training_data), 256 * cells, replace=False)]
+        centroids, _ = _kmeans(sample, cells, 10, rng)
+        _, cell = cKDTree(centroids).query(training_data, workers=-1)
+        order = np.argsort(cell, kind="stable")
+
+        # Stored value = (value - low) / step - shift; identity for the float types, 256 levels per column for int8
+        if dtype_ == "int8":
+            low, high = training_data.min(axis=0), training_data.max(axis=0)
+            self.step = np.where(high > low, (high - low) / 255, 1.0)
+            self.low, self.shift = low, 128.0
+            self.vectors = (np.rint((training_data[order] - low) / self.step) - 128).astype(np.int8)
+        elif dtype_ in ("float16", "float32"):
+            self.step, self.low, self.shift = np.ones(training_data.shape[1]), np.zeros(training_data.shape[1]), 0.0
+            self.vectors = training_data[order].astype(dtype_)
+        else:
+            raise ValueError(f"Unsupported storage type: {dtype_}")
+        squared_step = (self.step ** 2).astype(np.float32)
+        stored = self.vectors.astype(np.float32)
+        self.norms = np.einsum("ij,ij,j->i", stored, stored, squared_step)
+        self.labels = np.asarray(labels_)[order].astype(np.int8 if len(classes_) < 128 else np.intp)
+        self.vote_weights = (np.ones(len(order), dtype=np.float32) if vote_weights_ is None
+                             else np.asarray(vote_weights_, dtype=np.float32)[order])
+        self.centroids = centroids.astype(np.float32)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(cell, minlength=cells))))
+        self._setup(classes_, n_neighbors_, probes_, features_, scaler_)
+        self.warmup(warmup_)
+
+    def _setup(self, classes_: np.ndarray, n_neighbors_: int, probes_: int, features_: list, scaler_) -> None:
+        self.classes = np.asarray(classes_)
+        self.n_neighbors = int(n_neighbors_)
+        self.probes = int(probes_)
+        self.features = feature_columns if features_ is None else list(features_)
+        self.scaler = scaler_
+        self.distance_weighted = False
+        self.row = np.empty(len(self.features), dtype=np.float64)
+        mean = 0.0 if scaler_ is None else scaler_.mean_
+        scale = 1.0 if scaler_ is None else scaler_.scale_
+        self._row_scale = (self.step / scale).astype(np.float32)
+        self._row_offset = (self.step * (mean / scale + self.low) + self.step ** 2 * self.shift).astype(np.float32)
+        self._stored_centroids = ((self.centroids - self.low) / self.step - self.shift).astype(np.float32)
+        self._centroid_norms = np.einsum("ij,ij,j->i", self._stored_centroids, self._stored_centroids, (self.step ** 2).astype(np.float32))
+        self._query = np.empty(len(self.features), dtype=np.float32)
+
+    def warmup(self, iterations_: int = 10) -> None:
+        for i in range(min(iterations_, len(self.vectors))):
+            self.row[:] = (self.vectors[i * (len(self.vectors) // max(iterations_, 1))] + self.shift) * self.step + self.low
+            if self.scaler is not None:
+                self.row *= self.scaler.scale_
+                self.row += self.scaler.mean_
+            self.predict()
+
+    def _predict_row(self, row_: np.ndarray):
+        if np.isnan(row_).any():
+            raise ValueError("Feature row contains NaN (indicators still warming up)")
+        # Scaling and the storage transform in one step: query = step^2 * ((scaled row - low) / step - shift),
+        # so that |x - row|^2 ranks like norms - 2 * stored @ query
+        query = self._query
+        np.multiply(row_, self._row_scale, out=query)
+        query -= self._row_offset
+        if self.probes < len(self.centroids):
+            centroid_distances = self._centroid_norms - 2 * (self._stored_centroids @ query)
+            probed = np.argpartition(centroid_distances, self.probes - 1)[:self.probes]
+            starts, ends = self.offsets[probed], self.offsets[probed + 1]
+            blocks = list(zip(starts.tolist(), ends.tolist()))
+            vectors = np.concatenate([self.vectors[start:end] for start, end in blocks])
+            norms = np.concatenate([self.norms[start:end] for start, end in blocks])
+        else:
+            vectors, norms = self.vectors, self.norms
+        distances = norms - 2 * (vectors.astype(np.float32, copy=False) @ query)
+        if len(distances) > self.n_neighbors:
+            nearest = np.argpartition(distances, self.n_neighbors - 1)[:self.n_neighbors]
+        else:
+            nearest = np.arange(len(distances))
+        if self.probes < len(self.centroids):
+            # Positions in the probed blocks back to stored rows
+            block_ends = np.cumsum(ends - starts)
+            block = np.searchsorted(block_ends, nearest, side="right")
+            nearest = starts[block] + nearest - (block_ends[block] - (ends - starts)[block])
+        votes = np.bincount(self.labels[nearest], weights=self.vote_weights[nearest], minlength=len(self.classes))
+        return self.classes[votes.argmax()]
+
+    def predict(self, row_: np.ndarray = None):
+        """
+        Predict one feature row, or each row of a 2D array.
+
+        Args:
+            row_: Feature values in self.features order (defaults to the preallocated self.row),
+                  or a 2D array of such rows as for KNeighborsClassifier.predict
+
+        Returns:
+            Prediction (-1 for lower, 1 for higher), or an array of predictions for a 2D input
+        """
+        row = self.row if row_ is None else np.asarray(row_, dtype=np.float64)
+        if row.ndim == 2:
+            return np.array([self._predict_row(values) for values in row])
+        return self._predict_row(row)
+
+    def nbytes(self) -> int:
+        """Bytes held by the index arrays."""
+        return sum(array.nbytes for array in (self.vectors, self.norms, self.labels, self.vote_weights, self.centroids, self.offsets,
+                                              self.step, self.low))
+
+    def save(self, path_: str) -> None:
+        np.savez(
+            path_,
+            vectors=self.vectors,
+            norms=self.norms,
+            labels=self.labels,
+            vote_weights=self.vote_weights,
+            centroids=self.centroids,
+            offsets=self.offsets,
+            step=self.step,
+            low=self.low,
+            shift=self.shift,
+            classes=self.classes,
+            n_neighbors=self.n_neighbors,
+            probes=self.probes,
+            features=np.array(self.features),
+            mean=np.empty(0) if self.scaler is None else self.scaler.mean_,
+            scale=np.empty(0) if self.scaler is None else self.scaler.scale_
+        )
+
+    @classmethod
+    def load(cls, path_: str, warmup_: int = 10) -> "CompactKNN":
+        with np.load(path_) as arrays:
+            loaded = {name: arrays[name] for name in arrays.files}
+        predictor = cls.__new__(cls)
+        for name in ('vectors', 'norms', 'labels', 'vote_weights', 'centroids', 'offsets', 'step', 'low'):
+            setattr(predictor, name, loaded[name])
+        predictor.shift = float(loaded['shift'])
+        scaler = ScalerArrays(loaded['mean'], loaded['scale']) if len(loaded['mean']) else None
+        predictor._setup(loaded['classes'], int(loaded['n_neighbors']), int(loaded['probes']), loaded['features'].tolist(), scaler)
+        predictor.warmup(warmup_)
+        return predictor
+
+
+def build_compact_knn(X_: np.ndarray, y_: np.ndarray, condense_: str = "clustering", prototypes_: int = 20_000,
+                      n_neighbors_: int = 5, dtype_: str = "float16", probes_: int = 8, features_: list = None,
+                      scaler_: "ScalerArrays" = None, random_state_: int = 0, warmup_: int = 10) -> CompactKNN:
+    """
+    Condense a training set and index it for the live loop.
+
+    Args:
+        X_: Training rows in model space (already scaled when scaler_ is given)
+        y_: Label of each row (e.g. the Higher/Lower column)
+        condense_: "clustering", "selection", or None to index every row
+        prototypes_: Rows kept by the condensation
+        n_neighbors_: Neighbors voting on each prediction
+        dtype_: Storage type of the rows: "float32", "float16" or "int8"
+        probes_: Inverted-file cells scanned per query
+        features_: Feature columns in training order
+        scaler_: Scaler applied to every live row
+        random_state_: Seed for condensation and indexing
+        warmup_: Number of predictions run before returning
+
+    Returns:
+        CompactKNN
+    """
+    classes, labels = np.unique(np.asarray(y_), return_inverse=True)
+    X = np.asarray(X_, dtype=np.float64)
+    if condense_ == "clustering":
+        X, labels, vote_weights = condense_by_clustering(X, labels, prototypes_, random_state_=random_state_)
+    elif condense_ == "selection":
+        X, labels, vote_weights = condense_by_selection(X, labels, prototypes_, random_state_=random_state_)
+    elif condense_ is None:
+        vote_weights = None
+    else:
+        raise ValueError(f"Unknown condensation: {condense_}")
+    return CompactKNN(X, labels, classes, n_neighbors_, vote_weights, dtype_, probes_=probes_, features_=features_,
+                      scaler_=scaler_, warmup_=warmup_, random_state_=random_state_)
+
+
+def load_compact_knn(bundle_dir: str = "knn_bundle") -> CompactKNN:
+    """
+    Load the compact predictor saved in a bundle.
+
+    Returns:
+        Warmed-up CompactKNN, or None if the bundle has none
+    """
+    try:
+        with open(os.path.join(bundle_dir, "manifest.json")) as handle:
+            manifest = json.load(handle)
+        if manifest.get('bundle_version') != bundle_version or 'compact_predictor' not in manifest:
+            return None
+        predictor = CompactKNN.load(os.path.join(bundle_dir, manifest['compact_predictor']))
+        print(f"Compact model loaded successfully from: {bundle_dir}")
+        return predictor
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading compact model: {e}")
+        return None
@@ -0,0 +1,231 @@
+import json
+import os
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+
+from alpaca_data import regular_hours_mask
+from bar_store import BarStore, DAY, _from_day_number
+from indicators import batch_indicators
+from machine_learning import feature_columns
+
+# Builds training datasets straight from the local bar store. Labels are
+# computed with array operations instead of a per-row apply, and features and
+# labels come out as compact float32/int8 arrays with the NaN and no-change
+# rows already removed. write_dataset works through each symbol's history a
+# few days at a time (with enough earlier days to warm the indicators up) and
+# appends every chunk to flat files on disk, so a dataset larger than memory
+# can be built and then memory-mapped or streamed into training.
+
+dataset_version = 1
+
+
+def price_gap_labels(open_: np.ndarray, close_: np.ndarray, horizon_: int = 1, threshold_: float = 0.0) -> np.ndarray:
+    """
+    Direction of the open horizon_ bars ahead relative to each bar's close.
+
+    Args:
+        open_: Open prices, oldest first
+        close_: Close prices, same length
+        horizon_: Bars ahead whose open is compared (1 is classify_price_gap's next candlestick)
+        threshold_: Relative gap inside which the label is 0, e.g. 0.0005 for +/-5 basis points
+            (0 gives np.sign of the gap, as classify_price_gap does)
+
+    Returns:
+        Float array of 1 (higher), -1 (lower) and 0 (inside the band), NaN for the last
+        horizon_ bars, which have no future open yet
+    """
+    labels = np.full(len(close_), np.nan)
+    if len(close_) <= horizon_:
+        return labels
+    gap = open_[horizon_:] - close_[:-horizon_]
+    if threshold_:
+        gap = gap / close_[:-horizon_]
+        labels[:-horizon_] = np.where(gap > threshold_, 1.0, np.where(gap < -threshold_, -1.0, 0.0))
+    else:
+        labels[:-horizon_] = np.sign(gap)
+    return labels
+
+
+def build_dataset(data_: pd.DataFrame, horizon_: int = 1, threshold_: float = 0.0, features_: list = None,
+                  keep_flat_: bool = False) -> tuple:
+    """
+    Compute indicators and labels for a frame of bars and return the training arrays.
+
+    Args:
+        data_: Bars shaped like data_frame_from_stock_bars output (e.g. filter_regular_hours of a BarStore read)
+        horizon_: Label horizon in bars (see price_gap_labels)
+        threshold_: Relative no-change band (see price_gap_labels)
+        features_: Feature columns, defaults to the ones the KNN model is trained on
+        keep_flat_: Keep rows labeled 0 (the training functions drop them)
+
+    Returns:
+        (X float32 array, y int8 array, index of the kept rows)
+    """
+    features = feature_columns if features_ is None else features_
+    data_ = data_.sort_index()
+    close = data_['close'].to_numpy(dtype=np.float64)
+    columns = {
+        'close': close,
+        'high': data_['high'].to_numpy(dtype=np.float64),
+        'low': data_['low'].to_numpy(dtype=np.float64),
+        'open': data_['open'].to_numpy(dtype=np.float64),
+        'volume': data_['volume'].to_numpy(dtype=np.float64)
+    }
+    indicators = batch_indicators(columns['high'][:, None], columns['low'][:, None], close[:, None])
+    columns.update({column: values[:, 0] for column, values in indicators.items()})
+
+    X = np.empty((len(close), len(features)), dtype=np.float32)
+    for position, feature in enumerate(features):
+        X[:, position] = columns[feature]
+    labels = price_gap_labels(columns['open'], close, horizon_=horizon_, threshold_=threshold_)
+
+    # Same rows the training functions keep after dropna and the no-change filter
+    keep = ~np.isnan(labels) & ~np.isnan(X).any(axis=1)
+    if not keep_flat_:
+        keep &= labels != 0
+    return X[keep], labels[keep].astype(np.int8), data_.index[keep]
+
+
+def _append(path_: str, values_: np.ndarray) -> None:
+    with open(path_, "ab") as handle:
+        handle.write(np.ascontiguousarray(values_).tobytes())
+
+
+def write_dataset(store_: BarStore, symbols_: list, output_dir_: str, start_: date = None, end_: date = None,
+                  horizon_: int = 1, threshold_: float = 0.0, features_: list = None, keep_flat_: bool = False,
+                  days_per_chunk_: int = 20, warmup_days_: int = 5) -> dict:
+    """
+    Build a dataset for several symbols from the bar store and write it to disk chunk by chunk.
+
+    Only regular-hours bars are used, as in the live loop. Each chunk re-reads warmup_days_
+    earlier days so the indicators have settled (the moving averages are exact; Wilder
+    smoothing differs from a full-history computation by less than float rounding after
+    a few days) and one later day for the labels of the chunk's last bars.
+
+    Args:
+        store_: Bar store to read from
+        symbols_: Symbols to include
+        output_dir_: Directory for X.bin, y.bin, timestamps.bin and manifest.json (replaced if present)
+        start_: First ET day to include (None for the first stored day)
+        end_: Last ET day to include (None for the last stored day)
+        horizon_: Label horizon in bars (see price_gap_labels)
+        threshold_: Relative no-change band (see price_gap_labels)
+        features_: Feature columns, defaults to the ones the KNN model is trained on
+        keep_flat_: Keep rows labeled 0
+        days_per_chunk_: Stored days processed per chunk
+        warmup_days_: Earlier days read before each chunk for the indicators
+
+    Returns:
+        Dictionary with the row count, per-symbol row ranges and rows per second
+    """
+    features = feature_columns if features_ is None else features_
+    os.makedirs(output_dir_, exist_ok=True)
+    paths = {name: os.path.join(output_dir_, f"{name}.bin") for name in ('X', 'y', 'timestamps')}
+    for path in paths.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+    start_time = time.perf_counter()
+    rows = 0
+    chunks = 0
+    bars = 0
+    symbol_rows = {}
+    for symbol in symbols_:
+        day_numbers = store_.day_index(symbol)[:, DAY]
+        wanted = np.ones(len(day_numbers), dtype=bool)
+        if start_ is not None:
+            wanted &= day_numbers >= (start_ - date(1970, 1, 1)).days
+        if end_ is not None:
+            wanted &= day_numbers <= (end_ - date(1970, 1, 1)).days
+        wanted_positions = np.flatnonzero(wanted)
+        first_row = rows
+
+        for chunk_start in range(0, len(wanted_positions), days_per_chunk_):
+            positions = wanted_positions[chunk_start:chunk_start + days_per_chunk_]
+            read_first = max(0, positions[0] - warmup_days_)
+            read_last = min(len(day_numbers) - 1, positions[-1] + 1)
+            data = store_.read(symbol, _from_day_number(day_numbers[read_first]), _from_day_number(day_numbers[read_last]))
+            data = data[regular_hours_mask(data.index)]
+            bars += len(data)
+            X, y, index = build_dataset(data, horizon_=horizon_, threshold_=threshold_, features_=features, keep_flat_=keep_flat_)
+
+            # Keep only the rows on this chunk's days
+            index_days = index.tz_localize(None).normalize().asi8 // (24 * 60 * 60 * 1_000_000_000)
+            in_chunk = (index_days >= day_numbers[positions[0]]) & (index_days <= day_numbers[positions[-1]])
+            _append(paths['X'], X[in_chunk])
+            _append(paths['y'], y[in_chunk])
+            _append(paths['timestamps'], index[in_chunk].tz_convert("UTC").asi8)
+            rows += int(in_chunk.sum())
+            chunks += 1
+        symbol_rows[symbol] = [first_row, rows]
+
+    seconds = time.perf_counter() - start_time
+    manifest = {
+        'dataset_version': dataset_version,
+        'features': list(features),
+        'rows': rows,
+        'horizon': horizon_,
+        'threshold': threshold_,
+        'keep_flat': keep_flat_,
+        'symbols': symbol_rows,
+        'start': None if start_ is None else start_.isoformat(),
+        'end': None if end_ is None else end_.isoformat()
+    }
+    with open(os.path.join(output_dir_, "manifest.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+
+    print(f"Dataset written to {output_dir_}: {rows} rows from {bars} bars in {seconds:.2f} seconds ({rows / seconds if seconds else 0:.0f} rows/s)")
+    return {
+        'rows': rows,
+        'chunks': chunks,
+        'symbols': symbol_rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else 0.0
+    }
+
+
+def load_dataset(dataset_dir_: str, mmap_: bool = True) -> tuple:
+    """
+    Open a dataset written by write_dataset.
+
+    Args:
+        dataset_dir_: Directory written by write_dataset
+        mmap_: Memory-map the arrays (read-only) instead of reading them into memory
+
+    Returns:
+        (X float32 array, y int8 array, UTC timestamps as int64 nanoseconds, manifest dictionary)
+    """
+    with open(os.path.join(dataset_dir_, "manifest.json")) as handle:
+        manifest = json.load(handle)
+    if manifest.get('dataset_version') != dataset_version:
+        raise ValueError(f"Unsupported dataset version {manifest.get('dataset_version')} in '{dataset_dir_}'")
+    rows = manifest['rows']
+    shapes = {'X': ((rows, len(manifest['features'])), np.float32), 'y': ((rows,), np.int8), 'timestamps': ((rows,), np.int64)}
+    arrays = {}
+    for name, (shape, dtype) in shapes.items():
+        path = os.path.join(dataset_dir_, f"{name}.bin")
+        if rows == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        elif mmap_:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype).reshape(shape)
+    return arrays['X'], arrays['y'], arrays['timestamps'], manifest
+
+
+def iter_dataset_chunks(dataset_dir_: str, rows_: int = 100_000):
+    """
+    Stream a dataset written by write_dataset in blocks, e.g. for partial_fit.
+
+    Args:
+        dataset_dir_: Directory written by write_dataset
+        rows_: Rows per block
+
+    Yields:
+        (X, y) blocks as in-memory arrays, in file order
+    """
+    X, y, _, manifest = load_dataset(dataset_dir_, mmap_=True)
+    for first in range(0, manifest['rows'], rows_):
+        yield np.array(X[first:first + rows_]), np.array(y[first:first + rows_])
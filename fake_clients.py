@@ -0,0 +1,587 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import msgpack
+import numpy as np
+import pandas as pd
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from alpaca_data import market_status_categorical, regular_hours_mask
+
+# Local stand-ins for the Alpaca clients so the data path can be exercised and
+# timed offline. They answer the same request objects as the real clients in
+# raw data mode and count every call so round-trips can be compared.
+
+
+def _random_walk_bars(rng_: np.random.Generator, count_: int) -> tuple:
+    close = np.maximum(1.0, 100 + np.cumsum(rng_.normal(0, 0.1, count_))).round(2)
+    open_ = np.maximum(0.5, close + rng_.normal(0, 0.05, count_)).round(2)
+    high = (np.maximum(open_, close) + rng_.exponential(0.05, count_)).round(2)
+    low = np.maximum(0.01, np.minimum(open_, close) - rng_.exponential(0.05, count_)).round(2)
+    volume = rng_.integers(100, 10_000, count_)
+    return open_, high, low, close, volume
+
+
+def make_raw_bars(symbols_: list, bars_per_symbol_: int, start_: str = "2025-01-02 04:00", seed_: int = 0) -> dict:
+    """
+    Generate synthetic 1-minute bars shaped like a raw get_stock_bars response.
+
+    Args:
+        symbols_: Stock symbols to generate bars for
+        bars_per_symbol_: Number of consecutive minute bars per symbol
+        start_: ET wall clock time of the first bar
+        seed_: Random seed so runs are reproducible
+
+    Returns:
+        Dictionary of {symbol: [{'t', 'o', 'h', 'l', 'c', 'v', 'n', 'vw'}, ...]} oldest first
+    """
+    rng = np.random.default_rng(seed_)
+    timestamps = pd.date_range(start_, periods=bars_per_symbol_, freq="min", tz="America/New_York")
+    timestamps = timestamps.tz_convert("UTC").strftime("%Y-%m-%dT%H:%M:%SZ").tolist()
+    data = {}
+    for symbol in symbols_:
+        open_, high, low, close, volume = _random_walk_bars(rng, bars_per_symbol_)
+        trades = rng.integers(1, 100, bars_per_symbol_)
+        data[symbol] = [
+            {'c': c, 'h': h, 'l': l, 'n': n, 'o': o, 't': t, 'v': v, 'vw': round((h + l + c) / 3, 4)}
+            for t, o, h, l, c, v, n in zip(timestamps, open_.tolist(), high.tolist(), low.tolist(), close.tolist(), volume.tolist(), trades.tolist())
+        ]
+    return data
+
+
+def make_bar_frame(bars_: int, start_: str = "2025-01-02 09:30", seed_: int = 0, regular_hours_only_: bool = True) -> pd.DataFrame:
+    """
+    Generate a synthetic frame shaped like data_frame_from_stock_bars output without building raw dicts.
+
+    Args:
+        bars_: Number of bars
+        start_: ET wall clock time of the first bar
+        seed_: Random seed so runs are reproducible
+        regular_hours_only_: Only use 9:30-16:00 weekday minutes (what filter_regular_hours keeps)
+
+    Returns:
+        DataFrame with close/high/low/open/volume/market_status columns and an ET index
+    """
+    rng = np.random.default_rng(seed_)
+    if regular_hours_only_:
+        days = pd.bdate_range(pd.Timestamp(start_).normalize(), periods=bars_ // 390 + 2)
+        minutes = pd.timedelta_range("9:30:00", periods=390, freq="min")
+        wall_clock = (days.values[:, None] + minutes.values[None, :]).ravel()
+        index = pd.DatetimeIndex(wall_clock).tz_localize("America/New_York")
+        index = index[index >= pd.Timestamp(start_, tz="America/New_York")][:bars_]
+        assert regular_hours_mask(index).all()
+    else:
+        index = pd.date_range(start_, periods=bars_, freq="min", tz="America/New_York")
+    open_, high, low, close, volume = _random_walk_bars(rng, len(index))
+    return pd.DataFrame({
+        'close': close, 'high': high, 'low': low, 'open': open_, 'volume': volume,
+        'market_status': market_status_categorical(index)
+    }, index=index.rename('timestamp'))
+
+
+def _utc_nanoseconds(value) -> int:
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")  # alpaca-py requests carry naive UTC times
+    return timestamp.value
+
+
+class FakeStockHistoricalDataClient:
+    """
+    In-memory StockHistoricalDataClient(raw_data=True) serving pre-recorded raw bars.
+
+    Honors symbol_or_symbols, start, end, limit and sort the way the bars endpoint does,
+    splits each response into pages of page_limit_ bars (as alpaca-py does when it follows
+    next_page_token) and sleeps latency_ seconds per page to stand in for the HTTP round-trip.
+    Setting clock (epoch seconds) hides bars that have not closed yet at that time.
+    """
+
+    def __init__(self, bars_: dict, latency_: float = 0.0, page_limit_: int = 10_000):
+        """
+        Args:
+            bars_: Raw bars per symbol, oldest first (see make_raw_bars)
+            latency_: Seconds slept for every page served
+            page_limit_: Maximum bars per page
+        """
+        self.bars = bars_
+        self.latency = latency_
+        self.page_limit = page_limit_
+        self.calls = 0
+        self.http_requests = 0
+        self.total_latency = 0.0
+        self.clock = None
+        self._timestamps = {
+            symbol: pd.to_datetime([bar['t'] for bar in bars], utc=True).asi8 if bars else np.array([], dtype=np.int64)
+            for symbol, bars in bars_.items()
+        }
+
+    def reset_counts(self) -> None:
+        self.calls = 0
+        self.http_requests = 0
+        self.total_latency = 0.0
+
+    def _round_trip(self) -> None:
+        self.http_requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+            self.total_latency += self.latency
+
+    def get_stock_bars(self, request_params) -> dict:
+        self.calls += 1
+        symbols = request_params.symbol_or_symbols
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        start = _utc_nanoseconds(request_params.start) if request_params.start is not None else None
+        end = _utc_nanoseconds(request_params.end) if request_params.end is not None else None
+        descending = getattr(request_params.sort, "value", request_params.sort) == "desc"
+        remaining = request_params.limit
+
+        data = {}
+        served = 0
+        for symbol in sorted(symbols):
+            timestamps = self._timestamps.get(symbol)
+            if timestamps is None:
+                continue
+            first = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+            last = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+            if self.clock is not None:
+                # A minute bar is published once its minute is over
+                last = min(last, int(np.searchsorted(timestamps, int(self.clock * 1e9) - 60_000_000_000, side="right")))
+            bars = self.bars[symbol][first:last]
+            if descending:
+                bars = bars[::-1]
+            if remaining is not None:
+                bars = bars[:remaining - served]
+            if bars:
+                data[symbol] = bars
+                served += len(bars)
+            if remaining is not None and served >= remaining:
+                break
+
+        for _ in range(max(1, -(-served // self.page_limit))):
+            self._round_trip()
+        return data
+
+    def latest_close(self, symbol_: str) -> float:
+        """Close of the newest bar published at clock, without counting a call (e.g. a FakeTradingClient price_lookup_)."""
+        timestamps = self._timestamps.get(symbol_)
+        last = len(timestamps) if timestamps is not None else 0
+        if self.clock is not None and last:
+            last = int(np.searchsorted(timestamps, int(self.clock * 1e9) - 60_000_000_000, side="right"))
+        if not last:
+            raise ValueError(f"No bars published for {symbol_}")
+        return self.bars[symbol_][last - 1]['c']
+
+    def get_stock_latest_bar(self, request_params) -> dict:
+        self.calls += 1
+        self._round_trip()
+        symbols = request_params.symbol_or_symbols
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        latest = {}
+        for symbol in symbols:
+            timestamps = self._timestamps.get(symbol)
+            last = len(timestamps) if timestamps is not None else 0
+            if self.clock is not None and last:
+                last = int(np.searchsorted(timestamps, int(self.clock * 1e9) - 60_000_000_000, side="right"))
+            if last:
+                latest[symbol] = self.bars[symbol][last - 1]
+        return latest
+
+
+# Statuses of orders that FakeTradingClient can still fill
+fake_open_order_statuses = {"new", "accepted", "partially_filled"}
+
+
+class FakeTradingClient:
+    """
+    In-memory TradingClient standing in for the paper broker.
+
+    Market orders fill immediately at price_lookup_(symbol); limit orders fill when marketable
+    and otherwise stay open. With instant_fills_=False every order comes back "accepted" with
+    nothing filled, as the broker answers a submitted market order, and only fills on
+    fill_open_orders. Positions and cash update on fills. Every call sleeps latency_ seconds
+    and is counted, and calls are safe from several threads at once. Orders are returned as
+    copies, so a caller only sees a fill by fetching the order again.
+    """
+
+    def __init__(self, latency_: float = 0.0, cash_: float = 100_000.0, price_lookup_=None, instant_fills_: bool = True):
+        """
+        Args:
+            latency_: Seconds slept for every call
+            cash_: Starting cash
+            price_lookup_: Function returning the current price of a symbol (default: 100.0)
+            instant_fills_: Fill marketable orders on submission (False leaves every order open)
+        """
+        self.latency = latency_
+        self.cash = cash_
+        self.price_lookup = price_lookup_ if price_lookup_ is not None else (lambda symbol: 100.0)
+        self.instant_fills = instant_fills_
+        self.positions = {} # symbol -> [qty, cost_basis]
+        self.orders = []
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self, name_: str) -> None:
+        with self._lock:
+            self.calls[name_] = self.calls.get(name_, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _fill(self, symbol_: str, qty_: float, price_: float) -> None:
+        qty, cost_basis = self.positions.get(symbol_, [0.0, 0.0])
+        if qty_ > 0:
+            cost_basis += qty_ * price_
+        elif qty:
+            cost_basis *= (qty + qty_) / qty
+        qty += qty_
+        self.cash -= qty_ * price_
+        if qty:
+            self.positions[symbol_] = [qty, cost_basis]
+        else:
+            self.positions.pop(symbol_, None)
+
+    def _fill_order(self, order_, qty_: float) -> bool:
+        # Caller holds the lock; fills up to qty_ of order_ when it is marketable
+        price = float(self.price_lookup(order_.symbol))
+        if order_.limit_price is not None and not (price <= order_.limit_price if order_.side == "buy" else price >= order_.limit_price):
+            return False
+        qty = min(qty_, order_.qty - order_.filled_qty)
+        self._fill(order_.symbol, qty if order_.side == "buy" else -qty, price)
+        filled_value = (order_.filled_avg_price or 0.0) * order_.filled_qty + price * qty
+        order_.filled_qty += qty
+        order_.filled_avg_price = filled_value / order_.filled_qty
+        order_.status = "filled" if order_.filled_qty >= order_.qty else "partially_filled"
+        return True
+
+    def submit_order(self, order_data):
+        self._round_trip("submit_order")
+        side = getattr(order_data.side, "value", order_data.side)
+        qty = float(order_data.qty)
+        limit_price = getattr(order_data, "limit_price", None)
+        with self._lock:
+            order = SimpleNamespace(
+                id=uuid.uuid4(),
+                symbol=order_data.symbol,
+                qty=qty,
+                side=side,
+                limit_price=limit_price,
+                status="new" if self.instant_fills else "accepted",
+                filled_qty=0.0,
+                filled_avg_price=None,
+                submitted_at=time.time()
+            )
+            if self.instant_fills:
+                self._fill_order(order, qty)
+            self.orders.append(order)
+            return SimpleNamespace(**vars(order))
+
+    def get_order_by_id(self, order_id):
+        self._round_trip("get_order_by_id")
+        with self._lock:
+            for order in self.orders:
+                if str(order.id) == str(order_id):
+                    return SimpleNamespace(**vars(order))
+        raise ValueError(f"order not found: {order_id}")
+
+    def get_orders(self, filter=None) -> list:
+        self._round_trip("get_orders")
+        status = getattr(getattr(filter, "status", None), "value", None)
+        with self._lock:
+            return [SimpleNamespace(**vars(order)) for order in self.orders
+                    if status != "open" or order.status in fake_open_order_statuses]
+
+    def fill_open_orders(self, qty_: float = None) -> int:
+        """
+        Fill open orders that are marketable at the current prices.
+
+        Args:
+            qty_: Shares filled per order (None fills each order completely)
+
+        Returns:
+            Number of orders that received a fill
+        """
+        filled = 0
+        with self._lock:
+            for order in self.orders:
+                if order.status in fake_open_order_statuses:
+                    filled += self._fill_order(order, order.qty if qty_ is None else qty_)
+        return filled
+
+    def get_all_positions(self) -> list:
+        self._round_trip("get_all_positions")
+        with self._lock:
+            positions = []
+            for symbol, (qty, cost_basis) in self.positions.items():
+                price = float(self.price_lookup(symbol))
+                market_value = qty * price
+                positions.append(SimpleNamespace(
+                    symbol=symbol,
+                    qty=str(qty),
+                    market_value=str(market_value),
+                    cost_basis=str(cost_basis),
+                    unrealized_pl=str(market_value - cost_basis),
+                    unrealized_plpc=str((market_value - cost_basis) / cost_basis if cost_basis else 0.0),
+                    current_price=str(price)
+                ))
+            return positions
+
+    def get_account(self):
+        self._round_trip("get_account")
+        with self._lock:
+            equity = self.cash + sum(qty * float(self.price_lookup(symbol)) for symbol, (qty, _) in self.positions.items())
+            return SimpleNamespace(
+                buying_power=str(max(self.cash, 0.0)),
+                cash=str(self.cash),
+                portfolio_value=str(equity),
+                equity=str(equity),
+                pattern_day_trader=False
+            )
+
+
+class ReplayBarServer:
+    """
+    Local websocket server speaking the Alpaca market data stream protocol, replaying raw bars.
+
+    Clients connect with StockDataStream(url_override=server.url). After the connect/auth/
+    subscribe handshake, bars of the subscribed symbols are sent oldest first as msgpack 'b'
+    messages, one every interval_ seconds. With drop_every_ set, the connection is closed
+    after that many bars and skip_on_drop_ bars are never streamed, as if they were
+    published while the client was reconnecting. When data_client_ is given, its clock is
+    moved to each bar's close as the bar is published (streamed or skipped), so REST
+    backfills see exactly the bars published so far.
+    """
+
+    def __init__(self, bars_: dict, interval_: float = 0.0, drop_every_: int = None, skip_on_drop_: int = 0,
+                 data_client_: FakeStockHistoricalDataClient = None, host_: str = "127.0.0.1", port_: int = 0):
+        """
+        Args:
+            bars_: Raw bars per symbol, oldest first (see make_raw_bars)
+            interval_: Seconds between bars
+            drop_every_: Close the connection after this many bars (None never drops)
+            skip_on_drop_: Bars published but not streamed after each drop
+            data_client_: Fake REST client kept in step with the replay
+            host_: Interface to listen on
+            port_: Port to listen on (0 picks a free one)
+        """
+        self.bars = bars_
+        self.interval = interval_
+        self.drop_every = drop_every_
+        self.skip_on_drop = skip_on_drop_
+        self.data_client = data_client_
+        self.host = host_
+        self.port = port_
+        self.connections = 0
+        self.sent = 0
+        self.skipped = 0
+        self.finished = asyncio.Event()
+        self.send_times = {} # (symbol, 't') -> perf_counter when sent
+        self._queue = None
+        self._position = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self._server = await serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _build_queue(self, symbols_: list) -> list:
+        queue = []
+        for symbol in symbols_:
+            for bar in self.bars.get(symbol, []):
+                timestamp = pd.Timestamp(bar['t'])
+                queue.append((timestamp.value, symbol, bar))
+        queue.sort(key=lambda item: item[0])
+        return queue
+
+    def _publish(self, nanoseconds_: int) -> None:
+        if self.data_client is not None:
+            self.data_client.clock = nanoseconds_ / 1e9 + 60
+
+    async def _handle(self, websocket) -> None:
+        self.connections += 1
+        await websocket.send(msgpack.packb([{'T': "success", 'msg': "connected"}]))
+        await websocket.recv() # auth
+        await websocket.send(msgpack.packb([{'T': "success", 'msg': "authenticated"}]))
+        subscription = msgpack.unpackb(await websocket.recv())
+        symbols = subscription.get('bars', [])
+        await websocket.send(msgpack.packb([{'T': "subscription", 'bars': symbols}]))
+        if self._queue is None:
+            self._queue = self._build_queue(symbols)
+
+        sent_this_connection = 0
+        try:
+            while self._position < len(self._queue):
+                if self.drop_every is not None and sent_this_connection == self.drop_every:
+                    for nanoseconds, _, _ in self._queue[self._position:self._position + self.skip_on_drop]:
+                        self._publish(nanoseconds)
+                    skipped = min(self.skip_on_drop, len(self._queue) - self._position)
+                    self._position += skipped
+                    self.skipped += skipped
+                    await websocket.close()
+                    return
+                if self.interval:
+                    await asyncio.sleep(self.interval)
+                nanoseconds, symbol, bar = self._queue[self._position]
+                message = {
+                    'T': "b", 'S': symbol, 'o': bar['o'], 'h': bar['h'], 'l': bar['l'], 'c': bar['c'],
+                    'v': bar['v'], 't': msgpack.Timestamp.from_unix_nano(nanoseconds), 'n': bar['n'], 'vw': bar['vw']
+                }
+                self._publish(nanoseconds)
+                self.send_times[(symbol, bar['t'])] = time.perf_counter()
+                await websocket.send(msgpack.packb([message]))
+                self._position += 1
+                self.sent += 1
+                sent_this_connection += 1
+            self.finished.set()
+            await websocket.wait_closed()
+        except ConnectionClosed:
+            pass
+
+
+def _order_json(order_) -> dict:
+    timestamp = datetime.fromtimestamp(order_.submitted_at, timezone.utc).isoformat()
+    return {
+        'id': str(order_.id), 'client_order_id': str(order_.id), 'created_at': timestamp, 'updated_at': timestamp,
+        'submitted_at': timestamp, 'filled_at': timestamp if order_.status == "filled" else None,
+        'asset_id': str(uuid.uuid5(uuid.NAMESPACE_DNS, order_.symbol)), 'symbol': order_.symbol, 'asset_class': "us_equity",
+        'qty': str(order_.qty), 'filled_qty': str(order_.filled_qty),
+        'filled_avg_price': None if order_.filled_avg_price is None else str(order_.filled_avg_price),
+        'order_class': "simple", 'order_type': "market" if order_.limit_price is None else "limit",
+        'type': "market" if order_.limit_price is None else "limit", 'side': order_.side, 'time_in_force': "day",
+        'limit_price': None if order_.limit_price is None else str(order_.limit_price),
+        'status': order_.status, 'extended_hours': False
+    }
+
+
+def _position_json(position_) -> dict:
+    qty = float(position_.qty)
+    return {
+        'asset_id': str(uuid.uuid5(uuid.NAMESPACE_DNS, position_.symbol)), 'symbol': position_.symbol, 'exchange': "NASDAQ",
+        'asset_class': "us_equity", 'avg_entry_price': str(float(position_.cost_basis) / qty if qty else 0.0),
+        'qty': position_.qty, 'side': "long" if qty >= 0 else "short", 'market_value': position_.market_value,
+        'cost_basis': position_.cost_basis, 'unrealized_pl': position_.unrealized_pl,
+        'unrealized_plpc': position_.unrealized_plpc, 'current_price': position_.current_price
+    }
+
+
+class MockBrokerServer:
+    """
+    Local HTTP server answering the trading API endpoints the bot uses, backed by a FakeTradingClient.
+
+    A real TradingClient(url_override=server.url) talks to it over HTTP/1.1 keep-alive, so
+    connection reuse and pool sizing behave as they do against the broker. Each request
+    sleeps latency_ seconds; connections counts the TCP connections accepted.
+    """
+
+    def __init__(self, broker_: FakeTradingClient = None, latency_: float = 0.0, host_: str = "127.0.0.1", port_: int = 0):
+        """
+        Args:
+            broker_: Fake trading client holding the orders and positions (default: a new one)
+            latency_: Seconds slept for every request
+            host_: Interface to listen on
+            port_: Port to listen on (0 picks a free one)
+        """
+        self.broker = broker_ if broker_ is not None else FakeTradingClient()
+        self.latency = latency_
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host_, port_), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, name_: str) -> None:
+        with self._lock:
+            if name_ == "connection":
+                self.connections += 1
+            else:
+                self.requests += 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True # Headers and body go out as separate writes
+
+            def setup(self):
+                super().setup()
+                server._count("connection")
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status_, body_) -> None:
+                payload = json.dumps(body_).encode()
+                self.send_response(status_)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _route(self, method_: str) -> None:
+                server._count("request")
+                if server.latency:
+                    time.sleep(server.latency)
+                path = self.path.split("?")[0].rstrip("/")
+                broker = server.broker
+                if method_ == "POST" and path == "/v2/orders":
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    order_data = SimpleNamespace(symbol=body['symbol'], qty=float(body['qty']), side=body['side'],
+                                                 limit_price=float(body['limit_price']) if body.get('limit_price') else None)
+                    return self._reply(200, _order_json(broker.submit_order(order_data)))
+                if method_ == "GET" and path.startswith("/v2/orders/"):
+                    try:
+                        return self._reply(200, _order_json(broker.get_order_by_id(path.rsplit("/", 1)[1])))
+                    except ValueError:
+                        return self._reply(404, {'code': 40410000, 'message': "order not found"})
+                if method_ == "GET" and path == "/v2/orders":
+                    return self._reply(200, [_order_json(order) for order in broker.get_orders()])
+                if method_ == "GET" and path == "/v2/positions":
+                    return self._reply(200, [_position_json(position) for position in broker.get_all_positions()])
+                if method_ == "GET" and path == "/v2/account":
+                    account = broker.get_account()
+                    return self._reply(200, {
+                        'id': str(uuid.uuid5(uuid.NAMESPACE_DNS, "account")), 'account_number': "PA0000000", 'status': "ACTIVE",
+                        'buying_power': account.buying_power, 'cash': account.cash, 'portfolio_value': account.portfolio_value,
+                        'equity': account.equity, 'pattern_day_trader': account.pattern_day_trader
+                    })
+                self._reply(404, {'code': 40410000, 'message': "not found"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+        return Handler
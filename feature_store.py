@@ -0,0 +1,329 @@
+import hashlib
+import json
+import os
+import sys
+from datetime import date
+import numpy as np
+import pandas as pd
+
+from alpaca_data import regular_hours_mask
+from bar_store import BarStore, FIRST, END, COMPLETE, eastern_time_zone
+from dataset_builder import price_gap_labels
+from indicators import moving_averages
+from machine_learning import feature_columns
+
+# Indicator columns persisted next to the bars of a BarStore, so training and
+# backtesting read ready features instead of running add_technical_indicators
+# over the whole history every time. On-disk layout, inside each symbol's
+# BarStore directory:
+#   <root>/<symbol>/features/<column>.<key>.bin   float64, one value per stored bar row
+#                                                 (NaN outside regular hours)
+#   <root>/<symbol>/features/<column>.<key>.json  rows covered, a digest of the day index
+#                                                 they were computed from, and the
+#                                                 indicator state at the end of them
+# Indicators run over each symbol's regular-hours bars, as in the live loop and
+# dataset_builder. The key hashes the column's spec (kind, length, source column),
+# so changing one indicator's config only recomputes that column; the others keep
+# their files. update() continues each column from its saved state (the Wilder
+# sums and observation count behind ATR and RSI, the last length - 1 values of a
+# moving average) over the bars appended since, so new bars cost O(new bars).
+# When the bar store rewrites stored days (a backfill completing a live-appended
+# day, or filling a gap), the digest no longer matches: the column resumes from a
+# checkpoint saved at the start of its first incomplete day when the days before
+# it are unchanged, and is recomputed in full otherwise.
+# Values match add_technical_indicators on the regular-hours bars to float
+# rounding; like StreamingATR, a flat bar only nudges its own true range.
+
+feature_store_version = 1
+
+# Indicator config of add_technical_indicators
+default_indicator_config = {
+    'ATR': {'kind': "atr", 'length': 20},
+    'RSI': {'kind': "rsi", 'length': 14, 'source': "close"},
+    'MA40': {'kind': "sma", 'length': 40, 'source': "close"},
+    'MA80': {'kind': "sma", 'length': 80, 'source': "close"},
+    'MA160': {'kind': "sma", 'length': 160, 'source': "close"}
+}
+
+
+def column_key(column_: str, spec_: dict) -> str:
+    """Version key of one indicator column: a digest of its name, spec and the store format."""
+    description = json.dumps({'column': column_, 'spec': spec_, 'session': "regular", 'version': feature_store_version}, sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()[:12]
+
+
+def config_version(config_: dict) -> str:
+    """Version of a whole indicator config (changes when any column's key does)."""
+    keys = {column: column_key(column, spec) for column, spec in config_.items()}
+    return hashlib.sha256(json.dumps(keys, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _days_digest(days_: np.ndarray, rows_: int) -> str:
+    # The day index as far as the first rows_ rows go, with completeness: appending bars to the
+    # newest day leaves it unchanged, rewriting or completing a day does not
+    covered = days_[days_[:, FIRST] < rows_].copy()
+    covered[:, END] = np.minimum(covered[:, END], rows_)
+    return hashlib.sha256(np.ascontiguousarray(covered).tobytes()).hexdigest()
+
+
+def _rma(values_: np.ndarray, length_: int, weighted_sum_: float, observations_: int) -> tuple:
+    # Continue Series.ewm(alpha=1/length, adjust=True, min_periods=length).mean() (pandas_ta rma) from
+    # the weighted sum and observation count it stopped at, with the recurrence of indicators._rma_from_second_bar
+    from scipy.signal import lfilter
+
+    decay = 1.0 - 1.0 / length_
+    weighted_sums, _ = lfilter([1.0], [1.0, -decay], values_, zi=[decay * weighted_sum_])
+    observations = observations_ + np.arange(1, len(values_) + 1)
+    weights = (1.0 - decay ** observations) / (1.0 - decay)
+    averages = weighted_sums / weights
+    averages[observations < length_] = np.nan
+    return averages, float(weighted_sums[-1]), int(observations[-1])
+
+
+def _extend_column(spec_: dict, bars_: dict, state_: dict) -> tuple:
+    """
+    Indicator values for new regular-hours bars, continuing from state_.
+
+    Args:
+        spec_: Column spec (see default_indicator_config)
+        bars_: New bars as {'open', 'high', 'low', 'close'} float64 arrays, oldest first
+        state_: State after the previous bar ({} before the first bar)
+
+    Returns:
+        (values for the new bars, state after the last one)
+    """
+    count = len(bars_['close'])
+    if count == 0:
+        return np.empty(0), state_
+    if spec_['kind'] == "sma":
+        source = bars_[spec_['source']]
+        window = np.asarray(state_.get('window', []), dtype=np.float64)
+        values = np.concatenate((window, source))
+        averages = moving_averages(values[None, :], [spec_['length']])[spec_['length']][0, len(window):]
+        return averages, {'window': values[-(spec_['length'] - 1):].tolist() if spec_['length'] > 1 else []}
+
+    source = bars_['close'] if spec_['kind'] == "atr" else bars_[spec_['source']]
+    previous = np.concatenate(([state_.get('previous', np.nan)], source[:-1]))
+    if spec_['kind'] == "atr":
+        high_low = bars_['high'] - bars_['low']
+        high_low[high_low == 0] += sys.float_info.epsilon # pandas_ta non_zero_range, per bar as in StreamingATR
+        changes = np.maximum(np.maximum(np.abs(high_low), np.abs(bars_['high'] - previous)), np.abs(previous - bars_['low']))
+        sources = {'range': changes}
+    else:
+        changes = source - previous
+        sources = {'gain': np.maximum(changes, 0.0), 'loss': np.minimum(changes, 0.0)}
+
+    # The very first bar has no previous value and no observation
+    start = 1 if 'previous' not in state_ else 0
+    state = {'previous': float(source[-1])}
+    averages = {}
+    for name, values in sources.items():
+        averages[name] = np.full(count, np.nan)
+        weighted_sum, observations = state_.get(f'{name}_sum', 0.0), state_.get(f'{name}_observations', 0)
+        if count > start:
+            averages[name][start:], weighted_sum, observations = _rma(values[start:], spec_['length'], weighted_sum, observations)
+        state[f'{name}_sum'], state[f'{name}_observations'] = weighted_sum, observations
+    if spec_['kind'] == "atr":
+        return averages['range'], state
+
+    # Same steps as indicators.relative_strength_index
+    loss = np.abs(averages['loss'])
+    loss += averages['gain']
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = np.multiply(averages['gain'], 100)
+        rsi /= loss
+    return rsi, state
+
+
+class FeatureStore:
+    """
+    Indicator columns for the bars of a BarStore, kept up to date incrementally.
+
+    Reads memory-map the column files like BarStore.read, so features for a long history
+    load without recomputing anything.
+    """
+
+    def __init__(self, bar_store_: BarStore, config_: dict = None):
+        """
+        Args:
+            bar_store_: Bar store whose bars the features are computed from and stored next to
+            config_: {column: spec} indicator config (default default_indicator_config)
+        """
+        self.bar_store = bar_store_
+        self.config = default_indicator_config if config_ is None else config_
+        self.keys = {column: column_key(column, spec) for column, spec in self.config.items()}
+        self.version = config_version(self.config)
+
+    def _path(self, symbol_: str, column_: str, extension_: str) -> str:
+        return os.path.join(self.bar_store.root, symbol_, "features", f"{column_}.{self.keys[column_]}.{extension_}")
+
+    def _load_state(self, symbol_: str, column_: str) -> dict:
+        path = self._path(symbol_, column_, "json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            return json.load(handle)
+
+    def _save_state(self, symbol_: str, column_: str, state_: dict) -> None:
+        path = self._path(symbol_, column_, "json")
+        with open(path + ".tmp", "w") as handle:
+            json.dump(state_, handle)
+        os.replace(path + ".tmp", path)
+
+    def _resume_point(self, symbol_: str, column_: str, days_: np.ndarray) -> tuple:
+        # (rows, indicator state, where from, saved checkpoint if still valid) to continue a column from:
+        # the end of its saved rows, the checkpoint at its first incomplete day, or the beginning
+        saved = self._load_state(symbol_, column_)
+        if saved is None:
+            return 0, {}, "start", None
+        end = int(days_[-1, END]) if len(days_) else 0
+        checkpoint = saved['checkpoint']
+        if checkpoint['rows'] > end or checkpoint['digest'] != _days_digest(days_, checkpoint['rows']):
+            return 0, {}, "start", None
+        if saved['rows'] <= end and saved['digest'] == _days_digest(days_, saved['rows']):
+            return saved['rows'], saved['state'], "end", checkpoint
+        return checkpoint['rows'], checkpoint['state'], "checkpoint", checkpoint
+
+    def _bars(self, symbol_: str, first_: int, end_: int) -> tuple:
+        # Bar rows [first_, end_) as float64 arrays of the regular-hours bars, and their mask
+        columns = {name: self.bar_store.column(symbol_, name, first_, end_) for name in ('timestamp', 'open', 'high', 'low', 'close')}
+        index = pd.DatetimeIndex(columns['timestamp'].view('M8[ns]')).tz_localize("UTC").tz_convert(eastern_time_zone)
+        regular = regular_hours_mask(index)
+        return {name: np.asarray(columns[name][regular], dtype=np.float64) for name in ('open', 'high', 'low', 'close')}, regular
+
+    def is_current(self, symbol_: str) -> bool:
+        """Whether every configured column covers all stored bars of symbol_."""
+        days = self.bar_store.day_index(symbol_)
+        end = int(days[-1, END]) if len(days) else 0
+        for column in self.config:
+            rows, _, resumed_from, _ = self._resume_point(symbol_, column, days)
+            if rows != end or resumed_from != "end":
+                return False
+        return True
+
+    def update(self, symbol_: str) -> dict:
+        """
+        Extend every configured column of symbol_ over the bars stored since its last update.
+
+        Returns:
+            Dictionary with the bar rows stored, and per column the rows computed and where it resumed
+            from ('end' of the last update, the 'checkpoint' before rewritten days, or the 'start')
+        """
+        days = self.bar_store.day_index(symbol_)
+        end = int(days[-1, END]) if len(days) else 0
+        os.makedirs(os.path.join(self.bar_store.root, symbol_, "features"), exist_ok=True)
+        # Rows from the start of the first incomplete day may still be rewritten by a backfill
+        incomplete = days[days[:, COMPLETE] == 0]
+        checkpoint_rows = int(incomplete[0, FIRST]) if len(incomplete) else end
+
+        resume_points = {column: self._resume_point(symbol_, column, days) for column in self.config}
+        report = {'rows': end, 'columns': {}}
+        # Columns resuming from the same row share one read of the bars
+        for first in sorted(set(point[0] for point in resume_points.values())):
+            bars, regular = self._bars(symbol_, first, end)
+            split = int(regular[:max(checkpoint_rows - first, 0)].sum())
+            for column, (rows, state, resumed_from, checkpoint) in resume_points.items():
+                if rows != first:
+                    continue
+                spec = self.config[column]
+                # Computed in two parts so the state at the start of the first incomplete day is kept
+                head, split_state = _extend_column(spec, {name: values[:split] for name, values in bars.items()}, state)
+                tail, end_state = _extend_column(spec, {name: values[split:] for name, values in bars.items()}, split_state)
+                values = np.full(end - first, np.nan)
+                values[regular] = np.concatenate((head, tail))
+                if checkpoint_rows >= first:
+                    checkpoint = {'rows': checkpoint_rows, 'digest': _days_digest(days, checkpoint_rows), 'state': split_state}
+                elif checkpoint is None or checkpoint['rows'] != checkpoint_rows:
+                    checkpoint = {'rows': first, 'digest': _days_digest(days, first), 'state': state}
+
+                path = self._path(symbol_, column, "bin")
+                with open(path, "ab") as handle:
+                    handle.truncate(first * 8) # drop rows past the resume point (rewritten days or an interrupted write)
+                    handle.write(values.tobytes())
+                self._save_state(symbol_, column, {
+                    'key': self.keys[column],
+                    'spec': spec,
+                    'rows': end,
+                    'digest': _days_digest(days, end),
+                    'state': end_state,
+                    'checkpoint': checkpoint
+                })
+                report['columns'][column] = {'computed_rows': end - first, 'resumed_from': resumed_from}
+        return report
+
+    def update_all(self, symbols_: list = None) -> dict:
+        """Update every symbol in symbols_ (default every stored symbol)."""
+        return {symbol: self.update(symbol) for symbol in (self.bar_store.symbols() if symbols_ is None else symbols_)}
+
+    def stale_files(self, symbol_: str) -> list:
+        """Feature files of symbol_ whose key is not in the current config (left by earlier configs)."""
+        directory = os.path.join(self.bar_store.root, symbol_, "features")
+        if not os.path.isdir(directory):
+            return []
+        current = {f"{column}.{key}" for column, key in self.keys.items()}
+        return sorted(name for name in os.listdir(directory) if name.rsplit(".", 1)[0] not in current)
+
+    def prune(self, symbol_: str) -> int:
+        """Delete the feature files no current column uses. Returns the number removed."""
+        stale = self.stale_files(symbol_)
+        for name in stale:
+            os.remove(os.path.join(self.bar_store.root, symbol_, "features", name))
+        return len(stale)
+
+    def read(self, symbol_: str, start_: date = None, end_: date = None, regular_hours_only_: bool = True) -> pd.DataFrame:
+        """
+        Load stored bars for [start_, end_] with their indicator columns.
+
+        Columns not updated since the newest bars were stored are computed first.
+
+        Args:
+            symbol_: Stored symbol
+            start_: First ET day (None for the first stored day)
+            end_: Last ET day (None for the last stored day)
+            regular_hours_only_: Keep only regular-hours bars, the ones the indicators run over
+
+        Returns:
+            DataFrame shaped like add_technical_indicators(filter_regular_hours(BarStore.read(...)))
+        """
+        if not self.is_current(symbol_):
+            self.update(symbol_)
+        days = self.bar_store.day_index(symbol_)
+        end = int(days[-1, END]) if len(days) else 0
+        data = self.bar_store.read(symbol_, start_, end_)
+        selected = self.bar_store.day_index(symbol_, start_, end_)
+        first = int(selected[0, FIRST]) if len(selected) else 0
+        for column in self.config:
+            values = np.memmap(self._path(symbol_, column, "bin"), dtype=np.float64, mode="r", shape=(end,)) if end else np.empty(0)
+            data[column] = values[first:first + len(data)]
+        if regular_hours_only_:
+            data = data[regular_hours_mask(data.index)]
+        return data
+
+    def training_arrays(self, symbol_: str, start_: date = None, end_: date = None, horizon_: int = 1, threshold_: float = 0.0,
+                        features_: list = None, keep_flat_: bool = False) -> tuple:
+        """
+        Feature matrix and labels straight from the stored columns, like dataset_builder.build_dataset.
+
+        Args:
+            symbol_: Stored symbol
+            start_: First ET day (None for the first stored day)
+            end_: Last ET day (None for the last stored day)
+            horizon_: Label horizon in bars (see price_gap_labels)
+            threshold_: Relative no-change band (see price_gap_labels)
+            features_: Feature columns, defaults to the ones the KNN model is trained on
+            keep_flat_: Keep rows labeled 0 (the training functions drop them)
+
+        Returns:
+            (X float32 array, y int8 array, index of the kept rows)
+        """
+        features = feature_columns if features_ is None else features_
+        data = self.read(symbol_, start_, end_)
+        X = np.empty((len(data), len(features)), dtype=np.float32)
+        for position, feature in enumerate(features):
+            X[:, position] = data[feature].to_numpy(dtype=np.float64)
+        labels = price_gap_labels(data['open'].to_numpy(dtype=np.float64), data['close'].to_numpy(dtype=np.float64),
+                                  horizon_=horizon_, threshold_=threshold_)
+        keep = ~np.isnan(labels) & ~np.isnan(X).any(axis=1)
+        if not keep_flat_:
+            keep &= labels != 0
+        return X[keep], labels[keep].astype(np.int8), data.index[keep]
@@ -3,9 +3,9 @@ import pandas as pd
 def RSI_MA_Crossover(data_: pd.DataFrame) -> str:
     # Get indicators 
     rsi_prev, rsi_curr = data_["RSI"].tail(2)
-    close = data_["close"].tail(1)
-    ma40 = data_["MA40"].tail(1)
-    ma80 = data_["MA80"].tail(1)
+    close = data_["close"].iloc[-1]
+    ma40 = data_["MA40"].iloc[-1]
+    ma80 = data_["MA80"].iloc[-1]
     # Buy
     if(rsi_prev < 30 and 
     rsi_curr >= 30 and 
@@ -0,0 +1,334 @@
+import math
+import sys
+from collections import deque
+import numpy as np
+
+# Streaming versions of the indicators computed by add_technical_indicators.
+# Each class keeps just enough running state to produce the next value in O(1)
+# when a new bar is appended, and reproduces the arithmetic pandas uses
+# underneath pandas_ta (rolling().mean() for SMA, ewm(alpha=1/length).mean()
+# for the RMA behind ATR and RSI) so the values match the DataFrame path.
+
+NaN = float("nan")
+
+
+class StreamingSMA:
+    """
+    Simple moving average, equivalent to pandas_ta sma / Series.rolling(length).mean().
+
+    Mirrors the compensated add/remove sums of pandas' rolling mean so the
+    streamed value is the same float the DataFrame path produces.
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self._window = deque()
+        self._sum = 0.0
+        self._compensation_add = 0.0
+        self._compensation_remove = 0.0
+        self._nobs = 0
+        self._neg_ct = 0
+        self._num_consecutive_same_value = 0
+        self._prev_value = None
+        self.value = NaN
+
+    def update(self, value: float) -> float:
+        if self._prev_value is None:
+            self._prev_value = value
+
+        self._window.append(value)
+        if len(self._window) > self.length:
+            self._remove(self._window.popleft())
+        self._add(value)
+
+        if self._nobs >= self.length and self._nobs > 0:
+            result = self._sum / self._nobs
+            if self._num_consecutive_same_value >= self._nobs:
+                result = self._prev_value
+            elif self._neg_ct == 0 and result < 0:
+                result = 0.0
+            elif self._neg_ct == self._nobs and result > 0:
+                result = 0.0
+        else:
+            result = NaN
+        self.value = result
+        return result
+
+    def _add(self, value: float) -> None:
+        if value != value:
+            return
+        self._nobs += 1
+        y = value - self._compensation_add
+        t = self._sum + y
+        self._compensation_add = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, value) < 0:
+            self._neg_ct += 1
+        if value == self._prev_value:
+            self._num_consecutive_same_value += 1
+        else:
+            self._num_consecutive_same_value = 1
+        self._prev_value = value
+
+    def _remove(self, value: float) -> None:
+        if value != value:
+            return
+        self._nobs -= 1
+        y = -value - self._compensation_remove
+        t = self._sum + y
+        self._compensation_remove = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, value) < 0:
+            self._neg_ct -= 1
+
+
+class StreamingRMA:
+    """
+    Wilder's moving average as pandas_ta computes it (rma), i.e.
+    Series.ewm(alpha=1/length, min_periods=length).mean() with adjust=True.
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self._old_wt_factor = 1.0 - 1.0 / length
+        self._old_wt = 1.0
+        self._weighted = NaN
+        self._nobs = 0
+        self.value = NaN
+
+    def update(self, value: float) -> float:
+        is_observation = value == value
+        self._nobs += is_observation
+        if self._weighted == self._weighted:
+            self._old_wt *= self._old_wt_factor
+            if is_observation:
+                if self._weighted != value:
+                    self._weighted = (self._old_wt * self._weighted + value) / (self._old_wt + 1.0)
+                self._old_wt += 1.0
+        elif is_observation:
+            self._weighted = value
+
+        self.value = self._weighted if self._nobs >= self.length else NaN
+        return self.value
+
+
+class StreamingATR:
+    """Average True Range (pandas_ta atr with the default rma smoothing)."""
+
+    def __init__(self, length: int = 14):
+        self.length = length
+        self._rma = StreamingRMA(length)
+        self._prev_close = None
+        self.value = NaN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self._prev_close is None:
+            true_range = NaN  # pandas_ta blanks the first true range (no previous close)
+        else:
+            high_low = high - low
+            if high_low == 0:
+                # pandas_ta non_zero_range nudges every range in the frame once any bar is flat;
+                # per bar is the closest a stream can get (at most an ulp apart)
+                high_low += sys.float_info.epsilon
+            true_range = max(abs(high_low), abs(high - self._prev_close), abs(self._prev_close - low))
+        self._prev_close = close
+        self.value = self._rma.update(true_range)
+        return self.value
+
+
+class StreamingRSI:
+    """Relative Strength Index (pandas_ta rsi with rma smoothing)."""
+
+    def __init__(self, length: int = 14):
+        self.length = length
+        self._gain = StreamingRMA(length)
+        self._loss = StreamingRMA(length)
+        self._prev_close = None
+        self.value = NaN
+
+    def update(self, close: float) -> float:
+        if self._prev_close is None:
+            change = NaN
+        else:
+            change = close - self._prev_close
+        self._prev_close = close
+
+        positive = change if not change < 0 else 0.0
+        negative = change if not change > 0 else 0.0
+        gain = self._gain.update(positive)
+        loss = abs(self._loss.update(negative))
+
+        denominator = gain + loss
+        if denominator != denominator or denominator == 0:
+            self.value = NaN
+        else:
+            self.value = 100 * gain / denominator
+        return self.value
+
+
+class StreamingIndicators:
+    """
+    Running ATR(20), RSI(14), MA40, MA80 and MA160 state for one symbol.
+
+    Feeding bars in chronological order gives the same values
+    add_technical_indicators computes for the same history, one bar at a time.
+    """
+
+    columns = ['ATR', 'RSI', 'MA40', 'MA80', 'MA160']
+
+    def __init__(self):
+        self.atr = StreamingATR(length=20)
+        self.rsi = StreamingRSI(length=14)
+        self.ma40 = StreamingSMA(length=40)
+        self.ma80 = StreamingSMA(length=80)
+        self.ma160 = StreamingSMA(length=160)
+
+    def update(self, high: float, low: float, close: float) -> dict:
+        return {
+            'ATR': self.atr.update(high, low, close),
+            'RSI': self.rsi.update(close),
+            'MA40': self.ma40.update(close),
+            'MA80': self.ma80.update(close),
+            'MA160': self.ma160.update(close)
+        }
+
+    def values(self) -> dict:
+        return {
+            'ATR': self.atr.value,
+            'RSI': self.rsi.value,
+            'MA40': self.ma40.value,
+            'MA80': self.ma80.value,
+            'MA160': self.ma160.value
+        }
+
+
+# Batched versions for many symbols at once. They take aligned 2D arrays
+# (rows are timestamps, columns are symbols, NaN where a symbol has no bar) and
+# compute every symbol in one vectorized pass: the three SMAs from one
+# cumulative sum and the RMA recurrence as a linear filter. Each column gives
+# what add_technical_indicators returns for that symbol's own bars (to within
+# float rounding), however its missing rows are spread.
+
+indicator_lengths = {'ATR': 20, 'RSI': 14, 'MA40': 40, 'MA80': 80, 'MA160': 160}
+
+
+def _rma_from_second_bar(values_: np.ndarray, length_: int) -> np.ndarray:
+    # ewm(alpha=1/length, adjust=True, min_periods=length).mean() of rows of values_ whose
+    # first entry is NaN (no previous close) and which have no gaps before their last bar.
+    # The average is a ratio of two decaying sums, S_t = x_t + (1 - alpha) * S_t-1 over the
+    # values and W_t the same over their weights, and W_t only depends on the row position
+    # scipy.signal takes about a second to import and only the batch path needs it
+    from scipy.signal import lfilter
+
+    decay = 1.0 - 1.0 / length_
+    values_[:, 0] = 0.0
+    weighted_sums = lfilter([1.0], [1.0, -decay], values_, axis=1)
+    observations = np.arange(values_.shape[1])
+    weights = (1.0 - decay ** observations) / (1.0 - decay)
+    weights[:length_] = np.nan # fewer than length_ observations
+    weighted_sums /= weights
+    return weighted_sums
+
+
+def _batch_indicators_compacted(high_: np.ndarray, low_: np.ndarray, close_: np.ndarray) -> dict:
+    # One row per symbol (time along axis 1), each starting at column 0 with no gaps,
+    # like a per-symbol DataFrame; columns after a symbol's last bar are NaN
+    rows, bars = close_.shape
+    high_low = high_ - low_
+    flat = (high_low == 0).any(axis=1)
+    high_low[flat] += sys.float_info.epsilon # pandas_ta non_zero_range, per symbol
+    np.abs(high_low, out=high_low)
+    true_range = np.empty((rows, bars))
+    true_range[:, 0] = np.nan
+    high_close = np.abs(high_[:, 1:] - close_[:, :-1])
+    low_close = np.abs(close_[:, :-1] - low_[:, 1:])
+    np.maximum(high_low[:, 1:], high_close, out=true_range[:, 1:])
+    np.maximum(true_range[:, 1:], low_close, out=true_range[:, 1:])
+    del high_low, high_close, low_close
+
+    results = {'ATR': _rma_from_second_bar(true_range, indicator_lengths['ATR']), 'RSI': relative_strength_index(close_, indicator_lengths['RSI'])}
+    averages = moving_averages(close_, [indicator_lengths[column] for column in ('MA40', 'MA80', 'MA160')])
+    for column in ('MA40', 'MA80', 'MA160'):
+        results[column] = averages[indicator_lengths[column]]
+    return results
+
+
+def relative_strength_index(close_: np.ndarray, length_: int = 14) -> np.ndarray:
+    """
+    RSI (pandas_ta rsi) of rows of closes, one row per symbol with time along axis 1.
+
+    Each row must start at column 0 with no gaps before its last bar (NaN after it).
+    """
+    rows, bars = close_.shape
+    change = np.empty((rows, bars))
+    change[:, 0] = np.nan
+    np.subtract(close_[:, 1:], close_[:, :-1], out=change[:, 1:])
+    gain = _rma_from_second_bar(np.maximum(change, 0.0), length_)
+    loss = _rma_from_second_bar(np.minimum(change, 0.0), length_)
+    np.abs(loss, out=loss)
+    loss += gain
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = np.multiply(gain, 100)
+        rsi /= loss
+    return rsi
+
+
+def moving_averages(close_: np.ndarray, lengths_: list) -> dict:
+    """
+    Simple moving averages (pandas_ta sma) of rows of closes for several lengths, sharing one cumulative sum.
+
+    Rows are laid out as for relative_strength_index.
+
+    Returns:
+        Dictionary of {length: averages shaped like close_}
+    """
+    rows, bars = close_.shape
+    # Cumulative sums of the distance from each symbol's first close keep the totals small
+    reference = close_[:, :1]
+    sums = np.cumsum(close_ - reference, axis=1)
+    results = {}
+    for length in lengths_:
+        averages = np.full((rows, bars), np.nan)
+        if length <= bars:
+            averages[:, length - 1] = sums[:, length - 1]
+            np.subtract(sums[:, length:], sums[:, :-length], out=averages[:, length:])
+            averages /= length
+            averages += reference
+        results[length] = averages
+    return results
+
+
+def batch_indicators(high_: np.ndarray, low_: np.ndarray, close_: np.ndarray, chunk_symbols_: int = 64) -> dict:
+    """
+    ATR(20), RSI(14), MA40, MA80 and MA160 for many symbols at once.
+
+    Args:
+        high_: 2D array of highs, one row per timestamp and one column per symbol (NaN where a symbol has no bar)
+        low_: Lows, same shape
+        close_: Closes, same shape
+        chunk_symbols_: Symbols processed together (bounds the temporary arrays)
+
+    Returns:
+        Dictionary of {'ATR', 'RSI', 'MA40', 'MA80', 'MA160'} float64 arrays shaped like close_
+    """
+    high_, low_, close_ = (np.asarray(values, dtype=np.float64) for values in (high_, low_, close_))
+    # Column-major so each symbol's output is written contiguously
+    results = {column: np.empty(close_.shape, order="F") for column in StreamingIndicators.columns}
+    for first in range(0, close_.shape[1], chunk_symbols_):
+        columns = slice(first, first + chunk_symbols_)
+        # Work symbol-major so every series is contiguous
+        high, low, close = (np.ascontiguousarray(values[:, columns].T) for values in (high_, low_, close_))
+        valid = ~np.isnan(close)
+        if valid.all():
+            for column, values in _batch_indicators_compacted(high, low, close).items():
+                results[column][:, columns] = values.T
+            continue
+        # Move each symbol's bars to the front (keeping their order), compute, and move them back
+        order = np.argsort(~valid, axis=1, kind="stable")
+        compacted = (np.take_along_axis(values, order, axis=1) for values in (high, low, close))
+        for column, values in _batch_indicators_compacted(*compacted).items():
+            restored = np.empty_like(values)
+            np.put_along_axis(restored, order, values, axis=1)
+            restored[~valid] = np.nan
+            results[column][:, columns] = restored.T
+    return results
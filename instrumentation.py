@@ -0,0 +1,422 @@
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Lightweight instrumentation for the live loop. Code on the hot path wraps
+# each stage in `with metrics.stage("fetch"):` and each broker/data API call
+# in `with metrics.api_call("get_stock_bars"):`. While metrics are disabled
+# (the default) both return one shared no-op context manager, so the cost is
+# a method call. When enabled they feed fixed-bucket latency histograms, API
+# call and error counters, the bar staleness gauge and named gauges (set_gauge),
+# which can be served as Prometheus text (MetricsServer) or written to a rolling
+# JSON file (JsonMetricsWriter). CycleProfiler captures cProfile stats or
+# sampled stacks for a chosen number of cycles.
+
+# Upper bounds in seconds; observations above the last bound land in +Inf
+latency_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+staleness_buckets = (1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0, 3600.0)
+
+_disabled = nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus layout (counts per bucket, sum, count, plus max)."""
+
+    def __init__(self, buckets_: tuple = latency_buckets):
+        self.buckets = buckets_
+        self.counts = [0] * (len(buckets_) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value_: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value_)] += 1
+        self.sum += value_
+        self.count += 1
+        if value_ > self.max:
+            self.max = value_
+
+    def quantile(self, quantile_: float) -> float:
+        """Upper bound of the bucket holding the quantile_ observation (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        target = quantile_ * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return min(self.buckets[position], self.max) if position < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max
+        }
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics_, name_: str):
+        self.metrics = metrics_
+        self.name = name_
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _ApiCallTimer(_StageTimer):
+    __slots__ = ()
+
+    def __enter__(self):
+        self.metrics.count_call(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe_api_call(self.name, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+class Metrics:
+    """
+    Per-stage latency histograms, API call and error counters and bar staleness for the live loop.
+
+    Thread safe, so stages and API calls can be recorded from worker threads (e.g. the
+    OrderManager's executor or asyncio.to_thread calls).
+    """
+
+    def __init__(self, enabled_: bool = False):
+        self.enabled = enabled_
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages = {}
+            self.api_latency = {}
+            self.api_calls = Counter()
+            self.api_errors = Counter()
+            self.staleness = Histogram(staleness_buckets)
+            self.last_staleness = None
+            self.gauges = {}
+            self.cycles = 0
+            self._cycle = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def stage(self, name_: str):
+        """Context manager timing one stage (a no-op while disabled)."""
+        return _StageTimer(self, name_) if self.enabled else _disabled
+
+    def api_call(self, name_: str):
+        """Context manager counting and timing one API call; an exception leaving it counts as an error."""
+        return _ApiCallTimer(self, name_) if self.enabled else _disabled
+
+    def observe_stage(self, name_: str, seconds_: float, cycle_: bool = True) -> None:
+        # Background work (e.g. model updates) passes cycle_=False to stay out of the cycle breakdown
+        with self._lock:
+            histogram = self.stages.get(name_)
+            if histogram is None:
+                histogram = self.stages[name_] = Histogram()
+            histogram.observe(seconds_)
+            if cycle_:
+                self._cycle[name_] = self._cycle.get(name_, 0.0) + seconds_
+
+    def set_gauge(self, name_: str, value_: float) -> None:
+        """Record the current value of a named gauge (e.g. model memory in bytes)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name_] = value_
+
+    def count_call(self, name_: str) -> None:
+        with self._lock:
+            self.api_calls[name_] += 1
+
+    def observe_api_call(self, name_: str, seconds_: float, error_: bool = False) -> None:
+        with self._lock:
+            histogram = self.api_latency.get(name_)
+            if histogram is None:
+                histogram = self.api_latency[name_] = Histogram()
+            histogram.observe(seconds_)
+            if error_:
+                self.api_errors[name_] += 1
+
+    def observe_bar_staleness(self, bar_close_: float, now_: float = None) -> None:
+        """
+        Record how old the newest bar is when the strategy acts on it.
+
+        Args:
+            bar_close_: Epoch seconds the newest bar closed (its timestamp plus one minute)
+            now_: Current epoch seconds (default time.time())
+        """
+        if not self.enabled:
+            return
+        staleness = (time.time() if now_ is None else now_) - bar_close_
+        with self._lock:
+            self.staleness.observe(max(staleness, 0.0))
+            self.last_staleness = staleness
+
+    def end_cycle(self) -> dict:
+        """
+        Close the current cycle.
+
+        Returns:
+            Seconds spent in each stage during the cycle
+        """
+        with self._lock:
+            cycle = self._cycle
+            self._cycle = {}
+            if self.enabled:
+                self.cycles += 1
+        return cycle
+
+    def snapshot(self) -> dict:
+        """Current metrics as a JSON-serializable dictionary (latencies in seconds)."""
+        with self._lock:
+            return {
+                'cycles': self.cycles,
+                'stages': {name: histogram.summary() for name, histogram in self.stages.items()},
+                'api_calls': dict(self.api_calls),
+                'api_errors': dict(self.api_errors),
+                'api_latency': {name: histogram.summary() for name, histogram in self.api_latency.items()},
+                'bar_staleness_seconds': self.last_staleness,
+                'bar_staleness': self.staleness.summary(),
+                'gauges': dict(self.gauges)
+            }
+
+    def prometheus_text(self) -> str:
+        """Current metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram_lines(metric_: str, label_: str, histograms_: dict) -> None:
+            lines.append(f"# TYPE {metric_} histogram")
+            for name, histogram in sorted(histograms_.items()):
+                labels = f'{label_}="{name}",' if label_ else ""
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric_}_bucket{{{labels}le="{le}"}} {cumulative}')
+                labels = f'{{{labels.rstrip(",")}}}' if labels else ""
+                lines.append(f"{metric_}_sum{labels} {histogram.sum!r}")
+                lines.append(f"{metric_}_count{labels} {histogram.count}")
+
+        with self._lock:
+            histogram_lines("trading_stage_seconds", "stage", self.stages)
+            histogram_lines("trading_api_call_seconds", "call", self.api_latency)
+            histogram_lines("trading_bar_staleness_seconds", "", {'': self.staleness})
+            for metric, counter in (("trading_api_calls_total", self.api_calls), ("trading_api_errors_total", self.api_errors)):
+                lines.append(f"# TYPE {metric} counter")
+                for name, count in sorted(counter.items()):
+                    lines.append(f'{metric}{{call="{name}"}} {count}')
+            lines.append("# TYPE trading_cycles_total counter")
+            lines.append(f"trading_cycles_total {self.cycles}")
+            if self.last_staleness is not None:
+                lines.append("# TYPE trading_last_bar_staleness_seconds gauge")
+                lines.append(f"trading_last_bar_staleness_seconds {self.last_staleness!r}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE trading_{name} gauge")
+                lines.append(f"trading_{name} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared instance the live loop modules record into
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = self.server.metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(self.server.metrics.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Serves /metrics (Prometheus text) and /metrics.json on a local port from a background thread."""
+
+    def __init__(self, metrics_: Metrics = metrics, host_: str = "127.0.0.1", port_: int = 9100):
+        """
+        Args:
+            metrics_: Metrics to serve
+            host_: Interface to listen on (local only by default)
+            port_: Port to listen on (0 picks a free one)
+        """
+        self.metrics = metrics_
+        self.host = host_
+        self.port = port_
+        self.server = None
+
+    def start(self) -> str:
+        """Start serving and return the metrics URL."""
+        self.server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.metrics = self.metrics
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class JsonMetricsWriter:
+    """Rewrites a JSON file after every cycle with the metrics snapshot and the last few cycles' stage timings."""
+
+    def __init__(self, path_: str, metrics_: Metrics = metrics, history_: int = 60):
+        """
+        Args:
+            path_: File to write (replaced atomically, so readers never see a partial file)
+            metrics_: Metrics to write
+            history_: Number of recent cycles kept in the file
+        """
+        self.path = path_
+        self.metrics = metrics_
+        self.history = deque(maxlen=history_)
+
+    def write(self, cycle_: dict) -> None:
+        """
+        Add one cycle's record and rewrite the file.
+
+        Args:
+            cycle_: Cycle record, e.g. the stage timings from Metrics.end_cycle plus the prediction
+        """
+        self.history.append({'time': time.time(), **cycle_})
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as handle:
+            json.dump({'updated': time.time(), 'metrics': self.metrics.snapshot(), 'cycles': list(self.history)}, handle)
+        os.replace(temporary, self.path)
+
+
+class CycleProfiler:
+    """
+    Profiles the next cycles_ loop cycles, then writes the result and switches itself off.
+
+    mode_ "cprofile" records every call with cProfile (accurate counts, higher overhead) and
+    writes pstats data to output_ plus a top-25 cumulative listing to stdout. mode_ "sample"
+    samples the looping thread's stack every interval_ seconds from a background thread
+    (low overhead) and writes folded stacks ("a;b;c count" lines, flamegraph input) to output_.
+    """
+
+    def __init__(self, cycles_: int, output_: str = "profile.out", mode_: str = "cprofile", interval_: float = 0.001):
+        """
+        Args:
+            cycles_: Number of cycles to profile
+            output_: File the profile is written to
+            mode_: "cprofile" or "sample"
+            interval_: Seconds between stack samples in "sample" mode
+        """
+        if mode_ not in ("cprofile", "sample"):
+            raise ValueError(f"Unknown profiler mode: {mode_}")
+        self.remaining = cycles_
+        self.output = output_
+        self.mode = mode_
+        self.interval = interval_
+        self.profile = cProfile.Profile() if mode_ == "cprofile" else None
+        self.samples = Counter()
+        self._sampling = threading.Event()
+        self._thread_id = None
+
+    @property
+    def active(self) -> bool:
+        return self.remaining > 0
+
+    def cycle(self):
+        """Context manager wrapped around one loop cycle (a no-op once the capture is done)."""
+        return _ProfiledCycle(self) if self.remaining > 0 else _disabled
+
+    def _sample(self) -> None:
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def _start(self) -> None:
+        if self.profile is not None:
+            self.profile.enable()
+        else:
+            self._thread_id = threading.get_ident()
+            self._sampling.set()
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    def _stop(self) -> None:
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            self._sampling.clear()
+            self._sampler.join()
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.write()
+
+    def write(self) -> None:
+        if self.profile is not None:
+            self.profile.dump_stats(self.output)
+            listing = io.StringIO()
+            pstats.Stats(self.profile, stream=listing).sort_stats("cumulative").print_stats(25)
+            print(listing.getvalue())
+        else:
+            with open(self.output, "w") as handle:
+                for stack, count in self.samples.most_common():
+                    handle.write(f"{stack} {count}\n")
+        print(f"Profile written to {self.output}")
+
+
+class _ProfiledCycle:
+    __slots__ = ("profiler",)
+
+    def __init__(self, profiler_: CycleProfiler):
+        self.profiler = profiler_
+
+    def __enter__(self):
+        self.profiler._start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler._stop()
+        return False
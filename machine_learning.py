@@ -1,19 +1,46 @@
 # Lorenz Formula
 # RSI-MA Crossover
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+import numpy as np
 import pandas as pd
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score
-import matplotlib.pyplot as plt
 import joblib
+from typing import TYPE_CHECKING
 
+from model_bundle import (
+    feature_columns,
+    bundle_version,
+    ModelBundle,
+    ScalerArrays,
+    encode_labels,
+    load_model_bundle,
+    load_predictor_arrays,
+    load_knn_model
+)
+
+# The live loop only loads models, so scikit-learn and the plotting dependencies
+# (matplotlib, RandomForestClassifier, train_test_split, the sklearn metrics) are
+# imported inside the functions that train with them. The loaders live in
+# model_bundle, which the live loop imports instead of this module.
+if TYPE_CHECKING:
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.preprocessing import StandardScaler
+
+# Rows every training function keeps: no NaN (indicator warm-up, unlabeled last row) and a nonzero label
+def clean_training_data(data_: pd.DataFrame) -> pd.DataFrame:
+    clean_data_ = data_.dropna() # Remove NaN
+    return clean_data_[clean_data_['Higher/Lower'] != 0] # Remove no change 0 classifier
     
 def train_and_test_KNN(data_: pd.DataFrame, neighbors_: int) -> None:
-    clean_data_ = data_.dropna() # Remove NaN
-    clean_data_ = clean_data_[clean_data_['Higher/Lower'] != 0] # Remove no change 0 classifier 
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score
+
+    clean_data_ = clean_training_data(data_) # Remove NaN and no change 0 classifier rows
 
-    features = ['close', 'high', 'low', 'open', 'volume', 'ATR', 'RSI', 'MA40', 'MA80', 'MA160'] # Define what features to look at 
+    features = feature_columns # Define what features to look at 
     # Separate data into X,y/train,test
     X = clean_data_[features]
     y = clean_data_['Higher/Lower']
@@ -32,10 +59,14 @@ def train_and_test_KNN(data_: pd.DataFrame, neighbors_: int) -> None:
 
 
 def train_and_test_RF(data_: pd.DataFrame) -> None:
-    clean_data_ = data_.dropna() # Remove NaN
-    clean_data_ = clean_data_[clean_data_['Higher/Lower'] != 0] # Remove no change 0 classifier 
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score
+    import matplotlib.pyplot as plt
 
-    features = ['close', 'high', 'low', 'open', 'volume', 'ATR', 'RSI', 'MA40', 'MA80', 'MA160'] # Define what features to look at 
+    clean_data_ = clean_training_data(data_) # Remove NaN and no change 0 classifier rows
+
+    features = feature_columns # Define what features to look at 
     # Separate data into X,y/train,test
     X = clean_data_[features]
     y = clean_data_['Higher/Lower']
@@ -75,12 +106,15 @@ def train_and_save_knn_model(data_: pd.DataFrame, neighbors_: int = 5, model_fil
         neighbors_: Number of neighbors for KNN (default: 5)
         model_filename: Filename to save the model (default: "knn_model.pkl")
     """
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score
+
     # Clean the data
-    clean_data_ = data_.dropna()  # Remove NaN
-    clean_data_ = clean_data_[clean_data_['Higher/Lower'] != 0]  # Remove no change 0 classifier 
+    clean_data_ = clean_training_data(data_) # Remove NaN and no change 0 classifier rows
 
     # Define features
-    features = ['close', 'high', 'low', 'open', 'volume', 'ATR', 'RSI', 'MA40', 'MA80', 'MA160']
+    features = feature_columns
     
     # Separate data into X, y
     X = clean_data_[features]
@@ -106,41 +140,23 @@ def train_and_save_knn_model(data_: pd.DataFrame, neighbors_: int = 5, model_fil
     print(f"Model saved as: {model_filename}")
 
 
-def load_knn_model(model_filename: str = "knn_model.pkl") -> KNeighborsClassifier:
-    """
-    Load a saved KNN model from disk.
-    
-    Args:
-        model_filename: Filename of the saved model (default: "knn_model.pkl")
-        
-    Returns:
-        Loaded KNeighborsClassifier model
-    """
-    try:
-        model = joblib.load(model_filename)
-        print(f"Model loaded successfully from: {model_filename}")
-        return model
-    except FileNotFoundError:
-        print(f"Error: Model file '{model_filename}' not found.")
-        return None
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        return None
-
-
 def predict_latest_candlestick(model, data_frame: pd.DataFrame) -> int:
     """
     Predict the expected output for the latest candlestick.
     
     Args:
-        model: Trained KNN model
+        model: Trained KNN model or a ModelBundle
         data_frame: DataFrame with technical indicators
         
     Returns:
         Prediction (-1 for lower, 1 for higher)
     """
+    if isinstance(model, ModelBundle):
+        model.check_columns(data_frame.columns)
+        return model.predict(data_frame[model.features].iloc[-1:].values)[0]
+
     # Define the features used in training
-    features = ['close', 'high', 'low', 'open', 'volume', 'ATR', 'RSI', 'MA40', 'MA80', 'MA160']
+    features = feature_columns
     
     # Get the latest candlestick data (last row)
     latest_data = data_frame[features].iloc[-1:].values  # Keep as 2D array for prediction
@@ -149,3 +165,124 @@ def predict_latest_candlestick(model, data_frame: pd.DataFrame) -> int:
     prediction = model.predict(latest_data)[0]  # Get the single prediction value
     
     return prediction
+
+
+def training_fingerprint(X: np.ndarray, y: np.ndarray, features_: list) -> str:
+    """SHA-256 over the feature names and the exact training arrays."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(features_)).encode())
+    digest.update(np.ascontiguousarray(X).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    return digest.hexdigest()
+
+
+def save_model_bundle(model, scaler: "StandardScaler", X: np.ndarray, y: np.ndarray, bundle_dir: str, features_: list = None,
+                      compact_predictor_=None, scaled_X_: np.ndarray = None) -> ModelBundle:
+    """
+    Save a trained model, its scaler and feature list as a bundle directory.
+
+    Args:
+        model: Trained estimator (fitted on scaler-transformed features)
+        scaler: Fitted StandardScaler, or None if the model uses raw features
+        X: Unscaled features the model was fitted on (the fingerprint, and a KNN model's predictor.npz rows)
+        y: Labels the model was fitted on
+        bundle_dir: Directory to write the bundle to (created if missing)
+        features_: Feature columns in training order
+        compact_predictor_: CompactKNN built from the same training set, which load_predictor then prefers
+        scaled_X_: X after the scaler, when already computed for training
+
+    Returns:
+        The saved ModelBundle
+
+    Raises:
+        ValueError: If a KNN model was not fitted on X and y
+    """
+    import sklearn
+    from sklearn.neighbors import KNeighborsClassifier
+
+    features = feature_columns if features_ is None else features_
+    os.makedirs(bundle_dir, exist_ok=True)
+    manifest = {
+        'bundle_version': bundle_version,
+        'model_type': type(model).__name__,
+        'features': list(features),
+        'fingerprint': training_fingerprint(X, y, features),
+        'training_rows': int(len(X)),
+        'sklearn_version': sklearn.__version__,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+    joblib.dump({'model': model, 'scaler': scaler}, os.path.join(bundle_dir, "model.joblib"))
+    if isinstance(model, KNeighborsClassifier):
+        # The rows and labels the model was fitted on, as it keeps them: scaled, with labels as indices into classes_
+        training_data = (X if scaler is None else scaler.transform(X)) if scaled_X_ is None else scaled_X_
+        if len(training_data) != model.n_samples_fit_ or len(y) != model.n_samples_fit_:
+            raise ValueError(f"The KNN model was fitted on {model.n_samples_fit_} rows, but {len(training_data)} rows "
+                             f"and {len(y)} labels were given for its predictor arrays")
+        np.savez(
+            os.path.join(bundle_dir, "predictor.npz"),
+            training_data=training_data,
+            labels=encode_labels(model.classes_, y),
+            classes=model.classes_,
+            n_neighbors=model.n_neighbors,
+            weights=model.weights,
+            metric=model.effective_metric_,
+            mean=np.empty(0) if scaler is None else scaler.mean_,
+            scale=np.empty(0) if scaler is None else scaler.scale_
+        )
+        manifest['predictor_arrays'] = "predictor.npz"
+    if compact_predictor_ is not None:
+        compact_predictor_.save(os.path.join(bundle_dir, "compact_knn.npz"))
+        manifest['compact_predictor'] = "compact_knn.npz"
+        manifest['compact_rows'] = int(len(compact_predictor_.vectors))
+    with open(os.path.join(bundle_dir, "manifest.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    print(f"Model bundle saved in: {bundle_dir}")
+    return ModelBundle(model, scaler, features, manifest)
+
+
+def train_and_save_knn_bundle(data_: pd.DataFrame, neighbors_: int = 5, bundle_dir: str = "knn_bundle", condense_: str = None,
+                              prototypes_: int = 20_000) -> ModelBundle:
+    """
+    Train a KNN model on standardized features and save it as a bundle.
+
+    Scaling keeps large-valued columns such as volume from dominating the distance metric.
+    The scaler is fitted on the training split only.
+
+    Args:
+        data_: DataFrame containing the training data
+        neighbors_: Number of neighbors for KNN (default: 5)
+        bundle_dir: Directory to save the bundle to (default: "knn_bundle")
+        condense_: Also save a CompactKNN condensed by "clustering" or "selection" (see compact_knn),
+                   which the live loop then loads instead of the full training set
+        prototypes_: Training rows the condensation keeps
+    """
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score
+
+    # Clean the data
+    clean_data_ = clean_training_data(data_) # Remove NaN and no change 0 classifier rows
+
+    X = clean_data_[feature_columns].to_numpy(dtype=np.float64)
+    y = clean_data_['Higher/Lower'].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    scaler = StandardScaler().fit(X_train)
+    scaled_X_train = scaler.transform(X_train)
+    knn = KNeighborsClassifier(n_neighbors=neighbors_)
+    knn.fit(scaled_X_train, y_train)
+
+    y_pred = knn.predict(scaler.transform(X_test))
+    print(f"KNN Model trained with {neighbors_} neighbors on scaled features")
+    print(f"Accuracy: {accuracy_score(y_test, y_pred):.4f}")
+    print(classification_report(y_test, y_pred))
+
+    compact = None
+    if condense_ is not None:
+        from compact_knn import build_compact_knn
+        compact = build_compact_knn(scaled_X_train, y_train, condense_=condense_, prototypes_=prototypes_,
+                                    n_neighbors_=neighbors_, scaler_=scaler)
+        print(f"Compact KNN ({condense_}, {len(compact.vectors)} rows) accuracy: {accuracy_score(y_test, compact.predict(X_test)):.4f}")
+
+    return save_model_bundle(knn, scaler, X_train, y_train, bundle_dir, compact_predictor_=compact, scaled_X_=scaled_X_train)
@@ -1,40 +1,33 @@
+# Training lives in machine_learning and is not imported here (the predictor is loaded
+# through model_bundle); the --async and --stream runners and online learning import
+# their modules when they are selected, so a restart of the default loop only loads
+# what inference and order placement need
+import asyncio
 import os
-import pandas as pd
+import sys
+import time
 from dotenv import load_dotenv
 
 from alpaca_data import (
     setup_historical_client, 
-    retrieve_stock_bars,
-    data_frame_from_stock_bars,
-    retrieve_latest,
-    filter_regular_hours,
-    add_technical_indicators,
     classify_price_gap
 )
-
-from machine_learning import (
-    train_and_save_knn_model,
-    load_knn_model,
-    predict_latest_candlestick
-)
-import numpy as np
-
+from bar_buffer import BarBuffer
+from bar_store import BarStore
+from predictor import load_predictor, KNNPredictor
+from instrumentation import metrics, MetricsServer, JsonMetricsWriter, CycleProfiler
 from alpaca_paper_trading import (
     setup_client, 
-    place_market_buy_order, 
     place_limit_buy_order, 
-    place_market_sell_order,
     place_limit_sell_order,
     get_account_info,
-    get_positions
+    OrderManager
 )
 
-import time
-from alpaca.data.timeframe import TimeFrameUnit
-
 load_dotenv("environment.env")
 
-def main() -> None:
+# Creates the clients, predictor and bar buffer shared by the sync and asyncio loops
+def setup_live_trading(symbol_: str = "TSLA"):
     # Get keys from environment
     alpaca_api_key = os.getenv("ALPACA_API_KEY")
     alpaca_secret = os.getenv("ALPACA_SECRET")
@@ -43,79 +36,201 @@ def main() -> None:
     # Setup clients
     alpaca_client = setup_client(key_=alpaca_api_key, secret_=alpaca_secret, paper_=True, base_url_=alpaca_base_url)
     alpaca_historical_client = setup_historical_client(key_=alpaca_api_key, secret_=alpaca_secret, base_url_=alpaca_base_url, raw_data_= True)
-    # Load trained model
-    model = load_knn_model(model_filename="knn_model1.pkl")
+    # Load trained model, preferring a scaled model bundle when one has been saved
+    # Build the neighbor index once and warm it up before the first live prediction
+    predictor = load_predictor(bundle_dir="knn_bundle", model_filename="knn_model1.pkl")
+    # Regular-hours bars with indicators, topped up with only the new bars each minute
+    # Every fetched bar is also appended to the local store used for training and backtests
+    bar_store = BarStore(root_="bar_data")
+    bar_buffer = BarBuffer(client_=alpaca_historical_client, symbol_=symbol_, max_bars_=1000, limit_=1000, store_=bar_store)
+    return alpaca_client, bar_buffer, predictor
+
+# Turns on the metrics exports and cycle profiler configured in environment.env
+# METRICS_PORT serves Prometheus text on localhost, METRICS_JSON names a rolling JSON file,
+# PROFILE_CYCLES profiles that many cycles (PROFILE_MODE cprofile or sample, PROFILE_OUTPUT file)
+def setup_instrumentation():
+    metrics_port = os.getenv("METRICS_PORT")
+    metrics_json = os.getenv("METRICS_JSON")
+    profile_cycles = int(os.getenv("PROFILE_CYCLES", "0"))
+
+    json_writer = None
+    if metrics_port or metrics_json:
+        metrics.enable()
+    if metrics_port:
+        print(f"Serving metrics at {MetricsServer(port_=int(metrics_port)).start()}")
+    if metrics_json:
+        json_writer = JsonMetricsWriter(path_=metrics_json)
+    profiler = CycleProfiler(cycles_=profile_cycles, output_=os.getenv("PROFILE_OUTPUT", "profile.out"),
+                             mode_=os.getenv("PROFILE_MODE", "cprofile"))
+    return json_writer, profiler
+
+# ONLINE_LEARNING=1 keeps training the loaded KNN model on live bars in the background
+# (ONLINE_MAX_ROWS bounds its training set, ONLINE_MIN_INTERVAL spaces out updates, and the index is
+# rebuilt every ONLINE_REBUILD_ROWS new rows or ONLINE_REBUILD_SECONDS, whichever comes first)
+def setup_online_learning(predictor_):
+    if predictor_ is None or os.getenv("ONLINE_LEARNING", "0") in ("", "0"):
+        return None
+    if not isinstance(predictor_, KNNPredictor):
+        # A CompactKNN keeps only condensed, quantized rows, which cannot be trained further
+        print(f"Online learning needs a KNNPredictor, not a {type(predictor_).__name__}; continuing without it")
+        return None
+    from online_learning import OnlineKNN, OnlineLearner
+    model = OnlineKNN.from_predictor(predictor_, max_rows_=int(os.getenv("ONLINE_MAX_ROWS", "200000")),
+                                     rebuild_rows_=int(os.getenv("ONLINE_REBUILD_ROWS", "390")),
+                                     rebuild_seconds_=float(os.getenv("ONLINE_REBUILD_SECONDS", "300")))
+    return OnlineLearner(model, min_interval_=float(os.getenv("ONLINE_MIN_INTERVAL", "0"))).start()
+
+# setup_ returns the trading client, bar buffer and predictor (replay.py passes fake clients),
+# clock_ provides time(), monotonic() and sleep() (replay.py passes a virtual clock)
+# and cycles_ stops the loop after that many iterations (None runs forever)
+def main(setup_=setup_live_trading, clock_=time, cycles_: int = None) -> None:
+    alpaca_client, bar_buffer, predictor = setup_(symbol_="TSLA")
+    json_writer, profiler = setup_instrumentation()
+    learner = setup_online_learning(predictor)
+    # Positions are kept locally from order fills (the open orders are fetched on every position check
+    # while any are working) and reconciled with the broker every 5 minutes
+    order_manager = OrderManager(alpaca_client, max_workers=4, reconcile_interval=300.0, clock=clock_.monotonic)
     # Run during stock market hours
-    while True:
-        start_time = time.time()
+    cycle = 0
+    while cycles_ is None or cycle < cycles_:
+        cycle += 1
+        start_time = clock_.time()
+        prediction = None
         
-        stock_bars = retrieve_stock_bars(client_=alpaca_historical_client, symbol_= "TSLA", time_interval_=1, time_unit_=TimeFrameUnit.Minute, limit_= 1000)
-        stock_data_frame = data_frame_from_stock_bars(data_ = stock_bars)
-        filtered_data_frame = filter_regular_hours(data_= stock_data_frame)
-        technical_data_frame = add_technical_indicators(data_=filtered_data_frame.copy())
-        # classified_data_frame = classify_price_gap(data_=technical_data_frame)
+        with profiler.cycle(), metrics.stage("cycle"):
+            bar_buffer.refresh()
+            technical_data_frame = bar_buffer.latest_frame()
+            if learner is not None:
+                # Queue the newly labeled bars and pick up the latest model the worker has published
+                learner.observe_buffer(bar_buffer)
+                predictor = learner.predictor
+            # classified_data_frame = classify_price_gap(data_=bar_buffer.to_data_frame())
         
-        if model is not None:
-             # Get prediction for the latest candlestick
-            prediction = predict_latest_candlestick(model, technical_data_frame)
+            if predictor is not None:
+                 # Get prediction for the latest candlestick
+                with metrics.stage("predict"):
+                    prediction = predictor.predict(bar_buffer.latest_features(predictor.row, predictor.features))
+                # Age of the newest bar (minute bars are stamped with their start) when the strategy acts on it
+                metrics.observe_bar_staleness(bar_buffer.last_timestamp.timestamp() + 60, clock_.time())
              
-             # Get current price for limit orders
-            print(technical_data_frame.iloc[-1])
-            current_price = technical_data_frame['close'].iloc[-1]
+                 # Get current price for limit orders
+                print(technical_data_frame.iloc[-1])
+                current_price = technical_data_frame['close'].iloc[-1]
              
-            if prediction == 1:
-                print("Prediction: Price will go HIGHER")
+                if prediction == 1:
+                    print("Prediction: Price will go HIGHER")
                  
-                # Example: Place a market buy order for 1 share
-                # Uncomment the line below to actually place the order
-                order_result = place_market_buy_order(alpaca_client, "TSLA", 1)
+                    # Example: Place a market buy order for 1 share
+                    # Uncomment the line below to actually place the order
+                    with metrics.stage("order"):
+                        order_result = order_manager.submit_order("TSLA", 1, "buy")
                  
-                # Example: Place a limit buy order slightly below current price
-                # limit_price = current_price * 0.995  # 0.5% below current price
-                # order_result = place_limit_buy_order(alpaca_client, "TSLA", 1, limit_price)
+                    # Example: Place a limit buy order slightly below current price
+                    # limit_price = current_price * 0.995  # 0.5% below current price
+                    # order_result = place_limit_buy_order(alpaca_client, "TSLA", 1, limit_price)
                  
-                print(f"Would place BUY order at current price: ${current_price:.2f}")
+                    print(f"Would place BUY order at current price: ${current_price:.2f}")
                  
-            elif prediction == -1:
-                print("Prediction: Price will go LOWER")
+                elif prediction == -1:
+                    print("Prediction: Price will go LOWER")
                  
-                # Check if we have any TSLA positions to sell
-                positions = get_positions(alpaca_client)
-                if 'TSLA' in positions and positions['TSLA']['qty'] > 0:
-                    tsla_qty = int(positions['TSLA']['qty'])
-                    print(f"Found {tsla_qty} shares of TSLA to sell")
+                    # Check if we have any TSLA positions to sell
+                    held = order_manager.position("TSLA")
+                    if held > 0:
+                        tsla_qty = int(held)
+                        print(f"Found {tsla_qty} shares of TSLA to sell")
                      
-                    # Example: Place a market sell order for all TSLA shares
-                    # Uncomment the line below to actually place the order
-                    order_result = place_market_sell_order(alpaca_client, "TSLA", tsla_qty)
+                        # Example: Place a market sell order for all TSLA shares
+                        # Uncomment the line below to actually place the order
+                        with metrics.stage("order"):
+                            order_result = order_manager.submit_order("TSLA", tsla_qty, "sell")
                      
-                    # Example: Place a limit sell order slightly above current price
-                    # limit_price = current_price * 1.005  # 0.5% above current price
-                    # order_result = place_limit_sell_order(alpaca_client, "TSLA", tsla_qty, limit_price)
+                        # Example: Place a limit sell order slightly above current price
+                        # limit_price = current_price * 1.005  # 0.5% above current price
+                        # order_result = place_limit_sell_order(alpaca_client, "TSLA", tsla_qty, limit_price)
                      
-                    print(f"Would place SELL order for {tsla_qty} shares at current price: ${current_price:.2f}")
-                else:
-                    print("No TSLA positions to sell")
+                        print(f"Would place SELL order for {tsla_qty} shares at current price: ${current_price:.2f}")
+                    elif order_manager.open_quantity("TSLA") > 0:
+                        print("TSLA buy order has not filled yet, nothing to sell")
+                    else:
+                        print("No TSLA positions to sell")
                  
-            else:
-                print("Prediction: No significant change expected")
-                print("No orders placed")
+                else:
+                    print("Prediction: No significant change expected")
+                    print("No orders placed")
                  
-            # Check account info (optional)
-            account_info = get_account_info(alpaca_client)
-            print(f"Buying Power: ${account_info.get('buying_power', 'N/A')}")
+                # Check account info (optional)
+                with metrics.stage("account"):
+                    account_info = get_account_info(alpaca_client)
+                print(f"Buying Power: ${account_info.get('buying_power', 'N/A')}")
              
-        else:
-             print("Failed to load model. Please train a model first.")
+            else:
+                 print("Failed to load model. Please train a model first.")
          
          # Calculate how long the loop took and adjust sleep time
-        elapsed_time = time.time() - start_time
+        elapsed_time = clock_.time() - start_time
         sleep_time = max(0, 60 - elapsed_time)  # Ensure sleep_time is not negative
+        stage_seconds = metrics.end_cycle()
+        if json_writer is not None:
+            json_writer.write({'prediction': None if prediction is None else int(prediction), 'stages': stage_seconds})
          
         print(f"Loop completed in {elapsed_time:.2f} seconds. Sleeping for {sleep_time:.2f} seconds.")
-        time.sleep(sleep_time)
+        clock_.sleep(sleep_time)
+    order_manager.close()
+    if learner is not None:
+        learner.stop()
 
     
 
+# Same strategy with concurrent API calls and cycles aligned to minute boundaries
+async def main_async() -> None:
+    from async_runner import AsyncTradingRunner
+    alpaca_client, bar_buffer, predictor = setup_live_trading(symbol_="TSLA")
+    if predictor is None:
+        print("Failed to load model. Please train a model first.")
+        return
+    runner = AsyncTradingRunner(trading_client_=alpaca_client, bar_buffer_=bar_buffer, predictor_=predictor, quantity_=1)
+    await runner.run()
+
+# Same strategy driven by the minute bar stream, deciding as soon as each bar arrives
+async def main_stream() -> None:
+    from bar_stream import ReconnectingStockDataStream, StreamingBarIngestor
+    alpaca_client, bar_buffer, predictor = setup_live_trading(symbol_="TSLA")
+    if predictor is None:
+        print("Failed to load model. Please train a model first.")
+        return
+    order_manager = OrderManager(alpaca_client, max_workers=4, reconcile_interval=300.0)
+    # Fills reach the local book from the trade updates stream as they happen
+    from alpaca.trading.stream import TradingStream
+    trading_stream = TradingStream(api_key=os.getenv("ALPACA_API_KEY"), secret_key=os.getenv("ALPACA_SECRET"), paper=True)
+    order_manager.subscribe(trading_stream)
+
+    def decide(bar_buffer_: BarBuffer) -> int:
+        return predictor.predict(bar_buffer_.latest_features(predictor.row, predictor.features))
+
+    async def act(prediction_: int) -> None:
+        if prediction_ == 1:
+            await asyncio.to_thread(order_manager.submit_order, "TSLA", 1, "buy")
+        elif prediction_ == -1:
+            held = await asyncio.to_thread(order_manager.position, "TSLA")
+            if held > 0:
+                await asyncio.to_thread(order_manager.submit_order, "TSLA", int(held), "sell")
+            elif order_manager.open_quantity("TSLA") > 0:
+                print("TSLA buy order has not filled yet, nothing to sell")
+        latency = ingestor.decisions[-1]
+        print(f"Prediction: {prediction_}. Bar received to decision: {latency['event_to_decision'] * 1000:.2f} ms. "
+              f"Bar close to decision: {latency['bar_close_to_decision']:.2f} seconds")
+
+    # The stream backfills the buffer over REST on every (re)connection. Both streams share this
+    # event loop through alpaca-py's private _run_forever coroutine (pinned version, see bar_stream.py)
+    stream = ReconnectingStockDataStream(api_key_=os.getenv("ALPACA_API_KEY"), secret_key_=os.getenv("ALPACA_SECRET"))
+    ingestor = StreamingBarIngestor(stream_=stream, bar_buffer_=bar_buffer, decide_=decide, act_=act)
+    await asyncio.gather(ingestor.run(), trading_stream._run_forever())
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--stream" in sys.argv:
+        asyncio.run(main_stream())
+    elif "--async" in sys.argv:
+        asyncio.run(main_async())
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,163 @@
+import json
+import os
+import numpy as np
+from typing import TYPE_CHECKING
+
+# Loading side of the trained models, kept apart from machine_learning so the live
+# loop can load a predictor without importing the training code, pandas-heavy
+# helpers or joblib: joblib (and with it scikit-learn, when unpickling a model) is
+# only imported by the loaders that unpickle, which a bundle with predictor.npz
+# never reaches. machine_learning re-exports everything here.
+if TYPE_CHECKING:
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.preprocessing import StandardScaler
+
+# Columns the KNN model is trained on and predicts from
+feature_columns = ['close', 'high', 'low', 'open', 'volume', 'ATR', 'RSI', 'MA40', 'MA80', 'MA160']
+
+# Model bundles: the estimator, its feature scaler, the feature list and a fingerprint
+# of the training data saved together in one directory
+#   <bundle_dir>/manifest.json    format version, features, fingerprint, model type, versions
+#   <bundle_dir>/model.joblib     {'model', 'scaler'} dumped uncompressed so it can be memory-mapped
+#   <bundle_dir>/predictor.npz    KNN models only: training arrays, labels and scaler statistics,
+#                                 which load_predictor reads without unpickling (or importing) scikit-learn
+#   <bundle_dir>/compact_knn.npz  optional condensed, approximate KNN index (see compact_knn)
+bundle_version = 1
+
+
+class ModelBundle:
+    """A trained model with the scaler and feature list it was trained with."""
+
+    def __init__(self, model, scaler: "StandardScaler", features_: list, manifest_: dict):
+        self.model = model
+        self.scaler = scaler
+        self.features = list(features_)
+        self.manifest = manifest_
+
+    @property
+    def fingerprint(self) -> str:
+        return self.manifest['fingerprint']
+
+    def check_columns(self, columns_) -> None:
+        """Raise if a live frame is missing any feature the model was trained on."""
+        missing = [feature for feature in self.features if feature not in set(columns_)]
+        if missing:
+            raise ValueError(f"Data frame is missing model features: {missing}")
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        return self.model.predict(X)
+
+
+def load_model_bundle(bundle_dir: str = "knn_bundle", mmap_: bool = True) -> ModelBundle:
+    """
+    Load a model bundle, memory-mapping its arrays instead of reading them into memory.
+
+    Args:
+        bundle_dir: Directory written by save_model_bundle
+        mmap_: Memory-map the numpy arrays inside the model (read-only)
+
+    Returns:
+        Loaded ModelBundle, or None if it could not be loaded
+    """
+    import joblib
+
+    try:
+        with open(os.path.join(bundle_dir, "manifest.json")) as handle:
+            manifest = json.load(handle)
+        if manifest.get('bundle_version') != bundle_version:
+            print(f"Error: Unsupported bundle version {manifest.get('bundle_version')} in '{bundle_dir}'")
+            return None
+        artifacts = joblib.load(os.path.join(bundle_dir, "model.joblib"), mmap_mode="r" if mmap_ else None)
+        print(f"Model bundle loaded successfully from: {bundle_dir}")
+        return ModelBundle(artifacts['model'], artifacts['scaler'], manifest['features'], manifest)
+    except FileNotFoundError:
+        print(f"Error: Model bundle '{bundle_dir}' not found.")
+        return None
+    except Exception as e:
+        print(f"Error loading model bundle: {e}")
+        return None
+
+
+class ScalerArrays:
+    """The mean_ and scale_ of a fitted StandardScaler, all the live predictors use of it."""
+
+    def __init__(self, mean_: np.ndarray, scale_: np.ndarray):
+        self.mean_ = mean_
+        self.scale_ = scale_
+
+
+def encode_labels(classes_: np.ndarray, y_: np.ndarray) -> np.ndarray:
+    """
+    Index into classes_ (sorted, as in KNeighborsClassifier.classes_) of every label in y_.
+
+    Raises:
+        ValueError: If a label is not one of classes_
+    """
+    classes = np.asarray(classes_)
+    labels = np.searchsorted(classes, y_).clip(max=len(classes) - 1)
+    if not np.array_equal(classes[labels], y_):
+        raise ValueError(f"Labels outside the model's classes {classes.tolist()}")
+    return labels
+
+
+def load_predictor_arrays(bundle_dir: str = "knn_bundle") -> dict:
+    """
+    Load the KNN arrays a bundle saved next to its model, without importing scikit-learn.
+
+    Args:
+        bundle_dir: Directory written by save_model_bundle
+
+    Returns:
+        Dictionary with training_data, labels, classes, n_neighbors, weights, metric, scaler
+        (ScalerArrays or None), features and manifest, or None if the bundle has no arrays
+    """
+    try:
+        with open(os.path.join(bundle_dir, "manifest.json")) as handle:
+            manifest = json.load(handle)
+        if manifest.get('bundle_version') != bundle_version or 'predictor_arrays' not in manifest:
+            return None
+        with np.load(os.path.join(bundle_dir, manifest['predictor_arrays'])) as arrays:
+            loaded = {name: arrays[name] for name in arrays.files}
+        print(f"Model arrays loaded successfully from: {bundle_dir}")
+        return {
+            'training_data': loaded['training_data'],
+            'labels': loaded['labels'],
+            'classes': loaded['classes'],
+            'n_neighbors': int(loaded['n_neighbors']),
+            'weights': str(loaded['weights']),
+            'metric': str(loaded['metric']),
+            'scaler': ScalerArrays(loaded['mean'], loaded['scale']) if len(loaded['mean']) else None,
+            'features': manifest['features'],
+            'manifest': manifest
+        }
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading model arrays: {e}")
+        return None
+
+
+def load_knn_model(model_filename: str = "knn_model.pkl") -> "KNeighborsClassifier":
+    """
+    Load a saved KNN model from disk.
+    
+    Args:
+        model_filename: Filename of the saved model (default: "knn_model.pkl")
+        
+    Returns:
+        Loaded KNeighborsClassifier model
+    """
+    import joblib
+
+    try:
+        model = joblib.load(model_filename)
+        print(f"Model loaded successfully from: {model_filename}")
+        return model
+    except FileNotFoundError:
+        print(f"Error: Model file '{model_filename}' not found.")
+        return None
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        return None
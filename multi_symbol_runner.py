@@ -0,0 +1,267 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from alpaca.data.timeframe import TimeFrameUnit
+
+from alpaca_data import retrieve_multi_stock_bars
+from alpaca_paper_trading import OrderManager
+from bar_buffer import BarBuffer
+from model_bundle import feature_columns
+
+# Runs the strategy over a symbol universe by sharding the symbols across
+# worker processes. Each worker owns the bar buffers (and so the indicator
+# state) of its symbols, fetches their new bars with one batched request per
+# cycle (plus one for the lookback of symbols that have no bars yet), and
+# writes each symbol's feature row, prediction and bar timestamp into a shared
+# memory block. The parent only reads those arrays and submits the resulting
+# orders; no DataFrames cross the process boundary.
+
+
+def shard_symbols(symbols_: list, shards_: int) -> list:
+    """Split symbols_ into shards_ round-robin lists of roughly equal size."""
+    return [symbols_[shard::shards_] for shard in range(shards_) if symbols_[shard::shards_]]
+
+
+def _shared_arrays(buffer_, symbols_: int, features_: int) -> dict:
+    # One block holds three arrays: features (float64), bar timestamps (int64 ns) and predictions (int8)
+    features = np.ndarray((symbols_, features_), dtype=np.float64, buffer=buffer_)
+    timestamps = np.ndarray(symbols_, dtype=np.int64, buffer=buffer_, offset=features.nbytes)
+    predictions = np.ndarray(symbols_, dtype=np.int8, buffer=buffer_, offset=features.nbytes + timestamps.nbytes)
+    return {'features': features, 'timestamps': timestamps, 'predictions': predictions}
+
+
+def _shared_size(symbols_: int, features_: int) -> int:
+    return symbols_ * (features_ * 8 + 8 + 1)
+
+
+def fetch_shard_bars(client_, buffers_: list, end_: datetime, lookback_: timedelta) -> int:
+    """
+    Fetch and append the new bars of a shard's symbols with at most two batched requests.
+
+    Symbols that have no bars yet (first cycle, or no trades so far) get the full lookback
+    so their indicators start warmed up; the rest get the bars since the oldest of their
+    newest bars.
+
+    Args:
+        client_: Historical data client (raw data mode)
+        buffers_: Bar buffers of the shard's symbols
+        end_: Time bars are fetched up to (exclusive)
+        lookback_: History loaded for symbols without bars
+
+    Returns:
+        Number of regular-hours bars appended
+    """
+    bars = 0
+    empty = [buffer for buffer in buffers_ if buffer.last_fetched is None]
+    filled = [buffer for buffer in buffers_ if buffer.last_fetched is not None]
+    if empty:
+        raw_bars = retrieve_multi_stock_bars(client_=client_, symbols_=[buffer.symbol for buffer in empty], start_=end_ - lookback_,
+                                             end_=end_, time_interval_=1, time_unit_=TimeFrameUnit.Minute)
+        bars += sum(buffer.append_raw(raw_bars) for buffer in empty)
+    if filled:
+        start = min(buffer.last_fetched for buffer in filled) + timedelta(minutes=1)
+        raw_bars = retrieve_multi_stock_bars(client_=client_, symbols_=[buffer.symbol for buffer in filled], start_=start,
+                                             end_=end_, time_interval_=1, time_unit_=TimeFrameUnit.Minute)
+        for buffer in filled:
+            # Bars a buffer already holds (fetched for a symbol that was further behind) are skipped by append_bar
+            bars += sum(buffer.append_bar(bar) for bar in raw_bars.get(buffer.symbol) or [])
+    return bars
+
+
+def _worker(connection_, shared_name_: str, universe_size_: int, rows_: list, symbols_: list,
+            client_factory_, predictor_factory_, features_: list, lookback_: timedelta, limit_: int) -> None:
+    shared = SharedMemory(name=shared_name_)
+    arrays = _shared_arrays(shared.buf, universe_size_, len(features_))
+    row = np.empty(len(features_), dtype=np.float64)
+    setup_error = None
+    try:
+        client = client_factory_(symbols_)
+        predictor = predictor_factory_()
+        if predictor is None:
+            raise ValueError("predictor_factory_ returned no predictor")
+        buffers = [BarBuffer(client, symbol, max_bars_=limit_) for symbol in symbols_]
+    except Exception as e:
+        setup_error = f"worker setup failed: {e}"
+
+    try:
+        while True:
+            command, end = connection_.recv()
+            if command == "stop":
+                break
+            start_time = time.perf_counter()
+            fetched = start_time
+            bars = 0
+            try:
+                if setup_error is not None:
+                    raise RuntimeError(setup_error)
+                end = datetime.fromtimestamp(end, timezone.utc) if end is not None else datetime.now(timezone.utc) + timedelta(minutes=1)
+                bars = fetch_shard_bars(client, buffers, end, lookback_)
+                fetched = time.perf_counter()
+
+                for position, buffer in zip(rows_, buffers):
+                    if not len(buffer):
+                        arrays['predictions'][position] = 0
+                        continue
+                    buffer.latest_features(row, features_)
+                    arrays['features'][position] = row
+                    arrays['timestamps'][position] = buffer.last_timestamp.value
+                    # 0 while indicators are warming up
+                    arrays['predictions'][position] = 0 if np.isnan(row).any() else predictor.predict(row)
+                error = None
+            except Exception as e:
+                # e.g. a failed request: no orders for this shard this cycle, the next cycle fetches the missed bars
+                arrays['predictions'][rows_] = 0
+                error = str(e)
+            connection_.send({
+                'bars': bars,
+                'fetch_seconds': fetched - start_time,
+                'compute_seconds': time.perf_counter() - fetched,
+                'error': error
+            })
+    finally:
+        del arrays
+        shared.close()
+
+
+class MultiSymbolRunner:
+    """
+    Runs the KNN strategy over many symbols with the symbols sharded across worker processes.
+
+    client_factory_ and predictor_factory_ are called inside each worker (they must be
+    picklable, e.g. module-level functions or functools.partial objects), so every worker
+    has its own data client and predictor. A worker whose cycle fails reports the error
+    and predicts 0 for its symbols that cycle. Use the runner as a context manager (or
+    call close()) so the worker processes stop and the shared memory block is removed.
+    """
+
+    def __init__(self, symbols_: list, client_factory_, predictor_factory_, workers_: int = None,
+                 order_manager_: OrderManager = None, quantity_: int = 1, features_: list = None,
+                 lookback_: timedelta = timedelta(days=4), limit_: int = 1000):
+        """
+        Args:
+            symbols_: Symbol universe
+            client_factory_: Function taking a list of symbols and returning a historical data client (raw data mode)
+            predictor_factory_: Function returning a predictor (e.g. functools.partial(load_predictor, "knn_bundle"))
+            workers_: Number of worker processes (default: one per core)
+            order_manager_: Order manager orders are submitted through (None only computes predictions)
+            quantity_: Shares bought per buy signal
+            features_: Feature columns in the order the model was trained on
+            lookback_: History loaded on the first cycle
+            limit_: Bars kept in memory per symbol
+        """
+        self.symbols = list(symbols_)
+        self.features = feature_columns if features_ is None else features_
+        self.order_manager = order_manager_
+        self.quantity = quantity_
+        workers = min(workers_ or os.cpu_count(), len(self.symbols))
+        # Fail here rather than in every worker when there is no model to load
+        if predictor_factory_() is None:
+            raise ValueError("predictor_factory_ returned no predictor (train a model first)")
+
+        self.shared = SharedMemory(create=True, size=_shared_size(len(self.symbols), len(self.features)))
+        self.arrays = _shared_arrays(self.shared.buf, len(self.symbols), len(self.features))
+        self.arrays['predictions'][:] = 0
+
+        self.shards = shard_symbols(list(range(len(self.symbols))), workers)
+        self.connections = []
+        self.processes = []
+        try:
+            for shard_rows in self.shards:
+                parent_connection, child_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_worker,
+                    args=(child_connection, self.shared.name, len(self.symbols), shard_rows, [self.symbols[row] for row in shard_rows],
+                          client_factory_, predictor_factory_, self.features, lookback_, limit_),
+                    daemon=True
+                )
+                process.start()
+                self.connections.append(parent_connection)
+                self.processes.append(process)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "MultiSymbolRunner":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _receive(self, connection_, shard_rows_: list) -> dict:
+        try:
+            return connection_.recv()
+        except (EOFError, OSError):
+            # The worker process has exited
+            self.arrays['predictions'][shard_rows_] = 0
+            return {'bars': 0, 'fetch_seconds': 0.0, 'compute_seconds': 0.0, 'error': "worker process exited"}
+
+    def run_cycle(self, end_: float = None) -> dict:
+        """
+        Have every worker fetch its new bars and predict, then submit the orders.
+
+        Args:
+            end_: Epoch seconds bars are fetched up to (exclusive), default now
+
+        Returns:
+            Dictionary with the predictions, order responses and timings
+        """
+        start_time = time.perf_counter()
+        for connection in self.connections:
+            try:
+                connection.send(("cycle", end_))
+            except OSError:
+                pass # The worker has exited, which _receive reports
+        worker_stats = [self._receive(connection, shard_rows) for connection, shard_rows in zip(self.connections, self.shards)]
+        predicted = time.perf_counter()
+        errors = {self.symbols[shard_rows[0]]: stats['error'] for shard_rows, stats in zip(self.shards, worker_stats) if stats['error']}
+        for symbol, error in errors.items():
+            print(f"Error in the worker for {symbol}'s shard: {error}")
+
+        predictions = self.arrays['predictions']
+        orders = []
+        if self.order_manager is not None:
+            for position in np.flatnonzero(predictions == 1):
+                orders.append({'symbol': self.symbols[position], 'quantity': self.quantity, 'side': "buy"})
+            for position in np.flatnonzero(predictions == -1):
+                held = self.order_manager.position(self.symbols[position])
+                if held > 0:
+                    orders.append({'symbol': self.symbols[position], 'quantity': held, 'side': "sell"})
+        order_results = self.order_manager.submit_orders(orders) if orders else []
+
+        return {
+            'predictions': dict(zip(self.symbols, predictions.tolist())),
+            'orders': order_results,
+            'errors': errors,
+            'bars': sum(stats['bars'] for stats in worker_stats),
+            'predict_seconds': predicted - start_time,
+            'max_fetch_seconds': max(stats['fetch_seconds'] for stats in worker_stats),
+            'max_compute_seconds': max(stats['compute_seconds'] for stats in worker_stats),
+            'cycle_seconds': time.perf_counter() - start_time
+        }
+
+    def feature_rows(self) -> np.ndarray:
+        """Copy of the newest feature row of every symbol, in self.symbols order."""
+        return self.arrays['features'].copy()
+
+    def close(self) -> None:
+        """Stop the worker processes and remove the shared memory block (safe to call more than once)."""
+        if self.shared is None:
+            return
+        try:
+            for connection in self.connections:
+                try:
+                    connection.send(("stop", None))
+                except OSError:
+                    pass # Worker already gone
+            for process in self.processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+        finally:
+            del self.arrays
+            self.shared.close()
+            self.shared.unlink()
+            self.shared = None
@@ -0,0 +1,435 @@
+import queue
+import resource
+import threading
+import time
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from bar_buffer import BarBuffer, frame_positions
+from instrumentation import metrics
+from machine_learning import feature_columns
+from predictor import KNNPredictor
+
+# Online learning for the live loop. Every bar is labeled once the next bar's
+# open is known (the sign of next open minus close, as classify_price_gap does)
+# and handed to a background thread, which folds the labeled rows into the model
+# and publishes a new predictor. Predictors are never modified after they are
+# published: the swap is one attribute assignment, so the trading loop reads
+# either the old or the new model and never waits for an update.
+#   KNN: OnlineKNN keeps a bounded ring buffer of training rows and rebuilds
+#        the KD-tree over it once enough rows (or time) have accumulated, since
+#        a rebuild costs O(n log n) in the buffer size however few rows arrived.
+#   SGD: OnlineSGD calls partial_fit on a private SGDClassifier and publishes
+#        a copy of its coefficients.
+
+
+def _scale(rows_: np.ndarray, scaler_: StandardScaler) -> np.ndarray:
+    return rows_ if scaler_ is None else (rows_ - scaler_.mean_) / scaler_.scale_
+
+
+class LinearPredictor:
+    """
+    Single-row predictor for the coefficients of a linear classifier, with the same
+    interface as KNNPredictor (row, features, predict).
+    """
+
+    def __init__(self, coef_: np.ndarray, intercept_: np.ndarray, classes_: np.ndarray, features_: list = None, scaler_: StandardScaler = None):
+        """
+        Args:
+            coef_: Coefficients, shape (1, features) for two classes or (classes, features)
+            intercept_: Intercepts matching coef_
+            classes_: Class values, as in SGDClassifier.classes_
+            features_: Feature columns in training order
+            scaler_: Scaler applied to every row before scoring
+        """
+        self.coef = coef_
+        self.intercept = intercept_
+        self.classes = classes_
+        self.features = feature_columns if features_ is None else features_
+        self.scaler = scaler_
+        self.row = np.empty(len(self.features), dtype=np.float64)
+        self._scaled_row = np.empty(len(self.features), dtype=np.float64)
+
+    def predict(self, row_: np.ndarray = None) -> int:
+        """
+        Predict one feature row.
+
+        Args:
+            row_: Feature values in self.features order (defaults to the preallocated self.row)
+
+        Returns:
+            Prediction (-1 for lower, 1 for higher)
+        """
+        row = self.row if row_ is None else row_
+        if np.isnan(row).any():
+            raise ValueError("Feature row contains NaN (indicators still warming up)")
+        if self.scaler is not None:
+            np.subtract(row, self.scaler.mean_, out=self._scaled_row)
+            np.divide(self._scaled_row, self.scaler.scale_, out=self._scaled_row)
+            row = self._scaled_row
+        scores = self.coef @ row + self.intercept
+        if len(scores) == 1:
+            return self.classes[int(scores[0] > 0)]
+        return self.classes[scores.argmax()]
+
+
+class OnlineKNN:
+    """
+    Bounded, appendable KNN training set behind a rebuildable KD-tree.
+
+    Rows are kept in a preallocated ring buffer of max_rows_ rows (already scaled when
+    the model has a scaler), so memory stops growing once it is full and the oldest
+    rows are the first to go. update() writes the new rows, and once rebuild_rows_
+    rows have arrived since the last build, or rebuild_seconds_ have passed with any
+    waiting, returns a fresh KNNPredictor built over copies of the buffer.
+    """
+
+    def __init__(self, training_data_: np.ndarray, labels_: np.ndarray, classes_: np.ndarray, n_neighbors_: int = 5,
+                 distance_weighted_: bool = False, features_: list = None, scaler_: StandardScaler = None, max_rows_: int = 200_000,
+                 rebuild_rows_: int = 390, rebuild_seconds_: float = 300.0, clock_=time.monotonic):
+        """
+        Args:
+            training_data_: Initial training rows in model space (scaled when scaler_ is given)
+            labels_: Index into classes_ of each initial row's label
+            classes_: Class values the model predicts
+            n_neighbors_: Neighbors voting on each prediction
+            distance_weighted_: Weight votes by inverse distance
+            features_: Feature columns in training order
+            scaler_: Fixed scaler applied to new rows (it is not refitted)
+            max_rows_: Capacity of the training buffer
+            rebuild_rows_: New rows that trigger a rebuild of the index (1 rebuilds on every update)
+            rebuild_seconds_: Seconds after which waiting rows trigger a rebuild (None for no time limit)
+            clock_: Function returning a monotonic time in seconds
+        """
+        self.classes = np.asarray(classes_)
+        self.n_neighbors = n_neighbors_
+        self.distance_weighted = distance_weighted_
+        self.features = feature_columns if features_ is None else features_
+        self.scaler = scaler_
+        self.max_rows = max_rows_
+        self._data = np.empty((max_rows_, len(self.features)), dtype=np.float64)
+        self._labels = np.empty(max_rows_, dtype=np.intp)
+        self.rows = 0
+        self._next = 0
+        self._append(np.asarray(training_data_, dtype=np.float64)[-max_rows_:], np.asarray(labels_, dtype=np.intp)[-max_rows_:])
+        self.rebuild_rows = rebuild_rows_
+        self.rebuild_seconds = rebuild_seconds_
+        self.clock = clock_
+        self.pending_rows = 0 # rows added since the last build
+        self._built_at = clock_()
+        self._predictor = None
+
+    @classmethod
+    def from_predictor(cls, predictor_: KNNPredictor, max_rows_: int = 200_000, **rebuild_parameters) -> "OnlineKNN":
+        """
+        Start from the training set of a loaded KNNPredictor (see load_predictor).
+
+        Args:
+            predictor_: Loaded KNNPredictor
+            max_rows_: Capacity of the training buffer
+            rebuild_parameters: rebuild_rows_, rebuild_seconds_ and clock_ (see __init__)
+        """
+        if not isinstance(predictor_, KNNPredictor):
+            raise ValueError(f"OnlineKNN starts from a KNNPredictor's training set, not a {type(predictor_).__name__}")
+        return cls(predictor_.training_data, predictor_.labels, predictor_.classes, predictor_.n_neighbors, predictor_.distance_weighted,
+                   predictor_.features, predictor_.scaler, max_rows_, **rebuild_parameters)
+
+    def _append(self, data_: np.ndarray, labels_: np.ndarray) -> None:
+        for start in range(0, len(data_), self.max_rows):
+            block = slice(start, start + self.max_rows)
+            count = len(data_[block])
+            first = min(count, self.max_rows - self._next)
+            self._data[self._next:self._next + first] = data_[block][:first]
+            self._labels[self._next:self._next + first] = labels_[block][:first]
+            self._data[:count - first] = data_[block][first:]
+            self._labels[:count - first] = labels_[block][first:]
+            self._next = (self._next + count) % self.max_rows
+            self.rows = min(self.rows + count, self.max_rows)
+
+    def predictor(self) -> KNNPredictor:
+        """Predictor over the current buffer (built on first use)."""
+        if self._predictor is None:
+            self._predictor = self._build()
+        return self._predictor
+
+    def _build(self) -> KNNPredictor:
+        self.pending_rows = 0
+        self._built_at = self.clock()
+        # Copies, so the next update can overwrite ring slots a published predictor still uses
+        return KNNPredictor.from_arrays(self._data[:self.rows].copy(), self._labels[:self.rows].copy(), self.classes, self.n_neighbors,
+                                        self.distance_weighted, self.features, self.scaler)
+
+    def rebuild(self) -> KNNPredictor:
+        """Rebuild the index now if rows are waiting, and return the current predictor."""
+        if self._predictor is None or self.pending_rows:
+            self._predictor = self._build()
+        return self._predictor
+
+    def update(self, X_: np.ndarray, y_: np.ndarray) -> KNNPredictor:
+        """
+        Add labeled rows, rebuilding the index once enough rows or time have accumulated.
+
+        Args:
+            X_: Raw feature rows in self.features order
+            y_: Labels (-1 or 1); rows whose label is not one of self.classes are skipped
+
+        Returns:
+            New KNNPredictor including the rows after a rebuild, otherwise the current one
+        """
+        positions = np.searchsorted(self.classes, y_).clip(max=len(self.classes) - 1)
+        known = self.classes[positions] == y_
+        self._append(_scale(np.asarray(X_, dtype=np.float64)[known], self.scaler), positions[known])
+        self.pending_rows += int(known.sum())
+        if self.pending_rows >= self.rebuild_rows or (
+                self.pending_rows and self.rebuild_seconds is not None and self.clock() - self._built_at >= self.rebuild_seconds):
+            return self.rebuild()
+        return self.predictor()
+
+    def nbytes(self) -> int:
+        """Bytes held by the buffer and the current predictor's data, labels and tree indices."""
+        total = self._data.nbytes + self._labels.nbytes
+        if self._predictor is not None:
+            total += self._predictor.training_data.nbytes + self._predictor.labels.nbytes + self._predictor.tree.indices.nbytes
+        return total
+
+
+class OnlineSGD:
+    """
+    Linear model updated with SGDClassifier.partial_fit.
+
+    The classifier is only touched by update(); every update publishes a LinearPredictor
+    over copies of its coefficients, so predictions never see a half-applied step.
+    """
+
+    def __init__(self, model_: SGDClassifier, features_: list = None, scaler_: StandardScaler = None, classes_: tuple = (-1, 1)):
+        """
+        Args:
+            model_: SGDClassifier, fitted or not (partial_fit is called with classes_)
+            features_: Feature columns in training order
+            scaler_: Fixed scaler applied to every row
+            classes_: Every class the model can see
+        """
+        self.model = model_
+        self.features = feature_columns if features_ is None else features_
+        self.scaler = scaler_
+        self.classes = np.asarray(classes_)
+        self.rows = 0
+        self._predictor = None
+
+    @classmethod
+    def from_dataset(cls, X_: np.ndarray, y_: np.ndarray, features_: list = None, epochs_: int = 5, **sgd_parameters) -> "OnlineSGD":
+        """
+        Fit the scaler on a training set and run epochs_ passes of partial_fit over it.
+
+        Args:
+            X_: Training feature rows (e.g. from load_dataset or clean_training_data)
+            y_: Labels (-1 or 1)
+            features_: Feature columns in X_ order
+            epochs_: Passes over the training set
+            sgd_parameters: SGDClassifier parameters (e.g. loss="log_loss", alpha=1e-4)
+
+        Returns:
+            OnlineSGD ready for update()
+        """
+        scaler = StandardScaler().fit(X_)
+        online = cls(SGDClassifier(**sgd_parameters), features_, scaler)
+        scaled = scaler.transform(X_)
+        for _ in range(epochs_):
+            online.model.partial_fit(scaled, y_, classes=online.classes)
+        online.rows = len(X_)
+        return online
+
+    def predictor(self) -> LinearPredictor:
+        """Predictor for the current coefficients."""
+        if self._predictor is None:
+            self._predictor = self._build()
+        return self._predictor
+
+    def _build(self) -> LinearPredictor:
+        return LinearPredictor(self.model.coef_.copy(), self.model.intercept_.copy(), self.model.classes_, self.features, self.scaler)
+
+    def update(self, X_: np.ndarray, y_: np.ndarray) -> LinearPredictor:
+        """
+        Take one partial_fit step on labeled rows.
+
+        Args:
+            X_: Raw feature rows in self.features order
+            y_: Labels (-1 or 1)
+
+        Returns:
+            New LinearPredictor with the updated coefficients
+        """
+        self.model.partial_fit(_scale(np.asarray(X_, dtype=np.float64), self.scaler), y_, classes=self.classes)
+        self.rows += len(y_)
+        self._predictor = self._build()
+        return self._predictor
+
+    def nbytes(self) -> int:
+        """Bytes held by the coefficients."""
+        return self.model.coef_.nbytes + self.model.intercept_.nbytes
+
+
+class OnlineLearner:
+    """
+    Labels live bars and updates an online model (OnlineKNN or OnlineSGD) on a background thread.
+
+    The trading loop calls observe_buffer() after each BarBuffer refresh and reads
+    learner.predictor when it predicts. observe_buffer() only copies the new rows onto a
+    queue; labeling needs the next bar's open, so a bar is queued one bar after it
+    arrives. The worker drains the queue, applies one update per batch (at most one
+    every min_interval_ seconds) and swaps self.predictor whenever the update
+    publishes a new model (version counts the swaps).
+    """
+
+    def __init__(self, model_, min_interval_: float = 0.0, max_queue_: int = 100_000):
+        """
+        Args:
+            model_: OnlineKNN or OnlineSGD
+            min_interval_: Minimum seconds between updates, so rows arriving together share one rebuild
+            max_queue_: Labeled rows waiting for the worker before new ones are dropped
+        """
+        self.model = model_
+        self.predictor = model_.predictor()
+        self.min_interval = min_interval_
+        self.version = 0
+        self._queue = queue.Queue(maxsize=max_queue_)
+        self._pending = None  # (feature row, close) of the newest bar, waiting for the next open
+        self._last_timestamp = None
+        self._buffer_positions = [frame_positions.get(feature) for feature in model_.features]
+        self._thread = None
+        self._initial_bytes = model_.nbytes()
+        self._stats = {'observed': 0, 'queued': 0, 'dropped': 0, 'absorbed': 0, 'updates': 0, 'errors': 0,
+                       'last_update_seconds': None, 'max_update_seconds': 0.0}
+
+    def start(self) -> "OnlineLearner":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="online-learner", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Apply the rows already queued and stop the worker."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def flush(self) -> None:
+        """Block until every queued row has been absorbed."""
+        self._queue.join()
+
+    def observe(self, row_: np.ndarray, close_: float, open_: float) -> None:
+        """
+        Feed the next bar in time order.
+
+        Args:
+            row_: The bar's feature values in model.features order (copied)
+            close_: The bar's close
+            open_: The bar's open, which labels the previous bar
+        """
+        self._stats['observed'] += 1
+        if self._pending is not None:
+            row, close = self._pending
+            label = np.sign(open_ - close)
+            # Same rows the training functions keep: no NaN features and a nonzero label
+            if label != 0 and not np.isnan(row).any():
+                try:
+                    self._queue.put_nowait((row, int(label)))
+                    self._stats['queued'] += 1
+                except queue.Full:
+                    self._stats['dropped'] += 1
+        self._pending = (np.array(row_, dtype=np.float64), close_)
+
+    def observe_buffer(self, bar_buffer_: BarBuffer) -> int:
+        """
+        Feed every bar appended to bar_buffer_ since the last call.
+
+        Features that are not BarBuffer frame columns (e.g. "RSI_15Min") can only be read
+        for the newest bar, so older bars from a catch-up refresh are skipped in that case.
+
+        Returns:
+            Number of new bars
+        """
+        bars = bar_buffer_.bars_since(self._last_timestamp)
+        if not bars:
+            return 0
+        frame_only = None not in self._buffer_positions
+        close_position, open_position = frame_positions['close'], frame_positions['open']
+        for timestamp, row in bars[:-1]:
+            if frame_only:
+                self.observe([row[position] for position in self._buffer_positions], row[close_position], row[open_position])
+            else:
+                self._pending = None
+        newest = bars[-1][1]
+        features = bar_buffer_.latest_features(np.empty(len(self.model.features)), self.model.features)
+        self.observe(features, newest[close_position], newest[open_position])
+        self._last_timestamp = bars[-1][0]
+        return len(bars)
+
+    def _run(self) -> None:
+        last_update = 0.0
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+            wait = self.min_interval - (time.perf_counter() - last_update)
+            if batch and wait > 0:
+                time.sleep(wait)
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._apply(batch)
+                last_update = time.perf_counter()
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+
+    def _apply(self, batch_: list) -> None:
+        X = np.array([row for row, _ in batch_])
+        y = np.array([label for _, label in batch_])
+        start_time = time.perf_counter()
+        try:
+            predictor = self.model.update(X, y)
+        except Exception as e:
+            self._stats['errors'] += 1
+            print(f"Online model update failed: {e}")
+            return
+        seconds = time.perf_counter() - start_time
+        if predictor is not self.predictor:
+            # Hot swap: one reference assignment, readers see the old or the new predictor
+            self.predictor = predictor
+            self.version += 1
+        self._stats['absorbed'] += len(batch_)
+        self._stats['updates'] += 1
+        self._stats['last_update_seconds'] = seconds
+        self._stats['max_update_seconds'] = max(self._stats['max_update_seconds'], seconds)
+        if metrics.enabled:
+            metrics.observe_stage("model_update", seconds, cycle_=False)
+        model_bytes = self.model.nbytes()
+        metrics.set_gauge("model_rows", self.model.rows)
+        metrics.set_gauge("model_bytes", model_bytes)
+        metrics.set_gauge("model_bytes_growth", model_bytes - self._initial_bytes)
+        metrics.set_gauge("process_max_rss_bytes", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+    def stats(self) -> dict:
+        """Counters, update latency and memory of the online model."""
+        model_bytes = self.model.nbytes()
+        return {
+            **self._stats,
+            'version': self.version,
+            'queue_size': self._queue.qsize(),
+            'model_rows': self.model.rows,
+            'model_bytes': model_bytes,
+            'model_bytes_growth': model_bytes - self._initial_bytes
+        }
@@ -0,0 +1,235 @@
+import os
+import time
+from typing import TYPE_CHECKING
+import numpy as np
+from scipy.spatial import cKDTree
+
+from compact_knn import load_compact_knn
+from model_bundle import feature_columns, ModelBundle, encode_labels, load_model_bundle, load_knn_model, load_predictor_arrays
+
+# Annotations only: a bundle's predictor arrays are loaded without importing scikit-learn
+if TYPE_CHECKING:
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.preprocessing import StandardScaler
+
+
+def _check_configuration(metric_: str, weights_: str) -> None:
+    if metric_ != "euclidean" or weights_ not in ("uniform", "distance"):
+        raise ValueError(f"Unsupported KNN configuration: metric={metric_}, weights={weights_}")
+
+
+class KNNPredictor:
+    """
+    Single-row predictor for a trained KNeighborsClassifier, built once at startup.
+
+    The training set is copied into a contiguous array behind a KD-tree, and predictions
+    vote over the nearest labels the same way KNeighborsClassifier.predict does, without
+    going through a DataFrame or sklearn's per-call input validation. Feature rows are
+    written into a preallocated array (see row and BarBuffer.latest_features).
+    """
+
+    def __init__(self, model: "KNeighborsClassifier", features_: list = None, warmup_: int = 10, scaler_: "StandardScaler" = None,
+                 training_data_: np.ndarray = None, y_: np.ndarray = None):
+        """
+        Args:
+            model: Trained KNN model (e.g. from load_knn_model)
+            features_: Feature columns in the order the model was trained on
+            warmup_: Number of predictions run at startup so the first live one is not cold
+            scaler_: Scaler the model's training features went through, applied to every row
+            training_data_: Rows the model was fitted on (after scaler_); without them the model's
+                fitted data is read from scikit-learn's private _fit_X/_y
+            y_: Labels the model was fitted on, with training_data_
+
+        Raises:
+            ValueError: If the training rows do not match the model or cannot be read from it
+        """
+        _check_configuration(model.effective_metric_, model.weights)
+        self.model = model
+        if training_data_ is None:
+            # A model loaded on its own (e.g. load_knn_model) only has its fitted data in private attributes
+            if not (hasattr(model, "_fit_X") and hasattr(model, "_y")):
+                raise ValueError("KNN model has no _fit_X/_y (scikit-learn changed them); pass training_data_ and y_")
+            training_data, labels = model._fit_X, model._y
+        else:
+            if len(training_data_) != model.n_samples_fit_ or y_ is None or len(y_) != model.n_samples_fit_:
+                raise ValueError(f"The KNN model was fitted on {model.n_samples_fit_} rows; training_data_ and y_ must be those rows")
+            training_data, labels = training_data_, encode_labels(model.classes_, y_)
+        self._build(training_data, labels, model.classes_, model.n_neighbors, model.weights == "distance", features_, scaler_)
+        self.warmup(warmup_)
+
+    def _build(self, training_data_, labels_, classes_, n_neighbors_: int, distance_weighted_: bool, features_: list, scaler_) -> None:
+        self.features = feature_columns if features_ is None else features_
+        self.classes = classes_
+        self.n_neighbors = n_neighbors_
+        self.distance_weighted = distance_weighted_
+        self.training_data = np.ascontiguousarray(training_data_, dtype=np.float64)
+        self.labels = np.ascontiguousarray(labels_, dtype=np.intp)
+        self.tree = cKDTree(self.training_data)
+        self.row = np.empty(len(self.features), dtype=np.float64)
+        self.scaler = scaler_
+        self._scaled_row = np.empty(len(self.features), dtype=np.float64)
+
+    @classmethod
+    def from_bundle(cls, bundle_: ModelBundle, warmup_: int = 10) -> "KNNPredictor":
+        model_type = bundle_.manifest.get('model_type')
+        if model_type != "KNeighborsClassifier":
+            raise ValueError(f"Bundle holds a {model_type}, not a KNeighborsClassifier (use BundlePredictor)")
+        return cls(bundle_.model, features_=bundle_.features, warmup_=warmup_, scaler_=bundle_.scaler)
+
+    @classmethod
+    def from_arrays(cls, training_data_: np.ndarray, labels_: np.ndarray, classes_: np.ndarray, n_neighbors_: int,
+                    distance_weighted_: bool = False, features_: list = None, scaler_: "StandardScaler" = None,
+                    warmup_: int = 0) -> "KNNPredictor":
+        """
+        Build a predictor straight from training arrays, without a fitted sklearn model.
+
+        Args:
+            training_data_: Training rows in model space (already scaled when scaler_ is given)
+            labels_: Index into classes_ of each row's label
+            classes_: Class values, as in KNeighborsClassifier.classes_
+            n_neighbors_: Neighbors voting on each prediction
+            distance_weighted_: Weight votes by inverse distance (weights="distance")
+            features_: Feature columns in training order
+            scaler_: Scaler applied to every live row
+            warmup_: Number of predictions run before returning
+
+        Returns:
+            KNNPredictor whose model attribute is None
+        """
+        predictor = cls.__new__(cls)
+        predictor.model = None
+        predictor._build(training_data_, labels_, classes_, n_neighbors_, distance_weighted_, features_, scaler_)
+        predictor.warmup(warmup_)
+        return predictor
+
+    def warmup(self, iterations_: int = 10) -> None:
+        for i in range(iterations_):
+            self.row[:] = self.training_data[i % len(self.training_data)]
+            if self.scaler is not None:
+                # StandardScaler.inverse_transform, using only mean_/scale_ like predict
+                self.row *= self.scaler.scale_
+                self.row += self.scaler.mean_
+            self.predict()
+
+    def predict(self, row_: np.ndarray = None) -> int:
+        """
+        Predict one feature row.
+
+        Args:
+            row_: Feature values in self.features order (defaults to the preallocated self.row)
+
+        Returns:
+            Prediction (-1 for lower, 1 for higher)
+        """
+        row = self.row if row_ is None else row_
+        if np.isnan(row).any():
+            raise ValueError("Feature row contains NaN (indicators still warming up)")
+        if self.scaler is not None:
+            # Same in-place steps as StandardScaler.transform
+            np.subtract(row, self.scaler.mean_, out=self._scaled_row)
+            np.divide(self._scaled_row, self.scaler.scale_, out=self._scaled_row)
+            row = self._scaled_row
+        distances, indices = self.tree.query(row, k=self.n_neighbors)
+        neighbor_labels = self.labels[np.atleast_1d(indices)]
+        if self.distance_weighted:
+            distances = np.atleast_1d(distances)
+            with np.errstate(divide="ignore"):
+                weights = 1.0 / distances
+            if np.isinf(weights).any():
+                weights = np.isinf(weights).astype(np.float64) # Exact matches outvote everything else
+            votes = np.bincount(neighbor_labels, weights=weights, minlength=len(self.classes))
+        else:
+            votes = np.bincount(neighbor_labels, minlength=len(self.classes))
+        return self.classes[votes.argmax()]
+
+
+class BundlePredictor:
+    """
+    Single-row predictor for a bundled model other than KNN (e.g. a RandomForestClassifier).
+
+    Rows go through ModelBundle.predict, so a prediction costs what the model's own
+    predict does; this gives such bundles the row/features/predict interface of KNNPredictor.
+    """
+
+    def __init__(self, bundle_: ModelBundle, warmup_: int = 10):
+        """
+        Args:
+            bundle_: Loaded model bundle (see load_model_bundle)
+            warmup_: Number of predictions run at startup so the first live one is not cold
+        """
+        self.bundle = bundle_
+        self.features = bundle_.features
+        self.row = np.empty(len(self.features), dtype=np.float64)
+        self.warmup(warmup_)
+
+    def warmup(self, iterations_: int = 10) -> None:
+        for i in range(iterations_):
+            self.row[:] = 0.0 if self.bundle.scaler is None else self.bundle.scaler.mean_
+            self.predict()
+
+    def predict(self, row_: np.ndarray = None) -> int:
+        """
+        Predict one feature row.
+
+        Args:
+            row_: Feature values in self.features order (defaults to the preallocated self.row)
+
+        Returns:
+            Prediction (-1 for lower, 1 for higher)
+        """
+        row = self.row if row_ is None else row_
+        if np.isnan(row).any():
+            raise ValueError("Feature row contains NaN (indicators still warming up)")
+        return self.bundle.predict(row.reshape(1, -1))[0]
+
+
+def load_predictor(bundle_dir: str = "knn_bundle", model_filename: str = "knn_model1.pkl"):
+    """
+    Load the live predictor, preferring a scaled model bundle when one has been saved.
+
+    Args:
+        bundle_dir: Model bundle directory (see save_model_bundle)
+        model_filename: Plain KNN model file used when there is no bundle
+
+    Returns:
+        Warmed-up KNNPredictor (CompactKNN when the bundle has one, BundlePredictor when it holds
+        another model type), or None if no model could be loaded
+    """
+    if os.path.isdir(bundle_dir):
+        compact = load_compact_knn(bundle_dir=bundle_dir)
+        if compact is not None:
+            return compact
+        arrays = load_predictor_arrays(bundle_dir=bundle_dir)
+        if arrays is not None:
+            # Same predictor as from_bundle, without unpickling the model
+            _check_configuration(arrays['metric'], arrays['weights'])
+            return KNNPredictor.from_arrays(arrays['training_data'], arrays['labels'], arrays['classes'], arrays['n_neighbors'],
+                                            arrays['weights'] == "distance", arrays['features'], arrays['scaler'], warmup_=10)
+        bundle = load_model_bundle(bundle_dir=bundle_dir)
+        if bundle is None:
+            return None
+        if bundle.manifest.get('model_type') != "KNeighborsClassifier":
+            return BundlePredictor(bundle)
+        return KNNPredictor.from_bundle(bundle)
+    model = load_knn_model(model_filename=model_filename)
+    return KNNPredictor(model) if model is not None else None
+
+
+def measure_latency(predict_, iterations_: int = 1000) -> dict:
+    """
+    Time repeated calls of a zero-argument predict function.
+
+    Returns:
+        Dictionary with p50/p99/mean latency in microseconds
+    """
+    timings = np.empty(iterations_)
+    for i in range(iterations_):
+        start_time = time.perf_counter()
+        predict_()
+        timings[i] = time.perf_counter() - start_time
+    timings *= 1_000_000
+    return {
+        'p50_us': float(np.percentile(timings, 50)),
+        'p99_us': float(np.percentile(timings, 99)),
+        'mean_us': float(timings.mean())
+    }
@@ -0,0 +1,198 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import sys
+import time
+from datetime import date, timedelta
+import pandas as pd
+
+import main as trading
+from alpaca_paper_trading import get_positions
+from bar_buffer import BarBuffer
+from bar_store import BarStore
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient, FakeTradingClient
+from instrumentation import metrics
+from predictor import load_predictor
+
+# Offline replay of the live loop. main() runs unchanged against a
+# FakeStockHistoricalDataClient serving recorded (or synthetic) minute bars and
+# a FakeTradingClient that fills at the latest published close, while a virtual
+# clock stands in for time.sleep: every sleep moves the clock forward and
+# publishes the bars that closed in the meantime. A full session (390 cycles)
+# replays in seconds, so throughput and per-stage latency can be measured
+# deterministically without network access.
+# Run from the repo root:
+#   python replay.py --day 2025-01-06 --store bar_data
+#   python replay.py --day 2025-01-06 --synthetic
+
+
+class VirtualClock:
+    """
+    Stand-in for the time module in main(): sleep() advances the clock instead of blocking.
+
+    With data_client_ given, its clock follows, so bars become visible as their minute closes.
+    """
+
+    def __init__(self, start_: float, data_client_: FakeStockHistoricalDataClient = None):
+        """
+        Args:
+            start_: Epoch seconds the replay starts at
+            data_client_: Fake data client kept in step with the clock
+        """
+        self.now = start_
+        self.data_client = data_client_
+        self.sleeps = 0
+        if data_client_ is not None:
+            data_client_.clock = start_
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds_: float) -> None:
+        self.sleeps += 1
+        self.now += seconds_
+        if self.data_client is not None:
+            self.data_client.clock = self.now
+
+
+def raw_bars_from_frame(data_: pd.DataFrame) -> list:
+    """
+    Convert a bar frame (e.g. BarStore.read output) into raw get_stock_bars bar dictionaries.
+
+    Args:
+        data_: DataFrame with close/high/low/open/volume columns and a timezone-aware index
+
+    Returns:
+        List of {'t', 'o', 'h', 'l', 'c', 'v', 'n', 'vw'} dictionaries, oldest first
+    """
+    timestamps = data_.index.tz_convert("UTC").strftime("%Y-%m-%dT%H:%M:%SZ").tolist()
+    return [
+        {'c': c, 'h': h, 'l': l, 'n': 0, 'o': o, 't': t, 'v': int(v), 'vw': round((h + l + c) / 3, 4)}
+        for t, o, h, l, c, v in zip(timestamps, data_['open'].tolist(), data_['high'].tolist(), data_['low'].tolist(),
+                                    data_['close'].tolist(), data_['volume'].tolist())
+    ]
+
+
+def load_recorded_bars(store_root_: str, symbol_: str, day_: date, history_days_: int = 4) -> dict:
+    """
+    Read the bars main() would see on day_ (the day plus the lookback before it) from a bar store.
+
+    Args:
+        store_root_: BarStore directory
+        symbol_: Stored symbol to replay
+        day_: Trading day to replay
+        history_days_: Days before day_ included for the first lookback
+
+    Returns:
+        Raw bars keyed by "TSLA", the symbol main() trades
+    """
+    frame = BarStore(store_root_).read(symbol_, day_ - timedelta(days=history_days_), day_)
+    return {"TSLA": raw_bars_from_frame(frame)}
+
+
+def synthetic_bars(day_: date, history_days_: int = 4, seed_: int = 0) -> dict:
+    """Synthetic minute bars for the 4:00-20:00 weekday minutes of day_ and the history_days_ before it, keyed by "TSLA"."""
+    start = pd.Timestamp(day_ - timedelta(days=history_days_)).strftime("%Y-%m-%d 00:00")
+    bars = make_raw_bars(["TSLA"], (history_days_ + 1) * 1440, start_=start, seed_=seed_)["TSLA"]
+    index = pd.to_datetime([bar['t'] for bar in bars], utc=True).tz_convert("America/New_York")
+    # Only the minutes the bars endpoint has data for (premarket, regular and after hours)
+    keep = (index.weekday < 5) & (index.hour >= 4) & (index.hour < 20)
+    return {"TSLA": [bar for bar, kept in zip(bars, keep) if kept]}
+
+
+def replay_day(raw_bars_: dict, day_: date, predictor_, cycles_: int = 390, data_latency_: float = 0.0,
+               trading_latency_: float = 0.0, quiet_: bool = True) -> dict:
+    """
+    Run main() over one session with fake clients and a virtual clock.
+
+    The clock starts when the 9:30 bar closes and main() sleeps to the next minute after
+    every cycle, so the default 390 cycles cover the regular session.
+
+    Args:
+        raw_bars_: Raw bars keyed by "TSLA" (see load_recorded_bars or synthetic_bars)
+        day_: Trading day to replay
+        predictor_: Predictor main() uses (e.g. from load_predictor)
+        cycles_: main() iterations to run
+        data_latency_: Seconds slept per fake data API page (real time, not virtual)
+        trading_latency_: Seconds slept per fake trading API call (real time, not virtual)
+        quiet_: Discard main()'s per-cycle output
+
+    Returns:
+        Dictionary with throughput, per-stage latency, API call counts, orders and final positions
+    """
+    session_open = pd.Timestamp(day_).tz_localize("America/New_York") + pd.Timedelta(hours=9, minutes=30)
+    data_client = FakeStockHistoricalDataClient(raw_bars_, latency_=data_latency_)
+    clock = VirtualClock(session_open.timestamp() + 60, data_client)
+    trading_client = FakeTradingClient(latency_=trading_latency_, price_lookup_=data_client.latest_close)
+
+    def setup(symbol_: str = "TSLA"):
+        bar_buffer = BarBuffer(client_=data_client, symbol_=symbol_, max_bars_=1000, limit_=1000, clock_=clock.time)
+        return trading_client, bar_buffer, predictor_
+
+    was_enabled = metrics.enabled
+    metrics.enable()
+    metrics.reset()
+    output = contextlib.redirect_stdout(io.StringIO()) if quiet_ else contextlib.nullcontext()
+    start_time = time.perf_counter()
+    try:
+        with output:
+            trading.main(setup_=setup, clock_=clock, cycles_=cycles_)
+        wall_seconds = time.perf_counter() - start_time
+        snapshot = metrics.snapshot()
+    finally:
+        if not was_enabled:
+            metrics.disable()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        positions = get_positions(trading_client)
+    orders = [(order.symbol, order.side, order.qty, order.status, order.filled_avg_price) for order in trading_client.orders]
+    simulated_seconds = clock.now - (session_open.timestamp() + 60)
+    return {
+        'cycles': snapshot['cycles'],
+        'simulated_minutes': simulated_seconds / 60,
+        'wall_seconds': wall_seconds,
+        'cycles_per_second': snapshot['cycles'] / wall_seconds,
+        'speedup': simulated_seconds / wall_seconds,
+        'stages_ms': {name: {'p50': summary['p50'] * 1000, 'p99': summary['p99'] * 1000}
+                      for name, summary in sorted(snapshot['stages'].items())},
+        'api_calls': snapshot['api_calls'],
+        'data_requests': data_client.calls,
+        'orders': len(orders),
+        'buys': sum(side == "buy" for _, side, _, _, _ in orders),
+        'sells': sum(side == "sell" for _, side, _, _, _ in orders),
+        'orders_digest': hashlib.sha256(repr(orders).encode()).hexdigest()[:16],
+        'positions': positions,
+        'cash': trading_client.cash
+    }
+
+
+def main(arguments_: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay one trading day through main() offline")
+    parser.add_argument("--day", required=True, help="Trading day to replay (YYYY-MM-DD)")
+    parser.add_argument("--store", default="bar_data", help="BarStore directory with the recorded bars")
+    parser.add_argument("--symbol", default="TSLA", help="Stored symbol to replay")
+    parser.add_argument("--synthetic", action="store_true", help="Replay synthetic bars instead of recorded ones")
+    parser.add_argument("--cycles", type=int, default=390)
+    parser.add_argument("--verbose", action="store_true", help="Show main()'s per-cycle output")
+    arguments = parser.parse_args(arguments_)
+
+    day = date.fromisoformat(arguments.day)
+    predictor = load_predictor()
+    if predictor is None:
+        print("Failed to load model. Please train a model first.")
+        return 1
+    raw_bars = synthetic_bars(day) if arguments.synthetic else load_recorded_bars(arguments.store, arguments.symbol, day)
+    if not raw_bars["TSLA"]:
+        print(f"No recorded bars for {arguments.symbol} around {day} in {arguments.store}")
+        return 1
+    for key, value in replay_day(raw_bars, day, predictor, cycles_=arguments.cycles, quiet_=not arguments.verbose).items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
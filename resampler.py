@@ -0,0 +1,326 @@
+import re
+import numpy as np
+import pandas as pd
+import pytz
+
+from alpaca_data import add_technical_indicators, market_status_codes, market_status_labels
+from indicators import StreamingIndicators
+
+# Higher timeframes (5Min, 15Min, 1Hour, 1Day, ...) derived locally from the
+# 1-minute series instead of fetching each timeframe from the API.
+# resample_bars aggregates a whole frame at once; TimeframeAggregator does the
+# same one minute bar at a time and hands back each higher-timeframe bar as
+# soon as its last minute arrives. With the defaults (every session, buckets on
+# clock boundaries stamped with their start) the bars are aggregated the way
+# Alpaca's bars endpoint aggregates them. sessions_ keeps only some sessions
+# and split_sessions_ stops a bucket from spanning a session boundary (e.g.
+# the 9:00 hour bar splits into 9:00-9:29 pre-market and 9:30-9:59 regular);
+# anchor_="session" starts the buckets at the session open instead (9:30,
+# 10:30, ... for regular-hours hour bars).
+
+eastern_time_zone = pytz.timezone("America/New_York")
+nanoseconds_per_minute = 60 * 1_000_000_000
+minutes_per_day = 24 * 60
+
+# First and last (exclusive) minute of day of each session code in market_status_labels order;
+# closed spans two ranges, split at 4:00
+session_starts = np.array([0, 4 * 60, 9 * 60 + 30, 16 * 60], dtype=np.int64)
+session_ends = np.array([4 * 60, 9 * 60 + 30, 16 * 60, 20 * 60], dtype=np.int64)
+timeframe_units = {'Min': 1, 'Hour': 60, 'Day': minutes_per_day}
+
+
+def timeframe_minutes(timeframe_: str) -> int:
+    """Length in minutes of a timeframe written like alpaca-py's TimeFrame ("5Min", "1Hour", "1Day")."""
+    match = re.fullmatch(r"(\d+)(Min|Hour|Day)", str(timeframe_))
+    if match is None:
+        raise ValueError(f"Unsupported timeframe: {timeframe_}")
+    minutes = int(match.group(1)) * timeframe_units[match.group(2)]
+    if minutes > minutes_per_day or (minutes > 60 and minutes_per_day % minutes and minutes != minutes_per_day):
+        raise ValueError(f"Unsupported timeframe: {timeframe_}")
+    return minutes
+
+
+def _session_bounds(minute_of_day_, codes_):
+    # Session start/end minute of day for each bar (the closed session after 20:00 runs to midnight)
+    starts = session_starts[codes_]
+    ends = session_ends[codes_]
+    late = (codes_ == 0) & (minute_of_day_ >= 20 * 60)
+    return np.where(late, 20 * 60, starts), np.where(late, minutes_per_day, ends)
+
+
+def _bucket_bounds(minute_of_day_, codes_, minutes_: int, anchor_: str, split_sessions_: bool):
+    """Start and end (exclusive) minute of day of the bucket holding each bar."""
+    if minutes_ == minutes_per_day:
+        start = np.zeros_like(minute_of_day_)
+        end = np.full_like(minute_of_day_, minutes_per_day)
+        if split_sessions_:
+            start, end = _session_bounds(minute_of_day_, codes_)
+        return start, end
+    session_start, session_end = _session_bounds(minute_of_day_, codes_)
+    origin = session_start if anchor_ == "session" else 0
+    start = origin + (minute_of_day_ - origin) // minutes_ * minutes_
+    end = start + minutes_
+    if split_sessions_:
+        start = np.maximum(start, session_start)
+        end = np.minimum(end, session_end)
+    return start, np.minimum(end, minutes_per_day)
+
+
+def resample_bars(data_: pd.DataFrame, timeframe_: str, sessions_: list = None, split_sessions_: bool = False,
+                  anchor_: str = "clock") -> pd.DataFrame:
+    """
+    Aggregate 1-minute bars into a higher timeframe.
+
+    Args:
+        data_: 1-minute bars shaped like data_frame_from_stock_bars output (ET index)
+        timeframe_: Target timeframe, e.g. "5Min", "15Min", "1Hour", "1Day"
+        sessions_: market_status values to keep (None keeps every session, as the API does)
+        split_sessions_: Never let a bar span two sessions
+        anchor_: "clock" aligns buckets to clock boundaries, "session" to each session's open
+
+    Returns:
+        Frame with the same columns, one row per higher-timeframe bar stamped with its start
+        (ET); open is the first minute's open, close the last minute's close, high/low the
+        extremes and volume the sum
+    """
+    minutes = timeframe_minutes(timeframe_)
+    data_ = data_.sort_index()
+    codes = market_status_codes(data_.index)
+    if sessions_ is not None:
+        keep = np.isin(codes, [market_status_labels.index(session) for session in sessions_])
+        data_ = data_[keep]
+        codes = codes[keep]
+    if len(data_) == 0:
+        return data_[['close', 'high', 'low', 'open', 'volume', 'market_status']].iloc[:0]
+
+    utc_minutes = data_.index.asi8 // nanoseconds_per_minute
+    wall_minutes = data_.index.tz_localize(None).asi8 // nanoseconds_per_minute
+    minute_of_day = wall_minutes % minutes_per_day
+    bucket_start, _ = _bucket_bounds(minute_of_day, codes, minutes, anchor_, split_sessions_)
+    # Buckets are identified by their UTC start minute, so the repeated 1:00 hour at the end of DST stays apart
+    keys = utc_minutes - (minute_of_day - bucket_start)
+    if minutes == minutes_per_day:
+        keys = wall_minutes - minute_of_day + bucket_start
+    if split_sessions_:
+        keys = keys * 4 + codes
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    if minutes == minutes_per_day:
+        # Stamp daily bars at the bucket start on the ET wall clock (midnight, or the session open when split)
+        stamps = pd.DatetimeIndex((wall_minutes[starts] - minute_of_day[starts] + bucket_start[starts]) * nanoseconds_per_minute).tz_localize(eastern_time_zone)
+    else:
+        stamps = pd.DatetimeIndex((utc_minutes[starts] - (minute_of_day[starts] - bucket_start[starts])) * nanoseconds_per_minute).tz_localize("UTC").tz_convert(eastern_time_zone)
+
+    high = data_['high'].to_numpy()
+    low = data_['low'].to_numpy()
+    return pd.DataFrame({
+        'close': data_['close'].to_numpy()[ends - 1],
+        'high': np.maximum.reduceat(high, starts),
+        'low': np.minimum.reduceat(low, starts),
+        'open': data_['open'].to_numpy()[starts],
+        'volume': np.add.reduceat(data_['volume'].to_numpy(), starts),
+        'market_status': pd.Categorical.from_codes(codes[starts], categories=market_status_labels)
+    }, index=stamps.rename('timestamp'))
+
+
+class TimeframeAggregator:
+    """
+    Builds one higher timeframe incrementally from minute bars.
+
+    update returns each higher-timeframe bar once it is complete: when its last minute
+    arrives, or, if that minute has no bar, when the first bar of a later bucket does.
+    The bars match resample_bars with the same arguments.
+    """
+
+    def __init__(self, timeframe_: str, sessions_: list = None, split_sessions_: bool = False, anchor_: str = "clock"):
+        """
+        Args:
+            timeframe_: Target timeframe, e.g. "15Min"
+            sessions_: market_status values to keep (None keeps every session)
+            split_sessions_: Never let a bar span two sessions
+            anchor_: "clock" or "session" (see resample_bars)
+        """
+        self.timeframe = timeframe_
+        self.minutes = timeframe_minutes(timeframe_)
+        self.sessions = None if sessions_ is None else set(sessions_)
+        self.split_sessions = split_sessions_
+        self.anchor = anchor_
+        self.current = None # partial bar: [key, start, close, high, low, open, volume, market_status]
+
+    def _bounds(self, timestamp_: pd.Timestamp, market_status_: str):
+        # Scalar form of _bucket_bounds (numpy on single values costs more than the arithmetic)
+        minute_of_day = timestamp_.hour * 60 + timestamp_.minute
+        code = market_status_labels.index(market_status_)
+        if code == 0 and minute_of_day >= 20 * 60:
+            session_start, session_end = 20 * 60, minutes_per_day
+        else:
+            session_start, session_end = int(session_starts[code]), int(session_ends[code])
+        if self.minutes == minutes_per_day:
+            start, end = (session_start, session_end) if self.split_sessions else (0, minutes_per_day)
+            return minute_of_day, start, end, code
+        origin = session_start if self.anchor == "session" else 0
+        start = origin + (minute_of_day - origin) // self.minutes * self.minutes
+        end = start + self.minutes
+        if self.split_sessions:
+            start = max(start, session_start)
+            end = min(end, session_end)
+        return minute_of_day, start, min(end, minutes_per_day), code
+
+    def _emit(self) -> dict:
+        key, start, close, high, low, open_, volume, market_status = self.current
+        self.current = None
+        return {'timestamp': start, 'close': close, 'high': high, 'low': low, 'open': open_, 'volume': volume, 'market_status': market_status}
+
+    def update(self, timestamp_: pd.Timestamp, open_: float, high_: float, low_: float, close_: float, volume_: float,
+               market_status_: str) -> list:
+        """
+        Add one minute bar (in time order).
+
+        Returns:
+            Completed higher-timeframe bars (usually none, at most two), oldest first
+        """
+        if self.sessions is not None and market_status_ not in self.sessions:
+            return []
+        minute_of_day, bucket_start, bucket_end, code = self._bounds(timestamp_, market_status_)
+        utc_minute = timestamp_.value // nanoseconds_per_minute
+        if self.minutes == minutes_per_day:
+            # Daily buckets are identified and stamped by their ET wall clock start
+            key = utc_minute + int(timestamp_.utcoffset().total_seconds()) // 60 - minute_of_day + bucket_start
+        else:
+            key = utc_minute - (minute_of_day - bucket_start)
+        bucket_key = (key, code) if self.split_sessions else key
+
+        completed = []
+        if self.current is not None and self.current[0] != bucket_key:
+            completed.append(self._emit())
+        if self.current is None:
+            if self.minutes == minutes_per_day:
+                start = pd.Timestamp(key * nanoseconds_per_minute).tz_localize(eastern_time_zone)
+            else:
+                start = pd.Timestamp(key * nanoseconds_per_minute, tz="UTC").tz_convert(eastern_time_zone)
+            self.current = [bucket_key, start, close_, high_, low_, open_, volume_, market_status_]
+        else:
+            current = self.current
+            current[2] = close_
+            if high_ > current[3]:
+                current[3] = high_
+            if low_ < current[4]:
+                current[4] = low_
+            current[6] += volume_
+        if minute_of_day + 1 >= bucket_end:
+            completed.append(self._emit()) # Last minute of the bucket
+        return completed
+
+
+class MultiTimeframeIndicators:
+    """
+    Higher-timeframe bars and their indicators kept up to date from minute bars.
+
+    Each timeframe feeds its completed bars to a StreamingIndicators, so the values are
+    what add_technical_indicators gives on resample_bars output. feature("RSI_15Min")
+    returns the newest completed 15-minute bar's RSI (NaN until there is one).
+    """
+
+    def __init__(self, timeframes_: list, sessions_: list = None, split_sessions_: bool = False, anchor_: str = "clock"):
+        """
+        Args:
+            timeframes_: Timeframes to maintain, e.g. ["5Min", "15Min", "1Hour"]
+            sessions_: market_status values to keep (None keeps every session)
+            split_sessions_: Never let a bar span two sessions
+            anchor_: "clock" or "session" (see resample_bars)
+        """
+        self.aggregators = {timeframe: TimeframeAggregator(timeframe, sessions_, split_sessions_, anchor_) for timeframe in timeframes_}
+        self.indicators = {timeframe: StreamingIndicators() for timeframe in timeframes_}
+        self.latest = {timeframe: None for timeframe in timeframes_}
+        self._values = {f"{column}_{timeframe}": np.nan for timeframe in timeframes_ for column in StreamingIndicators.columns}
+
+    def update(self, timestamp_: pd.Timestamp, open_: float, high_: float, low_: float, close_: float, volume_: float,
+               market_status_: str) -> None:
+        for timeframe, aggregator in self.aggregators.items():
+            for bar in aggregator.update(timestamp_, open_, high_, low_, close_, volume_, market_status_):
+                values = self.indicators[timeframe].update(bar['high'], bar['low'], bar['close'])
+                for column, value in values.items():
+                    self._values[f"{column}_{timeframe}"] = value
+                self.latest[timeframe] = bar
+
+    def feature(self, name_: str) -> float:
+        return self._values[name_]
+
+    def values(self) -> dict:
+        return dict(self._values)
+
+
+def add_multi_timeframe_indicators(data_: pd.DataFrame, timeframes_: list, sessions_: list = None,
+                                   split_sessions_: bool = False, anchor_: str = "clock") -> pd.DataFrame:
+    """
+    Add each timeframe's indicators to a 1-minute frame, for training on the live features.
+
+    A row gets the indicators of the newest higher-timeframe bar completed by that row,
+    exactly what MultiTimeframeIndicators holds after the row's bar was fed to it.
+
+    Args:
+        data_: 1-minute bars (e.g. filter_regular_hours output)
+        timeframes_: Timeframes to add, e.g. ["5Min", "15Min"]
+        sessions_, split_sessions_, anchor_: As for resample_bars
+
+    Returns:
+        data_ sorted by time with "<indicator>_<timeframe>" columns added (e.g. "RSI_15Min")
+    """
+    data_ = data_.sort_index()
+    codes = market_status_codes(data_.index)
+    minute_of_day = (data_.index.tz_localize(None).asi8 // nanoseconds_per_minute) % minutes_per_day
+    kept = np.ones(len(data_), dtype=bool) if sessions_ is None else np.isin(codes, [market_status_labels.index(session) for session in sessions_])
+    kept_positions = np.flatnonzero(kept)
+
+    for timeframe in timeframes_:
+        minutes = timeframe_minutes(timeframe)
+        higher = add_technical_indicators(resample_bars(data_, timeframe, sessions_, split_sessions_, anchor_))
+        _, bucket_end = _bucket_bounds(minute_of_day[kept], codes[kept], minutes, anchor_, split_sessions_)
+
+        # Row (within the kept rows) at which each higher bar is emitted: its last row when that is the
+        # bucket's last minute, otherwise the first row of the next bucket
+        bar_numbers = np.searchsorted(higher.index.asi8, data_.index.asi8[kept_positions], side="right") - 1
+        last_rows = np.flatnonzero(np.r_[bar_numbers[1:] != bar_numbers[:-1], True])
+        complete_on_last = minute_of_day[kept_positions[last_rows]] + 1 >= bucket_end[last_rows]
+        emit_rows = np.where(complete_on_last, last_rows, last_rows + 1)
+
+        for column in StreamingIndicators.columns:
+            values = np.full(len(data_), np.nan)
+            emitted = emit_rows < len(kept_positions)
+            values[kept_positions[emit_rows[emitted]]] = higher[column].to_numpy()[emitted]
+            # Carry forward from the emitting row; rows before the first emission stay NaN
+            has_value = np.zeros(len(data_), dtype=bool)
+            has_value[kept_positions[emit_rows[emitted]]] = True
+            carry = np.maximum.accumulate(np.where(has_value, np.arange(len(data_)), -1))
+            data_[f"{column}_{timeframe}"] = np.where(carry >= 0, values[np.maximum(carry, 0)], np.nan)
+    return data_
+
+
+def compare_bars(resampled_: pd.DataFrame, reference_: pd.DataFrame, tolerance_: float = 1e-9) -> dict:
+    """
+    Compare resampled bars with bars of the same timeframe from the API.
+
+    Args:
+        resampled_: resample_bars output
+        reference_: data_frame_from_stock_bars output of a request for the same timeframe and window
+        tolerance_: Largest price difference still counted as equal
+
+    Returns:
+        Dictionary with the bar counts, timestamps present on only one side and the
+        timestamps whose OHLCV differ
+    """
+    common = resampled_.index.intersection(reference_.index)
+    left = resampled_.loc[common]
+    right = reference_.loc[common]
+    differs = np.zeros(len(common), dtype=bool)
+    for column in ('open', 'high', 'low', 'close'):
+        differs |= np.abs(left[column].to_numpy() - right[column].to_numpy()) > tolerance_
+    differs |= left['volume'].to_numpy() != right['volume'].to_numpy()
+    return {
+        'resampled_bars': len(resampled_),
+        'reference_bars': len(reference_),
+        'only_resampled': list(resampled_.index.difference(reference_.index)),
+        'only_reference': list(reference_.index.difference(resampled_.index)),
+        'different': list(common[differs])
+    }
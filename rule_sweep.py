@@ -0,0 +1,272 @@
+import argparse
+import itertools
+import sys
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from indicators import moving_averages, relative_strength_index
+
+# Parameter sweep for the RSI/moving-average crossover in hardcoded_algorithms,
+# generalized to any RSI length, buy/sell thresholds and fast/slow moving
+# averages:
+#   buy:  RSI crosses up through rsi_lower and close is above both averages
+#   sell: RSI crosses down through rsi_upper and close is below either average
+# (RSI_MA_Crossover is rsi_length=14, rsi_lower=30, rsi_upper=70, fast=40, slow=80.)
+# Every symbol's bars sit in one row of a 2D array (time along axis 1, NaN after
+# its last bar), so each indicator is computed once for all symbols. Parameter
+# sets are grouped by (rsi_length, fast, slow), so the comparisons against the
+# averages are shared by every threshold pair, and the groups run in a joblib
+# process pool, which memory-maps the shared arrays into the workers as
+# walk_forward does. Trading follows backtest.run_backtest with market orders
+# (each buy signal buys quantity_ shares at the next bar's open, each sell signal
+# sells everything), but only the fills are visited: PnL and Sharpe follow from
+# the positions between fills, so a parameter set costs little more than finding
+# its RSI crossings. Drawdowns need the full equity curve; get them for a chosen
+# parameter set from run_backtest on its rule_signals row.
+# Run from the repo root:
+#   python rule_sweep.py --store bar_data --symbols TSLA AAPL
+#   python rule_sweep.py --synthetic 8
+
+bars_per_year = 252 * 390
+
+
+def parameter_grid(rsi_lower_: tuple = (20, 25, 30, 35), rsi_upper_: tuple = (65, 70, 75, 80), fast_lengths_: tuple = (10, 20, 40),
+                   slow_lengths_: tuple = (80, 120, 160), rsi_lengths_: tuple = (14,)) -> list:
+    """
+    Every combination of the given values with rsi_lower < rsi_upper and fast < slow.
+
+    Returns:
+        List of {'rsi_length', 'rsi_lower', 'rsi_upper', 'fast', 'slow'} dictionaries
+    """
+    return [
+        {'rsi_length': rsi_length, 'rsi_lower': lower, 'rsi_upper': upper, 'fast': fast, 'slow': slow}
+        for rsi_length, fast, slow, lower, upper in itertools.product(rsi_lengths_, fast_lengths_, slow_lengths_, rsi_lower_, rsi_upper_)
+        if lower < upper and fast < slow
+    ]
+
+
+def build_sweep_arrays(frames_: dict, ma_lengths_: list, rsi_lengths_: list) -> dict:
+    """
+    Lay out every symbol's bars as one row and compute the indicators the grid needs once.
+
+    Args:
+        frames_: {symbol: DataFrame with open/close columns} in chronological order (e.g. regular-hours bars)
+        ma_lengths_: Moving average lengths used by any parameter set
+        rsi_lengths_: RSI lengths used by any parameter set
+
+    Returns:
+        Dictionary with symbols, lengths (bars per symbol), open, close, sma {length: array},
+        rsi {length: array}, close_change and squared_changes (its running sum of squares);
+        every array has one row per symbol
+    """
+    symbols = list(frames_)
+    lengths = np.array([len(frames_[symbol]) for symbol in symbols])
+    open_ = np.full((len(symbols), lengths.max()), np.nan)
+    close = np.full((len(symbols), lengths.max()), np.nan)
+    for row, symbol in enumerate(symbols):
+        open_[row, :lengths[row]] = frames_[symbol]['open'].to_numpy(dtype=np.float64)
+        close[row, :lengths[row]] = frames_[symbol]['close'].to_numpy(dtype=np.float64)
+    close_change = np.diff(close, axis=1, prepend=close[:, :1])
+    return {
+        'symbols': symbols,
+        'lengths': lengths,
+        'open': open_,
+        'close': close,
+        'sma': moving_averages(close, sorted(set(ma_lengths_))),
+        'rsi': {length: relative_strength_index(close, length) for length in sorted(set(rsi_lengths_))},
+        'close_change': close_change,
+        'squared_changes': np.cumsum(close_change ** 2, axis=1)
+    }
+
+
+def _crosses(rsi_: np.ndarray, threshold_: float, upward_: bool) -> np.ndarray:
+    previous = np.empty_like(rsi_)
+    previous[:, 0] = np.nan
+    previous[:, 1:] = rsi_[:, :-1]
+    # Comparisons with NaN are False, exactly as in RSI_MA_Crossover
+    if upward_:
+        return (previous < threshold_) & (rsi_ >= threshold_)
+    return (previous > threshold_) & (rsi_ <= threshold_)
+
+
+def rule_signals(arrays_: dict, params_: dict) -> np.ndarray:
+    """
+    Signals of one parameter set for every symbol and bar (e.g. for backtest.run_backtest on one row).
+
+    Returns:
+        int8 array shaped like arrays_['close'] (1 buy, -1 sell, 0 hold)
+    """
+    close = arrays_['close']
+    fast, slow = arrays_['sma'][params_['fast']], arrays_['sma'][params_['slow']]
+    rsi = arrays_['rsi'][params_['rsi_length']]
+    buy = _crosses(rsi, params_['rsi_lower'], True) & (close > fast) & (close > slow)
+    sell = _crosses(rsi, params_['rsi_upper'], False) & ((close < fast) | (close < slow))
+    return np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+
+
+def _backtest_events(arrays_: dict, buy_keys_: np.ndarray, sell_keys_: np.ndarray, quantity_: int, slippage_bps_: float,
+                     commission_per_share_: float, initial_cash_: float) -> dict:
+    # backtest.run_backtest (market orders) for every symbol at once, computed from the fills alone.
+    # Keys are row * bars + bar of the bars a buy or sell was decided on; each symbol trades with its own initial_cash_.
+    close, lengths = arrays_['close'], arrays_['lengths']
+    symbols, bars = close.shape
+    keys = np.concatenate((buy_keys_, sell_keys_))
+    order = np.argsort(keys, kind="stable")
+    is_buy = (order < len(buy_keys_))
+    rows, fill_bars = np.divmod(keys[order] + 1, bars)
+    keep = (fill_bars > 0) & (fill_bars < lengths[rows]) # orders decided on a symbol's last bar never fill
+    rows, fill_bars, is_buy = rows[keep], fill_bars[keep], is_buy[keep]
+
+    # Position is the shares bought since the last sell (or the symbol's first order), as in run_backtest
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = rows[1:] != rows[:-1]
+    last = np.ones(len(rows), dtype=bool)
+    last[:-1] = first[1:]
+    bought = np.cumsum(np.where(is_buy, quantity_, 0))
+    position = bought - np.maximum.accumulate(np.where(~is_buy, bought, np.where(first, bought - quantity_, 0)))
+    previous = np.zeros_like(position)
+    previous[1:] = position[:-1]
+    previous[first] = 0
+    traded = position - previous
+
+    slippage = slippage_bps_ / 10_000
+    fill_price = arrays_['open'][rows, fill_bars] * np.where(traded > 0, 1 + slippage, 1 - slippage)
+    commissions = np.abs(traded) * commission_per_share_
+    final_position = np.zeros(symbols)
+    final_position[rows[last]] = position[last]
+    pnl = np.bincount(rows, -traded * fill_price - commissions, minlength=symbols) + final_position * close[np.arange(symbols), lengths - 1]
+
+    # Sharpe of the per-bar equity changes: between fills the change is position * close change, so the sum of
+    # squares is position^2 times a range of the cumulative squared close changes, corrected on the fill bars
+    segment_end = np.empty_like(fill_bars)
+    segment_end[:-1] = fill_bars[1:]
+    segment_end[last] = lengths[rows[last]] - 1
+    squared_changes = arrays_['squared_changes']
+    held = position.astype(np.float64) ** 2 * (squared_changes[rows, segment_end] - squared_changes[rows, fill_bars])
+    before_fill = previous * arrays_['close_change'][rows, fill_bars]
+    fill_effect = traded * (close[rows, fill_bars] - fill_price) - commissions
+    squares = np.bincount(rows, held + 2 * before_fill * fill_effect + fill_effect ** 2, minlength=symbols)
+    mean = pnl / lengths
+    variance = squares / lengths - mean ** 2
+    deviation = np.sqrt(np.maximum(variance, 0.0))
+    sharpe = np.divide(mean, deviation, out=np.zeros(symbols), where=deviation > 1e-12 * initial_cash_) * np.sqrt(bars_per_year)
+    return {
+        'pnl': pnl,
+        'sharpe': sharpe,
+        'trades': np.bincount(rows, traded != 0, minlength=symbols)
+    }
+
+
+def _evaluate_group(arrays_: dict, params_list_: list, quantity_: int, slippage_bps_: float,
+                    commission_per_share_: float, initial_cash_: float) -> list:
+    # Every parameter set in a group has the same rsi_length, fast and slow, so the moving average filters
+    # are computed once and each RSI crossing once per threshold, as the flat keys of the bars it happens on
+    first = params_list_[0]
+    close = arrays_['close']
+    fast, slow = arrays_['sma'][first['fast']], arrays_['sma'][first['slow']]
+    rsi = arrays_['rsi'][first['rsi_length']]
+    above = ((close > fast) & (close > slow)).ravel()
+    below = ((close < fast) | (close < slow)).ravel()
+    crossings = {}
+    results = []
+    for params in params_list_:
+        lower, upper = params['rsi_lower'], params['rsi_upper']
+        if ('up', lower) not in crossings:
+            keys = np.flatnonzero(_crosses(rsi, lower, True))
+            crossings['up', lower] = keys[above[keys]]
+        if ('down', upper) not in crossings:
+            keys = np.flatnonzero(_crosses(rsi, upper, False))
+            crossings['down', upper] = keys[below[keys]]
+        buy_keys = crossings['up', lower]
+        sell_keys = crossings['down', upper]
+        sell_keys = sell_keys[~np.isin(sell_keys, buy_keys)] # a bar that is both is a buy, as in RSI_MA_Crossover
+        stats = _backtest_events(arrays_, buy_keys, sell_keys, quantity_, slippage_bps_, commission_per_share_, initial_cash_)
+        results.append({
+            **params,
+            'pnl': float(stats['pnl'].sum()),
+            'return_pct': float(stats['pnl'].sum() / (initial_cash_ * len(close)) * 100),
+            'sharpe': float(stats['sharpe'].mean()),
+            'worst_symbol_pnl': float(stats['pnl'].min()),
+            'trades': int(stats['trades'].sum())
+        })
+    return results
+
+
+def sweep_rule_strategy(frames_: dict, grid_: list = None, n_jobs_: int = -1, sort_by_: str = "sharpe", quantity_: int = 1,
+                        slippage_bps_: float = 0.0, commission_per_share_: float = 0.0, initial_cash_: float = 100_000.0) -> dict:
+    """
+    Backtest every parameter set of the RSI/moving-average crossover over every symbol's full history.
+
+    Args:
+        frames_: {symbol: DataFrame with open/close columns} in chronological order
+        grid_: Parameter sets (see parameter_grid; default parameter_grid())
+        n_jobs_: Worker processes (-1 uses every core)
+        sort_by_: Column the table is ranked by, highest first (e.g. "sharpe" or "pnl")
+        quantity_: Shares bought per buy signal
+        slippage_bps_: Adverse slippage for market orders in basis points
+        commission_per_share_: Commission charged per share traded
+        initial_cash_: Starting cash of each symbol
+
+    Returns:
+        Dictionary with the ranked 'table' (one row per parameter set, summed over symbols),
+        the 'best' row, 'combinations', 'symbols' and 'sweep_seconds'
+    """
+    grid = parameter_grid() if grid_ is None else grid_
+    start_time = time.perf_counter()
+    arrays = build_sweep_arrays(frames_, [params[key] for params in grid for key in ('fast', 'slow')],
+                                [params['rsi_length'] for params in grid])
+    groups = {}
+    for params in grid:
+        groups.setdefault((params['rsi_length'], params['fast'], params['slow']), []).append(params)
+
+    results = Parallel(n_jobs=n_jobs_)(
+        delayed(_evaluate_group)(arrays, params_list, quantity_, slippage_bps_, commission_per_share_, initial_cash_)
+        for params_list in groups.values()
+    )
+    sweep_seconds = time.perf_counter() - start_time
+    table = pd.DataFrame([row for group in results for row in group])
+    table = table.sort_values(sort_by_, ascending=False, kind="stable").reset_index(drop=True)
+    return {
+        'table': table,
+        'best': table.iloc[0].to_dict(),
+        'combinations': len(table),
+        'symbols': arrays['symbols'],
+        'sweep_seconds': sweep_seconds
+    }
+
+
+def main(arguments_: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Sweep the RSI/moving-average crossover parameters over stored bars")
+    parser.add_argument("--store", default="bar_data", help="BarStore directory with the recorded bars")
+    parser.add_argument("--symbols", nargs="*", help="Stored symbols to sweep (default: every stored symbol)")
+    parser.add_argument("--synthetic", type=int, metavar="SYMBOLS", help="Sweep this many synthetic symbols instead of stored ones")
+    parser.add_argument("--sort-by", default="sharpe", help="Column the table is ranked by")
+    parser.add_argument("--slippage-bps", type=float, default=0.0)
+    parser.add_argument("--commission", type=float, default=0.0, help="Commission per share")
+    parser.add_argument("--rows", type=int, default=10, help="Rows of the ranked table to show")
+    arguments = parser.parse_args(arguments_)
+
+    if arguments.synthetic:
+        from fake_clients import make_bar_frame
+        frames = {f"SYM{index}": make_bar_frame(20_000, seed_=index) for index in range(arguments.synthetic)}
+    else:
+        from alpaca_data import filter_regular_hours
+        from bar_store import BarStore
+        store = BarStore(arguments.store)
+        frames = {symbol: filter_regular_hours(store.read(symbol)) for symbol in arguments.symbols or store.symbols()}
+        frames = {symbol: frame for symbol, frame in frames.items() if len(frame)}
+    if not frames:
+        print(f"No stored bars to sweep in {arguments.store}")
+        return 1
+
+    sweep = sweep_rule_strategy(frames, sort_by_=arguments.sort_by, slippage_bps_=arguments.slippage_bps,
+                                commission_per_share_=arguments.commission)
+    print(f"Swept {sweep['combinations']} parameter sets over {len(sweep['symbols'])} symbols in {sweep['sweep_seconds']:.2f} seconds")
+    print(sweep['table'].head(arguments.rows).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
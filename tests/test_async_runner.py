@@ -0,0 +1,80 @@
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+
+from async_runner import AsyncTradingRunner
+from bar_buffer import BarBuffer
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient, FakeTradingClient
+from instrumentation import metrics
+from model_bundle import feature_columns
+
+# AsyncTradingRunner.run_cycle against the fake data and trading clients, with the
+# instrumentation enabled (stages, API calls and bar staleness recorded for the
+# cycle) and disabled (nothing recorded, same cycle results).
+
+session_open = pd.Timestamp("2025-03-04 09:30", tz="America/New_York")
+
+
+class ScriptedPredictor:
+    """Returns the given predictions in turn."""
+
+    features = feature_columns
+
+    def __init__(self, predictions_: list):
+        self.predictions = list(predictions_)
+        self.row = np.empty(len(feature_columns))
+
+    def predict(self, row_: np.ndarray) -> int:
+        assert not np.isnan(row_).any()
+        return self.predictions.pop(0)
+
+
+@pytest.fixture
+def instrumentation():
+    enabled = metrics.enabled
+    metrics.reset()
+    yield metrics
+    metrics.enabled = enabled
+    metrics.reset()
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_run_cycle_buys_then_sells(instrumentation, enabled):
+    now = [(session_open + pd.Timedelta(hours=3, seconds=2)).timestamp()]
+    data_client = FakeStockHistoricalDataClient(make_raw_bars(["TSLA"], 2 * 1440, start_="2025-03-03 04:00"))
+    data_client.clock = now[0]
+    bar_buffer = BarBuffer(data_client, "TSLA", clock_=lambda: now[0])
+    trading_client = FakeTradingClient()
+    runner = AsyncTradingRunner(trading_client, bar_buffer, ScriptedPredictor([1, -1]), quantity_=2, clock_=lambda: now[0])
+    if enabled:
+        instrumentation.enable()
+    else:
+        instrumentation.disable()
+
+    bought = asyncio.run(runner.run_cycle())
+    assert bought['prediction'] == 1
+    assert bought['order']['success']
+    assert bought['buying_power'] is not None
+    assert bar_buffer.last_timestamp == session_open + pd.Timedelta(hours=2, minutes=59)
+    assert bought['bar_close_to_submit'] == pytest.approx(2.0)
+
+    now[0] += 60
+    data_client.clock = now[0]
+    sold = asyncio.run(runner.run_cycle())
+    assert sold['prediction'] == -1
+    assert sold['order']['success']
+    assert trading_client.positions.get("TSLA", [0.0])[0] == 0
+    assert runner.cycles == [bought, sold]
+
+    snapshot = instrumentation.snapshot()
+    if enabled:
+        assert snapshot['cycles'] == 2
+        assert {"fetch", "predict"} <= set(snapshot['stages'])
+        assert snapshot['api_calls']['get_stock_bars'] == 2
+        assert snapshot['bar_staleness_seconds'] == pytest.approx(2.0)
+    else:
+        assert snapshot['cycles'] == 0
+        assert snapshot['stages'] == {}
+        assert snapshot['api_calls'] == {}
+        assert snapshot['bar_staleness_seconds'] is None
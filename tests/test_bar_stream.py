@@ -0,0 +1,64 @@
+import asyncio
+import pandas as pd
+from alpaca.data.live.websocket import DataStream
+
+from bar_buffer import BarBuffer
+from bar_stream import ReconnectingStockDataStream, StreamingBarIngestor
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient, ReplayBarServer
+
+# StreamingBarIngestor against a local ReplayBarServer that drops the connection
+# every few bars and publishes some bars while the client is away: every
+# reconnection backfills over REST, so the buffer ends up with every bar, the
+# same as appending all of them in one go. ReconnectingStockDataStream overrides
+# alpaca-py's private DataStream._start_ws and the ingestor runs _run_forever,
+# so this also breaks if an alpaca-py upgrade (it is pinned in requirements.txt)
+# moves them.
+
+first_bar = pd.Timestamp("2025-03-03 04:00", tz="America/New_York")
+first_streamed = 1440 + 9 * 60 # 13:00 ET on the second day
+
+
+async def _stream(raw_bars_: list, streamed_bars_: int, drop_every_: int, skip_on_drop_: int) -> tuple:
+    data_client = FakeStockHistoricalDataClient({"TSLA": raw_bars_})
+    data_client.clock = pd.Timestamp(raw_bars_[first_streamed]['t']).timestamp()
+    server = ReplayBarServer({"TSLA": raw_bars_[first_streamed:first_streamed + streamed_bars_]}, drop_every_=drop_every_,
+                             skip_on_drop_=skip_on_drop_, data_client_=data_client)
+    url = await server.start()
+    bar_buffer = BarBuffer(data_client, "TSLA", clock_=lambda: data_client.clock)
+    stream = ReconnectingStockDataStream("key", "secret", url_override_=url)
+    ingestor = StreamingBarIngestor(stream, bar_buffer, decide_=lambda buffer: buffer.last_timestamp)
+    stream_task = asyncio.create_task(ingestor.run())
+    try:
+        await asyncio.wait_for(server.finished.wait(), timeout=60)
+        # Let the client take the last bar before stopping
+        while not ingestor.decisions or ingestor.decisions[-1]['decision'] != pd.Timestamp(raw_bars_[first_streamed + streamed_bars_ - 1]['t']):
+            await asyncio.sleep(0.01)
+    finally:
+        await ingestor.stop()
+        await asyncio.wait_for(stream_task, timeout=10)
+        await server.stop()
+    return server, stream, ingestor, bar_buffer
+
+
+def test_private_stream_hooks_exist():
+    assert callable(getattr(DataStream, "_start_ws", None))
+    assert callable(getattr(DataStream, "_run_forever", None))
+
+
+def test_reconnects_and_backfills_missed_bars():
+    raw_bars = make_raw_bars(["TSLA"], 2 * 1440, start_=first_bar.strftime("%Y-%m-%d %H:%M"))["TSLA"]
+    server, stream, ingestor, bar_buffer = asyncio.run(asyncio.wait_for(_stream(raw_bars, 100, 30, 3), timeout=90))
+
+    # Three drops, each skipping 3 bars; the last bar arrives on the fourth connection
+    assert (server.sent, server.skipped) == (91, 9)
+    assert server.connections == stream.connections == 4
+    # Every connection backfills over REST (the first one loads the lookback)
+    assert ingestor.backfills == 4
+    assert ingestor.backfilled_bars == len(bar_buffer) - server.sent
+    assert len(ingestor.decisions) == server.sent
+
+    expected = BarBuffer(None, "TSLA")
+    expected.append_raw({"TSLA": raw_bars[first_streamed - bar_buffer.limit:first_streamed + 100]})
+    buffered = bar_buffer.to_data_frame()
+    assert buffered.index.equals(expected.to_data_frame().index)
+    pd.testing.assert_frame_equal(buffered, expected.to_data_frame())
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import pytz
+from alpaca.data.historical.stock import StockHistoricalDataClient
+from alpaca.data.timeframe import TimeFrameUnit
+
+from alpaca_data import retrieve_stock_bars, retrieve_multi_stock_bars, data_frame_from_stock_bars, data_frames_from_multi_stock_bars
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+
+# The batched path (retrieve_multi_stock_bars + data_frames_from_multi_stock_bars) must
+# give every symbol the frame the single-symbol path (retrieve_stock_bars +
+# data_frame_from_stock_bars) gives it, including when the response is split into
+# pages that break in the middle of a symbol's bars.
+
+eastern = pytz.timezone("America/New_York")
+now = eastern.localize(datetime(2025, 3, 6, 12, 0))
+start = eastern.localize(datetime(2025, 3, 3, 4, 0))
+end = eastern.localize(datetime(2025, 3, 7, 0, 0))
+symbols = ["AAPL", "MSFT", "TSLA"]
+
+
+def _raw_bars() -> dict:
+    # Different lengths, so pages of a fixed size end at different points of each symbol
+    return {symbol: make_raw_bars([symbol], 700 + 150 * index, start_="2025-03-03 04:00", seed_=index)[symbol]
+            for index, symbol in enumerate(symbols)}
+
+
+def _paged_client(raw_bars_: dict, page_size_: int) -> StockHistoricalDataClient:
+    """A real StockHistoricalDataClient whose HTTP GET serves raw_bars_ in pages of page_size_ bars."""
+    client = StockHistoricalDataClient("key", "secret", raw_data=True)
+    pages = []
+
+    def get(path, data):
+        flat = [(symbol, bar) for symbol in sorted(data['symbols'].split(",")) for bar in raw_bars_[symbol]]
+        offset = int(data.get('page_token') or 0)
+        page = {}
+        for symbol, bar in flat[offset:offset + page_size_]:
+            page.setdefault(symbol, []).append(bar)
+        pages.append(page)
+        following = offset + page_size_
+        return {'bars': page, 'next_page_token': str(following) if following < len(flat) else None}
+
+    client.get = get
+    client.pages = pages
+    return client
+
+
+def _single_symbol_frames(raw_bars_: dict) -> dict:
+    client = FakeStockHistoricalDataClient(raw_bars_)
+    return {symbol: data_frame_from_stock_bars(retrieve_stock_bars(client, symbol, 1, TimeFrameUnit.Minute, 10_000, now_=now)).sort_index()
+            for symbol in symbols}
+
+
+def _assert_same_frames(frames_: dict, expected_: dict) -> None:
+    assert sorted(frames_) == sorted(expected_)
+    for symbol, frame in frames_.items():
+        pd.testing.assert_frame_equal(frame, expected_[symbol])
+
+
+def test_batched_frames_match_single_symbol_frames():
+    raw_bars = _raw_bars()
+    client = FakeStockHistoricalDataClient(raw_bars)
+    frames = data_frames_from_multi_stock_bars(retrieve_multi_stock_bars(client, symbols, start, end, 1, TimeFrameUnit.Minute))
+    _assert_same_frames(frames, _single_symbol_frames(raw_bars))
+
+
+def test_pages_split_inside_a_symbol_are_merged():
+    raw_bars = _raw_bars()
+    client = _paged_client(raw_bars, page_size_=400)
+    frames = data_frames_from_multi_stock_bars(retrieve_multi_stock_bars(client, symbols, start, end, 1, TimeFrameUnit.Minute))
+    # 700 + 850 + 1000 bars in pages of 400, several of which hold the end of one symbol and the start of the next
+    assert len(client.pages) == 7
+    assert sum(len(page) > 1 for page in client.pages) >= 2
+    _assert_same_frames(frames, _single_symbol_frames(raw_bars))
+
+
+def test_symbols_without_bars_are_left_out():
+    raw_bars = _raw_bars()
+    raw_bars["EMPTY"] = []
+    client = FakeStockHistoricalDataClient(raw_bars)
+    frames = data_frames_from_multi_stock_bars(retrieve_multi_stock_bars(client, symbols + ["EMPTY"], start, end, 1, TimeFrameUnit.Minute))
+    assert sorted(frames) == symbols
@@ -0,0 +1,100 @@
+import os
+import shutil
+from datetime import date
+import numpy as np
+import pandas as pd
+import pytest
+
+from alpaca_data import data_frames_from_multi_stock_bars
+from bar_store import BarStore, FIRST, COMPLETE
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+from feature_store import FeatureStore, default_indicator_config
+
+# FeatureStore's incremental updates against a rebuild from scratch, when the
+# bar store rewrites stored days: a backfill completing a live-appended day
+# (resumed from the checkpoint at its start) and a gap filled before the
+# checkpoint (recomputed from the start). Also that changing one column's spec
+# only recomputes that column and that prune removes the files it left.
+
+days = [date(2024, 1, 2), date(2024, 1, 3), date(2024, 1, 4), date(2024, 1, 5), date(2024, 1, 8)] # weekdays
+
+
+@pytest.fixture
+def stores(tmp_path):
+    raw_bars = make_raw_bars(["TSLA"], 8 * 24 * 60, start_="2024-01-02 00:00")
+    bar_store = BarStore(str(tmp_path))
+    return bar_store, FeatureStore(bar_store), FakeStockHistoricalDataClient(raw_bars), raw_bars
+
+
+def _assert_matches_rebuild(bar_store_: BarStore, feature_store_: FeatureStore) -> None:
+    incremental = feature_store_.read("TSLA").copy()
+    shutil.rmtree(os.path.join(bar_store_.root, "TSLA", "features"))
+    rebuilt = feature_store_.read("TSLA")
+    assert incremental.index.equals(rebuilt.index)
+    for column in default_indicator_config:
+        np.testing.assert_allclose(incremental[column].to_numpy(), rebuilt[column].to_numpy(), rtol=1e-12, equal_nan=True, err_msg=column)
+
+
+def _resumed_from(report_: dict) -> set:
+    return {entry['resumed_from'] for entry in report_['columns'].values()}
+
+
+def test_backfill_completing_live_day_resumes_from_checkpoint(stores):
+    bar_store, feature_store, client, raw_bars = stores
+    bar_store.backfill(client, ["TSLA"], days[0], days[1])
+    assert _resumed_from(feature_store.update("TSLA")) == {"start"}
+
+    # The live loop appends the morning of the next day, which stays incomplete
+    frame = data_frames_from_multi_stock_bars(raw_bars)["TSLA"]
+    session_open = pd.Timestamp(days[2]).tz_localize("America/New_York") + pd.Timedelta(hours=9, minutes=30)
+    bar_store.append_bars("TSLA", frame[(frame.index >= pd.Timestamp(days[2]).tz_localize("America/New_York"))
+                                        & (frame.index < session_open + pd.Timedelta(hours=1))])
+    day_rows = bar_store.day_index("TSLA")
+    report = feature_store.update("TSLA")
+    assert _resumed_from(report) == {"end"}
+    assert feature_store.is_current("TSLA")
+
+    # The backfill rewrites that day; the days before it are unchanged
+    bar_store.backfill(client, ["TSLA"], days[2], days[2])
+    report = feature_store.update("TSLA")
+    assert _resumed_from(report) == {"checkpoint"}
+    rewritten = bar_store.day_index("TSLA")
+    assert all(entry['computed_rows'] == report['rows'] - int(day_rows[-1, FIRST]) for entry in report['columns'].values())
+    assert rewritten[-1, COMPLETE] == 1
+    _assert_matches_rebuild(bar_store, feature_store)
+
+
+def test_gap_filled_before_checkpoint_recomputes_from_start(stores):
+    bar_store, feature_store, client, _ = stores
+    bar_store.backfill(client, ["TSLA"], days[0], days[1])
+    bar_store.backfill(client, ["TSLA"], days[3], days[4])
+    feature_store.update("TSLA")
+
+    bar_store.backfill(client, ["TSLA"], days[2], days[2])
+    report = feature_store.update("TSLA")
+    assert _resumed_from(report) == {"start"}
+    assert all(entry['computed_rows'] == report['rows'] for entry in report['columns'].values())
+    _assert_matches_rebuild(bar_store, feature_store)
+
+
+def test_config_change_recomputes_one_column_and_prune_removes_old_files(stores):
+    bar_store, feature_store, client, _ = stores
+    bar_store.backfill(client, ["TSLA"], days[0], days[2])
+    feature_store.update("TSLA")
+    assert feature_store.stale_files("TSLA") == []
+
+    changed = FeatureStore(bar_store, dict(default_indicator_config, MA40={'kind': "sma", 'length': 30, 'source': "close"}))
+    report = changed.update("TSLA")
+    assert report['columns']['MA40'] == {'computed_rows': report['rows'], 'resumed_from': "start"}
+    for column in ('ATR', 'RSI', 'MA80', 'MA160'):
+        assert report['columns'][column] == {'computed_rows': 0, 'resumed_from': "end"}
+    expected = changed.read("TSLA")['close'].rolling(30).mean()
+    np.testing.assert_allclose(changed.read("TSLA")['MA40'].to_numpy(), expected.to_numpy(), rtol=1e-9, equal_nan=True)
+
+    # The old MA40 files are stale for the new config, and only those
+    stale = changed.stale_files("TSLA")
+    assert stale == [f"MA40.{feature_store.keys['MA40']}.bin", f"MA40.{feature_store.keys['MA40']}.json"]
+    assert changed.prune("TSLA") == 2
+    assert changed.stale_files("TSLA") == []
+    assert changed.is_current("TSLA")
+    assert not feature_store.is_current("TSLA")
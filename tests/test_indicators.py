@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from bar_buffer import BarBuffer
+from fake_clients import make_bar_frame
+from indicators import StreamingATR, StreamingRSI, StreamingSMA, StreamingIndicators, batch_indicators, indicator_lengths
+
+# The streaming indicators (and BarBuffer, which feeds them bar by bar) against the
+# batch paths: batch_indicators on aligned arrays, and add_technical_indicators
+# (pandas_ta) on the whole frame. The frame has one flat bar (high == low), which
+# makes pandas_ta nudge every range, and the first valid value of each indicator is
+# checked so the warmup lengths stay the same.
+
+# Index of the first non-NaN value: ATR and RSI need length values after the first bar
+# (which has no previous close), the averages length closes
+first_valid = {'ATR': 20, 'RSI': 14, 'MA40': 39, 'MA80': 79, 'MA160': 159}
+
+
+def _bars():
+    frame = make_bar_frame(400, seed_=3)
+    frame.iloc[100, frame.columns.get_loc('high')] = frame['low'].iloc[100] # flat bar
+    return frame
+
+
+def _streamed(frame_) -> dict:
+    atr, rsi = StreamingATR(indicator_lengths['ATR']), StreamingRSI(indicator_lengths['RSI'])
+    averages = {column: StreamingSMA(indicator_lengths[column]) for column in ('MA40', 'MA80', 'MA160')}
+    values = {column: [] for column in StreamingIndicators.columns}
+    for high, low, close in zip(frame_['high'], frame_['low'], frame_['close']):
+        values['ATR'].append(atr.update(high, low, close))
+        values['RSI'].append(rsi.update(close))
+        for column, average in averages.items():
+            values[column].append(average.update(close))
+    return {column: np.array(series) for column, series in values.items()}
+
+
+def _assert_matches(streamed_: dict, expected_: dict) -> None:
+    for column in StreamingIndicators.columns:
+        streamed, expected = np.asarray(streamed_[column]), np.asarray(expected_[column])
+        assert np.isnan(streamed[:first_valid[column]]).all(), column
+        assert not np.isnan(streamed[first_valid[column]:]).any(), column
+        np.testing.assert_allclose(streamed, expected, rtol=1e-12, atol=0, equal_nan=True, err_msg=column)
+
+
+def test_streaming_matches_batch_indicators():
+    frame = _bars()
+    batch = batch_indicators(*(frame[[column]].to_numpy() for column in ('high', 'low', 'close')))
+    _assert_matches(_streamed(frame), {column: values[:, 0] for column, values in batch.items()})
+
+
+def test_streaming_matches_add_technical_indicators():
+    pytest.importorskip("pandas_ta")
+    from alpaca_data import add_technical_indicators
+
+    frame = _bars()
+    expected = add_technical_indicators(frame.copy())
+    _assert_matches(_streamed(frame), {column: expected[column].to_numpy() for column in StreamingIndicators.columns})
+
+
+def test_bar_buffer_matches_add_technical_indicators():
+    pytest.importorskip("pandas_ta")
+    from alpaca_data import add_technical_indicators
+
+    frame = _bars()
+    buffer = BarBuffer(None, "TSLA")
+    assert buffer.append(frame.iloc[:200]) == 200
+    assert buffer.append(frame.iloc[150:]) == 200 # bars already held are skipped
+    buffered = buffer.to_data_frame()
+    expected = add_technical_indicators(frame.copy())
+    assert buffered.index.equals(expected.index)
+    _assert_matches({column: buffered[column].to_numpy() for column in StreamingIndicators.columns},
+                    {column: expected[column].to_numpy() for column in StreamingIndicators.columns})
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from machine_learning import save_model_bundle
+from model_bundle import feature_columns, load_predictor_arrays
+from predictor import KNNPredictor, load_predictor
+
+# predictor.npz and KNNPredictor take a KNN model's training rows from the arrays
+# training already has (the scaled rows and the labels as indices into classes_)
+# rather than from scikit-learn's private fitted attributes, and fail clearly when
+# the rows given are not the ones the model was fitted on.
+
+
+def _training_set(rows_: int = 500):
+    rng = np.random.default_rng(0)
+    X = rng.normal(100.0, 20.0, (rows_, len(feature_columns)))
+    y = np.where(X[:, 0] + rng.normal(0.0, 10.0, rows_) > 100.0, 1, -1)
+    return X, y
+
+
+def test_bundle_arrays_are_the_scaled_training_rows(tmp_path):
+    X, y = _training_set()
+    scaler = StandardScaler().fit(X)
+    model = KNeighborsClassifier(n_neighbors=5).fit(scaler.transform(X), y)
+    save_model_bundle(model, scaler, X, y, str(tmp_path))
+
+    arrays = load_predictor_arrays(bundle_dir=str(tmp_path))
+    np.testing.assert_array_equal(arrays['training_data'], scaler.transform(X))
+    np.testing.assert_array_equal(arrays['classes'][arrays['labels']], y)
+
+    predictor = load_predictor(bundle_dir=str(tmp_path))
+    probes = _training_set(50)[0] + 0.5
+    assert [predictor.predict(row) for row in probes] == list(model.predict(scaler.transform(probes)))
+
+
+def test_bundle_rejects_rows_the_model_was_not_fitted_on(tmp_path):
+    X, y = _training_set()
+    model = KNeighborsClassifier(n_neighbors=5).fit(X, y)
+    with pytest.raises(ValueError):
+        save_model_bundle(model, None, X[:-1], y[:-1], str(tmp_path))
+
+
+def test_predictor_from_training_arrays():
+    X, y = _training_set()
+    model = KNeighborsClassifier(n_neighbors=5).fit(X, y)
+    predictor = KNNPredictor(model, training_data_=X, y_=y)
+    np.testing.assert_array_equal(predictor.training_data, X)
+    np.testing.assert_array_equal(model.classes_[predictor.labels], y)
+    assert [predictor.predict(row) for row in X[::25]] == list(model.predict(X[::25]))
+
+    with pytest.raises(ValueError):
+        KNNPredictor(model, training_data_=X[:-1], y_=y[:-1])
+    with pytest.raises(ValueError):
+        KNNPredictor(model, training_data_=X, y_=np.zeros(len(y))) # 0 is not one of the classes
+
+
+def test_predictor_without_fitted_attributes_fails_clearly():
+    X, y = _training_set()
+    model = KNeighborsClassifier(n_neighbors=5).fit(X, y)
+    del model._fit_X
+    with pytest.raises(ValueError, match="training_data_"):
+        KNNPredictor(model)
+    np.testing.assert_array_equal(KNNPredictor(model, training_data_=X, y_=y).training_data, X)
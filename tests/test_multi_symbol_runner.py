@@ -0,0 +1,99 @@
+import functools
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+from fake_clients import make_raw_bars, FakeStockHistoricalDataClient
+from machine_learning import feature_columns
+from bar_buffer import BarBuffer
+from multi_symbol_runner import MultiSymbolRunner, fetch_shard_bars
+
+# A shard whose first symbol never trades, and a symbol whose first bars arrive
+# after the first cycle, must still leave every other symbol (and the late one)
+# with a warmed-up lookback and incremental fetches afterwards.
+
+first_end = pd.Timestamp("2025-03-03 13:00", tz="America/New_York")
+lookback = timedelta(days=1)
+
+
+def _raw_bars(symbols_: list) -> dict:
+    return {symbol: make_raw_bars([symbol], 900, start_="2025-03-03 04:00", seed_=index)[symbol] for index, symbol in enumerate(symbols_)}
+
+
+class RecordingClient(FakeStockHistoricalDataClient):
+    """Records the symbols and start of every request and hides the hidden_ symbols' bars."""
+
+    def __init__(self, bars_: dict):
+        super().__init__(bars_)
+        self.requests = []
+        self.hidden = set()
+
+    def get_stock_bars(self, request_params) -> dict:
+        # alpaca-py hands the start over as naive UTC
+        self.requests.append((tuple(request_params.symbol_or_symbols), pd.Timestamp(request_params.start).tz_localize("UTC")))
+        data = super().get_stock_bars(request_params)
+        return {symbol: bars for symbol, bars in data.items() if symbol not in self.hidden}
+
+
+def _warmed_up(buffer_: BarBuffer) -> bool:
+    return not np.isnan(buffer_.latest_features(np.empty(len(feature_columns)), feature_columns)).any()
+
+
+def test_empty_first_symbol_does_not_refetch_lookback_for_the_shard():
+    raw_bars = _raw_bars(["SYM1", "SYM2"])
+    raw_bars["EMPTY"] = []
+    client = RecordingClient(raw_bars)
+    buffers = [BarBuffer(client, symbol) for symbol in ("EMPTY", "SYM1", "SYM2")]
+
+    fetch_shard_bars(client, buffers, first_end, lookback)
+    assert all(_warmed_up(buffer) for buffer in buffers[1:])
+    assert not len(buffers[0])
+
+    client.requests.clear()
+    newest = buffers[1].last_fetched
+    assert fetch_shard_bars(client, buffers, first_end + pd.Timedelta(minutes=1), lookback) == 2
+    # The lookback is only asked again for the symbol without bars
+    lookback_requests = [request for request in client.requests if request[1] == first_end + pd.Timedelta(minutes=1) - lookback]
+    assert [request[0] for request in lookback_requests] == [("EMPTY",)]
+    incremental = [request for request in client.requests if request not in lookback_requests]
+    assert incremental == [(("SYM1", "SYM2"), newest + pd.Timedelta(minutes=1))]
+
+
+def test_late_symbol_gets_full_lookback():
+    client = RecordingClient(_raw_bars(["SYM1", "SYM2"]))
+    client.hidden = {"SYM2"}
+    buffers = [BarBuffer(client, symbol) for symbol in ("SYM1", "SYM2")]
+    fetch_shard_bars(client, buffers, first_end, lookback)
+    assert buffers[1].last_fetched is None
+
+    client.hidden = set()
+    fetch_shard_bars(client, buffers, first_end + pd.Timedelta(minutes=1), lookback)
+    assert _warmed_up(buffers[1])
+    assert buffers[0].last_timestamp == buffers[1].last_timestamp
+
+
+def fake_client(symbols_: list) -> FakeStockHistoricalDataClient:
+    bars = _raw_bars([symbol for symbol in symbols_ if symbol != "EMPTY"])
+    bars["EMPTY"] = []
+    return FakeStockHistoricalDataClient(bars)
+
+
+class SignPredictor:
+    features = feature_columns
+
+    def predict(self, row_: np.ndarray) -> int:
+        return 1 if row_[0] > row_[feature_columns.index('MA40')] else -1
+
+
+def sign_predictor() -> SignPredictor:
+    return SignPredictor()
+
+
+def test_runner_with_empty_first_symbol():
+    with MultiSymbolRunner(["EMPTY", "SYM1", "SYM2"], fake_client, sign_predictor, workers_=1, lookback_=lookback) as runner:
+        for cycle in range(3):
+            result = runner.run_cycle((first_end + pd.Timedelta(minutes=cycle)).timestamp())
+            assert result['errors'] == {}
+            assert result['predictions']['EMPTY'] == 0
+            assert result['predictions']['SYM1'] != 0 and result['predictions']['SYM2'] != 0
+        assert result['bars'] == 2
@@ -0,0 +1,91 @@
+import threading
+import numpy as np
+
+from online_learning import OnlineKNN, OnlineLearner
+
+# OnlineKNN's batched index rebuilds, and OnlineLearner's hot swap: predicting on
+# the main thread while the worker publishes new predictors must always see a
+# whole predictor, old or new, never one with part of an update.
+
+features = ["a", "b", "c"]
+classes = np.array([-1, 1])
+probe = np.zeros(len(features))
+batch_rows = 5
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _model(**kwargs) -> OnlineKNN:
+    rng = np.random.default_rng(0)
+    training_data = rng.normal(100.0, 10.0, (50, len(features)))
+    return OnlineKNN(training_data, rng.integers(0, 2, 50), classes, n_neighbors_=batch_rows, features_=features, **kwargs)
+
+
+def _batch(number_: int) -> tuple:
+    # Rows closer to the probe than every earlier batch, so the newest batch decides its prediction
+    X = np.tile(probe, (batch_rows, 1)) + 1.0 / (number_ + 2) + np.arange(batch_rows)[:, None] * 1e-6
+    return X, np.full(batch_rows, -1 if number_ % 2 else 1)
+
+
+def test_rebuilds_are_batched_by_rows_and_time():
+    clock = FakeClock()
+    model = _model(rebuild_rows_=10, rebuild_seconds_=60.0, clock_=clock)
+    initial = model.predictor()
+    assert model.update(*_batch(0)) is initial
+    assert model.pending_rows == batch_rows
+    rebuilt = model.update(*_batch(1))
+    assert rebuilt is not initial
+    assert len(rebuilt.training_data) == 50 + 2 * batch_rows
+    assert rebuilt.predict(probe) == -1
+
+    assert model.update(*_batch(2)) is rebuilt
+    clock.now = 60.0
+    timed = model.update(*_batch(3))
+    assert timed is not rebuilt
+    assert len(timed.training_data) == 50 + 4 * batch_rows
+    assert model.pending_rows == 0
+
+
+def test_predictions_during_updates_see_whole_predictors():
+    learner = OnlineLearner(_model(rebuild_rows_=1)).start()
+    initial = learner.predictor
+    initial_prediction = initial.predict(probe)
+    batches = 40
+    done = threading.Event()
+
+    def feed():
+        for number in range(batches):
+            for row, label in zip(*_batch(number)):
+                learner._queue.put((row, int(label)))
+            learner.flush()
+        done.set()
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    seen = []
+    while not done.is_set() or not seen or seen[-1][0] is not learner.predictor:
+        predictor = learner.predictor
+        seen.append((predictor, predictor.predict(probe)))
+    feeder.join()
+    learner.stop()
+
+    assert learner.stats()['updates'] == batches
+    assert learner.version == batches
+    assert len({id(predictor) for predictor, _ in seen}) > 1
+    published_rows = -1
+    for predictor, prediction in seen:
+        rows = len(predictor.training_data)
+        assert len(predictor.labels) == rows == predictor.tree.n
+        # Each published predictor holds whole batches, and the newest of them decides the prediction
+        absorbed, partial = divmod(rows - 50, batch_rows)
+        assert partial == 0
+        assert prediction == (initial_prediction if absorbed == 0 else (-1 if (absorbed - 1) % 2 else 1))
+        assert rows >= published_rows
+        published_rows = rows
+    assert published_rows == 50 + batches * batch_rows
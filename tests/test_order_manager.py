@@ -0,0 +1,213 @@
+import asyncio
+from types import SimpleNamespace
+
+from alpaca_paper_trading import OrderManager
+from fake_clients import FakeTradingClient
+
+# OrderManager's local book against FakeTradingClient. With instant_fills_=False the
+# fake answers every order as the broker answers a market order, "accepted" with
+# nothing filled, and only fills it on fill_open_orders.
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _manager(client_: FakeTradingClient, clock_: FakeClock = None) -> OrderManager:
+    return OrderManager(client_, max_workers=2, reconcile_interval=300.0, clock=clock_ or FakeClock())
+
+
+def test_instant_fill_updates_book():
+    client = FakeTradingClient()
+    manager = _manager(client)
+    manager.submit_order("TSLA", 2, "buy")
+    assert manager.position("TSLA") == 2
+    assert manager.open_quantity("TSLA") == 0
+
+
+def test_accepted_order_counts_as_pending_until_filled():
+    client = FakeTradingClient(instant_fills_=False)
+    manager = _manager(client)
+    result = manager.submit_order("TSLA", 1, "buy")
+    assert result['status'] == "accepted"
+    assert manager.position("TSLA") == 0
+    assert manager.open_quantity("TSLA") == 1
+
+    client.fill_open_orders()
+    # Picked up from the open order on the next check, well before the next reconciliation
+    assert manager.position("TSLA") == 1
+    assert manager.open_quantity("TSLA") == 0
+    assert client.calls['get_all_positions'] == 1
+
+
+def test_partial_fills():
+    client = FakeTradingClient(instant_fills_=False)
+    manager = _manager(client)
+    manager.submit_order("TSLA", 5, "buy")
+    client.fill_open_orders(qty_=2)
+    assert manager.position("TSLA") == 2
+    assert manager.open_quantity("TSLA") == 3
+    client.fill_open_orders(qty_=2)
+    assert manager.position("TSLA") == 4
+    client.fill_open_orders()
+    assert manager.position("TSLA") == 5
+    assert manager.open_quantity("TSLA") == 0
+
+    # A finished order is no longer fetched
+    order_calls = client.calls['get_order_by_id']
+    manager.position("TSLA")
+    assert client.calls['get_order_by_id'] == order_calls
+
+
+def test_sell_fill_reduces_position():
+    client = FakeTradingClient(instant_fills_=False)
+    manager = _manager(client)
+    manager.submit_order("TSLA", 3, "buy")
+    client.fill_open_orders()
+    manager.submit_order("TSLA", 3, "sell")
+    assert manager.position("TSLA") == 3
+    assert manager.open_quantity("TSLA") == -3
+    client.fill_open_orders()
+    assert manager.position("TSLA") == 0
+
+
+def test_rebalance_nets_open_orders():
+    client = FakeTradingClient(instant_fills_=False)
+    manager = _manager(client)
+    assert len(manager.rebalance({'TSLA': 3, 'AAPL': 2})) == 2
+    # The unfilled orders already cover the targets
+    assert manager.rebalance({'TSLA': 3, 'AAPL': 2}) == []
+    client.fill_open_orders(qty_=1)
+    assert manager.rebalance({'TSLA': 3, 'AAPL': 2}) == []
+    orders = manager.rebalance({'TSLA': 1, 'AAPL': 2})
+    assert [(order['symbol'], order['side'], order['quantity']) for order in orders] == [("TSLA", "SELL", 2)]
+
+
+class FillDuringPositions(FakeTradingClient):
+    """Fills the open orders right after the first positions snapshot is taken."""
+
+    def get_all_positions(self) -> list:
+        positions = super().get_all_positions()
+        if self.calls['get_all_positions'] == 2:
+            self.fill_open_orders()
+        return positions
+
+
+def test_reconcile_does_not_count_a_fill_twice():
+    client = FillDuringPositions(instant_fills_=False)
+    clock = FakeClock()
+    manager = _manager(client, clock)
+    assert manager.position("TSLA") == 0
+    manager.submit_order("TSLA", 1, "buy")
+    clock.now = 300.0
+    assert manager.position("TSLA") == 1
+    assert client.calls['get_all_positions'] == 3 # the snapshot with a fill in flight was retaken
+    assert manager.position("TSLA") == 1
+    assert manager.stats['discrepancies'] == 0
+
+
+class FailingPositions(FakeTradingClient):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = False
+
+    def get_all_positions(self) -> list:
+        if self.fail:
+            self._round_trip("get_all_positions")
+            raise ConnectionError("503 Service Unavailable")
+        return super().get_all_positions()
+
+
+def test_reconcile_error_keeps_book_and_retries():
+    client = FailingPositions()
+    clock = FakeClock()
+    manager = _manager(client, clock)
+    manager.submit_order("TSLA", 2, "buy")
+    assert manager.position("TSLA") == 2
+
+    client.fail = True
+    clock.now = 300.0
+    assert 'error' in manager.reconcile()
+    assert manager.position("TSLA") == 2
+    assert manager.stats['reconciliations'] == 1
+
+    client.fail = False
+    assert manager.position("TSLA") == 2
+    assert manager.stats['reconciliations'] == 2
+
+
+def test_reconcile_adopts_broker_positions():
+    client = FakeTradingClient()
+    clock = FakeClock()
+    manager = _manager(client, clock)
+    manager.submit_order("TSLA", 2, "buy")
+    client.positions["AAPL"] = [4.0, 400.0] # bought outside this manager
+    clock.now = 300.0
+    assert manager.position("AAPL") == 4
+    assert manager.stats['discrepancies'] == 1
+
+
+def test_trade_updates_reach_book():
+    class FakeTradingStream:
+        def subscribe_trade_updates(self, handler):
+            self.handler = handler
+
+    client = FakeTradingClient(instant_fills_=False)
+    manager = _manager(client)
+    stream = FakeTradingStream()
+    manager.subscribe(stream)
+    order_id = manager.submit_order("TSLA", 1, "buy")['order_id']
+    client.fill_open_orders()
+    asyncio.run(stream.handler(SimpleNamespace(event="fill", order=client.get_order_by_id(order_id))))
+    assert manager.positions == {'TSLA': 1}
+    assert manager.open_quantity("TSLA") == 0
+
+
+class FillAfterFetch(FakeTradingClient):
+    """After the fetches_-th order fetch, fills the open orders and hands them to the manager as trade updates."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.manager = None
+        self.fetches = None
+
+    def get_order_by_id(self, order_id):
+        order = super().get_order_by_id(order_id)
+        if self.fetches is not None:
+            self.fetches -= 1
+            if self.fetches == 0:
+                self.fetches = None
+                self.fill_open_orders()
+                self.manager.apply_order_update(super().get_order_by_id(order_id))
+        return order
+
+
+def test_reconcile_keeps_trade_update_applied_after_snapshot():
+    client = FillAfterFetch(instant_fills_=False)
+    clock = FakeClock()
+    manager = _manager(client, clock)
+    client.manager = manager
+    manager.submit_order("TSLA", 1, "buy")
+    client.fetches = 2 # the order fetch right after the positions snapshot
+    assert manager.reconcile()['positions'] == {'TSLA': 1}
+    assert manager.positions == {'TSLA': 1}
+    assert manager.open_quantity("TSLA") == 0
+    assert manager.stats['discrepancies'] == 0
+
+
+def test_finished_orders_leave_book_and_are_not_counted_again():
+    client = FakeTradingClient(instant_fills_=False)
+    manager = OrderManager(client, max_workers=2, reconcile_interval=300.0, clock=FakeClock(), max_finished=2)
+    order_ids = [str(manager.submit_order("TSLA", 1, "buy")['order_id']) for _ in range(3)]
+    client.fill_open_orders()
+    assert manager.position("TSLA") == 3
+    assert manager.orders == {}
+    assert list(manager._finished) == order_ids[1:]
+
+    # A repeated fill update for a remembered order changes nothing
+    manager.apply_order_update(client.get_order_by_id(order_ids[2]))
+    assert manager.positions == {'TSLA': 3}
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from backtest import run_backtest
+from fake_clients import make_bar_frame
+from rule_sweep import bars_per_year, build_sweep_arrays, parameter_grid, rule_signals, sweep_rule_strategy
+
+# Every row of sweep_rule_strategy, which only visits the fills, against
+# backtest.run_backtest run symbol by symbol on the same parameter set's
+# rule_signals, with symbols of different lengths and nonzero trading costs.
+
+slippage_bps = 2.0
+commission_per_share = 0.005
+quantity = 3
+
+
+def _sharpe(equity_: np.ndarray) -> float:
+    bar_pnl = np.diff(equity_, prepend=100_000.0)
+    return bar_pnl.mean() / bar_pnl.std() * np.sqrt(bars_per_year) if bar_pnl.std() > 0 else 0.0
+
+
+def test_sweep_matches_run_backtest():
+    frames = {f"SYM{index}": make_bar_frame(3000 - 700 * index, seed_=index) for index in range(3)}
+    grid = parameter_grid(rsi_lower_=(30, 40), rsi_upper_=(60, 70), fast_lengths_=(5, 20), slow_lengths_=(40,), rsi_lengths_=(7, 14))
+    sweep = sweep_rule_strategy(frames, grid, n_jobs_=1, quantity_=quantity, slippage_bps_=slippage_bps,
+                                commission_per_share_=commission_per_share)
+    assert sweep['combinations'] == len(grid)
+    assert sweep['table']['trades'].sum() > 0
+
+    for row in sweep['table'].to_dict("records"):
+        params = {key: row[key] for key in ('rsi_length', 'rsi_lower', 'rsi_upper', 'fast', 'slow')}
+        arrays = build_sweep_arrays(frames, [params['fast'], params['slow']], [params['rsi_length']])
+        signals = rule_signals(arrays, params)
+        backtests = [run_backtest(frame, signals[index, :len(frame)], quantity_=quantity, slippage_bps_=slippage_bps,
+                                  commission_per_share_=commission_per_share)
+                     for index, frame in enumerate(frames.values())]
+        pnls = [backtest['pnl'] for backtest in backtests]
+        assert row['pnl'] == pytest.approx(sum(pnls), abs=1e-6), params
+        assert row['worst_symbol_pnl'] == pytest.approx(min(pnls), abs=1e-6), params
+        assert row['trades'] == sum(backtest['trades'] for backtest in backtests), params
+        assert row['sharpe'] == pytest.approx(np.mean([_sharpe(backtest['equity'].to_numpy()) for backtest in backtests]),
+                                              rel=1e-6, abs=1e-9), params
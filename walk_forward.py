@@ -0,0 +1,148 @@
+import time
+import numpy as np
+import pandas as pd
+import joblib
+from joblib import Parallel, delayed
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+
+from machine_learning import feature_columns
+
+# Walk-forward (expanding window) training for the candlestick direction models.
+# The feature matrix is cleaned and converted to float32 once, then every
+# candidate/fold pair reads slices of that same array. Candidates run in a
+# joblib process pool, which memory-maps large arrays into the workers instead
+# of pickling a copy per task.
+
+
+def build_feature_matrix(data_: pd.DataFrame, features_: list = None) -> tuple:
+    """
+    Clean a labeled frame once and return the arrays every fold trains on.
+
+    Args:
+        data_: DataFrame from classify_price_gap (technical indicators plus 'Higher/Lower')
+        features_: Feature columns, defaults to the ones the KNN model is trained on
+
+    Returns:
+        (X float32 array, y int8 array, index of the kept rows) in chronological order
+    """
+    features = feature_columns if features_ is None else features_
+    clean_data_ = data_.sort_index().dropna() # Remove NaN
+    clean_data_ = clean_data_[clean_data_['Higher/Lower'] != 0] # Remove no change 0 classifier
+    X = np.ascontiguousarray(clean_data_[features].to_numpy(dtype=np.float32))
+    y = clean_data_['Higher/Lower'].to_numpy(dtype=np.int8)
+    return X, y, clean_data_.index
+
+
+def walk_forward_splits(rows_: int, folds_: int = 5, min_train_fraction_: float = 0.5, gap_: int = 1) -> list:
+    """
+    Expanding-window folds: each fold trains on everything before its test block.
+
+    Args:
+        rows_: Number of rows in the feature matrix
+        folds_: Number of test blocks
+        min_train_fraction_: Share of rows always used for training before the first test block
+        gap_: Rows dropped between train and test, since each label looks one bar ahead
+
+    Returns:
+        List of (train_end, test_start, test_end) row positions, without the folds that would
+        have no training rows before the gap
+    """
+    first_test = int(rows_ * min_train_fraction_)
+    boundaries = np.linspace(first_test, rows_, folds_ + 1).astype(int)
+    return [(int(start) - gap_, int(start), int(end)) for start, end in zip(boundaries[:-1], boundaries[1:])
+            if end > start and start - gap_ >= 1]
+
+
+def _make_model(model_type_: str, params_: dict):
+    if model_type_ == "knn":
+        return KNeighborsClassifier(**params_)
+    if model_type_ == "rf":
+        return RandomForestClassifier(random_state=42, n_jobs=1, **params_)
+    raise ValueError(f"Unknown model type: {model_type_}")
+
+
+def _evaluate_candidate(X: np.ndarray, y: np.ndarray, splits_: list, model_type_: str, params_: dict) -> dict:
+    folds = []
+    for train_end, test_start, test_end in splits_:
+        model = _make_model(model_type_, params_)
+        start_time = time.perf_counter()
+        model.fit(X[:train_end], y[:train_end])
+        fit_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        y_pred = model.predict(X[test_start:test_end])
+        predict_seconds = time.perf_counter() - start_time
+        folds.append({
+            'train_rows': train_end,
+            'test_rows': test_end - test_start,
+            'accuracy': accuracy_score(y[test_start:test_end], y_pred),
+            'fit_seconds': fit_seconds,
+            'predict_seconds': predict_seconds
+        })
+    return {
+        'model_type': model_type_,
+        'params': params_,
+        'mean_accuracy': float(np.mean([fold['accuracy'] for fold in folds])),
+        'folds': folds
+    }
+
+
+def walk_forward_search(data_: pd.DataFrame, knn_neighbors_: tuple = (3, 5, 7, 9, 15, 25),
+                        rf_params_: list = None, folds_: int = 5, n_jobs_: int = -1,
+                        model_filename: str = None) -> dict:
+    """
+    Grid-search KNN and Random Forest parameters with walk-forward validation and save the best model.
+
+    Args:
+        data_: DataFrame from classify_price_gap
+        knn_neighbors_: KNN n_neighbors values to try
+        rf_params_: Random Forest parameter dicts to try (default: a small n_estimators/max_depth grid)
+        folds_: Number of walk-forward folds
+        n_jobs_: Worker processes (-1 uses every core)
+        model_filename: Filename to save the best model, refit on all rows (default: "<model_type>_model.pkl",
+            so a Random Forest is never saved under the name load_knn_model reads)
+
+    Returns:
+        Dictionary with the best candidate and the results of every candidate
+    """
+    if rf_params_ is None:
+        rf_params_ = [{'n_estimators': n_estimators, 'max_depth': max_depth}
+                      for n_estimators in (100, 200) for max_depth in (None, 10)]
+    X, y, _ = build_feature_matrix(data_)
+    splits = walk_forward_splits(len(X), folds_=folds_)
+
+    candidates = [("knn", {'n_neighbors': neighbors}) for neighbors in knn_neighbors_]
+    candidates += [("rf", params) for params in rf_params_]
+
+    start_time = time.perf_counter()
+    results = Parallel(n_jobs=n_jobs_)(
+        delayed(_evaluate_candidate)(X, y, splits, model_type, params) for model_type, params in candidates
+    )
+    search_seconds = time.perf_counter() - start_time
+    results.sort(key=lambda result: result['mean_accuracy'], reverse=True)
+
+    for result in results:
+        fold_seconds = sum(fold['fit_seconds'] + fold['predict_seconds'] for fold in result['folds'])
+        print(f"{result['model_type']} {result['params']}: mean accuracy {result['mean_accuracy']:.4f} ({fold_seconds:.2f}s over {len(result['folds'])} folds)")
+
+    best = results[0]
+    model = _make_model(best['model_type'], best['params'])
+    model.fit(X, y)
+
+    print(f"Best model: {best['model_type']} {best['params']}")
+    print(f"Walk-forward accuracy: {best['mean_accuracy']:.4f}")
+    print(f"Search took {search_seconds:.2f} seconds")
+
+    # Save the model
+    model_filename = f"{best['model_type']}_model.pkl" if model_filename is None else model_filename
+    joblib.dump(model, model_filename)
+    print(f"Model saved as: {model_filename}")
+
+    return {
+        'best': best,
+        'results': results,
+        'search_seconds': search_seconds,
+        'model': model,
+        'model_filename': model_filename
+    }